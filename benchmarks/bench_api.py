@@ -0,0 +1,129 @@
+"""
+Localhost load test of the HTTP API (src/school_api.py): concurrent keep-alive clients
+posting attendance in batches of different sizes, then one streamed NDJSON read.
+The server runs in its own process on a scratch database.
+
+    python benchmarks/bench_api.py --clients 32 --rows 20000 --workers 4
+"""
+import argparse
+import asyncio
+import datetime
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+SRC = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+sys.path.insert(0, SRC)
+
+from school_core import DatabaseManager
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def seed(db_name, students, courses):
+    db = DatabaseManager(db_name)
+    student_ids = db.insert_students([(f"Name{i}", f"Last{i}", "2008-01-01") for i in range(students)])
+    course_ids = [db.insert_course(f"Course {i}", "120 ore", f"Prof. {i}") for i in range(courses)]
+    return student_ids, course_ids
+
+async def request(reader, writer, method, path, body=b""):
+    writer.write(f"{method} {path} HTTP/1.1\r\nHost: localhost\r\nContent-Type: application/json\r\n"
+                 f"Content-Length: {len(body)}\r\n\r\n".encode() + body)
+    await writer.drain()
+    status = int((await reader.readline()).split()[1])
+    headers = {}
+    while (line := await reader.readline()) not in (b"\r\n", b""):
+        key, _, value = line.decode().partition(":")
+        headers[key.strip().lower()] = value.strip()
+    if headers.get("transfer-encoding") == "chunked":
+        received = 0
+        while (size := int((await reader.readline()).strip(), 16)):
+            received += len(await reader.readexactly(size + 2)) - 2
+        await reader.readline()
+        return status, received
+    return status, await reader.readexactly(int(headers["content-length"]))
+
+async def post_attendance(port, clients, rows, batch_size, student_ids, course_ids):
+    # Every (student, course, date) is distinct so each row really is written
+    all_rows = [{"student_id": student_ids[i % len(student_ids)], "course_id": course_ids[(i // len(student_ids)) % len(course_ids)],
+                 "date": (datetime.date(2025, 9, 1) + datetime.timedelta(days=i // (len(student_ids) * len(course_ids)))).isoformat(),
+                 "status": "Present"} for i in range(rows)]
+    batches = [json.dumps(all_rows[i:i + batch_size]).encode() for i in range(0, rows, batch_size)]
+    queue = asyncio.Queue()
+    for batch in batches:
+        queue.put_nowait(batch)
+
+    async def client():
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        failed = 0
+        while not queue.empty():
+            status, _ = await request(reader, writer, "POST", "/attendance", queue.get_nowait())
+            failed += status != 200
+        writer.close()
+        return failed
+
+    start = time.perf_counter()
+    failed = sum(await asyncio.gather(*(client() for _ in range(clients))))
+    return time.perf_counter() - start, len(batches), failed
+
+async def stream_attendance(port):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    start = time.perf_counter()
+    _, received = await request(reader, writer, "GET", "/attendance")
+    elapsed = time.perf_counter() - start
+    writer.close()
+    return elapsed, received
+
+async def wait_until_up(port, timeout=10):
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            _, writer = await asyncio.open_connection("127.0.0.1", port)
+            writer.close()
+            return
+        except OSError:
+            if time.monotonic() > deadline:
+                raise
+            await asyncio.sleep(0.1)
+
+async def run(args, port, student_ids, course_ids):
+    await wait_until_up(port)
+    print(f"{args.rows} attendance rows, {args.clients} clients, {args.workers} DB workers")
+    for batch_size in args.batch_sizes:
+        rows = min(args.rows, batch_size * 2000) # Keep the per-row requests run short
+        elapsed, requests, failed = await post_attendance(port, args.clients, rows, batch_size, student_ids, course_ids)
+        print(f"  POST batch={batch_size:>5}: {requests / elapsed:>8,.0f} req/s {rows / elapsed:>10,.0f} rows/s"
+              f"  ({rows} rows, {failed} failed)")
+    elapsed, received = await stream_attendance(port)
+    print(f"  GET /attendance (NDJSON): {received / 1e6:.1f} MB in {elapsed:.2f}s")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, default=16)
+    parser.add_argument("--rows", type=int, default=20000)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 100, 1000])
+    parser.add_argument("--students", type=int, default=500)
+    parser.add_argument("--courses", type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_name = os.path.join(tmp, "school_data.db")
+        student_ids, course_ids = seed(db_name, args.students, args.courses)
+        port = free_port()
+        server = subprocess.Popen([sys.executable, os.path.join(SRC, "school_api.py"), "--db", db_name,
+                                   "--port", str(port), "--workers", str(args.workers)], stdout=subprocess.DEVNULL)
+        try:
+            asyncio.run(run(args, port, student_ids, course_ids))
+        finally:
+            server.terminate()
+            server.wait()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""
+Hot-path reads before and after moving closed academic years to archive files.
+
+Seeds several years of attendance, times the everyday queries (one course's
+attendance, a day's roll-call, the early-warning scan), archives every closed year
+and times them again, plus one historical query on an attached archive.
+
+    python benchmarks/bench_archive.py --years 5 --students 1000
+"""
+import argparse
+import datetime
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from school_core import DatabaseManager
+from school_core.academic_year import academic_year_bounds, academic_year_of
+
+def timed(fn, repeat=5):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+def seed(db_manager, years, students, courses):
+    db_manager.insert_students([(f"Name{i}", f"Last{i}", "2010-01-01") for i in range(students)])
+    for c in range(courses):
+        db_manager.insert_course(f"Course{c}", 40, f"Teacher{c}")
+    student_ids = [row[0] for row in db_manager.fetch_students()]
+    course_ids = [row[0] for row in db_manager.fetch_courses()]
+    current = academic_year_of()
+    first_year = int(current[:4]) - years
+    for year in range(first_year, first_year + years + 1):
+        start, end = academic_year_bounds(f"{year}-{year + 1}")
+        end = min(end, datetime.date.today())
+        rows = []
+        day = start
+        while day <= end:
+            if day.weekday() < 5:
+                rows += [(s, course_ids[s % courses], day.isoformat(), "Absent" if (s + day.day) % 9 == 0 else "Present")
+                         for s in student_ids]
+            day += datetime.timedelta(days=1)
+        db_manager.record_attendance_many(rows)
+    return course_ids, [f"{year}-{year + 1}" for year in range(first_year, first_year + years)]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--years", type=int, default=5, help="Closed academic years of history")
+    parser.add_argument("--students", type=int, default=1000)
+    parser.add_argument("--courses", type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_manager = DatabaseManager(os.path.join(tmp, "school.db"))
+        course_ids, closed_years = seed(db_manager, args.years, args.students, args.courses)
+        today = datetime.date.today().isoformat()
+        queries = {
+            "one course's attendance": lambda: db_manager.fetch_attendance(course_id=course_ids[0]),
+            "today's roll-call": lambda: db_manager.fetch_attendance(attendance_date=today),
+            "early-warning scan": lambda: sum(len(rows) for rows in db_manager.iter_attendance_records()),
+        }
+
+        def report(label):
+            size = os.path.getsize(db_manager.db_name) / 2 ** 20
+            print(f"--- {label}: live database {size:.1f} MB")
+            for name, query in queries.items():
+                print(f"{name:<40}{timed(query) * 1000:>9.1f}ms")
+
+        report(f"{args.years} closed years in the live database")
+        start = time.perf_counter()
+        for year in closed_years:
+            db_manager.archive_academic_year(year, vacuum=year == closed_years[-1])
+        print(f"archived {len(closed_years)} years in {time.perf_counter() - start:.1f}s")
+        report("closed years archived")
+        historical = timed(lambda: db_manager.fetch_attendance(course_id=course_ids[0], academic_year=closed_years[0]))
+        print(f"{'one course, archived year (ATTACH)':<40}{historical * 1000:>9.1f}ms")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""
+Attendance bitmaps vs. the SQL `attendance` table: memory and query time for the
+set and range questions (absent on all of these days, present in A but not B,
+absences per student in a month, one course on one day).
+
+    python benchmarks/bench_attendance_bitmap.py --students 1000 --courses 40 --days 180
+"""
+import argparse
+import datetime
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from school_core import DatabaseManager
+
+STATUSES = ["Present"] * 85 + ["Absent"] * 8 + ["Late"] * 5 + ["Excused"] * 2
+
+def school_days(count, start=datetime.date(2025, 9, 15)):
+    days, day = [], start
+    while len(days) < count:
+        if day.weekday() < 5:
+            days.append(day.isoformat())
+        day += datetime.timedelta(days=1)
+    return days
+
+def seed(db, students, courses, days, per_student):
+    student_ids = db.insert_students([(f"Name{i}", f"Last{i}", "2008-01-01") for i in range(students)])
+    course_ids = [db.insert_course(f"Course {i}", "120 ore", f"Prof. {i}") for i in range(courses)]
+    rng = random.Random(0)
+    enrollments = {s: rng.sample(course_ids, per_student) for s in student_ids}
+    for day in days:
+        db.record_attendance_many((s, c, day, rng.choice(STATUSES)) for s, cs in enrollments.items() for c in cs)
+    return course_ids
+
+def best_of(fn, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings), result
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--students", type=int, default=1000)
+    parser.add_argument("--courses", type=int, default=40)
+    parser.add_argument("--courses-per-student", type=int, default=6)
+    parser.add_argument("--days", type=int, default=180)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db = DatabaseManager(os.path.join(tmp, "school_data.db"))
+        days = school_days(args.days)
+        start = time.perf_counter()
+        course_ids = seed(db, args.students, args.courses, days, args.courses_per_student)
+        conn = sqlite3.connect(db.db_name)
+        rows = conn.execute("SELECT COUNT(*) FROM attendance").fetchone()[0]
+        print(f"{rows:,} attendance rows seeded in {time.perf_counter() - start:.1f}s")
+
+        start = time.perf_counter()
+        bitmaps = db.attendance_bitmaps()
+        print(f"bitmaps built from the table in {time.perf_counter() - start:.2f}s")
+        conn.execute("VACUUM")
+        page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+        try:
+            table_bytes = conn.execute("SELECT SUM(pgsize) FROM dbstat WHERE name LIKE '%attendance%'").fetchone()[0]
+        except sqlite3.OperationalError: # SQLite built without dbstat: count the whole file
+            table_bytes = conn.execute("PRAGMA page_count").fetchone()[0] * page_size
+        print(f"memory: SQL table + index {table_bytes / 1e6:.1f} MB, bitmaps {bitmaps.nbytes() / 1e6:.1f} MB\n")
+
+        course_a, course_b = course_ids[0], course_ids[1]
+        three_days, week, month = days[10:13], days[20:25], (days[40], days[61])
+        queries = {
+            "absent on all of 3 days": (
+                lambda: sorted(r[0] for r in conn.execute(
+                    "SELECT student_id FROM attendance WHERE course_id = ? AND status = 'Absent' AND attendance_date IN (?, ?, ?) "
+                    "GROUP BY student_id HAVING COUNT(*) = 3", (course_a, *three_days))),
+                lambda: sorted(bitmaps.student_ids(bitmaps.all_days(course_a, "Absent", three_days))),
+            ),
+            "present in A but not B (week)": (
+                lambda: sorted(r[0] for r in conn.execute(
+                    "SELECT student_id FROM attendance WHERE course_id = ? AND status = 'Present' AND attendance_date IN (?, ?, ?, ?, ?) "
+                    "EXCEPT SELECT student_id FROM attendance WHERE course_id = ? AND status = 'Present' AND attendance_date IN (?, ?, ?, ?, ?)",
+                    (course_a, *week, course_b, *week))),
+                lambda: sorted(bitmaps.student_ids(bitmaps.any_day(course_a, "Present", week) & ~bitmaps.any_day(course_b, "Present", week))),
+            ),
+            "absences per student (month)": (
+                lambda: dict(conn.execute(
+                    "SELECT student_id, COUNT(*) FROM attendance WHERE course_id = ? AND status = 'Absent' "
+                    "AND attendance_date BETWEEN ? AND ? GROUP BY student_id", (course_a, *month)).fetchall()),
+                lambda: bitmaps.count_by_student(course_a, "Absent", *month),
+            ),
+            "fetch one course, one day": (
+                lambda: sorted(conn.execute(
+                    "SELECT student_id, course_id, attendance_date, status FROM attendance WHERE course_id = ? AND attendance_date = ?",
+                    (course_a, days[30])).fetchall()),
+                lambda: sorted(bitmaps.fetch(course_id=course_a, attendance_date=days[30])),
+            ),
+        }
+        print(f"{'query':<32}{'SQL':>10}{'bitmaps':>10}{'speedup':>9}")
+        for label, (sql_query, bitmap_query) in queries.items():
+            sql_time, sql_result = best_of(sql_query, args.repeat)
+            bitmap_time, bitmap_result = best_of(bitmap_query, args.repeat)
+            assert sql_result == bitmap_result, label
+            print(f"{label:<32}{sql_time * 1000:>8.2f}ms{bitmap_time * 1000:>8.2f}ms{sql_time / bitmap_time:>8.0f}x")
+        conn.close()
+
+if __name__ == "__main__":
+    main()
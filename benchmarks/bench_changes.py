@@ -0,0 +1,74 @@
+"""
+Incremental export from the change log vs. re-exporting the whole database, and what
+the change-log triggers cost on bulk attendance writes.
+
+    python benchmarks/bench_changes.py --rows 200000 --changes 1000
+"""
+import argparse
+import datetime
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from school_core import DatabaseManager
+from school_core.changes import ChangeConsumer
+
+def attendance_rows(student_ids, course_id, count, first_day):
+    return [(student_ids[i % len(student_ids)], course_id,
+             (first_day + datetime.timedelta(days=i // len(student_ids))).isoformat(), "Present") for i in range(count)]
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return time.perf_counter() - start, result
+
+def full_export(db_manager):
+    rows = 0
+    for table in DatabaseManager.CHANGE_LOG_TABLES:
+        for batch in db_manager._iter_batches(f"SELECT * FROM {table}", (), 5000):
+            rows += len(batch)
+    return rows
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=200000, help="Attendance rows already in the table")
+    parser.add_argument("--changes", type=int, default=1000, help="Writes since the last export")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_manager = DatabaseManager(os.path.join(tmp, "school.db"))
+        db_manager.insert_students([(f"Name{i}", f"Last{i}", "2010-01-01") for i in range(1000)])
+        db_manager.insert_course("Course", 40, "Teacher")
+        student_ids = [row[0] for row in db_manager.fetch_students()]
+        course_id = db_manager.fetch_courses()[0][0]
+
+        with_triggers, _ = timed(lambda: db_manager.record_attendance_many(
+            attendance_rows(student_ids, course_id, args.rows, datetime.date(2020, 1, 1))))
+        consumer = ChangeConsumer(db_manager, "bench", batch_size=5000)
+        consumer.consume(lambda changes: None)
+
+        # Same bulk write on a database without the triggers
+        bare = DatabaseManager(os.path.join(tmp, "bare.db"))
+        with sqlite3.connect(bare.db_name) as conn:
+            for (name,) in conn.execute("SELECT name FROM sqlite_master WHERE type = 'trigger'").fetchall():
+                conn.execute(f"DROP TRIGGER {name}")
+        bare.insert_students([(f"Name{i}", f"Last{i}", "2010-01-01") for i in range(1000)])
+        bare.insert_course("Course", 40, "Teacher")
+        without_triggers, _ = timed(lambda: bare.record_attendance_many(
+            attendance_rows(student_ids, course_id, args.rows, datetime.date(2020, 1, 1))))
+
+        db_manager.record_attendance_many(attendance_rows(student_ids, course_id, args.changes, datetime.date(2030, 1, 1)))
+        full, exported = timed(lambda: full_export(db_manager))
+        incremental, changed = timed(lambda: consumer.consume(lambda changes: None))
+
+        print(f"{'bulk write ' + str(args.rows) + ' rows, no triggers':<40}{without_triggers * 1000:>9.0f}ms")
+        print(f"{'bulk write ' + str(args.rows) + ' rows, change log':<40}{with_triggers * 1000:>9.0f}ms")
+        print(f"{'full export (' + str(exported) + ' rows)':<40}{full * 1000:>9.1f}ms")
+        print(f"{'incremental export (' + str(changed) + ' changes)':<40}{incremental * 1000:>9.1f}ms")
+
+if __name__ == "__main__":
+    main()
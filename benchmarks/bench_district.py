@@ -0,0 +1,94 @@
+"""
+Multi-campus mode: one SQLite file per campus vs. one file for the whole district.
+
+Writers: one thread per campus records attendance in small transactions, either into
+its own campus file or all into the same file (where they queue on its write lock).
+Reports: district enrollment and supply needs, campus by campus vs. scattered over
+the ShardRouter's thread pool.
+
+    python benchmarks/bench_district.py --campuses 12 --students 2000
+"""
+import argparse
+import datetime
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from school_core import DatabaseManager, ShardRouter
+
+def seed(db_manager, students, rng):
+    db_manager.insert_students([(f"Name{i}", f"Last{i}", "2010-01-01") for i in range(students)])
+    for c in range(20):
+        db_manager.insert_course(f"Course{c}", 40, f"Teacher{c % 7}")
+    course_ids = [row[0] for row in db_manager.fetch_courses()]
+    student_ids = [row[0] for row in db_manager.fetch_students()]
+    # Enrolled before the rooms are scheduled: an unscheduled course has no seat limit: rooms stay overfull
+    db_manager.assign_students_to_courses([(rng.choice(course_ids), s) for s in student_ids])
+    for c in range(20):
+        db_manager.insert_classroom(f"Room{c}", rng.randint(15, 30), {f"Monday {8 + c % 8:02d}:00 - {9 + c % 8:02d}:00": f"Course{c}"})
+    return student_ids, course_ids
+
+def write_load(managers, ids, transactions, rows_per_transaction):
+    """One thread per campus; managers[i] may all be the same DatabaseManager."""
+    def writer(i):
+        student_ids, course_ids = ids[i]
+        day = datetime.date(2025, 9, 1)
+        for t in range(transactions):
+            date = (day + datetime.timedelta(days=t)).isoformat()
+            managers[i].record_attendance_many(
+                [(s, course_ids[0], date, "Present") for s in student_ids[:rows_per_transaction]]
+            )
+    threads = [threading.Thread(target=writer, args=(i,)) for i in range(len(managers))]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--campuses", type=int, default=12)
+    parser.add_argument("--students", type=int, default=2000, help="Students per campus")
+    parser.add_argument("--transactions", type=int, default=50, help="Attendance transactions per campus")
+    parser.add_argument("--rows", type=int, default=30, help="Rows per transaction")
+    args = parser.parse_args()
+    rng = random.Random(0)
+    errors = []
+
+    with tempfile.TemporaryDirectory() as tmp:
+        router = ShardRouter(os.path.join(tmp, "campuses"), on_error=errors.append)
+        single = DatabaseManager(os.path.join(tmp, "district.db"), on_error=errors.append)
+        shard_ids, single_ids = [], []
+        for i in range(args.campuses):
+            shard_ids.append(seed(router.shard(f"campus{i:02d}", create=True), args.students, rng))
+            single_ids.append(seed(single, args.students, rng) if i == 0 else single_ids[0])
+
+        print(f"{args.campuses} campuses, {args.campuses * args.transactions} transactions of {args.rows} rows")
+        one_file = write_load([single] * args.campuses, single_ids, args.transactions, args.rows)
+        sharded = write_load([router.shard(c) for c in router.campuses()], shard_ids, args.transactions, args.rows)
+        print(f"{'writers, one file':<32}{one_file * 1000:>9.0f}ms")
+        print(f"{'writers, one file per campus':<32}{sharded * 1000:>9.0f}ms")
+
+        start = time.perf_counter()
+        for campus in router.campuses():
+            router.enrollment_report([campus])
+            router.supply_needs([campus])
+        sequential = time.perf_counter() - start
+        start = time.perf_counter()
+        router.enrollment_report()
+        router.supply_needs()
+        scattered = time.perf_counter() - start
+        router.close()
+        print(f"{'district report, sequential':<32}{sequential * 1000:>9.0f}ms")
+        print(f"{'district report, scatter-gather':<32}{scattered * 1000:>9.0f}ms")
+        if errors:
+            print(f"{len(errors)} database errors, first: {errors[0]}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""
+Duplicate-student scan: blocking index vs. all-pairs comparison.
+
+Generates N students (Italian first and last names, birth years over a school's
+range) plus 2% near-duplicates of random records: a typo in the first or last name,
+first and last name swapped, or a mistyped birth day. Reports the time to build the
+DuplicateIndex and scan the whole school, the pairs scored, how many of the injected
+duplicates were found, and the time all-pairs scoring would take (extrapolated from
+a sample), plus the cost of the single-insert check.
+
+    python benchmarks/bench_duplicates.py --students 100000
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from school_core.duplicates import DuplicateIndex, _prepare, score
+
+FIRST_NAMES = ["Marco", "Maria", "Luca", "Giulia", "Francesco", "Sofia", "Alessandro", "Aurora", "Lorenzo", "Ginevra",
+               "Mattia", "Alice", "Andrea", "Emma", "Gabriele", "Giorgia", "Leonardo", "Martina", "Riccardo", "Beatrice",
+               "Tommaso", "Chiara", "Edoardo", "Anna", "Matteo", "Sara", "Davide", "Elena", "Federico", "Greta",
+               "Nicolò", "Vittoria", "Pietro", "Noemi", "Giuseppe", "Camilla", "Antonio", "Arianna", "Samuele", "Bianca"]
+LAST_NAMES = ["Rossi", "Russo", "Ferrari", "Esposito", "Bianchi", "Romano", "Colombo", "Ricci", "Marino", "Greco",
+              "Bruno", "Gallo", "Conti", "De Luca", "Mancini", "Costa", "Giordano", "Rizzo", "Lombardi", "Moretti",
+              "Barbieri", "Fontana", "Santoro", "Mariani", "Rinaldi", "Caruso", "Ferrara", "Galli", "Martini", "Leone",
+              "Longo", "Gentile", "Martinelli", "Vitale", "Lombardo", "Serra", "Coppola", "De Santis", "D'Angelo",
+              "Marchetti", "Parisi", "Villa", "Conte", "Ferraro", "Ferri", "Fabbri", "Bianco", "Marini", "Grasso",
+              "Valentini", "Messina", "Sala", "De Angelis", "Gatti", "Pellegrini", "Palumbo", "Sanna", "Farina",
+              "Rizzi", "Monti", "Cattaneo", "Morelli", "Amato", "Silvestri", "Mazza", "Testa", "Grassi", "Pellegrino",
+              "Carbone", "Giuliani", "Benedetti", "Barone", "Rossetti", "Caputo", "Montanari", "Guerra", "Palmieri",
+              "Bernardi", "Martino", "Fiore", "De Rosa", "Ferretti", "Bellini", "Basile", "Riva", "Donati", "Piras",
+              "Vitali", "Battaglia", "Sartori", "Neri", "Costantini", "Milani", "Pagano", "Ruggiero", "Sorrentino",
+              "D'Amico", "Orlando", "Damiani", "Negri"]
+
+def typo(rng, word):
+    i = rng.randrange(len(word))
+    edit = rng.randrange(3)
+    if edit == 0 and len(word) > 3:
+        return word[:i] + word[i + 1:] # Dropped letter
+    if edit == 1:
+        return word[:i] + rng.choice("aeioulnrst") + word[i + 1:] # Wrong letter
+    return word[:i] + word[i:i + 2][::-1] + word[i + 2:] # Swapped letters
+
+def generate(rng, students):
+    rows = []
+    for student_id in range(1, students + 1):
+        first = rng.choice(FIRST_NAMES) + (f" {rng.choice(FIRST_NAMES)}" if rng.random() < 0.05 else "")
+        dob = f"{rng.randrange(2005, 2019)}-{rng.randrange(1, 13):02d}-{rng.randrange(1, 29):02d}"
+        rows.append((student_id, first, rng.choice(LAST_NAMES), dob))
+    injected = set()
+    for _ in range(students // 50):
+        original_id, first, last, dob = rows[rng.randrange(students)]
+        edit = rng.randrange(4)
+        if edit == 0:
+            first = typo(rng, first)
+        elif edit == 1:
+            last = typo(rng, last)
+        elif edit == 2:
+            first, last = last, first
+        else:
+            dob = dob[:-1] + str((int(dob[-1]) + 1) % 10) # One digit of the day
+        rows.append((len(rows) + 1, first, last, dob))
+        injected.add((original_id, len(rows)))
+    return rows, injected
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--students", type=int, default=100_000)
+    parser.add_argument("--sample", type=int, default=200_000, help="Pairs scored to extrapolate all-pairs")
+    args = parser.parse_args()
+    rng = random.Random(0)
+    rows, injected = generate(rng, args.students)
+
+    start = time.perf_counter()
+    index = DuplicateIndex(rows)
+    build = time.perf_counter() - start
+    start = time.perf_counter()
+    pairs = index.pairs()
+    scan = time.perf_counter() - start
+    scored = len(set(index._candidate_pairs()))
+    found = {(match.id, match.other_id) for match in pairs}
+
+    records = [_prepare(*row) for row in rng.sample(rows, 2000)]
+    start = time.perf_counter()
+    for _ in range(args.sample):
+        score(rng.choice(records), rng.choice(records))
+    per_pair = (time.perf_counter() - start) / args.sample
+    all_pairs = len(rows) * (len(rows) - 1) // 2
+
+    start = time.perf_counter()
+    for _, first, last, dob in rows[:1000]:
+        index.matches(first, last, dob)
+    single = (time.perf_counter() - start) / 1000
+
+    print(f"{len(rows)} students, {len(injected)} injected duplicates")
+    print(f"{'blocking: build + scan':<28}{build + scan:>9.2f}s  ({build:.2f}s + {scan:.2f}s), {scored} pairs scored")
+    print(f"{'all pairs (extrapolated)':<28}{all_pairs * per_pair:>9.0f}s  {all_pairs} pairs")
+    print(f"{'injected duplicates found':<28}{len(found & injected) / len(injected):>9.1%}  "
+          f"({len(pairs)} pairs over the threshold in total)")
+    print(f"{'single insert check':<28}{single * 1e6:>9.0f}µs")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+Registration burst: many sessions enrolling students into courses with limited seats.
+
+"check then insert" is what a capacity check in front of a plain INSERT into
+course_students would do: read the free seats, then enroll, in two steps, so
+concurrent sessions can all see the last seat free. reserve_seats ranks and inserts a whole batch in one
+statement under BEGIN IMMEDIATE, waitlisting the rest. Both runs report the
+throughput and how many students ended up over the seats of their course.
+
+    python benchmarks/bench_enrollment.py --sessions 16 --requests 5000
+"""
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from school_core import DatabaseManager
+from school_core.academic_year import academic_year_of
+
+def seed(db_name, students, courses, seats):
+    db_manager = DatabaseManager(db_name)
+    student_ids = db_manager.insert_students([(f"Name{i}", f"Last{i}", "2010-01-01") for i in range(students)])
+    course_ids = [db_manager.insert_course(f"Course {c}", "120 ore", f"Teacher {c}") for c in range(courses)]
+    for c in range(courses):
+        db_manager.insert_classroom(f"Room {c}", seats, {f"Monday {8 + c % 8:02d}:00 - {9 + c % 8:02d}:00": f"Course {c}"})
+    return student_ids, course_ids
+
+def check_then_insert(db_manager, batch):
+    for course_id, student_id in batch:
+        free = {c: seats - enrolled for c, seats, enrolled, _ in db_manager.fetch_course_seats()}
+        if free[course_id] > 0:
+            with sqlite3.connect(db_manager.db_name, timeout=30) as conn:
+                conn.execute("INSERT OR IGNORE INTO course_students (course_id, student_id, academic_year) VALUES (?, ?, ?)",
+                             (course_id, student_id, academic_year_of()))
+
+def run(db_name, requests, sessions, batch_size, enroll):
+    errors = []
+    db_manager = DatabaseManager(db_name, on_error=errors.append)
+    chunks = [requests[i::sessions] for i in range(sessions)]
+
+    def session(chunk):
+        for i in range(0, len(chunk), batch_size):
+            enroll(db_manager, chunk[i:i + batch_size])
+
+    threads = [threading.Thread(target=session, args=(chunk,)) for chunk in chunks]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    overbooked = sum(max(enrolled - seats, 0) for _, seats, enrolled, _ in db_manager.fetch_course_seats())
+    waitlisted = len(db_manager.fetch_waitlist())
+    return elapsed, overbooked, waitlisted, errors
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=5000, help="Enrollment requests in the burst")
+    parser.add_argument("--courses", type=int, default=40)
+    parser.add_argument("--seats", type=int, default=25)
+    parser.add_argument("--batch", type=int, default=10, help="Requests per reserve_seats call (one form submit)")
+    args = parser.parse_args()
+    rng = random.Random(0)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        print(f"{args.requests} requests from {args.sessions} sessions for {args.courses} courses x {args.seats} seats")
+        for label, enroll in (("check then insert", check_then_insert),
+                              ("reserve_seats", lambda db_manager, batch: db_manager.reserve_seats(batch))):
+            db_name = os.path.join(tmp, f"{label.replace(' ', '_')}.db")
+            student_ids, course_ids = seed(db_name, args.requests, args.courses, args.seats)
+            requests = [(rng.choice(course_ids), student_id) for student_id in student_ids]
+            elapsed, overbooked, waitlisted, errors = run(db_name, requests, args.sessions, args.batch, enroll)
+            print(f"{label:<20}{args.requests / elapsed * 60:>10.0f}/min  overbooked {overbooked:>5}  "
+                  f"waitlisted {waitlisted:>5}  errors {len(errors)}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""
+Gradebook: score entry per score vs. per course roster, and final grades with Python loops vs. NumPy.
+
+Seeds a school of N students, 5 courses each out of N / 50 courses, with 4 assessments
+per course (20 scores per student). Scores are entered one roster per transaction with
+record_scores() (a sample of single-score transactions is timed and extrapolated), then
+the year's grades, course rankings and distributions are computed from the same rows
+with plain Python dicts and with build_gradebook().
+
+    python benchmarks/bench_gradebook.py --students 100000
+"""
+import argparse
+import collections
+import itertools
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from school_core import DatabaseManager
+from school_core.gradebook import build_gradebook
+
+COURSES_PER_STUDENT = 5
+ASSESSMENTS_PER_COURSE = 4
+
+def seed(db_manager, students, rng):
+    student_ids = db_manager.insert_students([(f"Name{i}", f"Last{i}", "2010-01-01") for i in range(students)])
+    course_ids = [db_manager.insert_course(f"Course {c}", "120 ore", f"Teacher {c % 200}")
+                  for c in range(max(students // 50, COURSES_PER_STUDENT))]
+    rosters = collections.defaultdict(list)
+    for s in student_ids:
+        for c in rng.sample(course_ids, COURSES_PER_STUDENT):
+            rosters[c].append(s)
+    db_manager.assign_students_to_courses([(c, s) for c, roster in rosters.items() for s in roster])
+    return [(db_manager.insert_assessment(c, f"Test {a}", weight=rng.choice((1, 1, 2)), max_score=rng.choice((10, 30, 100))), roster)
+            for c, roster in rosters.items() for a in range(ASSESSMENTS_PER_COURSE)]
+
+def naive_gradebook(assessments, scores):
+    """Per-pair weighted means, per-course sorted rankings and quantiles with dicts and loops."""
+    info = {a[0]: a for a in assessments}
+    weighted, weights = collections.defaultdict(float), collections.defaultdict(float)
+    for assessment_id, student_id, score in scores:
+        _, course_id, weight, max_score = info[assessment_id]
+        weighted[student_id, course_id] += weight * score / max_score
+        weights[student_id, course_id] += weight
+    by_course = collections.defaultdict(list)
+    for pair, total in weights.items():
+        if total > 0:
+            by_course[pair[1]].append((round(10 * weighted[pair] / total, 2), pair[0]))
+    ranks, summary = {}, {}
+    for course_id, grades in by_course.items():
+        grades.sort(reverse=True)
+        for position, (grade, student_id) in enumerate(grades):
+            if position == 0 or grade != grades[position - 1][0]:
+                rank = position + 1
+            ranks[student_id, course_id] = rank
+        values = sorted(g for g, _ in grades)
+        summary[course_id] = (statistics.fmean(values), statistics.quantiles(values, n=4, method="inclusive"))
+    return ranks, summary
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--students", type=int, default=20_000)
+    parser.add_argument("--sample", type=int, default=300, help="Single-score transactions timed for the extrapolation")
+    args = parser.parse_args()
+    rng = random.Random(0)
+    with tempfile.TemporaryDirectory() as tmp:
+        db_manager = DatabaseManager(os.path.join(tmp, "school.db"))
+        assessments = seed(db_manager, args.students, rng)
+
+        began = time.perf_counter()
+        for assessment_id, roster in assessments:
+            db_manager.record_scores(assessment_id, {s: round(rng.uniform(0.4, 1.0) * 10, 1) for s in roster})
+        bulk = time.perf_counter() - began
+        total = sum(len(roster) for _, roster in assessments)
+
+        sample = [(assessment_id, s) for assessment_id, roster in assessments[:50] for s in roster][:args.sample]
+        began = time.perf_counter()
+        for assessment_id, s in sample:
+            db_manager.record_scores(assessment_id, {s: 5.0})
+        single = (time.perf_counter() - began) / len(sample) * total
+
+        began = time.perf_counter()
+        rows = [(a[0], a[1], a[3], a[4]) for a in db_manager.fetch_assessments()]
+        scores = list(itertools.chain.from_iterable(db_manager.iter_score_records()))
+        read = time.perf_counter() - began
+        began = time.perf_counter()
+        naive_gradebook(rows, scores)
+        naive = time.perf_counter() - began
+        began = time.perf_counter()
+        gradebook = build_gradebook(rows, scores)
+        gradebook.distribution()
+        vectorized = time.perf_counter() - began
+
+        print(f"{args.students} students, {len(gradebook.courses)} courses, {len(rows)} assessments, {total} scores")
+        print(f"{'score entry, one per transaction':<42}{single:>9.1f}s  (extrapolated from {len(sample)})")
+        print(f"{'score entry, one roster per transaction':<42}{bulk:>9.1f}s  {single / bulk:.0f}x faster")
+        print(f"{'read assessments + scores':<42}{read * 1000:>9.0f}ms")
+        print(f"{'grades + ranks + quantiles, Python':<42}{naive * 1000:>9.0f}ms")
+        print(f"{'grades + ranks + quantiles, NumPy':<42}{vectorized * 1000:>9.0f}ms  {naive / vectorized:.1f}x faster")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""
+Calendar apps polling the iCalendar feeds: rendering every request vs. FeedCache.
+
+Every student, teacher and room feed is requested once per polling round. Without the
+cache each request reads the database and renders the VCALENDAR; with it a request is
+a MAX(seq) check plus a dict lookup, and between rounds a few enrollments and a course
+rename only drop the feeds they touch.
+
+    python benchmarks/bench_ical.py --students 3000 --rounds 5
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from school_core import DatabaseManager
+from school_core.ical import FeedCache, feed_events, render_feed
+from school_core.time_slots import WEEKDAY_NAMES
+
+TEACHERS = 40
+
+def teacher_of(course_number):
+    return f"Teacher {course_number % TEACHERS}"
+
+def seed(db_manager, students, courses, classrooms):
+    rng = random.Random(0)
+    student_ids = db_manager.insert_students([(f"Name{i}", f"Last{i}", "2010-01-01") for i in range(students)])
+    course_ids = [db_manager.insert_course(f"Course {c}", "120 ore", teacher_of(c)) for c in range(courses)]
+    # Seats for every roster: the enrollments between rounds must change feeds, not just the waitlist
+    seats = 2 * students * 6 // courses + 30
+    for a in range(classrooms):
+        schedule = {f"{day} {hour:02d}:00 - {hour + 1:02d}:00": f"Course {rng.randrange(courses)}"
+                    for day in WEEKDAY_NAMES[:5] for hour in range(8, 14) if rng.random() < 0.5}
+        db_manager.insert_classroom(f"Room {a}", seats, schedule)
+    db_manager.assign_students_to_courses([(course_id, student_id) for student_id in student_ids
+                                           for course_id in rng.sample(course_ids, 6)])
+    classroom_ids = [row[0] for row in db_manager.fetch_classrooms()]
+    teachers = sorted({teacher_of(c) for c in range(courses)})
+    return student_ids, course_ids, classroom_ids, teachers
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--students", type=int, default=3000)
+    parser.add_argument("--courses", type=int, default=120)
+    parser.add_argument("--classrooms", type=int, default=60)
+    parser.add_argument("--rounds", type=int, default=5, help="Polling rounds over every feed")
+    parser.add_argument("--changes", type=int, default=20, help="Enrollments between two rounds (plus one rename)")
+    args = parser.parse_args()
+    rng = random.Random(1)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_manager = DatabaseManager(os.path.join(tmp, "school.db"))
+        student_ids, course_ids, classroom_ids, teachers = seed(db_manager, args.students, args.courses, args.classrooms)
+        feeds = ([("student", s) for s in student_ids] + [("teacher", t) for t in teachers]
+                 + [("room", a) for a in classroom_ids])
+        cache = FeedCache(db_manager, max_feeds=len(feeds))
+
+        def change():
+            db_manager.assign_students_to_courses([(rng.choice(course_ids), rng.choice(student_ids))
+                                                   for _ in range(args.changes)])
+            course_id = rng.choice(course_ids)
+            db_manager.update_course(course_id, f"Course {course_id} ({rng.random():.3f})", "120 ore",
+                                     rng.choice(teachers))
+
+        start = time.perf_counter()
+        for kind, key in feeds:
+            seq, title, _, slots, rules = db_manager.fetch_feed(kind, key)
+            render_feed(title, feed_events(slots, rules))
+        uncached = time.perf_counter() - start
+
+        for kind, key in feeds: # Warm the cache
+            cache.get(kind, key)
+        cached, dropped = 0.0, 0
+        for _ in range(args.rounds):
+            change()
+            start = time.perf_counter()
+            dropped += cache.refresh()
+            for kind, key in feeds:
+                cache.get(kind, key)
+            cached += time.perf_counter() - start
+        cached /= args.rounds
+
+        print(f"{len(feeds)} feeds, {args.changes} enrollments + 1 rename between rounds")
+        print(f"{'render every request':<30}{uncached * 1000:>9.0f}ms per round  {len(feeds) / uncached:>9.0f} feeds/s")
+        print(f"{'FeedCache':<30}{cached * 1000:>9.0f}ms per round  {len(feeds) / cached:>9.0f} feeds/s  "
+              f"{dropped / args.rounds:.0f} feeds re-rendered per round")
+
+if __name__ == "__main__":
+    main()
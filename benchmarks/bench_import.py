@@ -0,0 +1,49 @@
+"""
+Import time of the headless core vs. the Streamlit front end: what every script,
+cron job or CLI run pays before doing any work. Each case runs in a fresh interpreter.
+
+    python benchmarks/bench_import.py --repeat 10
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+SRC = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+
+CASES = [
+    ("python (empty)", "pass"),
+    ("import school_core", "import school_core"),
+    ("school_core DatabaseManager + Segreteria", "from school_core import DatabaseManager, Segreteria"),
+    ("school_core.room_analytics (numpy)", "import school_core.room_analytics"),
+    ("streamlit + pandas + streamlit_calendar", "import streamlit, pandas, streamlit_calendar"),
+]
+
+def time_import(code, repeat):
+    env = dict(os.environ, PYTHONPATH=SRC)
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = subprocess.run([sys.executable, "-c", code], env=env, capture_output=True)
+        samples.append(time.perf_counter() - start)
+        if result.returncode != 0:
+            return None
+    return samples
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'case':<45}{'median':>10}{'min':>10}")
+    for label, code in CASES:
+        samples = time_import(code, args.repeat)
+        if samples is None:
+            print(f"{label:<45}{'not installed':>20}")
+            continue
+        print(f"{label:<45}{statistics.median(samples) * 1000:>8.0f}ms{min(samples) * 1000:>8.0f}ms")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""
+Graduating a whole year group: one set-based transaction vs. one statement
+(and one commit) per student, as a loop over the existing single-row style would do.
+
+    python benchmarks/bench_lifecycle.py --students 2000 --graduating 500
+"""
+import argparse
+import datetime
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from school_core import DatabaseManager
+
+def seed(db_manager, students, courses):
+    db_manager.insert_students([(f"Name{i}", f"Last{i}", "2010-01-01") for i in range(students)])
+    for c in range(courses):
+        db_manager.insert_course(f"Course{c}", 40, f"Teacher{c}")
+    student_ids = [row[0] for row in db_manager.fetch_students()]
+    course_ids = [row[0] for row in db_manager.fetch_courses()]
+    db_manager.assign_students_to_courses([(course_ids[(s + k) % courses], s) for s in student_ids for k in range(3)])
+    day = datetime.date(2025, 9, 1)
+    db_manager.record_attendance_many([(s, course_ids[s % courses], (day + datetime.timedelta(days=d)).isoformat(), "Present")
+                                       for s in student_ids for d in range(20)])
+    return student_ids
+
+def row_by_row(db_name, student_ids):
+    with sqlite3.connect(db_name) as conn:
+        conn.execute("PRAGMA foreign_keys = ON")
+        for student_id in student_ids:
+            conn.execute("UPDATE students SET inactive_since = ? WHERE id = ?", (datetime.date.today().isoformat(), student_id))
+            conn.execute("DELETE FROM course_students WHERE student_id = ?", (student_id,))
+            conn.commit()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--students", type=int, default=2000)
+    parser.add_argument("--courses", type=int, default=30)
+    parser.add_argument("--graduating", type=int, default=500)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        timings = {}
+        for label in ("one statement per student", "set-based, one transaction"):
+            db_manager = DatabaseManager(os.path.join(tmp, f"{len(timings)}.db"))
+            student_ids = seed(db_manager, args.students, args.courses)[:args.graduating]
+            start = time.perf_counter()
+            if label.startswith("set-based"):
+                db_manager.graduate_students(student_ids)
+            else:
+                row_by_row(db_manager.db_name, student_ids)
+            timings[label] = time.perf_counter() - start
+        for label, elapsed in timings.items():
+            print(f"{'graduate ' + str(args.graduating) + ', ' + label:<50}{elapsed * 1000:>9.1f}ms")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+"""
+Room reassignment optimizer on a synthetic full week.
+
+    python benchmarks/bench_optimizer.py --rooms 500
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from school_core import room_optimizer
+from school_core.room_optimizer import optimize_room_assignment
+
+DAYS = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday"]
+
+class Room:
+    def __init__(self, nome_aula, capacita_sedie, occupazione_aula):
+        self.nome_aula = nome_aula
+        self.capacita_sedie = capacita_sedie
+        self.occupazione_aula = occupazione_aula
+
+def make_week(rooms, occupancy, seed=0):
+    rng = random.Random(seed)
+    slots = [f"{day} {h:02d}:00 - {h + 2:02d}:00" for day in DAYS for h in range(8, 18, 2)]
+    course_students = {}
+    aule = []
+    for r in range(rooms):
+        schedule = {}
+        for slot in slots:
+            if rng.random() < occupancy:
+                course = f"Course {len(course_students)}"
+                course_students[course] = rng.randint(10, 60)
+                schedule[slot] = course
+        aule.append(Room(f"Aula {r}", rng.choice([15, 20, 25, 30, 40, 60]), schedule))
+    return aule, course_students
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rooms", type=int, default=500)
+    parser.add_argument("--occupancy", type=float, default=0.7, help="Share of room slots that are booked")
+    args = parser.parse_args()
+
+    aule, course_students = make_week(args.rooms, args.occupancy)
+    print(f"{args.rooms} rooms, {len(course_students)} scheduled lessons in one week")
+    solvers = [("numpy", None)]
+    if room_optimizer._scipy_linear_sum_assignment is not None:
+        solvers.insert(0, ("scipy", room_optimizer._scipy_linear_sum_assignment))
+    for label, scipy_solver in solvers:
+        room_optimizer._scipy_linear_sum_assignment = scipy_solver
+        start = time.perf_counter()
+        plan = optimize_room_assignment(aule, course_students)
+        elapsed = time.perf_counter() - start
+        print(f"{label:>6}: {elapsed:.2f}s, chairs to buy {plan.missing_before} -> {plan.missing_after}, {len(plan.moves)} moves")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""
+Renaming a course when schedules hold course names vs. course ids.
+
+With the schedule stored as a JSON blob of course names in every classroom, a rename
+rewrites every blob that mentions the course and the in-memory indexes are rebuilt
+with a full reload. With `classroom_slots` keyed by course id it's one row, and the
+id-keyed ScheduleIndex picks up the new name on the next read.
+
+    python benchmarks/bench_rename.py --classrooms 500 --courses 200
+"""
+import argparse
+import json
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from school_core import DatabaseManager, Segreteria
+from school_core.time_slots import WEEKDAY_NAMES
+
+SLOTS = [f"{day} {hour:02d}:00 - {hour + 1:02d}:00" for day in WEEKDAY_NAMES[:5] for hour in range(8, 16)]
+
+def seed(db_manager, classrooms, courses):
+    rng = random.Random(42)
+    for c in range(courses):
+        db_manager.insert_course(f"Course {c}", 40, f"Teacher {c % 50}")
+    for a in range(classrooms):
+        schedule = {slot: f"Course {rng.randrange(courses)}" for slot in SLOTS if rng.random() < 0.8}
+        db_manager.insert_classroom(f"Room {a}", 30, schedule)
+    # The same schedules in the old layout: one JSON blob of course names per classroom
+    with sqlite3.connect(db_manager.db_name) as conn:
+        conn.execute("CREATE TABLE legacy_schedules (classroom_id INTEGER PRIMARY KEY, occupazione_aula TEXT)")
+        for classroom_id, _, _, schedule in db_manager.fetch_classrooms():
+            conn.execute("INSERT INTO legacy_schedules VALUES (?, ?)", (classroom_id, json.dumps(schedule)))
+
+def legacy_rename(db_manager, segreteria, old_name, new_name):
+    with sqlite3.connect(db_manager.db_name) as conn:
+        conn.execute("UPDATE courses SET nome_corso = ? WHERE nome_corso = ?", (new_name, old_name))
+        for classroom_id, blob in conn.execute("SELECT classroom_id, occupazione_aula FROM legacy_schedules").fetchall():
+            schedule = json.loads(blob)
+            if old_name in schedule.values():
+                schedule = {slot: new_name if name == old_name else name for slot, name in schedule.items()}
+                conn.execute("UPDATE legacy_schedules SET occupazione_aula = ? WHERE classroom_id = ?",
+                             (json.dumps(schedule), classroom_id))
+    segreteria.load_data() # Name-keyed indexes can only be rebuilt
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--classrooms", type=int, default=500)
+    parser.add_argument("--courses", type=int, default=200)
+    parser.add_argument("--renames", type=int, default=10)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_manager = DatabaseManager(os.path.join(tmp, "school.db"))
+        seed(db_manager, args.classrooms, args.courses)
+        segreteria = Segreteria("Bench", "Mark", "1980-01-01", db_manager=db_manager, notify=lambda level, msg: None)
+        segreteria.load_data()
+
+        start = time.perf_counter()
+        for i in range(args.renames):
+            legacy_rename(db_manager, segreteria, f"Course {i}", f"Legacy {i}")
+        legacy = (time.perf_counter() - start) / args.renames
+
+        start = time.perf_counter()
+        for i in range(args.renames):
+            corso = segreteria.all_courses[i]
+            segreteria.edit_course(corso, f"Renamed {i}", corso.durata, corso.docente)
+        by_id = (time.perf_counter() - start) / args.renames
+        assert any(name.startswith("Renamed") for _, _, name in segreteria.schedule_index.slots_for_course(segreteria.all_courses[0].id))
+
+        print(f"{args.classrooms} classrooms x {len(SLOTS)} slots, {args.courses} courses")
+        print(f"{'rename, JSON blobs + reload':<40}{legacy * 1000:>9.1f}ms")
+        print(f"{'rename, classroom_slots by id':<40}{by_id * 1000:>9.1f}ms")
+
+if __name__ == "__main__":
+    main()
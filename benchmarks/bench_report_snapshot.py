@@ -0,0 +1,98 @@
+"""
+Roll-call writes while heavy reports run: reports on the live file vs. on a ReportSnapshot.
+
+One thread records attendance in small transactions (a class roll-call each), report
+threads keep scanning the whole attendance table. Reported: write latency percentiles
+and writes that failed with "database is locked".
+
+    python benchmarks/bench_report_snapshot.py --rows 300000 --seconds 5
+"""
+import argparse
+import datetime
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from school_core import DatabaseManager
+
+def seed(db_manager, rows):
+    students = max(1, rows // 200)
+    db_manager.insert_students([(f"Name{i}", f"Last{i}", "2010-01-01") for i in range(students)])
+    for c in range(10):
+        db_manager.insert_course(f"Course{c}", 40, f"Teacher{c}")
+    student_ids = [row[0] for row in db_manager.fetch_students()]
+    course_ids = [row[0] for row in db_manager.fetch_courses()]
+    start = datetime.date(2024, 9, 1)
+    batch = [(student_ids[i % students], course_ids[(i // students) % 10],
+              (start + datetime.timedelta(days=i // (students * 10))).isoformat(), "Present") for i in range(rows)]
+    db_manager.record_attendance_many(batch)
+    return student_ids, course_ids
+
+def run(db_manager, report_manager, student_ids, course_ids, seconds, readers):
+    stop = threading.Event()
+    latencies, failures, reports = [], [], [0]
+    reports_lock = threading.Lock()
+    db_manager.on_error = lambda message: failures.append(message)
+
+    def report():
+        while not stop.is_set():
+            report_manager().fetch_attendance()
+            with reports_lock:
+                reports[0] += 1
+
+    def roll_call():
+        day = datetime.date(2030, 1, 1)
+        n = 0
+        while not stop.is_set():
+            rows = [(s, course_ids[n % len(course_ids)], (day + datetime.timedelta(days=n)).isoformat(), "Present")
+                    for s in student_ids[:30]]
+            start = time.perf_counter()
+            if db_manager.record_attendance_many(rows):
+                latencies.append(time.perf_counter() - start)
+            n += 1
+            time.sleep(0.01)
+
+    threads = [threading.Thread(target=report) for _ in range(readers)] + [threading.Thread(target=roll_call)]
+    for thread in threads:
+        thread.start()
+    time.sleep(seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    locked = sum("locked" in message for message in failures)
+    return latencies, locked, reports[0]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=300000, help="Attendance rows in the table")
+    parser.add_argument("--seconds", type=float, default=5)
+    parser.add_argument("--readers", type=int, default=2, help="Report threads")
+    parser.add_argument("--max-age", type=int, default=2, help="Snapshot refresh interval (seconds)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_manager = DatabaseManager(os.path.join(tmp, "school.db"))
+        student_ids, course_ids = seed(db_manager, args.rows)
+        print(f"{args.rows} attendance rows, {args.readers} report threads, {args.seconds}s per case")
+        print(f"{'reports on':<16}{'writes':>8}{'p50':>10}{'p99':>10}{'max':>10}{'locked':>8}{'reports':>9}")
+        snapshot = None
+        for label in ("live file", "snapshot"):
+            if label == "snapshot":
+                snapshot = db_manager.enable_report_snapshot(args.max_age)
+            latencies, locked, reports = run(db_manager, db_manager.report_reader, student_ids, course_ids,
+                                             args.seconds, args.readers)
+            if latencies:
+                quantiles = statistics.quantiles(latencies, n=100, method="inclusive")
+                print(f"{label:<16}{len(latencies):>8}{quantiles[49] * 1000:>8.1f}ms{quantiles[98] * 1000:>8.1f}ms"
+                      f"{max(latencies) * 1000:>8.1f}ms{locked:>8}{reports:>9}")
+            else:
+                print(f"{label:<16}{0:>8}{'-':>10}{'-':>10}{'-':>10}{locked:>8}{reports:>9}")
+        snapshot.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+"""
+Throughput of the report rendering pipeline: serial rendering vs. the process pool,
+streamed into one ZIP archive.
+
+    python benchmarks/bench_reports.py --rooms 2000 --courses 1000
+"""
+import argparse
+import io
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from school_core.report_rendering import write_reports_zip
+
+DAYS = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday"]
+
+def make_jobs(rooms, courses, students_per_course):
+    jobs = [("purchase_order", (f"Aula {i}", 1 + i % 12)) for i in range(rooms)]
+    for i in range(rooms):
+        schedule = {f"{day} {h:02d}:00 - {h + 1:02d}:00": f"Course {(i + h) % courses}" for day in DAYS for h in range(8, 18)}
+        jobs.append(("room_calendar", (f"Aula {i}", schedule)))
+    for i in range(courses):
+        students = [(f"Name{j}", f"Last{j}", "2005-01-01") for j in range(students_per_course)]
+        jobs.append(("course_roster", (f"Course {i}", "120 ore", f"Prof. {i}", students)))
+    return jobs
+
+def run(jobs, workers):
+    start = time.perf_counter()
+    buffer = io.BytesIO()
+    count = write_reports_zip(jobs, buffer, max_workers=workers)
+    elapsed = time.perf_counter() - start
+    return count, elapsed, len(buffer.getvalue())
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rooms", type=int, default=1000)
+    parser.add_argument("--courses", type=int, default=500)
+    parser.add_argument("--students-per-course", type=int, default=30)
+    args = parser.parse_args()
+
+    jobs = make_jobs(args.rooms, args.courses, args.students_per_course)
+    print(f"{len(jobs)} reports, {os.cpu_count()} CPUs")
+    for label, workers in [("serial", 1), ("process pool", None)]:
+        count, elapsed, size = run(jobs, workers)
+        print(f"{label:>13}: {count} files in {elapsed:.2f}s -> {count / elapsed:,.0f} reports/s, ZIP {size / 1e6:.1f} MB")
+
+if __name__ == "__main__":
+    main()
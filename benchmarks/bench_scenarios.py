@@ -0,0 +1,112 @@
+"""
+What-if schedule scenarios: a full copy of the schedule per scenario vs. copy-on-write branches.
+
+A school of R rooms with a week of 2-hour slots; every scenario moves a few lessons to
+another room and evaluates chairs to buy and clashes. The copy approach duplicates every
+room's schedule and recomputes the metrics over the whole copy; a ScheduleScenarios
+branch stores only the moved slots and adjusts the base metrics by them. Reports the
+time and the memory per scenario.
+
+    python benchmarks/bench_scenarios.py --rooms 500 --scenarios 100
+"""
+import argparse
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from school_core.scenarios import ScheduleScenarios
+from school_core.time_slots import WEEKDAY_NAMES
+
+def seed(rng, rooms, courses, students):
+    slots = [f"{day} {hour:02d}:00 - {hour + 2:02d}:00" for day in WEEKDAY_NAMES[:5] for hour in range(8, 16, 2)]
+    schedules = {aula_id: {time_slot: rng.randrange(courses) for time_slot in slots if rng.random() < 0.8}
+                 for aula_id in range(rooms)}
+    capacities = {aula_id: rng.randrange(15, 45) for aula_id in range(rooms)}
+    teachers = {course_id: f"Teacher {course_id % (courses // 3)}" for course_id in range(courses)}
+    enrolled = {course_id: set() for course_id in range(courses)}
+    for student_id in range(students):
+        for course_id in rng.sample(range(courses), 6):
+            enrolled[course_id].add(student_id)
+    return schedules, capacities, teachers, enrolled
+
+def random_moves(rng, schedules, moves):
+    rooms = list(schedules)
+    result = []
+    while len(result) < moves:
+        aula_id = rng.choice(rooms)
+        if schedules[aula_id]:
+            result.append((aula_id, rng.choice(list(schedules[aula_id])), rng.choice(rooms)))
+    return result
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rooms", type=int, default=500)
+    parser.add_argument("--courses", type=int, default=1200)
+    parser.add_argument("--students", type=int, default=10000)
+    parser.add_argument("--scenarios", type=int, default=100)
+    parser.add_argument("--moves", type=int, default=5, help="Lessons moved in each scenario")
+    args = parser.parse_args()
+    rng = random.Random(0)
+    schedules, capacities, teachers, enrolled = seed(rng, args.rooms, args.courses, args.students)
+    plans = [random_moves(rng, schedules, args.moves) for _ in range(args.scenarios)]
+    lessons = sum(len(slots) for slots in schedules.values())
+
+    def apply(schedule, plan):
+        for aula_id, time_slot, to_aula_id in plan:
+            course_id = schedule[aula_id].pop(time_slot, None)
+            if course_id is not None:
+                schedule[to_aula_id][time_slot] = course_id
+
+    start = time.perf_counter()
+    copies = plans[:max(args.scenarios // 10, 1)] # A tenth of them: each one is a whole school
+    for plan in copies:
+        copy = {aula_id: dict(slots) for aula_id, slots in schedules.items()}
+        apply(copy, plan)
+        ScheduleScenarios(copy, capacities, teachers, enrolled).live.metrics()
+    copied = (time.perf_counter() - start) / len(copies)
+
+    start = time.perf_counter()
+    scenarios = ScheduleScenarios(schedules, capacities, teachers, enrolled)
+    base_metrics = scenarios.live.metrics()
+    base = time.perf_counter() - start
+
+    def branch(number, plan):
+        branch = scenarios.branch(f"scenario {number}")
+        for aula_id, time_slot, to_aula_id in plan:
+            if branch.course_at(aula_id, time_slot) is not None:
+                branch.move(aula_id, time_slot, to_aula_id)
+        return branch
+
+    start = time.perf_counter()
+    for number, plan in enumerate(plans):
+        branch(number, plan).metrics()
+    branched = (time.perf_counter() - start) / len(plans)
+
+    # Memory held by the schedule of one scenario (metrics and caches left out)
+    tracemalloc.start()
+    kept = []
+    for plan in copies:
+        kept.append({aula_id: dict(slots) for aula_id, slots in schedules.items()})
+        apply(kept[-1], plan)
+    copied_memory = tracemalloc.get_traced_memory()[0] / len(copies)
+    tracemalloc.stop()
+    del kept
+    tracemalloc.start()
+    for number, plan in enumerate(plans): # Kept alive by scenarios.branches
+        branch(f"memory {number}", plan)
+    branched_memory = tracemalloc.get_traced_memory()[0] / len(plans)
+    tracemalloc.stop()
+
+    print(f"{args.rooms} rooms, {lessons} lessons, {args.courses} courses, {args.students} students; "
+          f"{args.moves} moves per scenario")
+    print(f"live: {base_metrics}")
+    print(f"{'base copy + metrics (once)':<30}{base * 1000:>9.1f}ms")
+    print(f"{'full copy per scenario':<30}{copied * 1000:>9.1f}ms  {copied_memory / 1024:>9.1f} KiB per scenario")
+    print(f"{'copy-on-write branch':<30}{branched * 1000:>9.1f}ms  {branched_memory / 1024:>9.1f} KiB per scenario")
+
+if __name__ == "__main__":
+    main()
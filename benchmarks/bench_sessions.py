@@ -0,0 +1,138 @@
+"""
+Concurrent secretaries: N sessions working on the same database at once.
+
+Every simulated session does what a Streamlit session does through the headless core:
+its own Segreteria on the DatabaseManager shared by the process (st.cache_resource),
+loaded once, then in a loop
+
+    add students -> assign them to a course -> record attendance for the course's
+    whole roster (one read of the roster's attendance, then a commit per student, or one
+    transaction like the Record Attendance page with --batched) -> build the calendar
+
+The sweep runs each concurrency level on a fresh copy of the same seeded database and
+reports per level the p50/p99 latency of the steps, the throughput, and the
+"database is locked" errors that reached on_error; then p50/p99 per step for the
+highest level.
+
+    python benchmarks/bench_sessions.py --sessions 1,4,16,32 --rounds 5
+"""
+import argparse
+import collections
+import datetime
+import os
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from school_core import DatabaseManager, Segreteria
+
+STEPS = ["open session", "add students", "assign", "record attendance", "view calendar"]
+
+def seed(db_name, students, courses):
+    db_manager = DatabaseManager(db_name)
+    student_ids = db_manager.insert_students([(f"Name{i}", f"Last{i}", "2010-01-01") for i in range(students)])
+    course_ids = [db_manager.insert_course(f"Course {c}", "120 ore", f"Teacher {c % 10}") for c in range(courses)]
+    # Enrolled before the rooms are scheduled: an unscheduled course has no seat limit, so rosters keep their size
+    db_manager.assign_students_to_courses([(course_ids[s % courses], student_id) for s, student_id in enumerate(student_ids)])
+    for c in range(courses):
+        db_manager.insert_classroom(f"Room {c}", 25, {f"{day} {8 + c % 8:02d}:00 - {9 + c % 8:02d}:00": f"Course {c}"
+                                                      for day in ("Monday", "Wednesday", "Friday")})
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, round(p / 100 * (len(values) - 1)))] if values else 0.0
+
+def record_roster(segreteria, corso, date, batched):
+    """Attendance for every student of the course, the way the Record Attendance page saves it (batched)."""
+    roster = list(corso.alunni_frequentanti_il_tal_corso)
+    db_manager = segreteria.db_manager
+    existing = {row[6]: row[5] for row in db_manager.fetch_attendance(corso.id, None, date)}
+    statuses = {s.id: existing.get(s.id, "Absent") for s in roster}
+    if batched:
+        db_manager.record_attendance_many([(s.id, corso.id, date, "Present" if statuses[s.id] == "Absent" else "Absent")
+                                           for s in roster])
+    else:
+        for s in roster:
+            if not db_manager.record_attendance(s.id, corso.id, date, "Present" if statuses[s.id] == "Absent" else "Absent"):
+                break
+
+def session(db_manager, number, args, start_line, latencies):
+    def timed(step, fn):
+        start = time.perf_counter()
+        result = fn()
+        latencies.append((step, time.perf_counter() - start))
+        return result
+
+    rng = random.Random(number)
+    segreteria = Segreteria(f"Secretary{number}", "Load", "1980-01-01", db_manager=db_manager, notify=lambda level, msg: None)
+    timed("open session", segreteria.load_data)
+    start_line.wait()
+    for r in range(args.rounds):
+        new = timed("add students", lambda: [segreteria.add_student(f"New{number}_{r}_{i}", "Load", "2011-01-01")
+                                             for i in range(args.new_students)])
+        corso = rng.choice(segreteria.all_courses)
+        timed("assign", lambda: segreteria.creazione_classe(corso, [a for a in new if a]))
+        date = (datetime.date(2025, 9, 1) + datetime.timedelta(days=r)).isoformat()
+        timed("record attendance", lambda: record_roster(segreteria, corso, date, args.batched))
+        timed("view calendar", segreteria.calendar_events)
+
+def run_level(seed_db, tmp, sessions, args):
+    db_name = os.path.join(tmp, f"sessions_{sessions}.db")
+    shutil.copy(seed_db, db_name)
+    errors = collections.Counter()
+    errors_lock = threading.Lock()
+
+    def on_error(message):
+        with errors_lock:
+            errors["locked" if "locked" in message else "other"] += 1
+
+    db_manager = DatabaseManager(db_name, on_error=on_error, on_warning=lambda message: None)
+    latencies = [] # (step, seconds); list.append is atomic
+    start_line = threading.Barrier(sessions + 1)
+    threads = [threading.Thread(target=session, args=(db_manager, n, args, start_line, latencies)) for n in range(sessions)]
+    for thread in threads:
+        thread.start()
+    start_line.wait() # Every session loaded: time the work only
+    start = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    return latencies, elapsed, errors
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", default="1,2,4,8,16", help="Comma-separated concurrency levels")
+    parser.add_argument("--rounds", type=int, default=5, help="Scenario loops per session")
+    parser.add_argument("--students", type=int, default=600)
+    parser.add_argument("--courses", type=int, default=20)
+    parser.add_argument("--new-students", type=int, default=5, help="Students added per round")
+    parser.add_argument("--batched", action="store_true", help="Save the roster in one transaction instead of one per student")
+    args = parser.parse_args()
+    levels = [int(level) for level in args.sessions.split(",")]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        seed_db = os.path.join(tmp, "seed.db")
+        seed(seed_db, args.students, args.courses)
+        print(f"{args.students} students in {args.courses} courses, {args.rounds} rounds per session, "
+              f"roster saved {'in one transaction' if args.batched else 'one student at a time'}")
+        print(f"{'sessions':>8}{'steps':>8}{'steps/s':>10}{'p50 ms':>10}{'p99 ms':>10}{'lock errors':>13}{'other errors':>14}")
+        for sessions in levels:
+            latencies, elapsed, errors = run_level(seed_db, tmp, sessions, args)
+            work = [seconds for step, seconds in latencies if step != "open session"]
+            print(f"{sessions:>8}{len(work):>8}{len(work) / elapsed:>10.1f}{percentile(work, 50) * 1000:>10.1f}"
+                  f"{percentile(work, 99) * 1000:>10.1f}{errors['locked']:>13}{errors['other']:>14}")
+
+        print(f"--- per step, {levels[-1]} sessions")
+        by_step = collections.defaultdict(list)
+        for step, seconds in latencies:
+            by_step[step].append(seconds)
+        for step in STEPS:
+            print(f"{step:<20}{percentile(by_step[step], 50) * 1000:>9.1f}ms p50{percentile(by_step[step], 99) * 1000:>9.1f}ms p99")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""
+Streamlit rerun time with and without the query cache, measured headlessly with AppTest.
+
+A throwaway database is filled with synthetic students, courses, classrooms and
+attendance, then each page is rerun several times with the cache on and off.
+
+    python benchmarks/bench_ui_cache.py --students 2000 --reruns 10
+"""
+import argparse
+import datetime
+import os
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+
+import streamlit as st
+from streamlit.testing.v1 import AppTest
+
+APP = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src", "school_admin_UI.py")
+PAGES = ["View Attendance", "Record Attendance", "View School Calendar", "Assign Students to Course"]
+
+def seed(db_name, students, courses, days):
+    AppTest.from_file(APP, default_timeout=120).run() # Creates the tables
+    rng = random.Random(0)
+    conn = sqlite3.connect(db_name)
+    conn.executemany("INSERT INTO students (name, last_name, date_of_birth) VALUES (?, ?, ?)",
+                     [(f"Name{i}", f"Last{i}", "2005-01-01") for i in range(students)])
+    conn.executemany("INSERT INTO courses (nome_corso, durata, docente) VALUES (?, ?, ?)",
+                     [(f"Course {i}", "120 ore", f"Prof. {i % 20}") for i in range(courses)])
+    enrollments = [(c, s) for c in range(1, courses + 1) for s in rng.sample(range(1, students + 1), min(30, students))]
+    conn.executemany("INSERT INTO course_students (course_id, student_id) VALUES (?, ?)", enrollments)
+    slots = [f"{d} {h:02d}:00 - {h + 1:02d}:00" for d in ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday"] for h in range(8, 17)]
+    conn.executemany("INSERT INTO classrooms (nome_aula, capacita_sedie) VALUES (?, ?)", [(f"Aula {i}", 30) for i in range(courses // 2)])
+    conn.executemany("INSERT INTO classroom_slots (classroom_id, time_slot, course_id) VALUES (?, ?, ?)",
+                     [(i, slot, rng.randrange(1, courses + 1)) for i in range(1, courses // 2 + 1) for slot in slots])
+    start = datetime.date.today() - datetime.timedelta(days=days)
+    conn.executemany("INSERT OR IGNORE INTO attendance (student_id, course_id, attendance_date, status) VALUES (?, ?, ?, ?)",
+                     [(s, c, (start + datetime.timedelta(days=d)).isoformat(), rng.choice(["Present", "Absent", "Late"]))
+                      for c, s in enrollments for d in range(days)])
+    conn.commit()
+    conn.close()
+    st.cache_data.clear() # The writes above bypassed DatabaseManager, so the cache can't know about them
+
+def time_page(page, use_cache, reruns):
+    """Median rerun time as measured by the app itself (AppTest's own polling would blur it)."""
+    at = AppTest.from_file(APP, default_timeout=120)
+    at.run()
+    at.sidebar.checkbox(key="use_query_cache").set_value(use_cache)
+    at.sidebar.selectbox[0].select(page).run()
+    for _ in range(reruns):
+        at.run()
+    return statistics.median(at.session_state["rerun_timings"][use_cache][-reruns:])
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--students", type=int, default=2000)
+    parser.add_argument("--courses", type=int, default=40)
+    parser.add_argument("--days", type=int, default=60)
+    parser.add_argument("--reruns", type=int, default=10)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        os.chdir(workdir) # The app opens school_data.db in the working directory
+        seed("school_data.db", args.students, args.courses, args.days)
+        print(f"{'page':<28}{'cache off':>12}{'cache on':>12}")
+        for page in PAGES:
+            off = time_page(page, False, args.reruns)
+            on = time_page(page, True, args.reruns)
+            print(f"{page:<28}{off:>10.1f}ms{on:>10.1f}ms")
+
+if __name__ == "__main__":
+    sys.exit(main())
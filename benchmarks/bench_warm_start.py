@@ -0,0 +1,74 @@
+"""
+Worker cold start: load_data() from the database vs. from the warm-start snapshot.
+
+Seeds a school of N students (6 courses each, a classroom per 50 students with a week
+of lessons) and times a new Segreteria's load_data(): from the database, then from the
+snapshot it leaves behind, then after a write from another process (stale snapshot:
+full load plus rewrite) and after the process's own write (save_warm_start()).
+
+    python benchmarks/bench_warm_start.py --students 20000
+"""
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from school_core import DatabaseManager, Segreteria
+from school_core.time_slots import WEEKDAY_NAMES
+from school_core.warm_start import warm_start_path
+
+def seed(db_name, students):
+    rng = random.Random(0)
+    db_manager = DatabaseManager(db_name)
+    student_ids = db_manager.insert_students([(f"Name{i}", f"Last{i}", "2010-01-01") for i in range(students)])
+    courses = max(students // 25, 6)
+    course_ids = [db_manager.insert_course(f"Course {c}", "120 ore", f"Teacher {c % 60}") for c in range(courses)]
+    # Enrolled before the rooms are scheduled: an unscheduled course has no seat limit, so rosters keep their size
+    db_manager.assign_students_to_courses([(c, s) for s in student_ids for c in rng.sample(course_ids, 6)])
+    for a in range(max(students // 50, 1)):
+        db_manager.insert_classroom(f"Room {a}", 30, {f"{day} {hour:02d}:00 - {hour + 1:02d}:00": f"Course {rng.randrange(courses)}"
+                                                      for day in WEEKDAY_NAMES[:5] for hour in range(8, 15) if rng.random() < 0.6})
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--students", type=int, default=20_000)
+    parser.add_argument("--runs", type=int, default=3, help="Best of RUNS for the cold and warm loads")
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as tmp:
+        db_name = os.path.join(tmp, "school.db")
+        seed(db_name, args.students)
+        path = warm_start_path(db_name)
+
+        def start(warm=True):
+            began = time.perf_counter()
+            segreteria = Segreteria("Bench", "Warm", "1980-01-01", db_manager=DatabaseManager(db_name),
+                                    notify=lambda level, msg: None, warm_start=path if warm else None)
+            segreteria.load_data()
+            return segreteria, time.perf_counter() - began
+
+        cold = min(start(warm=False)[1] for _ in range(args.runs))
+        start() # Writes the snapshot
+        warm = min(start()[1] for _ in range(args.runs))
+
+        with sqlite3.connect(db_name) as conn: # Another process
+            conn.execute("UPDATE students SET name = 'Changed' WHERE id = 1")
+        segreteria, stale = start()
+        segreteria.add_student("Nuovo", "Alunno", "2012-01-01")
+        saving = time.perf_counter()
+        saved = segreteria.save_warm_start()
+        saving = time.perf_counter() - saving
+
+        print(f"{args.students} students, {len(segreteria.all_courses)} courses, {len(segreteria.all_aule)} classrooms; "
+              f"snapshot {os.path.getsize(path) / 2 ** 20:.1f} MiB")
+        print(f"{'cold start (database)':<34}{cold * 1000:>9.0f}ms")
+        print(f"{'warm start (snapshot)':<34}{warm * 1000:>9.0f}ms  {cold / warm:.1f}x faster")
+        print(f"{'stale snapshot (rebuild + save)':<34}{stale * 1000:>9.0f}ms")
+        print(f"{'save after own write':<34}{saving * 1000:>9.0f}ms  {'written' if saved else 'skipped'}")
+
+if __name__ == "__main__":
+    main()
@@ -1,296 +1,37 @@
+import argparse
+import contextlib
+import csv
 import datetime
 import json
 import os
-
-# --- Base Class ---
-class Persona:
-    def __init__(self, name, last_name, date_of_birth):
-        self.name = name
-        self.last_name = last_name
-        self.date_of_birth = date_of_birth # Format 'YYYY-MM-DD'
-
-class Alunni(Persona):
-    lista_alunni = [] # Class attribute to keep track of all students
-
-    def __init__(self, name, last_name, date_of_birth):
-        super().__init__(name, last_name, date_of_birth)
-        Alunni.lista_alunni.append(self) # Update global list of students
-        print(f"Student '{self.name} {self.last_name}' added to global list.")
-
-    def display_alunno_info(self):
-        """Prints details about the student."""
-        print(f"  Student Name: {self.name} {self.last_name}")
-        print(f"  Date of Birth: {self.date_of_birth}")
-
-class Corso:
-    def __init__(self, nome_corso, durata, docente):
-        self.nome_corso = nome_corso
-        self.durata = durata # e.g., '120 ore'
-        self.docente = docente # Persona object or string
-        self.alunni_frequentanti_il_tal_corso = [] # Students attending this course (Enrico's job to populate)
-        
-        print(f"Course '{self.nome_corso}' created.")
-
-    def display_corso_info(self):
-        """Prints details about the course."""
-        print(f"  Course Name: {self.nome_corso}")
-        print(f"  Duration: {self.durata}")
-        print(f"  Teacher: {self.docente.name if hasattr(self.docente, 'name') else self.docente}")
-        print(f"  Number of Students: {len(self.alunni_frequentanti_il_tal_corso)}")
-
-class Aula:
-    def __init__(self, nome_aula, capacita_sedie):
-        self.nome_aula = nome_aula
-        self.capacita_sedie = capacita_sedie # Number of chairs
-        self.occupazione_aula = {} # Calendar of the aula: { 'Day Time': Corso.nome_corso } (Emilian's job to populate)
-        
-        print(f"Classroom '{self.nome_aula}' with {self.capacita_sedie} chairs created.")
-
-    def display_aula_info(self):
-        """Prints details about the classroom."""
-        print(f"  Classroom Name: {self.nome_aula}")
-        print(f"  Chair Capacity: {self.capacita_sedie}")
-        print("  Occupancy Schedule:")
-        if not self.occupazione_aula:
-            print("    No schedule defined.")
-        for time, course_name in self.occupazione_aula.items():
-            print(f"    {time}: {course_name}")
-
-class UtilitySuite:
-    @staticmethod
-    def controlla_sedie(aula: Aula, numero_alunni_previsti: int) -> int:
-        """
-        Checks if there are enough chairs in a classroom for a given number of students.
-        Returns the number of missing chairs (positive value), 0 if sufficient,
-        or a negative value if there are excess chairs.
-        """
-        sedie_mancanti = numero_alunni_previsti - aula.capacita_sedie
-        print(f"Utility: Checking chairs for classroom '{aula.nome_aula}'. Needed: {numero_alunni_previsti}, Available: {aula.capacita_sedie}")
-        return sedie_mancanti
-    
-class Segreteria(Persona):
-    def __init__(self, name, last_name, date_of_birth):
-        super().__init__(name, last_name, date_of_birth)
-        self.all_courses = [] # Managed by Ivan
-        self.all_aule = []    # Managed by Ivan
-        self.all_aula_schedules = {} # To store calendars of all aulas for printing (Jay's usage)
-        print(f"Secretariat user '{self.name} {self.last_name}' initialized.")
-
-    def creazione_calendario(self, aula: Aula, corso: Corso, time_slot: str):
-        """
-        Emilian's method: Creates or updates the calendar for a specific classroom and course.
-        Example: aula.occupazione_aula['Lunedì 9:00'] = corso.nome_corso
-        """
-        print(f"Secretariat: Creating calendar for classroom '{aula.nome_aula}' and course '{corso.nome_corso}' at '{time_slot}'.")
-        aula.occupazione_aula[time_slot] = corso.nome_corso
-        # Update central schedule maintained by Segreteria
-        self.all_aula_schedules[aula.nome_aula] = aula.occupazione_aula
-        print(f"✅ Schedule for '{aula.nome_aula}' at '{time_slot}' set to '{corso.nome_corso}'.")
-
-    def creazione_classe(self, corso: Corso, students_to_assign: list):
-        """
-        Enrico's method: Populates the student list for a given course.
-        `students_to_assign` should contain Alunni objects.
-        """
-        print(f"Secretariat: Assigning students to course '{corso.nome_corso}'.")
-        newly_assigned_count = 0
-        for student in students_to_assign:
-            if student not in corso.alunni_frequentanti_il_tal_corso:
-                corso.alunni_frequentanti_il_tal_corso.append(student)
-                newly_assigned_count += 1
-        print(f"✅ {newly_assigned_count} new students assigned to course '{corso.nome_corso}'.")
-
-    def stampa_calendario(self):
-        """
-        Jay's method: Prints the complete schedule of all classrooms to a single TXT file.
-        It uses self.all_aula_schedules.
-        """
-        print("Secretariat: Printing overall calendar to file (Jay's task).")
-        output_filename = "calendario_scolastico.txt"
-        try:
-            with open(output_filename, "w", encoding="utf-8") as f:
-                f.write("--- School Calendar ---\n")
-                f.write(f"Generated On: {datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n\n")
-                if not self.all_aula_schedules:
-                    f.write("No classroom schedules defined.\n")
-                else:
-                    # Sort classrooms by name for consistent output
-                    sorted_aula_names = sorted(self.all_aula_schedules.keys())
-                    for aula_name in sorted_aula_names:
-                        schedule_data = self.all_aula_schedules[aula_name]
-                        f.write(f"=== Classroom: {aula_name} ===\n")
-                        if not schedule_data:
-                            f.write("  No schedule for this classroom.\n")
-                        else:
-                            # Sort schedule by key (time slot) for consistent output
-                            sorted_schedule = sorted(schedule_data.items())
-                            for time_slot, course_name in sorted_schedule:
-                                f.write(f"  {time_slot}: {course_name}\n")
-                        f.write("\n")
-            print(f"✅ Calendar printed successfully to '{output_filename}'.")
-        except IOError as e:
-            print(f"❌ Error printing calendar to file: {e}")
-
-    # --- Amin's method ---
-    def controllo_forniture(self, aula: Aula, numero_alunni_previsti: int):
-        """
-        Amin's method: Verifies if there are enough chairs in a given 'aula' for the 'numero_alunni_previsti'.
-        If chairs are missing (positive value from utility suite), it generates a purchase order.
-        """
-        print(f"\nSecretariat: Performing supply check for classroom '{aula.nome_aula}' (Amin's task).")
-
-        # Calls Andrea's utility function
-        sedie_mancanti = UtilitySuite.controlla_sedie(aula, numero_alunni_previsti)
-
-        if sedie_mancanti > 0:
-            print(f"🚨 Attention! {sedie_mancanti} chairs are missing for classroom '{aula.nome_aula}'.")
-            self._invia_ordine_fornitore(aula.nome_aula, sedie_mancanti) # Calls Amin's internal method
-        else:
-            print(f"✅ Sufficient chairs for classroom '{aula.nome_aula}'. No new orders needed.")
-
-    # Amin's internal helper method
-    def _invia_ordine_fornitore(self, nome_aula: str, quantita: int):
-        """
-        Amin's helper method: Generates a written purchase order form for the supplier.
-        This method is private (convention with underscore) as it's called internally.
-        """
-        data_odierna = datetime.date.today().strftime("%d-%m-%Y")
-        nome_file_ordine = f"ordine_fornitore_{nome_aula.replace(' ', '_')}_{data_odierna}.txt"
-
-        print(f"📧 Generating supplier order: '{nome_file_ordine}'...")
-        try:
-            with open(nome_file_ordine, "w", encoding="utf-8") as f:
-                f.write("--- SUPPLIER ORDER FORM ---\n")
-                f.write(f"Date: {data_odierna}\n")
-                f.write("Recipient: School Material Supplier\n")
-                f.write("\n")
-                f.write("Subject: Additional Chair Order\n")
-                f.write("\n")
-                f.write(f"Dear Supplier,\n")
-                f.write(f"We kindly request the supply of {quantita} additional chairs for classroom '{nome_aula}'.\n")
-                f.write("Please confirm availability and delivery times.\n")
-                f.write("\n")
-                f.write("Sincerely,\n")
-                f.write(f"The School Secretariat\n")
-            print(f"✅ Order generated successfully in '{nome_file_ordine}'.")
-        except IOError as e:
-            print(f"❌ Error generating order file: {e}")
-
-    # --- Data Persistence Methods (Moved from UtilitySuite to Segreteria) ---
-    def save_data(self, filename_alunni="alunni.json", filename_corsi="corsi.json", filename_aule="aule.json"):
-        """Saves school data (students, courses, classrooms) to JSON files."""
-        try:
-            # Save Alunni (students)
-            with open(filename_alunni, 'w', encoding='utf-8') as f:
-                alunni_data = []
-                for alunno in Alunni.lista_alunni:
-                    alunni_data.append({
-                        'name': alunno.name,
-                        'last_name': alunno.last_name,
-                        'date_of_birth': alunno.date_of_birth
-                    })
-                json.dump(alunni_data, f, indent=4)
-            print(f"✅ Students data saved to {filename_alunni}")
-
-            # Save Corsi (courses)
-            with open(filename_corsi, 'w', encoding='utf-8') as f:
-                corsi_data = []
-                for corso in self.all_courses: 
-                    corsi_data.append({
-                        'nome_corso': corso.nome_corso,
-                        'durata': corso.durata,
-                        'docente_name': corso.docente.name if hasattr(corso.docente, 'name') else corso.docente,
-                        'alunni_frequentanti_ids': [a.name + a.last_name for a in corso.alunni_frequentanti_il_tal_corso] # Simple ID based on name for linking
-                    })
-                json.dump(corsi_data, f, indent=4)
-            print(f"✅ Courses data saved to {filename_corsi}")
-
-            # Save Aule (classrooms)
-            with open(filename_aule, 'w', encoding='utf-8') as f:
-                aule_data = []
-                for aula in self.all_aule:
-                    aula_data = {
-                        'nome_aula': aula.nome_aula,
-                        'capacita_sedie': aula.capacita_sedie,
-                        'occupazione_aula': aula.occupazione_aula
-                    }
-                    aule_data.append(aula_data)
-                json.dump(aule_data, f, indent=4)
-            print(f"✅ Classrooms data saved to {filename_aule}")
-
-        except IOError as e:
-            print(f"❌ Error saving data: {e}")
-        except AttributeError as e:
-            print(f"❌ Data saving error: Missing attribute for data lists (e.g., self.all_courses or self.all_aule). {e}")
-
-    def load_data(self, filename_alunni="alunni.json", filename_corsi="corsi.json", filename_aule="aule.json"):
-        """Loads school data (students, courses, classrooms) from JSON files."""
-        # Clear existing data before loading
-        Alunni.lista_alunni = []
-        self.all_courses = []
-        self.all_aule = []
-        temp_alunni_dict = {} # Helper to quickly find students by 'ID' (name+lastname)
-
-        try:
-            # Load Alunni (students)
-            if os.path.exists(filename_alunni):
-                with open(filename_alunni, 'r', encoding='utf-8') as f:
-                    alunni_data = json.load(f)
-                    for data in alunni_data:
-                        alunno = Alunni(data['name'], data['last_name'], data['date_of_birth'])
-                        temp_alunni_dict[alunno.name + alunno.last_name] = alunno # Store for linking
-                print(f"✅ Students data loaded from {filename_alunni}")
-            else:
-                print(f"ℹ️ No students data file found: {filename_alunni}. Starting with empty student list.")
-
-            # Load Aule (classrooms) first, as courses might refer to their schedule
-            if os.path.exists(filename_aule):
-                with open(filename_aule, 'r', encoding='utf-8') as f:
-                    aule_data = json.load(f)
-                    for data in aule_data:
-                        aula = Aula(data['nome_aula'], data['capacita_sedie'])
-                        aula.occupazione_aula = data['occupazione_aula']
-                        self.all_aule.append(aula)
-                print(f"✅ Classrooms data loaded from {filename_aule}")
-            else:
-                print(f"ℹ️ No classrooms data file found: {filename_aule}. Starting with empty classroom list.")
-
-            # Load Corsi (courses)
-            if os.path.exists(filename_corsi):
-                with open(filename_corsi, 'r', encoding='utf-8') as f:
-                    corsi_data = json.load(f)
-                    for data in corsi_data:
-                        # Recreate Corso object
-                        corso = Corso(data['nome_corso'], data['durata'], data['docente_name'])
-                        # Re-link students to the course
-                        for alunno_id in data['alunni_frequentanti_ids']:
-                            if alunno_id in temp_alunni_dict:
-                                corso.alunni_frequentanti_il_tal_corso.append(temp_alunni_dict[alunno_id])
-                            else:
-                                print(f"⚠️ Warning: Student with ID '{alunno_id}' for course '{corso.nome_corso}' not found during load.")
-                        self.all_courses.append(corso)
-                print(f"✅ Courses data loaded from {filename_corsi}")
-            else:
-                print(f"ℹ️ No courses data file found: {filename_corsi}. Starting with empty course list.")
-
-            # Update all_aula_schedules in Segreteria from loaded Aule
-            self.all_aula_schedules = {aula.nome_aula: aula.occupazione_aula for aula in self.all_aule}
-
-
-        except (IOError, json.JSONDecodeError) as e:
-            print(f"❌ Error loading data: {e}")
-        except AttributeError as e:
-            print(f"❌ Data loading error: Ensure 'self.all_courses' and 'self.all_aule' are initialized in Segreteria __init__. {e}")
-        
-# --- Main Program Execution (CLI) ---
-if __name__ == "__main__":
-    print("--- School Management System ---")
-
-    # Initialize the secretariat and attempt to load previous data
-    secretario = Segreteria("Ivan", "Rossi", "1980-05-15")
-    secretario.load_data() # Load data after initializing lists in __init__
-
-
+import sqlite3
+import sys
+import tempfile
+
+from school_core import DatabaseManager, Segreteria, ShardRouter
+from school_core.changes import ChangeConsumer
+from school_core.report_rendering import write_reports_dir, write_reports_zip
+from school_core.warm_start import warm_start_path
+
+# --- Command-Line Interface ---
+def cli_notify(level, message):
+    """Segreteria messages: errors go to stderr, everything else to stdout (silenced by --quiet)."""
+    print(message, file=sys.stderr if level == "error" else sys.stdout)
+
+def _print_error(message):
+    print(f"❌ {message}", file=sys.stderr)
+
+def _write_output(secretario, content, filename):
+    path = os.path.join(secretario.output_dir, filename)
+    try:
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(content)
+        print(f"✅ Written '{path}'.")
+    except IOError as e:
+        _print_error(f"Error writing '{path}': {e}")
+
+def run_interactive_menu(secretario):
+    """The original input()-driven menu, kept as the 'menu' mode of the CLI."""
     while True:
         print("\n--- Main Menu ---")
         print("1. Add New Student (Alunni)")
@@ -312,21 +53,22 @@ if __name__ == "__main__":
             name = input("Enter student's first name: ")
             last_name = input("Enter student's last name: ")
             dob = input("Enter student's date of birth (YYYY-MM-DD): ")
-            new_alunno = Alunni(name, last_name, dob)
+            if secretario.add_student(name, last_name, dob):
+                print(f"✅ Student '{name} {last_name}' added.")
 
         elif choice == '2':
             nome_corso = input("Enter course name: ")
             durata = input("Enter course duration (e.g., '120 ore'): ")
             docente = input("Enter teacher's name (e.g., 'Prof. Bianchi'): ")
-            new_corso = Corso(nome_corso, durata, docente)
-            secretario.all_courses.append(new_corso)
+            if secretario.add_course(nome_corso, durata, docente):
+                print(f"✅ Course '{nome_corso}' created.")
 
         elif choice == '3':
             nome_aula = input("Enter classroom name: ")
             try:
                 capacita_sedie = int(input("Enter chair capacity: "))
-                new_aula = Aula(nome_aula, capacita_sedie)
-                secretario.all_aule.append(new_aula)
+                if secretario.add_classroom(nome_aula, capacita_sedie):
+                    print(f"✅ Classroom '{nome_aula}' created.")
             except ValueError:
                 print("❌ Invalid capacity. Please enter a number.")
 
@@ -334,7 +76,7 @@ if __name__ == "__main__":
             if not secretario.all_courses:
                 print("❌ No courses available. Please create a course first.")
                 continue
-            if not Alunni.lista_alunni:
+            if not secretario.all_students:
                 print("❌ No students registered. Please add students first.")
                 continue
 
@@ -346,7 +88,7 @@ if __name__ == "__main__":
             try:
                 corso_selected = secretario.all_courses[int(course_index) - 1]
                 print(f"\n--- Available Students (All) ---")
-                for i, alunno in enumerate(Alunni.lista_alunni):
+                for i, alunno in enumerate(secretario.all_students):
                     status = "(Already in this course)" if alunno in corso_selected.alunni_frequentanti_il_tal_corso else ""
                     print(f"{i+1}. {alunno.name} {alunno.last_name} {status}")
                 
@@ -355,8 +97,8 @@ if __name__ == "__main__":
                 
                 students_to_assign = []
                 for idx in student_indices:
-                    if 0 <= idx < len(Alunni.lista_alunni):
-                        alunno = Alunni.lista_alunni[idx]
+                    if 0 <= idx < len(secretario.all_students):
+                        alunno = secretario.all_students[idx]
                         if alunno not in corso_selected.alunni_frequentanti_il_tal_corso:
                             students_to_assign.append(alunno)
                         else:
@@ -413,20 +155,23 @@ if __name__ == "__main__":
             try:
                 aula_selected = secretario.all_aule[int(aula_index) - 1]
                 num_alunni = int(input(f"Enter number of students expected for '{aula_selected.nome_aula}': "))
-                secretario.controllo_forniture(aula_selected, num_alunni)
+                order = secretario.controllo_forniture(aula_selected, num_alunni)
+                if order:
+                    _write_output(secretario, *order)
             except (ValueError, IndexError):
                 print("❌ Invalid classroom selection or number of students.")
 
         elif choice == '7':
-            secretario.stampa_calendario()
+            _write_output(secretario, *secretario.stampa_calendario())
 
         elif choice == '8':
             print("\n--- All Registered Students ---")
-            if not Alunni.lista_alunni:
+            if not secretario.all_students:
                 print("No students registered yet.")
-            for i, alunno in enumerate(Alunni.lista_alunni):
+            for i, alunno in enumerate(secretario.all_students):
                 print(f"{i+1}.")
-                alunno.display_alunno_info()
+                for key, value in alunno.display_alunno_info().items():
+                    print(f"  {key}: {value}")
                 print("---")
             print("------------------------------")
 
@@ -436,7 +181,8 @@ if __name__ == "__main__":
                 print("No courses created yet.")
             for i, corso in enumerate(secretario.all_courses):
                 print(f"{i+1}.")
-                corso.display_corso_info()
+                for key, value in corso.display_corso_info().items():
+                    print(f"  {key}: {value}")
                 print("---")
             print("---------------------------")
 
@@ -446,7 +192,8 @@ if __name__ == "__main__":
                 print("No classrooms created yet.")
             for i, aula in enumerate(secretario.all_aule):
                 print(f"{i+1}.")
-                aula.display_aula_info()
+                for key, value in aula.display_aula_info().items():
+                    print(f"  {key}: {value}")
                 print("---")
             print("-----------------------------")
 
@@ -454,9 +201,569 @@ if __name__ == "__main__":
             secretario.save_data()
 
         elif choice == '12':
-            print("Exiting School Management System. Remember to save your data!")
+            print("Exiting School Management System.")
             break
         else:
             print("Invalid choice. Please try again.")
 
+
+def _read_rows(path, min_columns):
+    """
+    Reads CSV rows from a file, or from stdin when path is '-'.
+    Blank lines and lines starting with '#' are skipped; short rows are reported and dropped.
+    """
+    stream = sys.stdin if path == '-' else open(path, 'r', encoding='utf-8', newline='')
+    rows = []
+    try:
+        for line_number, row in enumerate(csv.reader(stream), start=1):
+            if not row or not row[0].strip() or row[0].lstrip().startswith('#'):
+                continue
+            row = [value.strip() for value in row]
+            if len(row) < min_columns:
+                print(f"❌ {path}:{line_number}: expected {min_columns} columns, got {len(row)}. Row skipped.", file=sys.stderr)
+                continue
+            rows.append(row)
+    finally:
+        if stream is not sys.stdin:
+            stream.close()
+    return rows
+
+def cmd_add_students(secretario, args):
+    """Rows: name,last_name,date_of_birth"""
+    errors = 0
+    for name, last_name, dob in (row[:3] for row in _read_rows(args.input, 3)):
+        try:
+            datetime.date.fromisoformat(dob)
+        except ValueError:
+            print(f"❌ Invalid date of birth '{dob}' for '{name} {last_name}'. Use YYYY-MM-DD.", file=sys.stderr)
+            errors += 1
+            continue
+        # Without --allow-duplicates, rows that look like a student already there (or earlier in the file) are skipped
+        if not secretario.add_student(name, last_name, dob, allow_duplicates=args.allow_duplicates):
+            errors += 1
+    return errors
+
+def cmd_create_courses(secretario, args):
+    """Rows: nome_corso,durata,docente"""
+    errors = 0
+    existing = {c.nome_corso for c in secretario.all_courses}
+    for nome_corso, durata, docente in (row[:3] for row in _read_rows(args.input, 3)):
+        if nome_corso in existing:
+            print(f"❌ Course '{nome_corso}' already exists.", file=sys.stderr)
+            errors += 1
+            continue
+        if not secretario.add_course(nome_corso, durata, docente):
+            errors += 1
+            continue
+        existing.add(nome_corso)
+    return errors
+
+def cmd_create_classrooms(secretario, args):
+    """Rows: nome_aula,capacita_sedie"""
+    errors = 0
+    existing = {a.nome_aula for a in secretario.all_aule}
+    for nome_aula, capacita in (row[:2] for row in _read_rows(args.input, 2)):
+        if nome_aula in existing:
+            print(f"❌ Classroom '{nome_aula}' already exists.", file=sys.stderr)
+            errors += 1
+            continue
+        try:
+            capacita_sedie = int(capacita)
+        except ValueError:
+            print(f"❌ Invalid capacity '{capacita}' for classroom '{nome_aula}'.", file=sys.stderr)
+            errors += 1
+            continue
+        if not secretario.add_classroom(nome_aula, capacita_sedie):
+            errors += 1
+            continue
+        existing.add(nome_aula)
+    return errors
+
+def cmd_assign(secretario, args):
+    """Rows: nome_corso,student_name,student_last_name"""
+    errors = 0
+    corsi = {c.nome_corso: c for c in secretario.all_courses}
+    alunni = _student_records(secretario)
+    students_per_course = {} # Grouped so creazione_classe runs once per course
+    for nome_corso, name, last_name in (row[:3] for row in _read_rows(args.input, 3)):
+        corso = corsi.get(nome_corso)
+        alunno = alunni.get((name, last_name))
+        if alunno is _HOMONYMS:
+            print(f"❌ Several students are named '{name} {last_name}': assign them in the app. Row skipped.", file=sys.stderr)
+            errors += 1
+            continue
+        if corso is None or alunno is None:
+            missing = f"course '{nome_corso}'" if corso is None else f"student '{name} {last_name}'"
+            print(f"❌ Unknown {missing}. Row skipped.", file=sys.stderr)
+            errors += 1
+            continue
+        students_per_course.setdefault(corso.nome_corso, []).append(alunno)
+    for nome_corso, students in students_per_course.items():
+        secretario.creazione_classe(corsi[nome_corso], students)
+    return errors
+
+def cmd_schedule(secretario, args):
+    """Rows: nome_aula,nome_corso,time_slot"""
+    errors = 0
+    aule = {a.nome_aula: a for a in secretario.all_aule}
+    corsi = {c.nome_corso: c for c in secretario.all_courses}
+    for nome_aula, nome_corso, time_slot in (row[:3] for row in _read_rows(args.input, 3)):
+        aula = aule.get(nome_aula)
+        corso = corsi.get(nome_corso)
+        if aula is None or corso is None:
+            missing = f"classroom '{nome_aula}'" if aula is None else f"course '{nome_corso}'"
+            print(f"❌ Unknown {missing}. Row skipped.", file=sys.stderr)
+            errors += 1
+            continue
+        secretario.creazione_calendario(aula, corso, time_slot)
+    return errors
+
+def cmd_check_supplies(secretario, args):
+    """Rows: nome_aula,numero_alunni_previsti"""
+    errors = 0
+    aule = {a.nome_aula: a for a in secretario.all_aule}
+    for nome_aula, num_alunni in (row[:2] for row in _read_rows(args.input, 2)):
+        aula = aule.get(nome_aula)
+        if aula is None:
+            print(f"❌ Unknown classroom '{nome_aula}'. Row skipped.", file=sys.stderr)
+            errors += 1
+            continue
+        try:
+            num_alunni = int(num_alunni)
+        except ValueError:
+            print(f"❌ Invalid number of students '{num_alunni}' for classroom '{nome_aula}'.", file=sys.stderr)
+            errors += 1
+            continue
+        order = secretario.controllo_forniture(aula, num_alunni)
+        if order:
+            _write_output(secretario, *order)
+    return errors
+
+def cmd_print_calendar(secretario, args):
+    _write_output(secretario, *secretario.stampa_calendario())
+    return 0
+
+def cmd_export_reports(secretario, args):
+    jobs = secretario.report_jobs()
+    if args.zip:
+        with open(args.zip, "wb") as f:
+            write_reports_zip(jobs, f, max_workers=args.workers)
+        print(f"✅ {len(jobs)} reports written to '{args.zip}'.")
+    else:
+        paths = write_reports_dir(jobs, secretario.output_dir, max_workers=args.workers)
+        print(f"✅ {len(paths)} reports written to '{secretario.output_dir}'.")
+    return 0
+
+def cmd_optimize_rooms(secretario, args):
+    plan = secretario.propose_room_reassignment(move_cost=args.move_cost)
+    print(f"Chairs to buy: {plan.missing_before} with the current schedule, {plan.missing_after} with the proposed one.")
+    print(f"--- Proposed Schedule Changes ({len(plan.moves)}) ---")
+    for time_slot, nome_corso, old_room, new_room in plan.moves:
+        print(f"  {time_slot}: '{nome_corso}' {old_room} -> {new_room}")
+    paths = write_reports_dir(plan.report_jobs(), secretario.output_dir)
+    print(f"✅ {len(paths)} purchase orders written to '{secretario.output_dir}'.")
+    if args.apply:
+        secretario.apply_room_reassignment(plan)
+    return 0
+
+def cmd_what_if(secretario, args):
+    """
+    Rows: scenario,action,nome_aula[,time_slot,target[,new_time_slot]] with action 'move' (target: classroom),
+    'add' (target: course), 'remove' or 'close' (the whole classroom). Prints each scenario's metrics and changes.
+    """
+    errors = 0
+    scenarios = secretario.scenarios()
+    aule = secretario.aula_options()
+    corsi = secretario.course_options()
+    for name, action, nome_aula, *rest in _read_rows(args.input, 3):
+        time_slot, target, new_time_slot = (rest + ["", "", ""])[:3]
+        try:
+            branch = scenarios.branches.get(name) or scenarios.branch(name)
+            if nome_aula not in aule:
+                raise ValueError(f"Unknown classroom '{nome_aula}'")
+            aula_id = aule[nome_aula].id
+            if action == 'move':
+                if target not in aule:
+                    raise ValueError(f"Unknown classroom '{target}'")
+                branch.move(aula_id, time_slot, aule[target].id, new_time_slot or None)
+            elif action == 'add':
+                if target not in corsi:
+                    raise ValueError(f"Unknown course '{target}'")
+                branch.assign(aula_id, time_slot, corsi[target].id)
+            elif action == 'remove':
+                branch.clear(aula_id, time_slot)
+            elif action == 'close':
+                branch.close_room(aula_id)
+            else:
+                raise ValueError(f"Unknown action '{action}' (move, add, remove, close)")
+        except ValueError as e:
+            print(f"❌ {name}: {e}. Row skipped.", file=sys.stderr)
+            errors += 1
+
+    names = {a.id: a.nome_aula for a in secretario.all_aule}
+    courses = {c.id: c.nome_corso for c in secretario.all_courses}
+    columns = ("Lessons", "Chairs to buy", "Room clashes", "Teacher clashes", "Student clashes", "Unplaced")
+    print(f"{'Scenario':<24}" + "".join(f"{column:>{len(column) + 2}}" for column in columns))
+    for name, branch in [("(live)", scenarios.live)] + list(scenarios.branches.items()):
+        print(f"{name:<24}" + "".join(f"{value:>{len(column) + 2}}" for value, column in zip(branch.metrics(), columns)))
+    for name, branch in scenarios.branches.items():
+        print(f"--- {name}: {len(branch)} slots changed ---")
+        for aula_id, time_slot, before, after in branch.changes():
+            print(f"  {names[aula_id]} {time_slot}: {courses.get(before, '-')} -> {courses.get(after, '-')}")
+    if args.apply:
+        if args.apply not in scenarios.branches:
+            _print_error(f"No scenario named '{args.apply}' in the input.")
+            return errors + 1
+        result = secretario.promote_scenario(args.apply)
+        if result is None or result["conflicts"]:
+            errors += 1
+    return errors
+
+def cmd_import_json(secretario, args):
+    """Migrates the JSON files written by the old versions of this CLI into the database."""
+    errors = 0
+    def load(path):
+        if not os.path.exists(path):
+            print(f"ℹ️ No data file found: {path}. Skipped.")
+            return []
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    try:
+        alunni_data, corsi_data, aule_data = load(args.alunni), load(args.corsi), load(args.aule)
+    except (IOError, json.JSONDecodeError) as e:
+        _print_error(f"Error loading data: {e}")
+        return 1
+
+    # The JSON files link students to courses by name + last name
+    alunni = {(a.name + a.last_name): a for a in secretario.all_students}
+    for data in alunni_data:
+        key = data['name'] + data['last_name']
+        if key not in alunni:
+            alunno = secretario.add_student(data['name'], data['last_name'], data['date_of_birth'])
+            if alunno is None:
+                errors += 1
+                continue
+            alunni[key] = alunno
+    aule = {a.nome_aula: a for a in secretario.all_aule}
+    schedules = [] # Scheduled once the courses they name exist
+    for data in aule_data:
+        aula = aule.get(data['nome_aula']) or secretario.add_classroom(data['nome_aula'], data['capacita_sedie'])
+        if aula is None:
+            errors += 1
+            continue
+        schedules += [(aula, nome_corso, time_slot) for time_slot, nome_corso in data.get('occupazione_aula', {}).items()]
+    corsi = {c.nome_corso: c for c in secretario.all_courses}
+    for data in corsi_data:
+        corso = corsi.get(data['nome_corso']) or secretario.add_course(data['nome_corso'], data['durata'], data['docente_name'])
+        if corso is None:
+            errors += 1
+            continue
+        students = []
+        for alunno_id in data.get('alunni_frequentanti_ids', []):
+            if alunno_id in alunni:
+                students.append(alunni[alunno_id])
+            else:
+                print(f"⚠️ Warning: Student with ID '{alunno_id}' for course '{corso.nome_corso}' not found.")
+        secretario.creazione_classe(corso, students)
+    corsi = secretario.course_options()
+    for aula, nome_corso, time_slot in schedules:
+        if nome_corso not in corsi:
+            print(f"⚠️ Warning: Course '{nome_corso}' scheduled in '{aula.nome_aula}' at '{time_slot}' not found.")
+    secretario.schedule_many([(aula, corsi[nome_corso], time_slot) for aula, nome_corso, time_slot in schedules if nome_corso in corsi])
+    print(f"✅ Imported {len(alunni_data)} students, {len(corsi_data)} courses and {len(aule_data)} classrooms.")
+    return errors
+
+def cmd_export_changes(secretario, args):
+    """Writes the changes since the consumer's last run as NDJSON, then advances its cursor."""
+    consumer = ChangeConsumer(secretario.db_manager, args.consumer, args.tables.split(",") if args.tables else None)
+    start = consumer.cursor
+    # The data goes to the real stdout even with --quiet
+    stream = sys.__stdout__ if args.output == '-' else open(args.output, 'a', encoding='utf-8')
+    try:
+        def write(changes):
+            stream.writelines(json.dumps(change._asdict()) + "\n" for change in changes)
+            stream.flush()
+        count = consumer.consume(write)
+    finally:
+        if stream is not sys.__stdout__:
+            stream.close()
+    message = f"✅ {count} change(s) after #{start} exported for '{args.consumer}'."
+    if args.output != '-':
+        print(message)
+    elif not args.quiet:
+        print(message, file=sys.stderr) # stdout carries the data
+    return 0
+
+def cmd_archive_year(secretario, args):
+    """Moves a closed academic year's attendance and enrollments to its archive file."""
+    moved = secretario.db_manager.archive_academic_year(args.academic_year, vacuum=not args.no_vacuum)
+    if moved is None:
+        return 1
+    print(f"✅ {args.academic_year}: {moved['attendance']} attendance records and {moved['course_students']} enrollments "
+          f"moved to '{secretario.db_manager.archive_path(args.academic_year)}'.")
+    return 0
+
+# Stands for a (name, last_name) shared by several students: rows naming it are refused, not guessed
+_HOMONYMS = object()
+
+def _student_records(secretario):
+    """(name, last_name) -> Alunni, or _HOMONYMS."""
+    records = {}
+    for a in secretario.all_students:
+        key = (a.name, a.last_name)
+        records[key] = _HOMONYMS if key in records else a
+    return records
+
+def _resolve(rows, records, what):
+    """Looks up each row's key in `records`; unknown and ambiguous ones are reported. Returns (found, errors)."""
+    found, errors = [], 0
+    for key in rows:
+        record = records.get(key)
+        if record is _HOMONYMS:
+            print(f"❌ Several {what}s are named '{' '.join(key)}': use their IDs (find-duplicates, merge-duplicates) "
+                  f"or the app. Row skipped.", file=sys.stderr)
+            errors += 1
+        elif record is None:
+            print(f"❌ Unknown {what} '{' '.join(key) if isinstance(key, tuple) else key}'. Row skipped.", file=sys.stderr)
+            errors += 1
+        elif record not in found:
+            found.append(record)
+    return found, errors
+
+def _retire(args, rows, records, what, delete, deactivate):
+    """Shared by the retire-* commands: one bulk operation (one transaction) for all the rows."""
+    found, errors = _resolve(rows, records, what)
+    if found:
+        result = delete(found) if args.delete else deactivate(found, args.date)
+        if result is None:
+            errors += len(found)
+    return errors
+
+def cmd_retire_students(secretario, args):
+    """Rows: name,last_name. Graduated (enrollments ended, history kept), or deleted with --delete."""
+    rows = [tuple(row[:2]) for row in _read_rows(args.input, 2)]
+    records = _student_records(secretario)
+    return _retire(args, rows, records, "student", secretario.delete_students, secretario.graduate_students)
+
+def cmd_retire_courses(secretario, args):
+    """Rows: nome_corso. Closed (off every schedule, history kept), or deleted with --delete."""
+    rows = [row[0] for row in _read_rows(args.input, 1)]
+    return _retire(args, rows, secretario.course_options(), "course",
+                   secretario.delete_courses, secretario.deactivate_courses)
+
+def cmd_retire_classrooms(secretario, args):
+    """Rows: nome_aula. Out of service (schedule emptied), or deleted with --delete."""
+    rows = [row[0] for row in _read_rows(args.input, 1)]
+    return _retire(args, rows, secretario.aula_options(), "classroom",
+                   secretario.delete_classrooms, secretario.deactivate_classrooms)
+
+def _merge(pairs, records, what, merge):
+    """(record to keep, duplicate) keys: one merge per kept record."""
+    groups, errors = {}, 0
+    for keep, duplicate in pairs:
+        _, failed = _resolve([keep, duplicate], records, what)
+        errors += failed
+        if not failed:
+            groups.setdefault(keep, []).append(records[duplicate])
+    for keep, duplicates in groups.items():
+        if merge(records[keep], duplicates) is None:
+            errors += len(duplicates)
+    return errors
+
+def cmd_merge_students(secretario, args):
+    """Rows: name,last_name,duplicate_name,duplicate_last_name"""
+    pairs = [(tuple(row[:2]), tuple(row[2:4])) for row in _read_rows(args.input, 4)]
+    return _merge(pairs, _student_records(secretario), "student", secretario.merge_students)
+
+def cmd_find_duplicates(secretario, args):
+    """Writes the likely duplicate students as 'keep_id,duplicate_id,score,...' rows, the input of merge-duplicates."""
+    groups = secretario.duplicate_groups()
+    # The data goes to the real stdout even with --quiet
+    stream = sys.__stdout__ if args.output == '-' else open(args.output, 'w', encoding='utf-8', newline='')
+    try:
+        stream.write("# keep_id,duplicate_id,score,keep,duplicate: delete the rows that are not duplicates\n")
+        writer = csv.writer(stream)
+        for (keep, _), *duplicates in groups:
+            for duplicate, score in duplicates:
+                writer.writerow([keep.id, duplicate.id, f"{score:.3f}",
+                                 f"{keep.name} {keep.last_name} {keep.date_of_birth}",
+                                 f"{duplicate.name} {duplicate.last_name} {duplicate.date_of_birth}"])
+    finally:
+        if stream is not sys.__stdout__:
+            stream.close()
+    message = f"✅ {len(groups)} group(s) of likely duplicates, {sum(len(g) - 1 for g in groups)} record(s) to merge."
+    if args.output != '-':
+        print(message)
+    elif not args.quiet:
+        print(message, file=sys.stderr) # stdout carries the data
+    return 0
+
+def cmd_merge_duplicates(secretario, args):
+    """Rows: keep_id,duplicate_id (find-duplicates output)"""
+    records = {str(a.id): a for a in secretario.all_students}
+    pairs = [tuple(row[:2]) for row in _read_rows(args.input, 2)]
+    return _merge(pairs, records, "student ID", secretario.merge_students)
+
+def cmd_merge_courses(secretario, args):
+    """Rows: nome_corso,duplicate"""
+    pairs = [tuple(row[:2]) for row in _read_rows(args.input, 2)]
+    return _merge(pairs, secretario.course_options(), "course", secretario.merge_courses)
+
+def cmd_merge_classrooms(secretario, args):
+    """Rows: nome_aula,duplicate"""
+    pairs = [tuple(row[:2]) for row in _read_rows(args.input, 2)]
+    return _merge(pairs, secretario.aula_options(), "classroom", secretario.merge_classrooms)
+
+def cmd_district(secretario, args):
+    """Enrollment and chairs to buy of every campus in --campuses-dir, queried in parallel."""
+    with ShardRouter(args.campuses_dir, on_error=_print_error, max_workers=args.workers) as router:
+        if not router.campuses():
+            _print_error(f"No campus databases in '{args.campuses_dir}'.")
+            return 1
+        enrollment, totals = router.enrollment_report()
+        shortfalls, chairs_to_buy = router.supply_needs()
+    columns = ("students", "courses", "enrollments", "classrooms", "chairs")
+    print(f"{'Campus':<20}" + "".join(f"{column.capitalize():>13}" for column in columns) + f"{'Chairs to buy':>15}")
+    for campus, summary in enrollment.items():
+        missing = sum(shortfalls.get(campus, {}).values())
+        print(f"{campus:<20}" + "".join(f"{summary[column]:>13}" for column in columns) + f"{missing:>15}")
+    print(f"{'Total':<20}" + "".join(f"{totals.get(column, 0):>13}" for column in columns) + f"{chairs_to_buy:>15}")
+    for campus, campus_shortfalls in shortfalls.items():
+        for nome_aula, missing in campus_shortfalls.items():
+            print(f"  {campus}/{nome_aula}: {missing} chairs missing")
+    return len(router.campuses()) - len(enrollment) # Campuses that couldn't be read
+
+def cmd_menu(secretario, args):
+    run_interactive_menu(secretario)
     print("--- Program Ended ---")
+    return 0
+
+# name -> (handler, help, CSV columns or None, modifies data)
+COMMANDS = {
+    'add-students': (cmd_add_students, "Add students in bulk", "name,last_name,date_of_birth", True),
+    'create-courses': (cmd_create_courses, "Create courses in bulk", "nome_corso,durata,docente", True),
+    'create-classrooms': (cmd_create_classrooms, "Create classrooms in bulk", "nome_aula,capacita_sedie", True),
+    'assign': (cmd_assign, "Assign students to courses", "nome_corso,student_name,student_last_name", True),
+    'schedule': (cmd_schedule, "Create course schedule entries", "nome_aula,nome_corso,time_slot", True),
+    'check-supplies': (cmd_check_supplies, "Check chairs and generate supplier orders", "nome_aula,numero_alunni_previsti", False),
+    'print-calendar': (cmd_print_calendar, "Print the school calendar to a TXT file", None, False),
+    'export-reports': (cmd_export_reports, "Render purchase orders, room calendars and course rosters", None, False),
+    'optimize-rooms': (cmd_optimize_rooms, "Propose room moves that minimize chair purchases", None, True),
+    'what-if': (cmd_what_if, "Compare schedule scenarios (moves, closed classrooms) and optionally apply one",
+                "scenario,action,nome_aula,time_slot,target,new_time_slot", True),
+    'import-json': (cmd_import_json, "Import the JSON files of older versions into the database", None, True),
+    'export-changes': (cmd_export_changes, "Export the changes since the last run as NDJSON (incremental export)", None, True),
+    'archive-year': (cmd_archive_year, "Move a closed academic year (e.g. 2023-2024) to its archive file", None, True),
+    'retire-students': (cmd_retire_students, "Graduate students (or delete them with --delete)", "name,last_name", True),
+    'retire-courses': (cmd_retire_courses, "Close courses (or delete them with --delete)", "nome_corso", True),
+    'retire-classrooms': (cmd_retire_classrooms, "Take classrooms out of service (or delete them with --delete)", "nome_aula", True),
+    'merge-students': (cmd_merge_students, "Merge duplicate student records into the first one of each row",
+                       "name,last_name,duplicate_name,duplicate_last_name", True),
+    'find-duplicates': (cmd_find_duplicates, "List likely duplicate students (typos, swapped names) for merge-duplicates",
+                        None, False),
+    'merge-duplicates': (cmd_merge_duplicates, "Merge students by ID, e.g. the reviewed output of find-duplicates",
+                         "keep_id,duplicate_id", True),
+    'merge-courses': (cmd_merge_courses, "Merge duplicate courses into the first one of each row", "nome_corso,duplicate", True),
+    'merge-classrooms': (cmd_merge_classrooms, "Merge duplicate classrooms into the first one of each row", "nome_aula,duplicate", True),
+    'district': (cmd_district, "Enrollment and supply needs of all campuses in --campuses-dir", None, False),
+    'menu': (cmd_menu, "Interactive menu (default when no command is given)", None, False),
+}
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        description="School Management System. Without a command the interactive menu is started."
+    )
+    parser.add_argument('--db', default="school_data.db", help="SQLite database, shared with the web app (default: %(default)s)")
+    parser.add_argument('--campus', help="Use the database of this campus in --campuses-dir instead of --db (created if missing)")
+    parser.add_argument('--campuses-dir', default="campuses", help="One <campus>.db file per campus (default: %(default)s)")
+    parser.add_argument('--output-dir', default=".", help="Directory for calendars and supplier orders (default: %(default)s)")
+    parser.add_argument('-q', '--quiet', action='store_true', help="Only print errors")
+    parser.add_argument('--dry-run', action='store_true', help="Run on a scratch copy of the database, nothing is saved")
+    subparsers = parser.add_subparsers(dest='command')
+    for name, (handler, help_text, columns, _) in COMMANDS.items():
+        sub = subparsers.add_parser(name, help=help_text)
+        if columns:
+            sub.add_argument('input', nargs='?', default='-',
+                             help=f"CSV file with rows '{columns}' ('-' or omitted: read stdin)")
+        if name == 'export-reports':
+            sub.add_argument('--zip', help="Write a single ZIP archive instead of files in --output-dir")
+            sub.add_argument('--workers', type=int, default=None, help="Worker processes (default: one per CPU)")
+        if name == 'export-changes':
+            sub.add_argument('--consumer', default="cli-export", help="Name of the cursor to resume from (default: %(default)s)")
+            sub.add_argument('--tables', help="Comma-separated tables to export (default: all)")
+            sub.add_argument('--output', default='-', help="NDJSON file to append to ('-': stdout, the default)")
+        if name == 'add-students':
+            sub.add_argument('--allow-duplicates', action='store_true',
+                             help="Also add rows that look like an existing student (skipped by default)")
+        if name == 'find-duplicates':
+            sub.add_argument('--output', default='-', help="CSV file to write ('-': stdout, the default)")
+        if name == 'archive-year':
+            sub.add_argument('academic_year', help="Academic year to archive, e.g. 2023-2024 (September to August)")
+            sub.add_argument('--no-vacuum', action='store_true', help="Skip compacting the live database afterwards")
+        if name.startswith('retire-'):
+            sub.add_argument('--delete', action='store_true', help="Delete the rows and their history instead (cascades)")
+            sub.add_argument('--date', type=datetime.date.fromisoformat, default=None,
+                             help="Date recorded as the end (YYYY-MM-DD, default: today)")
+        if name == 'district':
+            sub.add_argument('--workers', type=int, default=None, help="Campuses queried at the same time (default: automatic)")
+        if name == 'import-json':
+            sub.add_argument('--alunni', default="alunni.json", help="Students JSON file (default: %(default)s)")
+            sub.add_argument('--corsi', default="corsi.json", help="Courses JSON file (default: %(default)s)")
+            sub.add_argument('--aule', default="aule.json", help="Classrooms JSON file (default: %(default)s)")
+        if name == 'what-if':
+            sub.add_argument('--apply', metavar='SCENARIO', help="Make this scenario the live schedule (one transaction)")
+        if name == 'optimize-rooms':
+            sub.add_argument('--apply', action='store_true', help="Save the proposed schedule")
+            sub.add_argument('--move-cost', type=int, default=1, help="Cost of moving one lesson (default: %(default)s)")
+    return parser
+
+@contextlib.contextmanager
+def _scratch_copy(db_path):
+    """A throwaway copy of the database for --dry-run: commands run normally and the copy is deleted."""
+    with tempfile.TemporaryDirectory() as tmp:
+        scratch = os.path.join(tmp, os.path.basename(db_path))
+        if os.path.exists(db_path):
+            with contextlib.closing(sqlite3.connect(db_path)) as src, contextlib.closing(sqlite3.connect(scratch)) as dst:
+                src.backup(dst)
+        yield scratch
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    command = args.command or 'menu'
+    handler, _, _, modifies_data = COMMANDS[command]
+    if command == 'district':
+        # Reads every campus file on its own: there is no single database to load
+        return 1 if handler(None, args) else 0
+    if args.campus:
+        try:
+            args.db = ShardRouter(args.campuses_dir).path(args.campus)
+        except ValueError as e:
+            _print_error(str(e))
+            return 1
+        os.makedirs(args.campuses_dir, exist_ok=True)
+
+    # Interactive output can't be silenced, batch output can
+    quiet = args.quiet and command != 'menu'
+    with contextlib.ExitStack() as stack:
+        devnull = stack.enter_context(open(os.devnull, 'w'))
+        stack.enter_context(contextlib.redirect_stdout(devnull if quiet else sys.stdout))
+        db_path = stack.enter_context(_scratch_copy(args.db)) if args.dry_run and modifies_data else args.db
+        if command == 'menu':
+            print("--- School Management System ---")
+        # Changes are written to the database as they happen; the data is loaded once for the whole run
+        db_manager = DatabaseManager(db_path, on_error=_print_error, on_warning=lambda message: print(f"⚠️ {message}"))
+        # A scratch copy starts from the real database's snapshot (same change log) but never writes it
+        secretario = Segreteria("Ivan", "Rossi", "1980-05-15", db_manager=db_manager, notify=cli_notify,
+                                warm_start=warm_start_path(args.db))
+        secretario.output_dir = args.output_dir
+        secretario.load_data()
+
+        errors = handler(secretario, args)
+        if db_path == args.db:
+            secretario.save_warm_start()
+    if errors:
+        print(f"❌ {command}: {errors} row(s) failed.", file=sys.stderr)
+    return 1 if errors else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
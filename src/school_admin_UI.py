@@ -1,472 +1,136 @@
 import streamlit as st
 import datetime
-import json
 import os
-import sqlite3
+import time
+import uuid
+import numpy as np
 import pandas as pd
+import altair as alt
 from streamlit_calendar import calendar # Import the calendar component
-
-# --- Database Management Class ---
-class DatabaseManager:
-    def __init__(self, db_name="school_data.db"):
-        self.db_name = db_name
-        self.conn = None
-        self.cursor = None
-        self._connect()
-        self._create_tables()
-
-    def _connect(self):
-        try:
-            self.conn = sqlite3.connect(self.db_name, check_same_thread=False)
-            self.cursor = self.conn.cursor()
-            # print(f"Connected to database: {self.db_name}") # For debugging
-        except sqlite3.Error as e:
-            st.error(f"Database connection error: {e}")
-
-    def _close(self):
-        if self.conn:
-            self.conn.close()
-            # print("Database connection closed.") # For debugging
-
-    def _create_tables(self):
-        self._connect() # Ensure connection is open
-        try:
-            self.cursor.execute('''
-                CREATE TABLE IF NOT EXISTS students (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    name TEXT NOT NULL,
-                    last_name TEXT NOT NULL,
-                    date_of_birth TEXT NOT NULL
-                )
-            ''')
-            self.cursor.execute('''
-                CREATE TABLE IF NOT EXISTS courses (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    nome_corso TEXT NOT NULL UNIQUE,
-                    durata TEXT NOT NULL,
-                    docente TEXT NOT NULL
-                )
-            ''')
-            self.cursor.execute('''
-                CREATE TABLE IF NOT EXISTS classrooms (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    nome_aula TEXT NOT NULL UNIQUE,
-                    capacita_sedie INTEGER NOT NULL,
-                    occupazione_aula TEXT
-                )
-            ''')
-            self.cursor.execute('''
-                CREATE TABLE IF NOT EXISTS course_students (
-                    course_id INTEGER,
-                    student_id INTEGER,
-                    PRIMARY KEY (course_id, student_id),
-                    FOREIGN KEY (course_id) REFERENCES courses(id) ON DELETE CASCADE,
-                    FOREIGN KEY (student_id) REFERENCES students(id) ON DELETE CASCADE
-                )
-            ''')
-            # New table for attendance
-            self.cursor.execute('''
-                CREATE TABLE IF NOT EXISTS attendance (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    student_id INTEGER NOT NULL,
-                    course_id INTEGER NOT NULL,
-                    attendance_date TEXT NOT NULL,
-                    status TEXT NOT NULL, -- e.g., 'Present', 'Absent', 'Late', 'Excused'
-                    FOREIGN KEY (student_id) REFERENCES students(id) ON DELETE CASCADE,
-                    FOREIGN KEY (course_id) REFERENCES courses(id) ON DELETE CASCADE,
-                    UNIQUE(student_id, course_id, attendance_date) -- Ensure only one entry per student, course, and date
-                )
-            ''')
-            self.conn.commit()
-            # print("Tables checked/created successfully.") # For debugging
-        except sqlite3.Error as e:
-            st.error(f"Error creating tables: {e}")
-        finally:
-            self._close()
-
-    # --- Student Operations ---
-    def insert_student(self, name, last_name, date_of_birth):
-        self._connect()
-        try:
-            self.cursor.execute('''
-                INSERT INTO students (name, last_name, date_of_birth) VALUES (?, ?, ?)
-            ''', (name, last_name, date_of_birth))
-            self.conn.commit()
-            return self.cursor.lastrowid # Return the ID of the newly inserted student
-        except sqlite3.IntegrityError as e:
-            st.warning(f"Student '{name} {last_name}' might already exist. Error: {e}")
-            return None
-        except sqlite3.Error as e:
-            st.error(f"Error inserting student: {e}")
-            return None
-        finally:
-            self._close()
-
-    def fetch_students(self):
-        self._connect()
-        try:
-            self.cursor.execute('SELECT id, name, last_name, date_of_birth FROM students')
-            return self.cursor.fetchall()
-        except sqlite3.Error as e:
-            st.error(f"Error fetching students: {e}")
-            return []
-        finally:
-            self._close()
-    
-    # --- Course Operations ---
-    def insert_course(self, nome_corso, durata, docente):
-        self._connect()
-        try:
-            self.cursor.execute('''
-                INSERT INTO courses (nome_corso, durata, docente) VALUES (?, ?, ?)
-            ''', (nome_corso, durata, docente))
-            self.conn.commit()
-            return self.cursor.lastrowid
-        except sqlite3.IntegrityError:
-            st.warning(f"Course '{nome_corso}' already exists.")
-            return None
-        except sqlite3.Error as e:
-            st.error(f"Error inserting course: {e}")
-            return None
-        finally:
-            self._close()
-
-    def fetch_courses(self):
-        self._connect()
-        try:
-            self.cursor.execute('SELECT id, nome_corso, durata, docente FROM courses')
-            courses_data = self.cursor.fetchall()
-            
-            # Fetch student assignments for each course
-            courses_with_students = []
-            for course_id, nome_corso, durata, docente in courses_data:
-                self.cursor.execute('''
-                    SELECT s.id, s.name, s.last_name, s.date_of_birth
-                    FROM students s
-                    JOIN course_students cs ON s.id = cs.student_id
-                    WHERE cs.course_id = ?
-                ''', (course_id,))
-                assigned_students_data = self.cursor.fetchall()
-                courses_with_students.append((course_id, nome_corso, durata, docente, assigned_students_data))
-            return courses_with_students
-        except sqlite3.Error as e:
-            st.error(f"Error fetching courses: {e}")
-            return []
-        finally:
-            self._close()
-
-    def assign_student_to_course(self, course_id, student_id):
-        self._connect()
-        try:
-            self.cursor.execute('''
-                INSERT OR IGNORE INTO course_students (course_id, student_id) VALUES (?, ?)
-            ''', (course_id, student_id))
-            self.conn.commit()
-        except sqlite3.Error as e:
-            st.error(f"Error assigning student to course: {e}")
-        finally:
-            self._close()
-
-    # --- Classroom Operations ---
-    def insert_classroom(self, nome_aula, capacita_sedie, occupazione_aula):
-        self._connect()
-        try:
-            # Store occupazione_aula as JSON string
-            occupazione_aula_json = json.dumps(occupazione_aula)
-            self.cursor.execute('''
-                INSERT INTO classrooms (nome_aula, capacita_sedie, occupazione_aula) VALUES (?, ?, ?)
-            ''', (nome_aula, capacita_sedie, occupazione_aula_json))
-            self.conn.commit()
-            return self.cursor.lastrowid
-        except sqlite3.IntegrityError:
-            st.warning(f"Classroom '{nome_aula}' already exists.")
-            return None
-        except sqlite3.Error as e:
-            st.error(f"Error inserting classroom: {e}")
-            return None
-        finally:
-            self._close()
-
-    def fetch_classrooms(self):
-        self._connect()
-        try:
-            self.cursor.execute('SELECT id, nome_aula, capacita_sedie, occupazione_aula FROM classrooms')
-            classrooms_data = []
-            for aula_id, nome_aula, capacita_sedie, occupazione_aula_json in self.cursor.fetchall():
-                # Load occupazione_aula from JSON string
-                occupazione_aula = json.loads(occupazione_aula_json) if occupazione_aula_json else {}
-                classrooms_data.append((aula_id, nome_aula, capacita_sedie, occupazione_aula))
-            return classrooms_data
-        except sqlite3.Error as e:
-            st.error(f"Error fetching classrooms: {e}")
-            return []
-        finally:
-            self._close()
-
-    def update_classroom_schedule(self, aula_id, occupazione_aula):
-        self._connect()
-        try:
-            occupazione_aula_json = json.dumps(occupazione_aula)
-            self.cursor.execute('''
-                UPDATE classrooms SET occupazione_aula = ? WHERE id = ?
-            ''', (occupazione_aula_json, aula_id))
-            self.conn.commit()
-        except sqlite3.Error as e:
-            st.error(f"Error updating classroom schedule: {e}")
-        finally:
-            self._close()
-
-    # --- Attendance Operations ---
-    def record_attendance(self, student_id, course_id, attendance_date, status):
-        self._connect()
-        try:
-            # Use INSERT OR REPLACE to update if an entry for the same student, course, and date already exists
-            self.cursor.execute('''
-                INSERT OR REPLACE INTO attendance (student_id, course_id, attendance_date, status)
-                VALUES (?, ?, ?, ?)
-            ''', (student_id, course_id, attendance_date, status))
-            self.conn.commit()
-            return True
-        except sqlite3.Error as e:
-            st.error(f"Error recording attendance: {e}")
-            return False
-        finally:
-            self._close()
-
-    def fetch_attendance(self, course_id=None, student_id=None, attendance_date=None):
-        self._connect()
-        try:
-            query = '''
-                SELECT
-                    a.id,
-                    s.name,
-                    s.last_name,
-                    c.nome_corso,
-                    a.attendance_date,
-                    a.status
-                FROM attendance a
-                JOIN students s ON a.student_id = s.id
-                JOIN courses c ON a.course_id = c.id
-                WHERE 1=1
-            '''
-            params = []
-            if course_id:
-                query += " AND a.course_id = ?"
-                params.append(course_id)
-            if student_id:
-                query += " AND a.student_id = ?"
-                params.append(student_id)
-            if attendance_date:
-                query += " AND a.attendance_date = ?"
-                params.append(attendance_date)
-            
-            self.cursor.execute(query, params)
-            return self.cursor.fetchall()
-        except sqlite3.Error as e:
-            st.error(f"Error fetching attendance: {e}")
-            return []
-        finally:
-            self._close()
-
-
-# --- Classes (Modified for IDs and Database Interaction) ---
-class Persona:
-    def __init__(self, name, last_name, date_of_birth):
-        self.name = name
-        self.last_name = last_name
-        self.date_of_birth = date_of_birth
-
-class Alunni(Persona):
-    def __init__(self, name, last_name, date_of_birth, id=None):
-        super().__init__(name, last_name, date_of_birth)
-        self.id = id # Database ID
-
-    def display_alunno_info(self):
-        return {
-            "ID": self.id,
-            "Name": self.name,
-            "Last Name": self.last_name,
-            "Date of Birth": self.date_of_birth
-        }
-
-class Corso:
-    def __init__(self, nome_corso, durata, docente, id=None):
-        self.id = id # Database ID
-        self.nome_corso = nome_corso
-        self.durata = durata
-        self.docente = docente
-        self.alunni_frequentanti_il_tal_corso = [] # In-memory list of Alunni objects
-
-    def display_corso_info(self):
-        return {
-            "ID": self.id,
-            "Course Name": self.nome_corso,
-            "Duration": self.durata,
-            "Teacher": self.docente,
-            "Number of Students": len(self.alunni_frequentanti_il_tal_corso),
-            "Assigned Students": ", ".join([f"{s.name} {s.last_name}" for s in self.alunni_frequentanti_il_tal_corso]) if self.alunni_frequentanti_il_tal_corso else "None"
-        }
-
-class Aula:
-    def __init__(self, nome_aula, capacita_sedie, id=None):
-        self.id = id # Database ID
-        self.nome_aula = nome_aula
-        self.capacita_sedie = capacita_sedie
-        self.occupazione_aula = {} # Calendar of the aula: { 'Day Time': Corso.nome_corso }
-
-    def display_aula_info(self):
-        return {
-            "ID": self.id,
-            "Classroom Name": self.nome_aula,
-            "Chair Capacity": self.capacita_sedie,
-            "Occupancy Schedule": self.occupazione_aula if self.occupazione_aula else "No schedule defined."
-        }
-
-class UtilitySuite:
-    @staticmethod
-    def controlla_sedie(aula: Aula, numero_alunni_previsti: int) -> int:
-        return numero_alunni_previsti - aula.capacita_sedie
-
-class Segreteria(Persona):
-    def __init__(self, name, last_name, date_of_birth): # <--- Corrected parameter name
-        super().__init__(name, last_name, date_of_birth) # <--- Corrected usage in super() call
-        self.db_manager = DatabaseManager()
-        self.all_courses = []
-        self.all_aule = []
-        self.all_aula_schedules = {}
-
-    def creazione_calendario(self, aula: Aula, corso: Corso, time_slot: str):
-        aula.occupazione_aula[time_slot] = corso.nome_corso
-        self.db_manager.update_classroom_schedule(aula.id, aula.occupazione_aula) # Update DB
-        self.all_aula_schedules[aula.nome_aula] = aula.occupazione_aula
-        st.success(f"✅ Schedule for '{aula.nome_aula}' at '{time_slot}' set to '{corso.nome_corso}'.")
-
-    def creazione_classe(self, corso: Corso, students_to_assign: list):
-        newly_assigned_count = 0
-        for student in students_to_assign:
-            if student not in corso.alunni_frequentanti_il_tal_corso:
-                corso.alunni_frequentanti_il_tal_corso.append(student)
-                self.db_manager.assign_student_to_course(corso.id, student.id) # Assign in DB
-                newly_assigned_count += 1
-        st.success(f"✅ {newly_assigned_count} new students assigned to course '{corso.nome_corso}'.")
-
-    def stampa_calendario(self):
-        output_content = ""
-        output_content += "--- School Calendar ---\n"
-        output_content += f"Generated On: {datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n\n"
-        
-        if not self.all_aula_schedules:
-            output_content += "No classroom schedules defined.\n"
-        else:
-            sorted_aula_names = sorted(self.all_aula_schedules.keys())
-            for aula_name in sorted_aula_names:
-                schedule_data = self.all_aula_schedules[aula_name]
-                output_content += f"=== Classroom: {aula_name} ===\n"
-                if not schedule_data:
-                    output_content += "  No schedule for this classroom.\n"
-                else:
-                    sorted_schedule = sorted(schedule_data.items())
-                    for time_slot, course_name in sorted_schedule:
-                        output_content += f"  {time_slot}: {course_name}\n"
-                output_content += "\n"
-        return output_content, "calendario_scolastico.txt"
-
-    def controllo_forniture(self, aula: Aula, numero_alunni_previsti: int):
-        st.info(f"Secretariat: Performing supply check for classroom '{aula.nome_aula}'.")
-
-        sedie_mancanti = UtilitySuite.controlla_sedie(aula, numero_alunni_previsti)
-
-        if sedie_mancanti > 0:
-            st.warning(f"🚨 Attention! {sedie_mancanti} chairs are missing for classroom '{aula.nome_aula}'.")
-            order_content, order_filename = self._invia_ordine_fornitore(aula.nome_aula, sedie_mancanti)
-            st.download_button(
-                label=f"Download Purchase Order for {aula.nome_aula}",
-                data=order_content.encode('utf-8'),
-                file_name=order_filename,
-                mime="text/plain",
-                key=f"download_order_{aula.nome_aula}"
-            )
-            st.success(f"📧 Purchase order generated. Click the button above to download it.")
-        else:
-            st.success(f"✅ Sufficient chairs for classroom '{aula.nome_aula}'. No new orders needed.")
-
-    def _invia_ordine_fornitore(self, nome_aula: str, quantita: int):
-        data_odierna = datetime.date.today().strftime("%d-%m-%Y")
-        nome_file_ordine = f"ordine_fornitore_{nome_aula.replace(' ', '_')}_{data_odierna}.txt"
-
-        order_form_content = ""
-        order_form_content += "--- SUPPLIER ORDER FORM ---\n"
-        order_form_content += f"Date: {data_odierna}\n"
-        order_form_content += "Recipient: School Material Supplier\n"
-        order_form_content += "\n"
-        order_form_content += "Subject: Additional Chair Order\n"
-        order_form_content += "\n"
-        order_form_content += f"Dear Supplier,\n"
-        order_form_content += f"We kindly request the supply of {quantita} additional chairs for classroom '{nome_aula}'.\n"
-        order_form_content += "Please confirm availability and delivery times.\n"
-        order_form_content += "\n"
-        order_form_content += "Sincerely,\n"
-        order_form_content += f"The School Secretariat\n"
-        
-        return order_form_content, nome_file_ordine
-
-    # --- Data Persistence Methods (now using DBManager) ---
-    def save_data(self):
-        # Data is saved incrementally as it's added/updated through UI methods
-        # This method is primarily for a "Save All" button if needed, but not strictly necessary for every action
-        st.info("Data is saved incrementally. No need for a full save button in this design yet.")
-
-    def load_data(self):
-        st.session_state.alunni_list = []
-        self.all_courses = []
-        self.all_aule = []
-        self.all_aula_schedules = {}
-
-        # Load Students
-        students_data = self.db_manager.fetch_students()
-        temp_alunni_dict = {} # Use a dict for quick lookup by ID
-        for s_id, name, last_name, dob in students_data:
-            alunno = Alunni(name, last_name, dob, id=s_id)
-            st.session_state.alunni_list.append(alunno)
-            temp_alunni_dict[s_id] = alunno
-        # st.success(f"Loaded {len(st.session_state.alunni_list)} students from database.") # Removed for cleaner startup
-
-        # Load Classrooms
-        classrooms_data = self.db_manager.fetch_classrooms()
-        temp_aula_dict = {} # For quick lookup
-        for a_id, nome_aula, capacita_sedie, occupazione_aula in classrooms_data:
-            aula = Aula(nome_aula, capacita_sedie, id=a_id)
-            aula.occupazione_aula = occupazione_aula
-            self.all_aule.append(aula)
-            self.all_aula_schedules[aula.nome_aula] = aula.occupazione_aula # Update overall schedule
-            temp_aula_dict[a_id] = aula
-        # st.success(f"Loaded {len(self.all_aule)} classrooms from database.") # Removed for cleaner startup
-
-        # Load Courses and assign students
-        courses_data = self.db_manager.fetch_courses()
-        for c_id, nome_corso, durata, docente, assigned_students_data in courses_data:
-            corso = Corso(nome_corso, durata, docente, id=c_id)
-            for s_id, s_name, s_last_name, s_dob in assigned_students_data:
-                # Retrieve the actual Alunni object from temp_alunni_dict
-                if s_id in temp_alunni_dict:
-                    corso.alunni_frequentanti_il_tal_corso.append(temp_alunni_dict[s_id])
-                else:
-                    st.warning(f"Student with ID {s_id} for course '{nome_corso}' not found during loading.")
-            self.all_courses.append(corso)
-        # st.success(f"Loaded {len(self.all_courses)} courses from database.") # Removed for cleaner startup
+from school_core import DatabaseManager, Segreteria, ShardRouter
+from school_core.models import ATTENDANCE_STATUSES
+from school_core.early_warning import DEFAULT_THRESHOLDS, early_warning_from_db
+from school_core.gradebook import PASSING_GRADE, QUANTILES, gradebook_from_db
+from school_core.ical import FeedCache
+from school_core.profiling import ProfileStore, RerunProfiler, capture_zip
+from school_core.report_rendering import build_reports_zip
+from school_core.recurrence import FREQUENCIES, describe_rule
+from school_core.academic_year import academic_year_bounds, academic_year_of
+from school_core.room_analytics import build_occupancy
+from school_core.time_slots import WEEKDAY_NAMES
+from school_core.warm_start import warm_start_path
+
+# Multi-campus mode: one <campus>.db file per campus in this directory
+CAMPUSES_DIR = os.environ.get("SCHOOL_CAMPUSES_DIR")
+# Profiling mode for every session (single sessions: ?profile=1 in the URL)
+PROFILING = os.environ.get("SCHOOL_PROFILING") == "1"
+
+# --- Streamlit Caching Layer ---
+@st.cache_resource
+def get_db_manager(db_name="school_data.db"):
+    """One DatabaseManager per process, shared by every session and rerun."""
+    return DatabaseManager(db_name, on_error=st.error, on_warning=st.warning)
+
+# The ttl bounds how long writes made by other processes (e.g. the CLI) can go unnoticed
+@st.cache_data(show_spinner=False, max_entries=512, ttl=300)
+def _cached_read(db_name, method_name, data_version, args, _db_manager):
+    return getattr(_db_manager, method_name)(*args)
+
+def cached_read(db_manager, method_name, *args):
+    """
+    Runs a DatabaseManager read method through st.cache_data. The key holds the parameters and the
+    write versions of the tables the query depends on, so any write through db_manager invalidates it.
+    """
+    if not st.session_state.get("use_query_cache", True):
+        return getattr(db_manager, method_name)(*args)
+    return _cached_read(db_manager.db_name, method_name, db_manager.data_version(method_name), args, db_manager)
+
+# Reports from snapshot: how old the copy may get before the next report refreshes it
+REPORT_SNAPSHOT_MAX_AGE = 60
+
+def report_db(db_manager):
+    """
+    DatabaseManager for heavy report reads: a periodically refreshed copy when "Reports from snapshot"
+    is on (shows how old it is), else the live database. Each copy has its own db_name, so cache keys follow it.
+    """
+    if not st.session_state.get("reports_from_snapshot"):
+        return db_manager
+    snapshot = db_manager.enable_report_snapshot(REPORT_SNAPSHOT_MAX_AGE)
+    reader = snapshot.reader()
+    if snapshot.taken_at is not None:
+        st.caption(f"📸 Report data as of {snapshot.taken_at:%H:%M:%S} ({snapshot.age():.0f}s ago, "
+                   f"refreshed at most every {snapshot.max_age}s). Recent changes may not show yet.")
+    return reader
+
+_NOTIFIERS = {"success": st.success, "info": st.info, "warning": st.warning, "error": st.error}
+
+def st_notify(level, message):
+    """Shows Segreteria messages with the matching Streamlit element."""
+    _NOTIFIERS.get(level, st.info)(message)
+
+@st.cache_resource
+def get_router(directory):
+    """Campus router of the district reports. Its callbacks log: the campus queries run in worker threads."""
+    return ShardRouter(directory)
+
+@st.cache_data(show_spinner="Querying all campuses...", ttl=60)
+def _district_report(directory, campuses, _router):
+    return _router.enrollment_report(campuses), _router.supply_needs(campuses)
+
+@st.cache_resource
+def get_feed_cache(db_name):
+    """iCalendar feeds of this process, shared by every session; stale ones are dropped through the change log."""
+    return FeedCache(get_db_manager(db_name))
+
+@st.cache_resource
+def get_profile_store():
+    """Latest profiled reruns of this process, from every session (see the Profiling page)."""
+    return ProfileStore()
+
+@st.cache_data(show_spinner="Computing attendance trends...", max_entries=8, ttl=300)
+def _early_warning(db_name, data_version, as_of, _db_manager):
+    return early_warning_from_db(_db_manager, as_of)
+
+@st.cache_data(show_spinner="Computing grades...", max_entries=8, ttl=300)
+def _gradebook(db_name, data_version, academic_year, _db_manager):
+    return gradebook_from_db(_db_manager, academic_year)
+
+def cached_gradebook(db_manager):
+    """The current year's Gradebook, recomputed only after assessments, scores or students change."""
+    db_manager = report_db(db_manager)
+    return _gradebook(db_manager.db_name, db_manager.data_version("iter_score_records"), None, db_manager)
 
 
 # --- Streamlit UI ---
 st.set_page_config(page_title="School Management System 🏫", layout="wide")
+rerun_started = time.perf_counter() # Rerun timing, reported at the bottom of the sidebar
+profiling = PROFILING or st.query_params.get("profile") == "1"
+profiler = RerunProfiler()
+if profiling and not profiler.start():
+    st.sidebar.caption("🩺 Another rerun is being profiled: this one is not.")
 st.title("School Management System (with Database) 📚")
 
-# Initialize session state for the secretariat and student list if not already present
-if 'secretario' not in st.session_state:
-    st.session_state.secretario = Segreteria("Ivan", "Rossi", "1980-05-15")
-    st.session_state.alunni_list = [] # Centralized list for students
-    st.session_state.secretario.load_data() # Load initial data from DB on app start
+campuses = get_router(CAMPUSES_DIR).campuses() if CAMPUSES_DIR else []
+if CAMPUSES_DIR and not campuses:
+    st.sidebar.warning(f"No campus databases in '{CAMPUSES_DIR}': using the single-school database.")
+campus = st.sidebar.selectbox("Campus 🏫", campuses) if campuses else None
+db_name = get_router(CAMPUSES_DIR).path(campus) if campus else "school_data.db"
+if st.session_state.get("campus") != campus:
+    # Pending results of the previous campus
+    for key in ("supply_order", "room_plan", "reports_zip"):
+        st.session_state.pop(key, None)
+    st.session_state.campus = campus
+
+# One secretariat per campus, loaded on first use: from its warm-start snapshot when that is current, else the DB
+secretari = st.session_state.setdefault("secretari", {})
+if db_name not in secretari:
+    secretari[db_name] = Segreteria(
+        "Ivan", "Rossi", "1980-05-15", db_manager=get_db_manager(db_name), notify=st_notify, read=cached_read,
+        warm_start=warm_start_path(db_name)
+    )
+    secretari[db_name].load_data()
 
-secretario = st.session_state.secretario # Reference the secretariat object
+secretario = secretari[db_name] # Reference the secretariat object
 
 # Sidebar for navigation
 st.sidebar.header("Navigation 🧭")
@@ -483,11 +147,28 @@ menu_choice = st.sidebar.selectbox(
         "Record Attendance",
         "View Attendance",
         "View School Calendar", # This section will be updated
+        "Teacher Timetable",
+        "Student Timetable",
+        "📈 Room Utilization",
+        "🚩 Early Warning",
+        "📝 Gradebook",
+        "🏅 Grades & Rankings",
+        "📜 Student Transcript",
+        "🔀 Optimize Room Assignment",
+        "🧪 Schedule Scenarios",
+        "🗂️ Manage Records",
         "📊 View All Data",
+        "📦 Export Reports",
         "🔄 Reload Data (from DB)"
-    ]
+    ] + (["🏫 District Overview"] if campuses else []) + (["🩺 Profiling"] if profiling else [])
 )
 
+st.sidebar.checkbox("Use query cache", value=True, key="use_query_cache",
+                    help="Serve repeated DB reads from st.cache_data. Turn off to compare rerun times.")
+st.sidebar.checkbox("Reports from snapshot", value=False, key="reports_from_snapshot",
+                    help=f"Attendance reports read a copy of the database refreshed at most every "
+                         f"{REPORT_SNAPSHOT_MAX_AGE}s, so they never hold up attendance being recorded.")
+
 # --- UI Logic based on menu_choice ---
 
 if menu_choice == "🏠 Home":
@@ -520,19 +201,40 @@ elif menu_choice == "➕ Add New Student":
             if name and last_name and date_of_birth:
                 try:
                     datetime.date.fromisoformat(date_of_birth) # Validate date format
-                    # Insert into DB and get ID
-                    student_id = secretario.db_manager.insert_student(name, last_name, date_of_birth)
-                    if student_id:
-                        new_alunno = Alunni(name, last_name, date_of_birth, id=student_id)
-                        st.session_state.alunni_list.append(new_alunno) # Explicitly add to session state list
-                        st.success(f"Student '{name} {last_name}' added successfully! 🎉 (ID: {student_id})")
-                    else:
-                        st.error("❌ Failed to add student to database. Check if student already exists.")
                 except ValueError:
                     st.error("❌ Invalid date format. Please use YYYY-MM-DD.")
+                else:
+                    # Typos and swapped names of an existing student wait for a confirmation below the form
+                    st.session_state.pending_student = (name, last_name, date_of_birth)
             else:
                 st.error("❌ All fields are required.")
 
+    pending = st.session_state.get("pending_student")
+    if pending:
+        matches = secretario.find_duplicates(*pending)
+        add_anyway = False
+        confirmation = st.empty()
+        if matches:
+            with confirmation.container():
+                st.warning(f"⚠️ '{pending[0]} {pending[1]}' ({pending[2]}) looks like an existing student:")
+                st.dataframe(pd.DataFrame([(a.id, a.name, a.last_name, a.date_of_birth, f"{score:.0%}") for a, score in matches],
+                                          columns=["ID", "First Name", "Last Name", "Date of Birth", "Similarity"]),
+                             hide_index=True)
+                col1, col2 = st.columns(2)
+                add_anyway = col1.button("Add anyway (not a duplicate)")
+                if col2.button("Cancel"):
+                    del st.session_state.pending_student
+                    st.rerun()
+        if not matches or add_anyway:
+            confirmation.empty()
+            del st.session_state.pending_student
+            # Insert into DB, then into the session state list
+            new_alunno = secretario.add_student(*pending)
+            if new_alunno:
+                st.success(f"Student '{pending[0]} {pending[1]}' added successfully! 🎉 (ID: {new_alunno.id})")
+            else:
+                st.error("❌ Failed to add student to database.")
+
 elif menu_choice == "➕ Create New Course":
     st.header("Create New Course 📚")
     with st.form("create_course_form", clear_on_submit=True):
@@ -543,12 +245,10 @@ elif menu_choice == "➕ Create New Course":
         submitted = st.form_submit_button("Create Course")
         if submitted:
             if nome_corso and durata and docente:
-                # Insert into DB and get ID
-                course_id = secretario.db_manager.insert_course(nome_corso, durata, docente)
-                if course_id:
-                    new_corso = Corso(nome_corso, durata, docente, id=course_id)
-                    secretario.all_courses.append(new_corso)
-                    st.success(f"Course '{nome_corso}' created successfully! 📝 (ID: {course_id})")
+                # Insert into DB and get the new Corso
+                new_corso = secretario.add_course(nome_corso, durata, docente)
+                if new_corso:
+                    st.success(f"Course '{nome_corso}' created successfully! 📝 (ID: {new_corso.id})")
                 else:
                     st.error("❌ Failed to create course. Check if course name already exists.")
             else:
@@ -563,12 +263,10 @@ elif menu_choice == "➕ Create New Classroom":
         submitted = st.form_submit_button("Create Classroom")
         if submitted:
             if nome_aula and capacita_sedie:
-                # Insert into DB and get ID
-                classroom_id = secretario.db_manager.insert_classroom(nome_aula, int(capacita_sedie), {}) # Initial empty schedule
-                if classroom_id:
-                    new_aula = Aula(nome_aula, int(capacita_sedie), id=classroom_id) # Ensure capacity is int
-                    secretario.all_aule.append(new_aula)
-                    st.success(f"Classroom '{nome_aula}' with {int(capacita_sedie)} chairs created! 🛋️ (ID: {classroom_id})")
+                # Insert into DB and get the new Aula
+                new_aula = secretario.add_classroom(nome_aula, int(capacita_sedie)) # Ensure capacity is int
+                if new_aula:
+                    st.success(f"Classroom '{nome_aula}' with {int(capacita_sedie)} chairs created! 🛋️ (ID: {new_aula.id})")
                 else:
                     st.error("❌ Failed to create classroom. Check if classroom name already exists.")
             else:
@@ -578,11 +276,11 @@ elif menu_choice == "Assign Students to Course":
     st.header("Assign Students to Course 🧑‍🏫")
     if not secretario.all_courses:
         st.warning("No courses available. Please create a course first.")
-    elif not st.session_state.alunni_list:
+    elif not secretario.all_students:
         st.warning("No students registered. Please add students first.")
     else:
         with st.form("assign_students_form"):
-            course_options = {c.nome_corso: c for c in secretario.all_courses}
+            course_options = secretario.course_options()
             selected_course_name = st.selectbox("Select Course:", list(course_options.keys()))
             
             selected_course = course_options.get(selected_course_name)
@@ -590,20 +288,27 @@ elif menu_choice == "Assign Students to Course":
             if selected_course:
                 # Filter out students already assigned to this course (check in-memory list)
                 current_assigned_student_ids = {s.id for s in selected_course.alunni_frequentanti_il_tal_corso}
-                available_students = [a for a in st.session_state.alunni_list if a.id not in current_assigned_student_ids]
+                available_students = [a for a in secretario.all_students if a.id not in current_assigned_student_ids]
                 
                 assigned_students_names = [f"{a.name} {a.last_name}" for a in selected_course.alunni_frequentanti_il_tal_corso]
                 if assigned_students_names:
                     st.info(f"Students currently assigned to '{selected_course.nome_corso}': {', '.join(assigned_students_names)}")
+                seats, enrolled, waiting = secretario.course_seats().get(selected_course.id, (None, 0, 0))
+                if seats is None:
+                    st.caption("🪑 No seat limit: the course isn't scheduled in any classroom yet.")
+                else:
+                    st.caption(f"🪑 {enrolled}/{seats} seats taken this year (smallest classroom it is scheduled in), "
+                               f"{waiting} on the waitlist. Students beyond the free seats join the waitlist.")
                 
-                student_options = [f"{a.name} {a.last_name}" for a in available_students]
+                # The ID tells homonyms apart
+                student_options = {f"{a.name} {a.last_name} (#{a.id})": a for a in available_students}
                 selected_student_names_to_add = st.multiselect(
                     "Select students to assign (only unassigned students shown):",
-                    options=student_options
+                    options=list(student_options.keys())
                 )
                 
-                # Convert selected names back to Alunni objects
-                students_to_assign_obj = [a for a in available_students if f"{a.name} {a.last_name}" in selected_student_names_to_add]
+                # Convert selected labels back to Alunni objects
+                students_to_assign_obj = [student_options[label] for label in selected_student_names_to_add]
 
                 submitted = st.form_submit_button("Assign Students")
                 if submitted:
@@ -615,6 +320,21 @@ elif menu_choice == "Assign Students to Course":
             else:
                 st.error("Selected course not found. This should not happen.")
 
+        # Waitlisted students are enrolled automatically, in order, as seats free up
+        waitlisted_courses = [c for c in secretario.all_courses if secretario.waitlist.get(c.id)]
+        if waitlisted_courses:
+            st.subheader("Waitlists ⏳")
+            waitlist_course = {c.nome_corso: c for c in waitlisted_courses}[
+                st.selectbox("Waitlist of:", [c.nome_corso for c in waitlisted_courses])]
+            with st.form("leave_waitlist_form"):
+                waiting = {f"{a.name} {a.last_name} (#{a.id})": a for a in secretario.waitlist[waitlist_course.id]}
+                leaving = st.multiselect("Remove from its waitlist:", list(waiting.keys()))
+                if st.form_submit_button("Remove from Waitlist") and leaving:
+                    secretario.leave_waitlist(waitlist_course, [waiting[label] for label in leaving])
+            st.dataframe([{"Course": c.nome_corso, "Position": position, "Student": f"{a.name} {a.last_name} (#{a.id})"}
+                          for c in waitlisted_courses for position, a in enumerate(secretario.waitlist.get(c.id, []), start=1)],
+                         use_container_width=True)
+
 
 elif menu_choice == "Create Course Schedule":
     st.header("Create Course Schedule 🗓️")
@@ -624,10 +344,10 @@ elif menu_choice == "Create Course Schedule":
         st.warning("No courses available. Please create a course first.")
     else:
         with st.form("create_schedule_form"):
-            aula_options = {a.nome_aula: a for a in secretario.all_aule}
+            aula_options = secretario.aula_options()
             selected_aula_name = st.selectbox("Select Classroom:", list(aula_options.keys()))
             
-            corso_options = {c.nome_corso: c for c in secretario.all_courses}
+            corso_options = secretario.course_options()
             selected_corso_name = st.selectbox("Select Course:", list(corso_options.keys()))
             
             # Use st.date_input for date and st.time_input for time
@@ -654,13 +374,63 @@ elif menu_choice == "Create Course Schedule":
                 else:
                     st.error("All fields are required.")
 
+        st.subheader("Recurring Lessons 🔁")
+        with st.form("create_schedule_rule_form"):
+            aula_options = secretario.aula_options()
+            corso_options = secretario.course_options()
+            col1, col2 = st.columns(2)
+            with col1:
+                rule_aula_name = st.selectbox("Classroom:", list(aula_options.keys()), key="rule_aula")
+                rule_weekday = st.selectbox("Day:", WEEKDAY_NAMES, key="rule_weekday")
+                rule_start = st.time_input("Start Time:", datetime.time(9, 0), key="rule_start")
+                rule_start_date = st.date_input("From:", datetime.date.today(), key="rule_start_date")
+            with col2:
+                rule_corso_name = st.selectbox("Course:", list(corso_options.keys()), key="rule_corso")
+                rule_frequency = st.selectbox("Frequency:", list(FREQUENCIES.keys()), key="rule_frequency")
+                rule_end = st.time_input("End Time:", datetime.time(11, 0), key="rule_end")
+                rule_end_date = st.date_input("Until:", datetime.date.today() + datetime.timedelta(weeks=16), key="rule_end_date")
+            rule_exceptions = st.text_input("No lesson on (YYYY-MM-DD, comma separated):", key="rule_exceptions")
+
+            if st.form_submit_button("Add Recurring Lesson"):
+                try:
+                    exceptions = [datetime.date.fromisoformat(d.strip()) for d in rule_exceptions.split(",") if d.strip()]
+                except ValueError:
+                    st.error("❌ Exception dates must be written as YYYY-MM-DD.")
+                else:
+                    secretario.add_schedule_rule(
+                        aula_options[rule_aula_name], corso_options[rule_corso_name], WEEKDAY_NAMES.index(rule_weekday),
+                        rule_start, rule_end, rule_start_date, rule_end_date, FREQUENCIES[rule_frequency], exceptions
+                    )
+
+        if secretario.recurring.rules:
+            rules = secretario.recurring_rules()
+            st.dataframe(pd.DataFrame([{
+                "Classroom": nome_aula,
+                "Course": nome_corso,
+                "When": describe_rule(rule),
+                "Cancelled": ", ".join(d.isoformat() for d in sorted(rule.exceptions)),
+            } for nome_aula, nome_corso, rule in rules]), use_container_width=True, hide_index=True)
+
+            rule_labels = {f"{nome_corso} in {nome_aula}, {describe_rule(rule)} (#{rule.id})": rule for nome_aula, nome_corso, rule in rules}
+            selected_rule = rule_labels[st.selectbox("Recurring lesson:", list(rule_labels.keys()))]
+            col1, col2 = st.columns(2)
+            with col1:
+                cancel_date = st.date_input("Cancel the lesson of:", datetime.date.today(), key="rule_cancel_date")
+                if st.button("Cancel Lesson"):
+                    secretario.add_schedule_rule_exception(selected_rule, cancel_date)
+                    st.rerun()
+            with col2:
+                if st.button("Delete Recurring Lesson"):
+                    secretario.delete_schedule_rule(selected_rule)
+                    st.rerun()
+
 elif menu_choice == "Check Classroom Supplies":
     st.header("Check Classroom Supplies 🪑")
     if not secretario.all_aule:
         st.warning("No classrooms available to check supplies.")
     else:
         with st.form("check_supplies_form"):
-            aula_options = {a.nome_aula: a for a in secretario.all_aule}
+            aula_options = secretario.aula_options()
             selected_aula_name = st.selectbox("Select Classroom:", list(aula_options.keys()))
             
             num_alunni = st.number_input("Number of students expected:", min_value=0, step=1)
@@ -670,11 +440,22 @@ elif menu_choice == "Check Classroom Supplies":
                 if selected_aula_name:
                     aula_selected = aula_options.get(selected_aula_name)
                     if aula_selected:
-                        secretario.controllo_forniture(aula_selected, num_alunni)
+                        st.session_state.supply_order = secretario.controllo_forniture(aula_selected, num_alunni)
                     else:
                         st.error("Selected classroom not found.")
                 else:
                     st.error("Please select a classroom.")
+        # Download buttons are not allowed inside a form
+        if st.session_state.get("supply_order"):
+            order_content, order_filename = st.session_state.supply_order
+            st.download_button(
+                label=f"Download {order_filename}",
+                data=order_content.encode('utf-8'),
+                file_name=order_filename,
+                mime="text/plain",
+                key="download_supply_order"
+            )
+            st.success("📧 Purchase order generated. Click the button above to download it.")
 
 # --- Section: Record Attendance ---
 elif menu_choice == "Record Attendance":
@@ -683,7 +464,7 @@ elif menu_choice == "Record Attendance":
         st.warning("No courses available. Please create a course and assign students first.")
     else:
         with st.form("record_attendance_form"):
-            course_options = {c.nome_corso: c for c in secretario.all_courses}
+            course_options = secretario.course_options()
             selected_course_name = st.selectbox("Select Course:", list(course_options.keys()))
             
             selected_course = course_options.get(selected_course_name)
@@ -694,21 +475,14 @@ elif menu_choice == "Record Attendance":
             if selected_course and selected_course.alunni_frequentanti_il_tal_corso:
                 st.subheader(f"Students in '{selected_course.nome_corso}' for {attendance_date_str}:")
                 
+                # The whole roster's existing attendance in one read: student_id (index 6) -> status (index 5)
+                existing_attendance = {row[6]: row[5] for row in cached_read(
+                    secretario.db_manager, "fetch_attendance", selected_course.id, None, attendance_date_str
+                )}
                 attendance_status = {}
                 for student in selected_course.alunni_frequentanti_il_tal_corso:
-                    # Fetch existing attendance for this student, course, and date
-                    existing_attendance = secretario.db_manager.fetch_attendance(
-                        student_id=student.id,
-                        course_id=selected_course.id,
-                        attendance_date=attendance_date_str
-                    )
-                    
-                    current_status = "Absent" # Default
-                    if existing_attendance:
-                        # existing_attendance is a list of tuples, take the first one if it exists
-                        current_status = existing_attendance[0][5] # Status is at index 5
-
-                    status_options = ["Present", "Absent", "Late", "Excused"]
+                    current_status = existing_attendance.get(student.id, "Absent") # Default: Absent
+                    status_options = list(ATTENDANCE_STATUSES)
                     
                     col1, col2 = st.columns([0.7, 0.3])
                     with col1:
@@ -723,16 +497,14 @@ elif menu_choice == "Record Attendance":
                 
                 submitted = st.form_submit_button("Save Attendance")
                 if submitted:
-                    all_saved = True
-                    for student_id, status in attendance_status.items():
-                        if not secretario.db_manager.record_attendance(student_id, selected_course.id, attendance_date_str, status):
-                            all_saved = False
-                            break
-                    
-                    if all_saved:
+                    # One transaction: the roster is saved whole or not at all
+                    if secretario.db_manager.record_attendance_many(
+                        (student_id, selected_course.id, attendance_date_str, status)
+                        for student_id, status in attendance_status.items()
+                    ):
                         st.success("✅ Attendance recorded successfully!")
                     else:
-                        st.error("❌ Failed to record some attendance entries.")
+                        st.error("❌ Failed to record attendance: nothing was saved.")
             elif selected_course:
                 st.info(f"No students assigned to '{selected_course.nome_corso}' yet. Please assign students first.")
             else:
@@ -742,19 +514,19 @@ elif menu_choice == "Record Attendance":
 elif menu_choice == "View Attendance":
     st.header("View Student Attendance 📊")
 
-    if not secretario.all_courses and not st.session_state.alunni_list:
+    if not secretario.all_courses and not secretario.all_students:
         st.warning("No courses or students available to view attendance.")
     else:
         # Filters
         st.subheader("Filter Attendance Records:")
         
-        all_courses_dict = {c.nome_corso: c for c in secretario.all_courses}
+        all_courses_dict = secretario.course_options()
         selected_course_name_filter = st.selectbox(
             "Filter by Course (Optional):", 
             ["All Courses"] + list(all_courses_dict.keys())
         )
         
-        all_students_dict = {f"{s.name} {s.last_name}": s for s in st.session_state.alunni_list}
+        all_students_dict = secretario.student_options()
         selected_student_name_filter = st.selectbox(
             "Filter by Student (Optional):", 
             ["All Students"] + list(all_students_dict.keys())
@@ -763,22 +535,27 @@ elif menu_choice == "View Attendance":
         attendance_date_filter = st.date_input("Filter by Date (Optional):", value=None)
         attendance_date_filter_str = attendance_date_filter.isoformat() if attendance_date_filter else None
 
+        # Closed years live in their own archive files, only opened when asked for
+        archived_years = secretario.db_manager.archived_years()
+        academic_year = st.selectbox("Academic Year:", ["Current"] + archived_years[::-1]) if archived_years else "Current"
+        academic_year = None if academic_year == "Current" else academic_year
+
         course_id_filter = all_courses_dict[selected_course_name_filter].id if selected_course_name_filter != "All Courses" else None
         student_id_filter = all_students_dict[selected_student_name_filter].id if selected_student_name_filter != "All Students" else None
 
         st.markdown("---")
         
         # Fetch and display attendance
-        attendance_records = secretario.db_manager.fetch_attendance(
-            course_id=course_id_filter,
-            student_id=student_id_filter,
-            attendance_date=attendance_date_filter_str
+        # Archives are never written to: they are read directly, not through the snapshot
+        attendance_records = cached_read(
+            secretario.db_manager if academic_year else report_db(secretario.db_manager), "fetch_attendance",
+            course_id_filter, student_id_filter, attendance_date_filter_str, academic_year
         )
 
         if attendance_records:
             df_attendance = pd.DataFrame(
                 attendance_records,
-                columns=["ID", "Student First Name", "Student Last Name", "Course Name", "Date", "Status"]
+                columns=["ID", "Student First Name", "Student Last Name", "Course Name", "Date", "Status", "Student ID"]
             )
             st.dataframe(df_attendance, use_container_width=True)
         else:
@@ -789,72 +566,19 @@ elif menu_choice == "View Attendance":
 elif menu_choice == "View School Calendar":
     st.header("School Calendar 📅")
     
-    # Prepare events for streamlit-calendar
-    events = []
-    for aula_obj in secretario.all_aule:
-        aula_name = aula_obj.nome_aula
-        # Ensure occupazione_aula is a dictionary before iterating
-        if isinstance(aula_obj.occupazione_aula, dict):
-            for time_slot_str, course_name in aula_obj.occupazione_aula.items():
-                # Parse the time_slot_str to get date and time for start/end
-                # Expected format: 'Monday 09:00 - 11:00' or similar
-                try:
-                    # Attempt to parse as 'YYYY-MM-DD HH:MM - HH:MM'
-                    # If the existing data isn't in this precise format, it will need adaptation.
-                    # For this example, let's assume the 'time_slot_desc' from Create Course Schedule
-                    # If `time_slot_desc` is "Monday 09:00 - 11:00", we need a date as well.
-                    # For a robust solution, you'd store actual start/end datetimes in the DB.
-                    # For now, let's mock a date for display if only day/time is stored.
-                    # This is a common challenge when integrating non-datetime strings into a calendar.
-
-                    # Let's simplify: if time_slot_str is "Monday 09:00 - 11:00", assume it's for the current week's Monday.
-                    # A more robust solution would require storing full date-times in the DB for schedules.
-
-                    # Simplified parsing assuming format "YYYY-MM-DD HH:MM - HH:MM" or similar
-                    parts = time_slot_str.split(' ')
-                    if len(parts) >= 4 and '-' in parts[-1]: # e.g., "YYYY-MM-DD 09:00 - 11:00" or "Monday 09:00 - 11:00"
-                        if len(parts[0]) == 10 and parts[0].count('-') == 2: # Likely a YYYY-MM-DD date
-                            date_part = parts[0]
-                            start_time_part = parts[1]
-                            end_time_part = parts[3]
-                        else: # Assume it's a day name like "Monday"
-                            # This is a hacky way to map a day name to a specific date for display.
-                            # In a real system, schedules would link to specific full datetimes.
-                            today = datetime.date.today()
-                            day_name_map = {
-                                "Monday": 0, "Tuesday": 1, "Wednesday": 2, "Thursday": 3,
-                                "Friday": 4, "Saturday": 5, "Sunday": 6
-                            }
-                            target_day_of_week = day_name_map.get(parts[0], -1)
-                            if target_day_of_week != -1:
-                                days_diff = (target_day_of_week - today.weekday() + 7) % 7
-                                current_week_day = today + datetime.timedelta(days=days_diff)
-                                date_part = current_week_day.isoformat()
-                                start_time_part = parts[1]
-                                end_time_part = parts[3]
-                            else:
-                                # Fallback if parsing fails
-                                date_part = datetime.date.today().isoformat()
-                                start_time_part = "08:00"
-                                end_time_part = "17:00"
-                                st.warning(f"Could not parse schedule time '{time_slot_str}' for calendar. Using today's date and default times.")
-                    else: # Fallback for other formats
-                        date_part = datetime.date.today().isoformat()
-                        start_time_part = "08:00"
-                        end_time_part = "17:00"
-                        st.warning(f"Could not parse schedule time '{time_slot_str}' for calendar. Using today's date and default times.")
-                        
-                    start_datetime_str = f"{date_part}T{start_time_part}:00"
-                    end_datetime_str = f"{date_part}T{end_time_part}:00"
-
-                    events.append({
-                        "title": f"{course_name} ({aula_name})",
-                        "start": start_datetime_str,
-                        "end": end_datetime_str,
-                        "resourceId": aula_name # Optional: to group by classroom if needed
-                    })
-                except Exception as e:
-                    st.warning(f"Error parsing schedule '{time_slot_str}' for '{aula_name}': {e}. Skipping this event.")
+    # Recurring lessons are only expanded for the weeks shown
+    col1, col2 = st.columns(2)
+    with col1:
+        window_start = st.date_input("From week of:", datetime.date.today())
+    with col2:
+        window_weeks = st.number_input("Weeks:", min_value=1, max_value=52, value=4)
+    window_start -= datetime.timedelta(days=window_start.weekday())
+    window = (window_start, window_start + datetime.timedelta(weeks=window_weeks, days=-1))
+
+    # Prepare events for streamlit-calendar (rebuilt only when the schedules change)
+    events, calendar_warnings = secretario.calendar_events(window)
+    for warning in calendar_warnings:
+        st.warning(warning)
 
     calendar_options = {
         "headerToolbar": {
@@ -863,6 +587,8 @@ elif menu_choice == "View School Calendar":
             "right": "dayGridMonth,timeGridWeek,timeGridDay"
         },
         "initialView": "timeGridWeek", # Start with a weekly view
+        "initialDate": window[0].isoformat(),
+        "validRange": {"start": window[0].isoformat(), "end": (window[1] + datetime.timedelta(days=1)).isoformat()},
         "slotMinTime": "08:00:00", # Start day at 8 AM
         "slotMaxTime": "18:00:00", # End day at 6 PM
         "height": "auto" # Adjust height automatically
@@ -886,12 +612,635 @@ elif menu_choice == "View School Calendar":
     )
 
 
+elif menu_choice == "Teacher Timetable":
+    st.header("Teacher Timetable 👩‍🏫")
+    teachers = secretario.schedule_index.teachers()
+    if not teachers:
+        st.info("No scheduled courses yet.")
+    else:
+        selected_teacher = st.selectbox("Select Teacher:", teachers)
+        entries = secretario.teacher_timetable(selected_teacher)
+        if entries:
+            st.dataframe(
+                pd.DataFrame(entries, columns=["Time Slot", "Classroom", "Course"]),
+                use_container_width=True
+            )
+        else:
+            st.info(f"{selected_teacher} has no scheduled lessons.")
+        feed = get_feed_cache(db_name).get("teacher", selected_teacher)
+        if feed:
+            st.download_button("Download for Calendar Apps (.ics) 📅", data=feed.body,
+                               file_name=f"{selected_teacher}.ics", mime="text/calendar")
+
+elif menu_choice == "Student Timetable":
+    st.header("Student Timetable 🎒")
+    if not secretario.all_students:
+        st.warning("No students registered yet.")
+    else:
+        students_by_label = {f"{s.name} {s.last_name} (ID: {s.id})": s for s in secretario.all_students}
+        selected_student = students_by_label[st.selectbox("Select Student:", list(students_by_label.keys()))]
+        entries = secretario.student_timetable(selected_student)
+        if entries:
+            st.dataframe(
+                pd.DataFrame(entries, columns=["Time Slot", "Classroom", "Course"]),
+                use_container_width=True
+            )
+        else:
+            st.info("This student has no scheduled lessons.")
+        feed = get_feed_cache(db_name).get("student", selected_student.id)
+        if feed:
+            st.download_button("Download for Calendar Apps (.ics) 📅", data=feed.body,
+                               file_name=f"{selected_student.name}_{selected_student.last_name}.ics", mime="text/calendar")
+
+        st.subheader("Where is the student?")
+        col1, col2 = st.columns(2)
+        with col1:
+            weekday_name = st.selectbox("Day:", WEEKDAY_NAMES, index=datetime.date.today().weekday())
+        with col2:
+            at_time = st.time_input("Time:", datetime.time(10, 0))
+        locations = secretario.student_location(selected_student, WEEKDAY_NAMES.index(weekday_name), at_time)
+        if locations:
+            for time_slot, aula_name, course_name in locations:
+                st.success(f"📍 {aula_name} — {course_name} ({time_slot})")
+        else:
+            st.info(f"No lesson on {weekday_name} at {at_time.strftime('%H:%M')}.")
+
+elif menu_choice == "📈 Room Utilization":
+    st.header("Room Utilization 📈")
+    if not secretario.all_aule:
+        st.warning("No classrooms available. Please create a classroom first.")
+    else:
+        default_start, default_end = academic_year_bounds(academic_year_of(), lessons_only=True)
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            period = st.date_input("Period:", (default_start, default_end))
+        with col2:
+            day_start, day_end = st.slider("Opening hours:", 0, 24, (8, 18))
+        with col3:
+            heatmap_metric = st.selectbox("Heatmap:", ["Utilization %", "Peak Demand"])
+
+        if len(period) == 2 and day_end > day_start:
+            course_students = {c.nome_corso: len(c.alunni_frequentanti_il_tal_corso) for c in secretario.all_courses}
+            occupancy = build_occupancy(secretario.all_aule, course_students, period[0], period[1], day_start, day_end)
+
+            df_rooms = pd.DataFrame(occupancy.room_metrics())
+            underused = int((df_rooms["Utilization %"] < 20).sum())
+            overfilled = int((df_rooms["Overfilled Hours"] > 0).sum())
+            m1, m2, m3 = st.columns(3)
+            m1.metric("Average Utilization", f"{df_rooms['Utilization %'].mean():.1f} %")
+            m2.metric("Underused Rooms (< 20 %)", underused)
+            m3.metric("Rooms Over Capacity", overfilled)
+
+            st.subheader("Per Room and Weekday")
+            per_weekday = occupancy.weekday_utilization() if heatmap_metric == "Utilization %" else occupancy.weekday_peak_demand()
+            df_heat = pd.DataFrame(per_weekday, index=occupancy.rooms, columns=WEEKDAY_NAMES)
+            df_heat = df_heat.reset_index(names="Classroom").melt(id_vars="Classroom", var_name="Weekday", value_name=heatmap_metric)
+            room_heatmap = alt.Chart(df_heat).mark_rect().encode(
+                x=alt.X("Weekday:N", sort=WEEKDAY_NAMES),
+                y=alt.Y("Classroom:N", sort=occupancy.rooms),
+                color=alt.Color(f"{heatmap_metric}:Q", scale=alt.Scale(scheme="orangered")),
+                tooltip=["Classroom", "Weekday", alt.Tooltip(f"{heatmap_metric}:Q", format=".1f")]
+            ).properties(height=min(20 * len(occupancy.rooms), 4000))
+            st.altair_chart(room_heatmap, use_container_width=True)
+
+            st.subheader("Campus Occupancy by Weekday and Hour")
+            df_hours = pd.DataFrame(occupancy.weekday_hour_utilization(), index=WEEKDAY_NAMES, columns=occupancy.hours)
+            df_hours = df_hours.reset_index(names="Weekday").melt(id_vars="Weekday", var_name="Hour", value_name="Rooms in Use %")
+            hour_heatmap = alt.Chart(df_hours.dropna()).mark_rect().encode(
+                x=alt.X("Hour:O"),
+                y=alt.Y("Weekday:N", sort=WEEKDAY_NAMES),
+                color=alt.Color("Rooms in Use %:Q", scale=alt.Scale(scheme="blues")),
+                tooltip=["Weekday", "Hour", alt.Tooltip("Rooms in Use %:Q", format=".1f")]
+            )
+            st.altair_chart(hour_heatmap, use_container_width=True)
+
+            st.subheader("Room Metrics")
+            st.dataframe(df_rooms.sort_values("Utilization %"), use_container_width=True, hide_index=True)
+        else:
+            st.info("Select a start and end date and a valid opening-hours range.")
+
+elif menu_choice == "🏫 District Overview":
+    st.header("District Overview 🏫")
+    (enrollment, totals), (shortfalls, chairs_to_buy) = _district_report(CAMPUSES_DIR, tuple(campuses), get_router(CAMPUSES_DIR))
+    m1, m2, m3, m4 = st.columns(4)
+    m1.metric("Campuses", len(enrollment))
+    m2.metric("Students", totals.get("students", 0))
+    m3.metric("Enrollments", totals.get("enrollments", 0))
+    m4.metric("Chairs to Buy", chairs_to_buy)
+    if len(enrollment) < len(campuses):
+        st.warning(f"⚠️ {len(campuses) - len(enrollment)} campus database(s) could not be read; see the server log.")
+
+    df_campuses = pd.DataFrame([{
+        "Campus": name,
+        "Students": summary["students"],
+        "Courses": summary["courses"],
+        "Enrollments": summary["enrollments"],
+        "Classrooms": summary["classrooms"],
+        "Chairs": summary["chairs"],
+        "Chairs to Buy": sum(shortfalls.get(name, {}).values()),
+    } for name, summary in enrollment.items()])
+    if not df_campuses.empty:
+        st.dataframe(df_campuses, use_container_width=True, hide_index=True)
+        st.altair_chart(alt.Chart(df_campuses).mark_bar().encode(
+            x=alt.X("Campus:N", sort="-y"), y="Students:Q", tooltip=["Campus", "Students", "Enrollments"]
+        ), use_container_width=True)
+
+    st.subheader("Supply Needs")
+    df_needs = pd.DataFrame([{"Campus": name, "Classroom": nome_aula, "Missing Chairs": missing}
+                             for name, campus_shortfalls in shortfalls.items() for nome_aula, missing in campus_shortfalls.items()])
+    if df_needs.empty:
+        st.success("✅ No campus needs chairs.")
+    else:
+        st.dataframe(df_needs, use_container_width=True, hide_index=True)
+
+elif menu_choice == "🚩 Early Warning":
+    st.header("Absence Early Warning 🚩")
+    col1, col2, col3, col4, col5 = st.columns(5)
+    with col1:
+        as_of = st.date_input("As of:", datetime.date.today())
+    with col2:
+        rate_14 = st.slider("2-week absence ≥ %", 0, 100, int(DEFAULT_THRESHOLDS["rate_14"] * 100))
+    with col3:
+        rate_28 = st.slider("4-week absence ≥ %", 0, 100, int(DEFAULT_THRESHOLDS["rate_28"] * 100))
+    with col4:
+        absence_streak = st.number_input("Consecutive absences ≥", min_value=1, value=DEFAULT_THRESHOLDS["absence_streak"])
+    with col5:
+        late_streak = st.number_input("Consecutive lates ≥", min_value=1, value=DEFAULT_THRESHOLDS["late_streak"])
+    thresholds = {"rate_14": rate_14 / 100, "rate_28": rate_28 / 100,
+                  "absence_streak": absence_streak, "late_streak": late_streak}
+
+    db_manager = report_db(secretario.db_manager)
+    warning = _early_warning(db_manager.db_name, db_manager.data_version("fetch_attendance"), as_of, db_manager)
+    if not len(warning):
+        st.info("No attendance recorded up to this date.")
+    else:
+        flagged = warning.flagged(thresholds)
+        students_by_id = {a.id: a for a in secretario.all_students}
+        courses_by_id = {c.id: c for c in secretario.all_courses}
+        reason_labels = {"rate_14": "2-week rate", "rate_28": "4-week rate",
+                         "absence_streak": "absence streak", "late_streak": "late streak"}
+
+        m1, m2, m3 = st.columns(3)
+        m1.metric("Student/Course Pairs", len(warning))
+        m2.metric("Flagged Students", len({f["student_id"] for f in flagged}))
+        m3.metric("Flagged Pairs", len(flagged))
+
+        if not flagged:
+            st.success("✅ No student crosses the thresholds.")
+        else:
+            def pair_label(f):
+                alunno = students_by_id.get(f["student_id"])
+                corso = courses_by_id.get(f["course_id"])
+                student = f"{alunno.name} {alunno.last_name}" if alunno else f"Student {f['student_id']}"
+                return student, corso.nome_corso if corso else f"Course {f['course_id']}"
+
+            df_flagged = pd.DataFrame([{
+                "Student": pair_label(f)[0],
+                "Course": pair_label(f)[1],
+                "2-Week Absence %": round(f["rate_14"] * 100, 1),
+                "4-Week Absence %": round(f["rate_28"] * 100, 1),
+                "2-Week Trend (pts)": round(f["trend_14"] * 100, 1),
+                "Sessions (4 weeks)": f["sessions_28"],
+                "Absence Streak": f["absence_streak"],
+                "Late Streak": f["late_streak"],
+                "Reasons": ", ".join(reason_labels[r] for r in f["reasons"]),
+            } for f in flagged])
+            st.dataframe(df_flagged, use_container_width=True, hide_index=True)
+
+            st.subheader("Trend")
+            labels = {f"{student} – {course}": f for f in flagged for student, course in [pair_label(f)]}
+            selected = labels[st.selectbox("Student and course:", list(labels.keys()))]
+            dates, trend_14, trend_28 = warning.trend(selected["student_id"], selected["course_id"], days=90)
+            df_trend = pd.DataFrame({"Date": dates, "2-Week Absence %": trend_14 * 100, "4-Week Absence %": trend_28 * 100})
+            df_trend = df_trend.melt(id_vars="Date", var_name="Window", value_name="Absence %").dropna()
+            trend_chart = alt.Chart(df_trend).mark_line().encode(
+                x="Date:T", y=alt.Y("Absence %:Q", scale=alt.Scale(domain=[0, 100])), color="Window:N",
+                tooltip=["Date:T", "Window", alt.Tooltip("Absence %:Q", format=".1f")]
+            )
+            threshold_rule = alt.Chart(pd.DataFrame({"Absence %": [rate_14]})).mark_rule(strokeDash=[4, 4]).encode(y="Absence %:Q")
+            st.altair_chart(trend_chart + threshold_rule, use_container_width=True)
+
+elif menu_choice == "📝 Gradebook":
+    st.header("Gradebook 📝")
+    if not secretario.all_courses:
+        st.warning("No courses available. Please create a course first.")
+    else:
+        course_options = secretario.course_options()
+        selected_course = course_options[st.selectbox("Select Course:", list(course_options.keys()))]
+
+        with st.form("add_assessment_form", clear_on_submit=True):
+            st.subheader("New Assessment")
+            col1, col2, col3, col4 = st.columns([0.4, 0.2, 0.2, 0.2])
+            with col1:
+                assessment_name = st.text_input("Name:", placeholder="e.g. Written test 1")
+            with col2:
+                assessment_weight = st.number_input("Weight:", min_value=0.0, value=1.0, step=0.5)
+            with col3:
+                assessment_max = st.number_input("Max Score:", min_value=0.5, value=10.0, step=0.5)
+            with col4:
+                assessment_date = st.date_input("Date:", datetime.date.today())
+            if st.form_submit_button("Add Assessment"):
+                secretario.add_assessment(selected_course, assessment_name, assessment_weight, assessment_max, assessment_date)
+
+        assessments = secretario.assessments(selected_course)
+        if not assessments:
+            st.info(f"No assessments for '{selected_course.nome_corso}' this year yet.")
+        else:
+            st.subheader("Assessments")
+            st.dataframe(pd.DataFrame([{"Name": a.name, "Date": a.assessment_date, "Weight": a.weight, "Max Score": a.max_score}
+                                       for a in assessments]), use_container_width=True, hide_index=True)
+            assessment_labels = {f"{a.name} ({a.assessment_date or 'no date'}) - ID: {a.id}": a for a in assessments}
+            col1, col2 = st.columns([0.8, 0.2])
+            with col1:
+                assessment = assessment_labels[st.selectbox("Enter Scores For:", list(assessment_labels.keys()))]
+            with col2:
+                st.write("")
+                if st.button("🗑️ Delete Assessment"):
+                    if secretario.delete_assessment(assessment) is not None:
+                        st.rerun()
+
+            roster = selected_course.alunni_frequentanti_il_tal_corso
+            if not roster:
+                st.info(f"No students assigned to '{selected_course.nome_corso}' yet. Please assign students first.")
+            else:
+                current_scores = secretario.scores(assessment)
+                with st.form("record_scores_form"):
+                    st.caption(f"Scores from 0 to {assessment.max_score:g}; leave a score empty to remove it.")
+                    entered = {}
+                    for student in sorted(roster, key=lambda a: (a.last_name, a.name, a.id)):
+                        col1, col2 = st.columns([0.7, 0.3])
+                        with col1:
+                            st.write(f"**{student.name} {student.last_name}** (ID: {student.id})")
+                        with col2:
+                            entered[student.id] = st.number_input(
+                                f"Score for {student.name} {student.last_name}", min_value=0.0,
+                                max_value=float(assessment.max_score), value=current_scores.get(student.id),
+                                step=0.25, key=f"score_{assessment.id}_{student.id}", label_visibility="collapsed"
+                            )
+                    if st.form_submit_button("Save Scores"):
+                        # Only what changed: the whole roster still goes in one transaction
+                        changed = {i: score for i, score in entered.items() if score != current_scores.get(i)}
+                        if changed:
+                            secretario.record_scores(assessment, changed)
+                        else:
+                            st.info("No score changed.")
+
+        ranking = cached_gradebook(secretario.db_manager).course_ranking(selected_course.id)
+        if any(r["grade"] is not None for r in ranking):
+            st.subheader("Final Grades")
+            students_by_id = {a.id: a for a in secretario.all_students}
+            st.dataframe(pd.DataFrame([{
+                "Rank": r["rank"],
+                "Student": f"{students_by_id[r['student_id']].name} {students_by_id[r['student_id']].last_name}"
+                           if r["student_id"] in students_by_id else f"Student {r['student_id']}",
+                "Grade": r["grade"],
+                "Percentile": None if r["percentile"] is None else round(r["percentile"], 1),
+                "Weight Covered %": round(r["coverage"] * 100, 1),
+                "Scores": r["scored"],
+            } for r in ranking]), use_container_width=True, hide_index=True)
+
+elif menu_choice == "🏅 Grades & Rankings":
+    st.header("Grades & Rankings 🏅")
+    gradebook = cached_gradebook(secretario.db_manager)
+    if not len(gradebook):
+        st.info("No scores recorded this academic year yet. Enter them from the Gradebook page.")
+    else:
+        students_by_id = {a.id: a for a in secretario.all_students}
+        courses_by_id = {c.id: c for c in secretario.all_courses}
+
+        def student_label(student_id):
+            alunno = students_by_id.get(student_id)
+            return f"{alunno.name} {alunno.last_name}" if alunno else f"Student {student_id}"
+
+        graded = gradebook.grade[gradebook.rank > 0]
+        m1, m2, m3, m4 = st.columns(4)
+        m1.metric("Graded Students", len(gradebook.students))
+        m2.metric("Courses with Assessments", len(gradebook.courses))
+        m3.metric("Average Grade", f"{graded.mean():.2f}" if len(graded) else "-")
+        m4.metric(f"Passing (≥ {PASSING_GRADE:g})", f"{(graded >= PASSING_GRADE).mean() * 100:.1f}%" if len(graded) else "-")
+
+        st.subheader("Grade Distribution per Course")
+        st.dataframe(pd.DataFrame([{
+            "Course": courses_by_id[d["course_id"]].nome_corso if d["course_id"] in courses_by_id else f"Course {d['course_id']}",
+            "Assessments": d["assessments"],
+            "Students": d["students"],
+            "Mean": d["mean"],
+            "Min": d["min"],
+            **{f"P{q}": d[f"p{q}"] for q in QUANTILES},
+            "Max": d["max"],
+            "Passing %": None if d["passing"] is None else round(d["passing"] * 100, 1),
+        } for d in gradebook.distribution()]).round(2), use_container_width=True, hide_index=True)
+
+        if len(graded):
+            counts, edges = np.histogram(graded, bins=20, range=(0, 10))
+            df_histogram = pd.DataFrame({"From": edges[:-1], "To": edges[1:], "Students": counts})
+            st.altair_chart(alt.Chart(df_histogram).mark_bar().encode(
+                x=alt.X("From:Q", bin="binned", title="Final Grade"), x2="To:Q", y="Students:Q",
+                tooltip=["From:Q", "To:Q", "Students:Q"]
+            ), use_container_width=True)
+
+        col1, col2 = st.columns(2)
+        with col1:
+            st.subheader("Course Ranking")
+            course_labels = {(courses_by_id[c].nome_corso if c in courses_by_id else f"Course {c}"): int(c) for c in gradebook.courses}
+            ranking = gradebook.course_ranking(course_labels[st.selectbox("Course:", list(course_labels.keys()))])
+            st.dataframe(pd.DataFrame([{
+                "Rank": r["rank"], "Student": student_label(r["student_id"]), "Grade": r["grade"],
+                "Percentile": None if r["percentile"] is None else round(r["percentile"], 1),
+            } for r in ranking]), use_container_width=True, hide_index=True)
+        with col2:
+            st.subheader("School Ranking")
+            limit = st.number_input("Top:", min_value=1, value=20)
+            st.dataframe(pd.DataFrame([{
+                "Rank": r["school_rank"], "Student": student_label(r["student_id"]), "Average": r["average"],
+                "Percentile": round(r["school_percentile"], 1),
+            } for r in gradebook.school_ranking(limit)]), use_container_width=True, hide_index=True)
+
+elif menu_choice == "📜 Student Transcript":
+    st.header("Student Transcript 📜")
+    if not secretario.all_students:
+        st.warning("No students available.")
+    else:
+        student_options = secretario.student_options()
+        alunno = student_options[st.selectbox("Select Student:", list(student_options.keys()))]
+        gradebook = cached_gradebook(secretario.db_manager)
+        transcript = secretario.transcript(alunno, gradebook)
+        standing = gradebook.student_standing(alunno.id)
+        if standing:
+            m1, m2, m3 = st.columns(3)
+            m1.metric("Average Grade", f"{standing['average']:.2f}")
+            m2.metric("School Rank", f"{standing['school_rank']} of {standing['of']}")
+            m3.metric("School Percentile", f"{standing['school_percentile']:.1f}")
+        if not transcript:
+            st.info(f"No assessments this academic year in the courses of {alunno.name} {alunno.last_name}.")
+        for entry in transcript:
+            st.subheader(entry["nome_corso"])
+            if entry["grade"] is None:
+                st.caption("No final grade yet.")
+            else:
+                st.caption(f"Final grade **{entry['grade']:.2f}** · rank {entry['rank']} of {entry['of']} · "
+                           f"percentile {entry['percentile']:.1f} · {entry['coverage'] * 100:.0f}% of the weight assessed")
+            st.dataframe(pd.DataFrame([{
+                "Assessment": a["name"], "Date": a["assessment_date"], "Weight": a["weight"],
+                "Score": a["score"], "Max Score": a["max_score"],
+            } for a in entry["assessments"]]), use_container_width=True, hide_index=True)
+
+elif menu_choice == "🔀 Optimize Room Assignment":
+    st.header("Optimize Room Assignment 🔀")
+    st.write("For every time slot, courses are matched to the free rooms so that as few chairs as possible are missing, then with as few room changes as possible. Chairs still missing afterwards go into the purchase orders.")
+    if not secretario.all_aule:
+        st.warning("No classrooms available. Please create a classroom first.")
+    else:
+        if st.button("Compute Proposal"):
+            with st.spinner("Optimizing..."):
+                st.session_state.room_plan = secretario.propose_room_reassignment()
+        plan = st.session_state.get("room_plan")
+        if plan:
+            m1, m2, m3 = st.columns(3)
+            m1.metric("Chairs to Buy (current)", plan.missing_before)
+            m2.metric("Chairs to Buy (proposed)", plan.missing_after, delta=plan.missing_after - plan.missing_before, delta_color="inverse")
+            m3.metric("Lessons Moved", len(plan.moves))
+
+            st.subheader("Proposed Schedule Changes")
+            if plan.moves:
+                st.dataframe(
+                    pd.DataFrame(plan.moves, columns=["Time Slot", "Course", "From Classroom", "To Classroom"]),
+                    use_container_width=True, hide_index=True
+                )
+            else:
+                st.info("The current schedule is already optimal.")
+
+            st.subheader("Remaining Purchase Orders")
+            orders = plan.purchase_orders()
+            if orders:
+                st.dataframe(
+                    pd.DataFrame(sorted(orders.items()), columns=["Classroom", "Chairs to Order"]),
+                    use_container_width=True, hide_index=True
+                )
+                st.download_button(
+                    label="Download Purchase Orders (ZIP) ⬇️",
+                    data=build_reports_zip(plan.report_jobs()),
+                    file_name=f"ordini_fornitore_{datetime.date.today().isoformat()}.zip",
+                    mime="application/zip"
+                )
+            else:
+                st.success("✅ No chairs need to be ordered with the proposed schedule.")
+
+            if plan.moves and st.button("Apply Proposed Schedule"):
+                secretario.apply_room_reassignment(plan)
+                del st.session_state.room_plan
+
+elif menu_choice == "🧪 Schedule Scenarios":
+    st.header("Schedule Scenarios 🧪")
+    st.write("Try changes to the weekly schedule, such as moving a lesson or closing a classroom, without touching it: "
+             "a scenario only stores the slots it changes. Compare chairs to buy and clashes across scenarios, then make "
+             "one the live schedule in a single transaction.")
+    if not secretario.all_aule or not secretario.all_courses:
+        st.warning("Scenarios need classrooms and courses. Please create them first.")
+    else:
+        scenarios = secretario.scenarios()
+        aule_by_id = {a.id: a for a in secretario.all_aule}
+        corsi_by_id = {c.id: c for c in secretario.all_courses}
+        with st.form("new_scenario_form"):
+            scenario_name = st.text_input("Scenario name:")
+            parent = st.selectbox("Starting from:", ["Live schedule"] + list(scenarios.branches))
+            if st.form_submit_button("Create Scenario"):
+                try:
+                    scenarios.branch(scenario_name.strip(), None if parent == "Live schedule" else parent)
+                    st.session_state.new_scenario = scenario_name.strip()
+                except ValueError as e:
+                    st.error(f"❌ {e}")
+
+        names = list(scenarios.branches)
+        if not names:
+            st.info("Create a scenario to start.")
+        else:
+            new_scenario = st.session_state.get("new_scenario")
+            branch = scenarios.get(st.selectbox("Scenario:", names, index=names.index(new_scenario) if new_scenario in names else 0))
+            if branch.dropped:
+                st.warning(f"⚠️ {len(branch.dropped)} changes of this scenario were dropped: the live schedule changed "
+                           f"the same slots in the meantime.")
+            open_rooms = {a.nome_aula: a for a in secretario.all_aule if a.id not in branch.closed}
+            lessons = {f"{corsi_by_id[course_id].nome_corso}, {time_slot} ({aula.nome_aula})": (aula.id, time_slot)
+                       for aula in secretario.all_aule for time_slot, course_id in branch.schedule(aula.id).items()}
+            move_tab, add_tab, close_tab = st.tabs(["Move or Remove a Lesson", "Add a Lesson", "Close a Classroom"])
+            with move_tab, st.form(f"scenario_move_form_{branch.name}"):
+                lesson = st.selectbox("Lesson:", sorted(lessons))
+                to_room = st.selectbox("To classroom:", list(open_rooms))
+                keep_time = st.checkbox("Keep its time slot", value=True)
+                col1, col2, col3 = st.columns(3)
+                day = col1.selectbox("Day:", WEEKDAY_NAMES[:6], key="scenario_move_day")
+                start_time = col2.time_input("Start Time:", datetime.time(9, 0), key="scenario_move_start")
+                end_time = col3.time_input("End Time:", datetime.time(11, 0), key="scenario_move_end")
+                col1, col2 = st.columns(2)
+                move, remove = col1.form_submit_button("Move Lesson"), col2.form_submit_button("Remove Lesson")
+                if (move or remove) and lesson is None:
+                    st.error("This scenario has no lessons.")
+                elif move:
+                    try:
+                        branch.move(*lessons[lesson], open_rooms[to_room].id,
+                                    None if keep_time else f"{day} {start_time:%H:%M} - {end_time:%H:%M}")
+                    except ValueError as e:
+                        st.error(f"❌ {e}")
+                elif remove:
+                    branch.clear(*lessons[lesson])
+            with add_tab, st.form(f"scenario_add_form_{branch.name}"):
+                room = st.selectbox("Classroom:", list(open_rooms))
+                course = st.selectbox("Course:", list(secretario.course_options()))
+                col1, col2, col3 = st.columns(3)
+                day = col1.selectbox("Day:", WEEKDAY_NAMES[:6], key="scenario_add_day")
+                start_time = col2.time_input("Start Time:", datetime.time(9, 0), key="scenario_add_start")
+                end_time = col3.time_input("End Time:", datetime.time(11, 0), key="scenario_add_end")
+                if st.form_submit_button("Add Lesson") and room:
+                    branch.assign(open_rooms[room].id, f"{day} {start_time:%H:%M} - {end_time:%H:%M}",
+                                  secretario.course_options()[course].id)
+            with close_tab, st.form(f"scenario_close_form_{branch.name}"):
+                st.caption("Its lessons count as unplaced until they are moved to another classroom at the same time.")
+                room = st.selectbox("Classroom:", list(open_rooms))
+                if st.form_submit_button("Close Classroom") and room:
+                    branch.close_room(open_rooms[room].id)
+
+            col1, col2 = st.columns(2)
+            if col1.button("Make It the Live Schedule", disabled=not branch.changes() and not branch.closed):
+                secretario.promote_scenario(branch.name)
+            if col2.button("Discard Scenario"):
+                scenarios.drop(branch.name)
+
+            # After the actions above: a promoted scenario has changed the live schedule
+            scenarios = secretario.scenarios()
+            st.subheader("Comparison")
+            st.dataframe(
+                pd.DataFrame([(name, len(scenario), *scenario.metrics()) for name, scenario in
+                              [("Live schedule", scenarios.live)] + list(scenarios.branches.items())],
+                             columns=["Scenario", "Changed Slots", "Lessons", "Chairs to Buy", "Room Clashes",
+                                      "Teacher Clashes", "Student Clashes", "Unplaced Lessons"]),
+                use_container_width=True, hide_index=True
+            )
+            if branch.name in scenarios.branches:
+                st.subheader(f"Changes in '{branch.name}'")
+                others = ["Live schedule"] + [name for name in scenarios.branches if name != branch.name]
+                compare_to = st.selectbox("Compared with:", others)
+                diff = scenarios.diff(None if compare_to == "Live schedule" else compare_to, branch.name)
+                if diff:
+                    st.dataframe(
+                        pd.DataFrame([(aule_by_id[aula_id].nome_aula, time_slot,
+                                       corsi_by_id[before].nome_corso if before else "—", corsi_by_id[after].nome_corso if after else "—")
+                                      for aula_id, time_slot, before, after in diff],
+                                     columns=["Classroom", "Time Slot", compare_to, branch.name]),
+                        use_container_width=True, hide_index=True
+                    )
+                else:
+                    st.info("No differences.")
+
+elif menu_choice == "🗂️ Manage Records":
+    st.header("Manage Records 🗂️")
+    st.write("Bulk changes, each saved in one transaction. Graduating, closing and taking out of service keep the history; "
+             "deleting also removes enrollments, attendance and recurring lessons; merging folds duplicates into one record. "
+             "Editing a course or a classroom updates every timetable that shows it.")
+    kind = st.radio("Records:", ["Students", "Courses", "Classrooms"], horizontal=True)
+    if kind == "Students":
+        # Duplicates usually share the name: the ID tells them apart
+        options = {f"{s.name} {s.last_name} (#{s.id}, {s.date_of_birth})": s for s in secretario.all_students}
+        retire_label, delete, retire, merge = "Graduate", secretario.delete_students, secretario.graduate_students, secretario.merge_students
+    elif kind == "Courses":
+        options = {f"{c.nome_corso} (#{c.id}, {c.docente})": c for c in secretario.all_courses}
+        retire_label, delete, retire, merge = "Close", secretario.delete_courses, secretario.deactivate_courses, secretario.merge_courses
+    else:
+        options = {f"{a.nome_aula} (#{a.id}, {a.capacita_sedie} chairs)": a for a in secretario.all_aule}
+        retire_label, delete, retire, merge = "Take out of service", secretario.delete_classrooms, secretario.deactivate_classrooms, secretario.merge_classrooms
+    if not options:
+        st.info(f"No {kind.lower()} yet.")
+    else:
+        actions = ["Edit", retire_label, "Delete", "Merge duplicates"] + (["Find duplicates"] if kind == "Students" else [])
+        action = st.radio("Action:", actions, horizontal=True)
+        if action == "Find duplicates":
+            # Typos, swapped first/last names and mistyped birth dates; homonyms born on other days are left alone
+            groups = secretario.duplicate_groups()
+            if not groups:
+                st.success("No likely duplicates found.")
+            else:
+                # Outside the form so that the choices below follow the selected group
+                number = st.selectbox("Group to merge:", range(1, len(groups) + 1),
+                                      format_func=lambda n: " / ".join(f"{a.name} {a.last_name} (#{a.id})" for a, _ in groups[n - 1]))
+                group = {f"{a.name} {a.last_name} (#{a.id}, {a.date_of_birth})": a for a, _ in groups[number - 1]}
+                with st.form(f"merge_duplicates_form_{'_'.join(str(a.id) for a in group.values())}"):
+                    keep_label = st.radio("Keep:", list(group.keys()))
+                    selected = st.multiselect("Merge into it:", list(group.keys()), default=list(group.keys())[1:])
+                    if st.form_submit_button("Merge"):
+                        duplicates = [group[label] for label in selected if label != keep_label]
+                        if duplicates:
+                            secretario.merge_students(group[keep_label], duplicates)
+                        else:
+                            st.error("Select at least one record other than the one to keep.")
+                groups = secretario.duplicate_groups() # After the form: a merge above is already reflected
+                st.write(f"{len(groups)} groups of records that look like the same student "
+                         f"({sum(len(group) - 1 for group in groups)} records to merge).")
+                st.dataframe(pd.DataFrame([(number, a.id, a.name, a.last_name, a.date_of_birth, f"{score:.0%}")
+                                           for number, group in enumerate(groups, start=1) for a, score in group],
+                                          columns=["Group", "ID", "First Name", "Last Name", "Date of Birth", "Similarity"]),
+                             hide_index=True, use_container_width=True)
+        elif action == "Edit":
+            # Outside the form so that the fields below follow the selected record
+            record = options[st.selectbox(f"{kind[:-1]}:", list(options.keys()))]
+            with st.form(f"edit_record_form_{kind}_{record.id}"):
+                if kind == "Students":
+                    name = st.text_input("First Name:", record.name)
+                    last_name = st.text_input("Last Name:", record.last_name)
+                    date_of_birth = st.text_input("Date of Birth (YYYY-MM-DD):", record.date_of_birth)
+                    if st.form_submit_button("Save"):
+                        if not (name and last_name and date_of_birth):
+                            st.error("Please fill in all fields.")
+                        else:
+                            try:
+                                datetime.date.fromisoformat(date_of_birth) # Validate date format
+                                secretario.edit_student(record, name, last_name, date_of_birth)
+                            except ValueError:
+                                st.error("Invalid date format. Please use YYYY-MM-DD.")
+                elif kind == "Courses":
+                    nome_corso = st.text_input("Course Name:", record.nome_corso)
+                    durata = st.text_input("Duration (e.g., '120 ore'):", record.durata)
+                    docente = st.text_input("Teacher:", record.docente)
+                    if st.form_submit_button("Save"):
+                        if nome_corso and durata and docente:
+                            secretario.edit_course(record, nome_corso, durata, docente)
+                        else:
+                            st.error("Please fill in all fields.")
+                else:
+                    nome_aula = st.text_input("Classroom Name:", record.nome_aula)
+                    capacita = st.number_input("Chair Capacity:", min_value=1, value=int(record.capacita_sedie))
+                    if st.form_submit_button("Save"):
+                        if nome_aula:
+                            secretario.edit_classroom(record, nome_aula, capacita)
+                        else:
+                            st.error("Please fill in all fields.")
+        else:
+            with st.form("manage_records_form"):
+                if action == "Merge duplicates":
+                    keep_label = st.selectbox("Keep:", list(options.keys()))
+                    selected = st.multiselect("Duplicates to merge into it:", [label for label in options if label != keep_label])
+                else:
+                    selected = st.multiselect(f"{kind}:", list(options.keys()))
+                    on_date = st.date_input("Effective date:", datetime.date.today()) if action == retire_label else None
+                    confirmed = st.checkbox("Also delete their history (cannot be undone)") if action == "Delete" else True
+                if st.form_submit_button(action):
+                    records = [options[label] for label in selected]
+                    if not records:
+                        st.error("Select at least one record.")
+                    elif action == "Merge duplicates":
+                        merge(options[keep_label], records)
+                    elif action == "Delete" and not confirmed:
+                        st.error("Tick the confirmation to delete.")
+                    elif action == "Delete":
+                        delete(records)
+                    else:
+                        retire(records, on_date)
+
 elif menu_choice == "📊 View All Data":
     st.header("All School Data")
 
     st.subheader("All Registered Students 🧑‍🎓")
-    if st.session_state.alunni_list:
-        alunni_data = [a.display_alunno_info() for a in st.session_state.alunni_list]
+    if secretario.all_students:
+        alunni_data = [a.display_alunno_info() for a in secretario.all_students]
         st.dataframe(alunni_data, use_container_width=True)
     else:
         st.info("No students registered yet.")
@@ -910,10 +1259,98 @@ elif menu_choice == "📊 View All Data":
     else:
         st.info("No classrooms created yet.")
 
+elif menu_choice == "📦 Export Reports":
+    st.header("Export Reports 📦")
+    st.write("Builds supplier orders for every classroom that is short of chairs, one calendar per classroom and one roster per course, in a single ZIP archive.")
+    with st.form("export_reports_form"):
+        include_orders = st.checkbox("Supplier orders", value=True)
+        include_calendars = st.checkbox("Classroom calendars", value=True)
+        include_rosters = st.checkbox("Course rosters", value=True)
+        submitted = st.form_submit_button("Generate Reports")
+    if submitted:
+        jobs = secretario.report_jobs(orders=include_orders, calendars=include_calendars, rosters=include_rosters)
+        if jobs:
+            with st.spinner(f"Rendering {len(jobs)} reports..."):
+                st.session_state.reports_zip = build_reports_zip(jobs)
+            st.success(f"✅ {len(jobs)} reports generated.")
+        else:
+            st.session_state.pop("reports_zip", None)
+            st.info("Nothing to export for the selected reports.")
+    if st.session_state.get("reports_zip"):
+        st.download_button(
+            label="Download Reports (ZIP) ⬇️",
+            data=st.session_state.reports_zip,
+            file_name=f"reports_{datetime.date.today().isoformat()}.zip",
+            mime="application/zip"
+        )
+
 elif menu_choice == "🔄 Reload Data (from DB)":
     st.header("Reload Data from Database")
     st.warning("This will clear the current in-memory data and reload everything from the database. Unsaved changes will be lost (though most changes are saved immediately).")
     if st.button("Confirm Reload Data"):
+        st.cache_data.clear() # Also picks up changes made outside this process (e.g. the CLI)
         secretario.load_data()
         st.success("Data reloaded successfully from the database! ✨")
-        st.rerun() # Rerun to update displayed data
\ No newline at end of file
+        st.rerun() # Rerun to update displayed data
+
+elif menu_choice == "🩺 Profiling":
+    st.header("Profiling 🩺")
+    st.write("With profiling on (`?profile=1` in the URL, or `SCHOOL_PROFILING=1` for every session) each rerun is "
+             "captured with cProfile and tracemalloc, together with the size of each entry of its session state. "
+             "The latest captures of this server process, from every session, are listed here; the ZIP holds the "
+             "`.prof` file (pstats, snakeviz) and the tracemalloc snapshot.")
+    store = get_profile_store()
+    captures = store.captures()
+    if not captures:
+        st.info("No profiled reruns yet: open another page.")
+    else:
+        st.dataframe([{
+            "Time": f"{c.started_at:%H:%M:%S}",
+            "Session": c.session,
+            "Page": c.label,
+            "Rerun (ms)": round(c.duration * 1000, 1),
+            "Peak traced (KiB)": round(c.peak_bytes / 1024, 1),
+            "Session state (KiB)": round(sum(size for level, _, _, size in c.session_sizes if level == 1) / 1024, 1),
+        } for c in captures], use_container_width=True)
+        labels = {f"{c.started_at:%H:%M:%S} · {c.label} · session {c.session}": c for c in captures}
+        capture = labels[st.selectbox("Capture:", list(labels.keys()))]
+        st.subheader("Session state by entry")
+        st.dataframe([{"Entry": "  " * (level - 1) + path, "Type": type_name, "KiB": round(size / 1024, 1)}
+                      for level, path, type_name, size in capture.session_sizes], use_container_width=True)
+        st.subheader("Memory still allocated at the end of the rerun")
+        st.code(capture.allocations_text)
+        st.subheader("Time by function")
+        st.code(capture.profile_text)
+        st.download_button(
+            label="Download Capture (ZIP) ⬇️",
+            data=capture_zip(capture),
+            file_name=f"profile_{capture.started_at:%Y%m%d_%H%M%S}_{capture.session}.zip",
+            mime="application/zip"
+        )
+        if st.button("Clear Captures"):
+            store.clear()
+            st.rerun()
+
+# Snapshot this rerun's writes for the next cold start (a no-op when nothing changed).
+# Reruns cut short by st.rerun() are picked up by the next one
+secretario.save_warm_start()
+
+# --- Rerun timing (with and without the query cache) ---
+rerun_ms = (time.perf_counter() - rerun_started) * 1000
+timings = st.session_state.setdefault("rerun_timings", {True: [], False: []})
+timings[st.session_state.use_query_cache].append(rerun_ms)
+with st.sidebar.expander("⏱️ Rerun Time"):
+    st.write(f"This rerun: {rerun_ms:.1f} ms")
+    for cache_on, label in ((True, "Cache on"), (False, "Cache off")):
+        recent = timings[cache_on][-50:]
+        if recent:
+            st.write(f"{label}: {sum(recent) / len(recent):.1f} ms average over {len(recent)} reruns")
+
+# --- Profiling capture (last, so it covers the whole rerun) ---
+if profiling:
+    session_id = st.session_state.setdefault("profile_session", uuid.uuid4().hex[:8])
+    # The DatabaseManagers are shared by every session: not part of what this one holds
+    capture = profiler.stop(label=menu_choice, session=session_id, state=st.session_state,
+                            exclude=[s.db_manager for s in secretari.values()])
+    if capture:
+        get_profile_store().add(capture)
@@ -0,0 +1,500 @@
+"""
+HTTP/JSON API for other school systems (badge readers, the LMS) on top of school_core.
+
+    python src/school_api.py --db school_data.db --port 8765 --workers 4
+
+Batch endpoints take a JSON array, or NDJSON (one object per line) with
+Content-Type: application/x-ndjson, and answer with the accepted count and the
+per-item errors (valid items are written even if others fail):
+
+    POST /students      {"name", "last_name", "date_of_birth"}   likely duplicates are reported
+    POST /enrollments   {"student_id", "course_id" | "nome_corso"}   beyond a course's seats: waitlisted
+    POST /attendance    {"student_id", "course_id", "date", "status"}
+    POST /schedule      {"nome_aula", "nome_corso", "time_slot"}
+    POST /reload        reload the in-memory state after writes from other processes
+
+Large reads are streamed as NDJSON (chunked), straight from an SQLite cursor:
+
+    GET /students
+    GET /attendance?course_id=&student_id=&date=&academic_year=2023-2024
+    GET /changes?after=SEQ | consumer=NAME, &tables=attendance,students   change log entries after a cursor
+    POST /changes/commit  {"consumer", "seq"}   save a consumer's cursor once its changes are processed
+
+Small reads: GET /health, GET /courses, GET /classrooms.
+
+iCalendar feeds for calendar apps, cached until the change log shows that what they
+display changed; send If-None-Match with the last ETag to get a 304 instead:
+
+    GET /calendar.ics?student_id=ID | teacher=NAME | classroom_id=ID
+
+asyncio handles the connections; every DB call runs in a bounded thread pool, and
+a semaphore caps the jobs waiting for it, so a burst of clients gets backpressure
+instead of an unbounded queue. Stdlib only.
+"""
+import argparse
+import asyncio
+import collections
+import datetime
+import json
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs, urlsplit
+
+from school_core import DatabaseManager, Segreteria
+from school_core.academic_year import academic_year_bounds
+from school_core.changes import change_from_row
+from school_core.ical import FeedCache, etag_matches
+from school_core.models import ATTENDANCE_STATUSES
+from school_core.warm_start import warm_start_path
+
+MAX_BODY_BYTES = 32 * 1024 * 1024
+MAX_BATCH_ITEMS = 50_000
+STREAM_BATCH_ROWS = 1000
+
+REASONS = {200: "OK", 304: "Not Modified", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+           413: "Payload Too Large", 500: "Internal Server Error"}
+
+# A body that isn't JSON (status, content type, bytes, extra header lines)
+RawResponse = collections.namedtuple("RawResponse", ["status", "content_type", "body", "headers"])
+
+class ApiError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+class ItemError(ValueError):
+    """A single batch item is invalid: reported in the response, the rest of the batch goes on."""
+
+def _require(item, *fields):
+    missing = [field for field in fields if item.get(field) in (None, "")]
+    if missing:
+        raise ItemError(f"missing field(s): {', '.join(missing)}")
+    return [item[field] for field in fields]
+
+def _iso_date(value, field):
+    try:
+        return datetime.date.fromisoformat(str(value)).isoformat()
+    except ValueError:
+        raise ItemError(f"invalid {field} '{value}', use YYYY-MM-DD") from None
+
+def _int_id(value, field):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise ItemError(f"invalid {field} '{value}'") from None
+
+def _parse_items(body, content_type):
+    """A JSON array (or a single object), or NDJSON lines."""
+    try:
+        text = body.decode("utf-8")
+        if content_type.startswith("application/x-ndjson"):
+            items = [json.loads(line) for line in text.splitlines() if line.strip()]
+        else:
+            items = json.loads(text) if text.strip() else []
+    except (UnicodeDecodeError, json.JSONDecodeError) as e:
+        raise ApiError(400, f"invalid JSON body: {e}")
+    if isinstance(items, dict):
+        items = [items]
+    if not isinstance(items, list) or not all(isinstance(item, dict) for item in items):
+        raise ApiError(400, "expected a JSON array of objects")
+    if len(items) > MAX_BATCH_ITEMS:
+        raise ApiError(413, f"at most {MAX_BATCH_ITEMS} items per request")
+    return items
+
+def _validate(items, check):
+    """Runs check(item) on every item; returns (valid results, [{index, error}])."""
+    valid, errors = [], []
+    for index, item in enumerate(items):
+        try:
+            valid.append(check(item))
+        except ItemError as e:
+            errors.append({"index": index, "error": str(e)})
+    return valid, errors
+
+
+class SchoolService:
+    """
+    The operations behind the endpoints, called from the worker threads. Segreteria's
+    in-memory state is not thread-safe, so lookups and writes on it hold `lock`;
+    streaming reads go straight to the database and don't.
+    """
+    def __init__(self, secretario: Segreteria):
+        self.secretario = secretario
+        self.lock = threading.Lock()
+        self.feeds = FeedCache(secretario.db_manager)
+
+    def save_warm_start(self):
+        with self.lock:
+            return self.secretario.save_warm_start()
+
+    def reload(self):
+        with self.lock:
+            self.secretario.load_data()
+            return {"students": len(self.secretario.all_students), "courses": len(self.secretario.all_courses),
+                    "classrooms": len(self.secretario.all_aule)}
+
+    def add_students(self, items):
+        def check(item):
+            name, last_name, dob = _require(item, "name", "last_name", "date_of_birth")
+            return str(name), str(last_name), _iso_date(dob, "date_of_birth")
+        rows, errors = _validate(items, check)
+        with self.lock:
+            new_alunni = self.secretario.add_students(rows) if rows else []
+            if rows and not new_alunni:
+                raise ApiError(500, "students could not be saved")
+            # Saved anyway (the caller decides): the new records that look like students already there, or each other
+            duplicates = [{"id": a.id, "looks_like": [other.id for other, _ in self.secretario.find_duplicates(
+                              a.name, a.last_name, a.date_of_birth, exclude=a)]} for a in new_alunni]
+        return {"accepted": len(new_alunni), "ids": [a.id for a in new_alunni],
+                "possible_duplicates": [d for d in duplicates if d["looks_like"]], "errors": errors}
+
+    def enroll(self, items):
+        with self.lock:
+            students = {a.id: a for a in self.secretario.all_students}
+            courses_by_id = {c.id: c for c in self.secretario.all_courses}
+            courses = self.secretario.course_options()
+            def check(item):
+                alunno = students.get(_int_id(_require(item, "student_id")[0], "student_id"))
+                if "course_id" in item:
+                    corso = courses_by_id.get(_int_id(item["course_id"], "course_id"))
+                else:
+                    corso = courses.get(_require(item, "nome_corso")[0])
+                if alunno is None or corso is None:
+                    raise ItemError("unknown student" if alunno is None else "unknown course")
+                return corso, alunno
+            pairs, errors = _validate(items, check)
+            # Over a course's seats the students are waitlisted, not enrolled
+            enrolled, waitlisted = self.secretario.reserve_seats(pairs) or ([], [])
+        return {"accepted": len(pairs), "new": len(enrolled), "waitlisted": len(waitlisted), "errors": errors}
+
+    def record_attendance(self, items):
+        with self.lock:
+            student_ids = {a.id for a in self.secretario.all_students}
+            course_ids = {c.id for c in self.secretario.all_courses}
+        def check(item):
+            student_id, course_id, date, status = _require(item, "student_id", "course_id", "date", "status")
+            student_id, course_id = _int_id(student_id, "student_id"), _int_id(course_id, "course_id")
+            if student_id not in student_ids or course_id not in course_ids:
+                raise ItemError("unknown student" if student_id not in student_ids else "unknown course")
+            if status not in ATTENDANCE_STATUSES:
+                raise ItemError(f"invalid status '{status}', expected one of {', '.join(ATTENDANCE_STATUSES)}")
+            return student_id, course_id, _iso_date(date, "date"), status
+        rows, errors = _validate(items, check)
+        if rows and not self.secretario.db_manager.record_attendance_many(rows):
+            raise ApiError(500, "attendance could not be saved")
+        return {"accepted": len(rows), "errors": errors}
+
+    def schedule(self, items):
+        with self.lock:
+            aule = self.secretario.aula_options()
+            courses = self.secretario.course_options()
+            def check(item):
+                nome_aula, nome_corso, time_slot = _require(item, "nome_aula", "nome_corso", "time_slot")
+                aula, corso = aule.get(nome_aula), courses.get(nome_corso)
+                if aula is None or corso is None:
+                    raise ItemError(f"unknown classroom '{nome_aula}'" if aula is None else f"unknown course '{nome_corso}'")
+                return aula, corso, str(time_slot)
+            entries, errors = _validate(items, check)
+            self.secretario.schedule_many(entries)
+        return {"accepted": len(entries), "errors": errors}
+
+    def courses(self):
+        with self.lock:
+            seats = self.secretario.course_seats()
+            return [{"id": c.id, "nome_corso": c.nome_corso, "durata": c.durata, "docente": c.docente,
+                     "student_ids": [a.id for a in c.alunni_frequentanti_il_tal_corso],
+                     "seats": seats.get(c.id, (None,))[0],
+                     "waitlist_ids": [a.id for a in self.secretario.waitlist.get(c.id, [])]} for c in self.secretario.all_courses]
+
+    def classrooms(self):
+        with self.lock:
+            return [{"id": a.id, "nome_aula": a.nome_aula, "capacita_sedie": a.capacita_sedie,
+                     "occupazione_aula": dict(a.occupazione_aula)} for a in self.secretario.all_aule]
+
+    def student_batches(self):
+        fields = ("id", "name", "last_name", "date_of_birth")
+        for rows in self.secretario.db_manager.iter_students(STREAM_BATCH_ROWS):
+            yield [dict(zip(fields, row)) for row in rows]
+
+    def attendance_batches(self, course_id=None, student_id=None, attendance_date=None, academic_year=None):
+        fields = ("id", "name", "last_name", "nome_corso", "date", "status", "student_id")
+        # Served from the report snapshot when enabled (--report-snapshot), so it never blocks roll-call writes.
+        # Archived years are read from their archive file instead
+        db_manager = self.secretario.db_manager
+        if not academic_year:
+            db_manager = db_manager.report_reader()
+        for rows in db_manager.iter_attendance(course_id, student_id, attendance_date, STREAM_BATCH_ROWS, academic_year):
+            yield [dict(zip(fields, row)) for row in rows]
+
+
+    def calendar_feed(self, kind, key):
+        return self.feeds.get(kind, key)
+
+    def change_batches(self, after, tables=None):
+        for rows in self.secretario.db_manager.iter_changes(after, STREAM_BATCH_ROWS, tables):
+            yield [change_from_row(row)._asdict() for row in rows]
+
+    def consumer_cursor(self, name):
+        return self.secretario.db_manager.consumer_cursor(name)
+
+    def commit_cursors(self, items):
+        """Items: {"consumer", "seq"}."""
+        errors = []
+        for index, item in enumerate(items):
+            try:
+                name, seq = _require(item, "consumer", "seq")
+                if not self.secretario.db_manager.commit_consumer_cursor(str(name), _int_id(seq, "seq")):
+                    raise ItemError("could not save the cursor")
+            except ItemError as e:
+                errors.append({"index": index, "error": str(e)})
+        if len(errors) < len(items):
+            self.secretario.db_manager.prune_change_log()
+        return {"accepted": len(items) - len(errors), "errors": errors}
+
+
+class ApiServer:
+    def __init__(self, service: SchoolService, workers=4, max_pending=None):
+        self.service = service
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="school-api")
+        # Jobs allowed in flight (running + queued for a worker); further requests wait on the socket
+        self.max_pending = max_pending or workers * 4
+        self.pending = None # Created in start(), on the serving loop
+        self.routes = {
+            ("GET", "/health"): self.get_health,
+            ("GET", "/courses"): self.get_courses,
+            ("GET", "/classrooms"): self.get_classrooms,
+            ("GET", "/students"): self.get_students,
+            ("GET", "/attendance"): self.get_attendance,
+            ("GET", "/changes"): self.get_changes,
+            ("GET", "/calendar.ics"): self.get_calendar,
+            ("POST", "/students"): self.post_students,
+            ("POST", "/enrollments"): self.post_enrollments,
+            ("POST", "/attendance"): self.post_attendance,
+            ("POST", "/schedule"): self.post_schedule,
+            ("POST", "/reload"): self.post_reload,
+            ("POST", "/changes/commit"): self.post_changes_commit,
+        }
+
+    async def run_in_pool(self, fn, *args):
+        async with self.pending:
+            return await asyncio.get_running_loop().run_in_executor(self.executor, fn, *args)
+
+    # --- Handlers: return (status, payload) or an iterator of NDJSON batches ---
+    async def get_health(self, request):
+        return 200, {"status": "ok"}
+
+    async def get_courses(self, request):
+        return 200, await self.run_in_pool(self.service.courses)
+
+    async def get_classrooms(self, request):
+        return 200, await self.run_in_pool(self.service.classrooms)
+
+    async def get_students(self, request):
+        return self.service.student_batches()
+
+    async def get_attendance(self, request):
+        query = request["query"]
+        try:
+            course_id = int(query["course_id"]) if query.get("course_id") else None
+            student_id = int(query["student_id"]) if query.get("student_id") else None
+        except ValueError:
+            raise ApiError(400, "course_id and student_id must be integers")
+        date = _iso_date(query["date"], "date") if query.get("date") else None
+        academic_year = query.get("academic_year") or None
+        if academic_year:
+            try:
+                academic_year_bounds(academic_year)
+            except ValueError as e:
+                raise ApiError(400, str(e))
+        return self.service.attendance_batches(course_id, student_id, date, academic_year)
+
+    async def get_changes(self, request):
+        query = request["query"]
+        if query.get("consumer"):
+            after = await self.run_in_pool(self.service.consumer_cursor, query["consumer"])
+        else:
+            try:
+                after = int(query.get("after", 0))
+            except ValueError:
+                raise ApiError(400, "after must be an integer")
+        tables = [table for table in query.get("tables", "").split(",") if table] or None
+        return self.service.change_batches(after or 0, tables)
+
+    async def get_calendar(self, request):
+        query = request["query"]
+        try:
+            if query.get("student_id"):
+                kind, key = "student", int(query["student_id"])
+            elif query.get("classroom_id"):
+                kind, key = "room", int(query["classroom_id"])
+            elif query.get("teacher"):
+                kind, key = "teacher", query["teacher"]
+            else:
+                raise ApiError(400, "one of student_id, teacher, classroom_id is required")
+        except ValueError:
+            raise ApiError(400, "student_id and classroom_id must be integers")
+        feed = await self.run_in_pool(self.service.calendar_feed, kind, key)
+        if feed is None:
+            raise ApiError(404, f"no {kind} '{key}'")
+        headers = [f"ETag: {feed.etag}", "Cache-Control: no-cache"]
+        if etag_matches(request["headers"].get("if-none-match"), feed.etag):
+            return RawResponse(304, "text/calendar; charset=utf-8", b"", headers)
+        return RawResponse(200, "text/calendar; charset=utf-8", feed.body, headers)
+
+    async def post_students(self, request):
+        return 200, await self.run_in_pool(self.service.add_students, request["items"])
+
+    async def post_enrollments(self, request):
+        return 200, await self.run_in_pool(self.service.enroll, request["items"])
+
+    async def post_attendance(self, request):
+        return 200, await self.run_in_pool(self.service.record_attendance, request["items"])
+
+    async def post_schedule(self, request):
+        return 200, await self.run_in_pool(self.service.schedule, request["items"])
+
+    async def post_reload(self, request):
+        return 200, await self.run_in_pool(self.service.reload)
+
+    async def post_changes_commit(self, request):
+        return 200, await self.run_in_pool(self.service.commit_cursors, request["items"])
+
+    # --- HTTP/1.1 plumbing ---
+    async def handle_connection(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line.strip():
+                    break
+                method, target, version = request_line.decode("latin-1").split()
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    key, _, value = line.decode("latin-1").partition(":")
+                    headers[key.strip().lower()] = value.strip()
+                length = int(headers.get("content-length", 0))
+                if length > MAX_BODY_BYTES:
+                    await self.send_json(writer, 413, {"error": "request body too large"}, keep_alive=False)
+                    break
+                body = await reader.readexactly(length) if length else b""
+                keep_alive = version == "HTTP/1.1" and headers.get("connection", "").lower() != "close"
+                await self.dispatch(method, target, headers, body, writer, keep_alive)
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass # Malformed request or client gone: drop the connection
+        finally:
+            writer.close()
+
+    async def dispatch(self, method, target, headers, body, writer, keep_alive):
+        url = urlsplit(target)
+        handler = self.routes.get((method, url.path))
+        try:
+            if handler is None:
+                allowed = any(path == url.path for _, path in self.routes)
+                raise ApiError(405 if allowed else 404, f"{method} {url.path} not supported")
+            request = {"query": {k: v[0] for k, v in parse_qs(url.query).items()}, "headers": headers}
+            if method == "POST" and url.path != "/reload":
+                request["items"] = _parse_items(body, headers.get("content-type", ""))
+            result = await handler(request)
+        except (ApiError, ItemError) as e:
+            await self.send_json(writer, getattr(e, "status", 400), {"error": str(e)}, keep_alive)
+            return
+        except Exception as e: # Never let one request take the server down
+            await self.send_json(writer, 500, {"error": f"{type(e).__name__}: {e}"}, keep_alive)
+            return
+        if isinstance(result, RawResponse):
+            await self.send_raw(writer, result, keep_alive)
+        elif isinstance(result, tuple):
+            await self.send_json(writer, *result, keep_alive)
+        else:
+            await self.send_ndjson(writer, result, keep_alive)
+
+    async def send_json(self, writer, status, payload, keep_alive):
+        body = json.dumps(payload).encode("utf-8")
+        writer.write(self._head(status, "application/json", keep_alive, f"Content-Length: {len(body)}") + body)
+        await writer.drain()
+
+    async def send_raw(self, writer, response, keep_alive):
+        # A 304 has no body, and no Content-Length that would describe a different one
+        length = [] if response.status == 304 else [f"Content-Length: {len(response.body)}"]
+        writer.write(self._head(response.status, response.content_type, keep_alive, *length, *response.headers) + response.body)
+        await writer.drain()
+
+    async def send_ndjson(self, writer, batches, keep_alive):
+        """Chunked NDJSON: each batch of rows is pulled from the DB by a worker and sent as one chunk."""
+        writer.write(self._head(200, "application/x-ndjson", keep_alive, "Transfer-Encoding: chunked"))
+        done = object()
+        try:
+            while True:
+                batch = await self.run_in_pool(next, batches, done)
+                if batch is done:
+                    break
+                chunk = "".join(json.dumps(row) + "\n" for row in batch).encode("utf-8")
+                writer.write(b"%x\r\n%s\r\n" % (len(chunk), chunk))
+                await writer.drain() # Slow clients slow the cursor down instead of filling memory
+            writer.write(b"0\r\n\r\n")
+            await writer.drain()
+        finally:
+            batches.close()
+
+    @staticmethod
+    def _head(status, content_type, keep_alive, *headers):
+        lines = "".join(f"{header}\r\n" for header in headers)
+        return (f"HTTP/1.1 {status} {REASONS.get(status, '')}\r\n"
+                f"Content-Type: {content_type}\r\n{lines}"
+                f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n").encode("latin-1")
+
+    async def start(self, host="127.0.0.1", port=8765):
+        self.pending = asyncio.Semaphore(self.max_pending)
+        return await asyncio.start_server(self.handle_connection, host, port, limit=2 ** 20)
+
+    def close(self):
+        self.executor.shutdown(wait=True)
+        # Once at shutdown rather than after every write: pickling the state would hold the lock
+        self.service.save_warm_start()
+
+
+def create_server(db_name="school_data.db", workers=4, report_snapshot=0):
+    """
+    Builds the service on a fresh Segreteria loaded from `db_name` (or its warm-start snapshot). With `report_snapshot` > 0,
+    attendance streaming reads a copy of the database refreshed every that many seconds.
+    """
+    db_manager = DatabaseManager(db_name, on_error=lambda message: print(f"❌ {message}", file=sys.stderr))
+    if report_snapshot > 0:
+        db_manager.enable_report_snapshot(report_snapshot)
+    secretario = Segreteria("Ivan", "Rossi", "1980-05-15", db_manager=db_manager, warm_start=warm_start_path(db_name))
+    secretario.load_data()
+    return ApiServer(SchoolService(secretario), workers=workers)
+
+async def serve(api, host, port):
+    server = await api.start(host, port)
+    addresses = ", ".join(f"http://{sock.getsockname()[0]}:{sock.getsockname()[1]}" for sock in server.sockets)
+    print(f"✅ School API listening on {addresses}")
+    async with server:
+        await server.serve_forever()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="HTTP/JSON API over the school database.")
+    parser.add_argument('--db', default="school_data.db", help="SQLite database (default: %(default)s)")
+    parser.add_argument('--host', default="127.0.0.1", help="Address to bind (default: %(default)s)")
+    parser.add_argument('--port', type=int, default=8765, help="Port (default: %(default)s)")
+    parser.add_argument('--workers', type=int, default=4, help="DB worker threads (default: %(default)s)")
+    parser.add_argument('--report-snapshot', type=int, default=0, metavar='SECONDS',
+                        help="Stream attendance from a snapshot refreshed every SECONDS (default: off, live reads)")
+    args = parser.parse_args(argv)
+
+    api = create_server(args.db, args.workers, args.report_snapshot)
+    try:
+        asyncio.run(serve(api, args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        api.close()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
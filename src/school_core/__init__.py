@@ -0,0 +1,34 @@
+"""
+Headless core of the school administration tools.
+
+Database access, domain model, scheduling, analytics and report rendering with no
+UI dependency: the Streamlit app, the CLI and scripts all build on this package.
+Submodules are imported lazily, so `import school_core` stays cheap and NumPy is
+only loaded by the modules that need it (room_analytics, room_optimizer).
+"""
+import importlib
+
+_EXPORTS = {
+    "DatabaseManager": "db",
+    "Segreteria": "segreteria",
+    "Persona": "models",
+    "Alunni": "models",
+    "Corso": "models",
+    "Aula": "models",
+    "UtilitySuite": "models",
+    "TimeSlot": "time_slots",
+    "parse_time_slot": "time_slots",
+    "WEEKDAY_NAMES": "time_slots",
+    "ScheduleIndex": "schedule_index",
+    "ShardRouter": "sharding",
+}
+
+__all__ = sorted(_EXPORTS)
+
+def __getattr__(name):
+    module_name = _EXPORTS.get(name)
+    if module_name is None:
+        raise AttributeError(f"module 'school_core' has no attribute '{name}'")
+    value = getattr(importlib.import_module(f".{module_name}", __name__), name)
+    globals()[name] = value
+    return value
@@ -0,0 +1,32 @@
+"""
+Academic years as labels ('2024-2025'): September 1st to August 31st, so that
+summer courses belong to the year that just ended. The single definition used by
+archiving, enrollments, feeds and the room analytics (which stop at the end of
+lessons, LESSONS_END).
+"""
+import datetime
+import re
+
+LABEL = re.compile(r"^(\d{4})-(\d{4})$")
+# (month, day) of the last day of lessons, before the summer
+LESSONS_END = (6, 30)
+
+def academic_year_of(date=None):
+    """Label of the academic year containing `date` (default: today). Accepts ISO strings."""
+    date = date or datetime.date.today()
+    if isinstance(date, str):
+        date = datetime.date.fromisoformat(date)
+    first_year = date.year if date.month >= 9 else date.year - 1
+    return f"{first_year}-{first_year + 1}"
+
+def academic_year_bounds(label, lessons_only=False):
+    """
+    (first day, last day) of academic year `label`; with `lessons_only` the last day is the end of
+    lessons (LESSONS_END) instead of August 31st. Raises ValueError for malformed labels.
+    """
+    match = LABEL.match(label or "")
+    if not match or int(match.group(2)) != int(match.group(1)) + 1:
+        raise ValueError(f"Invalid academic year '{label}': use e.g. '2024-2025'.")
+    first_year = int(match.group(1))
+    last_month, last_day = LESSONS_END if lessons_only else (8, 31)
+    return datetime.date(first_year, 9, 1), datetime.date(first_year + 1, last_month, last_day)
@@ -0,0 +1,195 @@
+"""
+Compact in-memory attendance store, next to the `attendance` table.
+
+For every (course, status) there is one bitmap per day: a Python int whose bit i is
+set when the i-th known student had that status on that day. A class of 30 students
+costs a few bytes per day and status instead of one TEXT row per student, and set
+questions become integer operations:
+
+    b = db_manager.attendance_bitmaps()
+    days = [datetime.date(2025, 10, d) for d in (6, 7, 8)]
+    absent_all_three = b.all_days(course_id, "Absent", days)
+    present_a_not_b = b.any_day(course_a, "Present", days) & ~b.any_day(course_b, "Present", days)
+    b.student_ids(present_a_not_b)
+
+DatabaseManager.attendance_bitmaps() builds it from the table and brings it up to
+date from the change log on every call, whichever process or connection wrote.
+"""
+import datetime
+import sys
+import threading
+
+from .models import ATTENDANCE_STATUSES
+
+def _ordinal(day):
+    if isinstance(day, str):
+        day = datetime.date.fromisoformat(day)
+    return day.toordinal()
+
+def _bit_positions(bitmap):
+    """Indexes of the set bits, lowest first."""
+    positions = []
+    while bitmap:
+        low = bitmap & -bitmap
+        positions.append(low.bit_length() - 1)
+        bitmap ^= low
+    return positions
+
+def popcount(bitmap):
+    return bin(bitmap).count("1")
+
+class AttendanceBitmaps:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._student_bit = {} # student_id -> bit position
+        self._bit_student = [] # bit position -> student_id
+        # (course_id, status) -> { day ordinal: bitmap of students }
+        self._days = {}
+
+    def _bit(self, student_id):
+        bit = self._student_bit.get(student_id)
+        if bit is None:
+            bit = self._student_bit[student_id] = len(self._bit_student)
+            self._bit_student.append(student_id)
+        return bit
+
+    # --- Writes (replayed from the change log) ---
+    def _clear(self, course_id, day, mask):
+        for status in ATTENDANCE_STATUSES:
+            days = self._days.get((course_id, status))
+            if days and days.get(day, 0) & mask:
+                days[day] &= ~mask
+                if not days[day]:
+                    del days[day]
+
+    def record_many(self, rows):
+        """(student_id, course_id, attendance_date, status) rows: the same semantics as INSERT OR REPLACE."""
+        with self._lock:
+            for student_id, course_id, attendance_date, status in rows:
+                mask = 1 << self._bit(student_id)
+                day = _ordinal(attendance_date)
+                self._clear(course_id, day, mask) # One status per student, course and day
+                days = self._days.setdefault((course_id, status), {})
+                days[day] = days.get(day, 0) | mask
+
+    def record(self, student_id, course_id, attendance_date, status):
+        self.record_many([(student_id, course_id, attendance_date, status)])
+
+    def forget_many(self, rows):
+        """(student_id, course_id, attendance_date) of deleted records."""
+        with self._lock:
+            for student_id, course_id, attendance_date in rows:
+                bit = self._student_bit.get(student_id)
+                if bit is not None:
+                    self._clear(course_id, _ordinal(attendance_date), 1 << bit)
+
+    def discard(self, student_ids=(), course_ids=()):
+        """Forgets deleted students (their bits are cleared, the positions stay allocated) and courses."""
+        with self._lock:
+            for course_id in course_ids:
+                for status in ATTENDANCE_STATUSES:
+                    self._days.pop((course_id, status), None)
+            mask = self.student_mask(student_ids)
+            if mask:
+                for days in self._days.values():
+                    for day in [day for day, bitmap in days.items() if bitmap & mask]:
+                        days[day] &= ~mask
+                        if not days[day]:
+                            del days[day]
+
+    # --- Set queries: results are student bitmaps, combine them with & | ~ ---
+    def students(self, course_id, status, day):
+        """Bitmap of the students with `status` in `course_id` on `day`."""
+        return self._days.get((course_id, status), {}).get(_ordinal(day), 0)
+
+    def all_days(self, course_id, status, days):
+        """Students with `status` on every one of `days`."""
+        days = list(days)
+        if not days:
+            return 0
+        result = -1
+        for day in days:
+            result &= self.students(course_id, status, day)
+            if not result:
+                break
+        return result
+
+    def any_day(self, course_id, status, days):
+        """Students with `status` on at least one of `days`."""
+        result = 0
+        for day in days:
+            result |= self.students(course_id, status, day)
+        return result
+
+    def in_range(self, course_id, status, start, end):
+        """Students with `status` at least once between `start` and `end` (inclusive)."""
+        first, last = _ordinal(start), _ordinal(end)
+        result = 0
+        with self._lock:
+            for day, bitmap in self._days.get((course_id, status), {}).items():
+                if first <= day <= last:
+                    result |= bitmap
+        return result
+
+    def student_ids(self, bitmap):
+        return [self._bit_student[bit] for bit in _bit_positions(bitmap)]
+
+    def student_mask(self, student_ids):
+        """Bitmap of the given students (unknown IDs are ignored)."""
+        mask = 0
+        for student_id in student_ids:
+            bit = self._student_bit.get(student_id)
+            if bit is not None:
+                mask |= 1 << bit
+        return mask
+
+    # --- Range analytics ---
+    def count_by_student(self, course_id, status, start=None, end=None):
+        """{ student_id: days with `status` } in the date range (whole history by default)."""
+        first = _ordinal(start) if start else 0
+        last = _ordinal(end) if end else sys.maxsize
+        counts = {}
+        with self._lock:
+            bitmaps = [bitmap for day, bitmap in self._days.get((course_id, status), {}).items() if first <= day <= last]
+        for bitmap in bitmaps:
+            for bit in _bit_positions(bitmap):
+                counts[bit] = counts.get(bit, 0) + 1
+        return {self._bit_student[bit]: count for bit, count in counts.items()}
+
+    def daily_counts(self, course_id, status, start, end):
+        """[(date, number of students with `status`)] for every day in the range that has records."""
+        first, last = _ordinal(start), _ordinal(end)
+        with self._lock:
+            days = list(self._days.get((course_id, status), {}).items())
+        return sorted((datetime.date.fromordinal(day), popcount(bitmap)) for day, bitmap in days if first <= day <= last)
+
+    def fetch(self, course_id=None, student_id=None, attendance_date=None):
+        """
+        Same filters as DatabaseManager.fetch_attendance, answered from the bitmaps.
+        Returns (student_id, course_id, attendance_date, status) rows, sorted.
+        """
+        day = _ordinal(attendance_date) if attendance_date else None
+        mask = self.student_mask([student_id]) if student_id else -1
+        if not mask:
+            return []
+        with self._lock:
+            selected = [((c_id, status), [(day, days.get(day, 0))] if day is not None else list(days.items()))
+                        for (c_id, status), days in self._days.items() if not course_id or c_id == course_id]
+        rows = []
+        for (c_id, status), items in selected:
+            for ordinal, bitmap in items:
+                bitmap &= mask
+                if bitmap:
+                    date = datetime.date.fromordinal(ordinal).isoformat()
+                    rows.extend((self._bit_student[bit], c_id, date, status) for bit in _bit_positions(bitmap))
+        rows.sort(key=lambda row: (row[2], row[1], row[0]))
+        return rows
+
+    def nbytes(self):
+        """Approximate memory footprint of the bitmaps and the student index."""
+        with self._lock:
+            total = sys.getsizeof(self._days) + sys.getsizeof(self._student_bit) + sys.getsizeof(self._bit_student)
+            total += sum(sys.getsizeof(student_id) + sys.getsizeof(bit) for student_id, bit in self._student_bit.items())
+            for days in self._days.values():
+                total += sys.getsizeof(days) + sum(sys.getsizeof(day) + sys.getsizeof(bitmap) for day, bitmap in days.items())
+        return total
@@ -0,0 +1,71 @@
+"""
+Incremental exports from the change log.
+
+Triggers on the school tables append every insert, update and delete to
+`change_log` with a growing sequence number (see DatabaseManager._create_tables).
+A consumer (an export to the LMS, a reporting copy...) keeps a named cursor in
+`change_consumers` and reads only the entries after it, so each run costs
+O(changes since the last run) instead of a full export.
+
+    consumer = ChangeConsumer(db_manager, "lms-export")
+    consumer.consume(lambda changes: send_to_lms(changes))
+
+Archiving an academic year (DatabaseManager.archive_academic_year) is logged as a
+single entry with table '*' and operation 'ARCHIVE' instead of one DELETE per row.
+
+Entries every registered consumer has committed are deleted after each consume()
+and archive (DatabaseManager.prune_change_log): a consumer that stops running holds
+the log back until it's removed from `change_consumers`.
+
+Delivery is at-least-once: the cursor is committed after the handler returns, so a
+crash in between replays that batch. Entries carry whole rows, so replaying is safe
+for consumers that upsert by `table` + `row_id`.
+"""
+import collections
+import json
+
+Change = collections.namedtuple("Change", ["seq", "table", "operation", "row_id", "data", "changed_at"])
+
+def change_from_row(row):
+    """Row of DatabaseManager.fetch_changes -> Change, with `data` decoded."""
+    seq, table, operation, row_id, data, changed_at = row
+    return Change(seq, table, operation, row_id, json.loads(data), changed_at)
+
+class ChangeConsumer:
+    def __init__(self, db_manager, name, tables=None, batch_size=1000):
+        self.db_manager = db_manager
+        self.name = name
+        self.tables = tuple(tables) if tables else None
+        self.batch_size = batch_size
+
+    @property
+    def cursor(self):
+        """Last committed seq."""
+        return self.db_manager.consumer_cursor(self.name) or 0
+
+    def lag(self):
+        """Changes in the log this consumer hasn't committed yet (all tables)."""
+        return (self.db_manager.last_change_seq() or 0) - self.cursor
+
+    def batches(self, after=None):
+        """Lists of Change after the committed cursor (or `after`). Nothing is committed."""
+        after = self.cursor if after is None else after
+        for rows in self.db_manager.iter_changes(after, self.batch_size, self.tables):
+            yield [change_from_row(row) for row in rows]
+
+    def commit(self, seq):
+        return self.db_manager.commit_consumer_cursor(self.name, seq)
+
+    def consume(self, handler):
+        """
+        Calls handler(batch) for every pending batch, committing the cursor after each one, then prunes
+        the entries every consumer has committed. Returns the count.
+        """
+        count = 0
+        for batch in self.batches():
+            handler(batch)
+            self.commit(batch[-1].seq)
+            count += len(batch)
+        if count:
+            self.db_manager.prune_change_log()
+        return count
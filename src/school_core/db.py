@@ -0,0 +1,1714 @@
+"""
+SQLite persistence for the school data.
+
+No UI code in here: errors are passed to the `on_error` / `on_warning` callbacks
+(logging by default); the Streamlit app passes `st.error` / `st.warning`.
+"""
+import contextlib
+import datetime
+import itertools
+import json
+import logging
+import os
+import pathlib
+import sqlite3
+import threading
+
+from .academic_year import LABEL, academic_year_bounds, academic_year_of
+from .changes import change_from_row
+
+logger = logging.getLogger("school_core")
+
+class DatabaseManager:
+    # Tables each read query depends on: cached results are keyed by their write versions
+    READ_DEPENDENCIES = {
+        "fetch_students": ("students",),
+        "fetch_courses": ("courses", "course_students", "students"),
+        "fetch_classrooms": ("classrooms", "classroom_slots", "courses"),
+        "fetch_classroom_slots": ("classroom_slots",),
+        "fetch_attendance": ("attendance", "students", "courses"),
+        "fetch_schedule_rules": ("schedule_rules",),
+        "fetch_waitlist": ("course_waitlist",),
+        "fetch_course_seats": ("courses", "classrooms", "classroom_slots", "schedule_rules", "course_students", "course_waitlist"),
+        "fetch_assessments": ("assessments",),
+        "fetch_scores": ("scores",),
+        "fetch_transcript": ("assessments", "scores", "courses", "course_students"),
+        "iter_score_records": ("assessments", "scores", "students"),
+    }
+    # Tables whose writes are recorded in change_log by triggers, with the columns copied into each entry
+    CHANGE_LOG_TABLES = {
+        "students": ("id", "name", "last_name", "date_of_birth", "inactive_since"),
+        "courses": ("id", "nome_corso", "durata", "docente", "inactive_since"),
+        "classrooms": ("id", "nome_aula", "capacita_sedie", "inactive_since"),
+        "classroom_slots": ("classroom_id", "time_slot", "course_id"),
+        "course_students": ("course_id", "student_id", "academic_year"),
+        "attendance": ("id", "student_id", "course_id", "attendance_date", "status"),
+        "schedule_rules": ("id", "classroom_id", "course_id", "weekday", "start_time", "end_time",
+                           "start_date", "end_date", "interval_weeks", "exceptions"),
+        "course_waitlist": ("id", "course_id", "student_id", "academic_year", "requested_at"),
+        "assessments": ("id", "course_id", "name", "weight", "max_score", "assessment_date", "academic_year"),
+        "scores": ("assessment_id", "student_id", "score"),
+    }
+    # Seconds a connection waits for another one's write to finish before "database is locked"
+    BUSY_TIMEOUT = 30
+
+    def __init__(self, db_name="school_data.db", on_error=None, on_warning=None, read_only=False):
+        self.db_name = db_name
+        self.read_only = read_only # Report snapshots: no schema setup, writes fail
+        # Failed operations keep returning None/[]/False; the message goes to these callbacks
+        self.on_error = on_error or logger.error
+        self.on_warning = on_warning or logger.warning
+        # One instance may be shared by many threads (Streamlit sessions, API workers): connections are per thread
+        self._local = threading.local()
+        self._versions_lock = threading.Lock()
+        self.table_versions = {table: 0 for tables in self.READ_DEPENDENCIES.values() for table in tables}
+        # Called with the (student_id, course_id, attendance_date, status) rows of every committed attendance write
+        self.attendance_listeners = []
+        self._attendance_bitmaps = None
+        self._bitmaps_seq = 0 # Change-log position the bitmaps are up to date with
+        self._bitmaps_lock = threading.Lock()
+        self.report_snapshot = None # See enable_report_snapshot()
+        self._snapshot_lock = threading.Lock()
+        self._connect()
+        if not read_only:
+            self._create_tables()
+
+    @property
+    def conn(self):
+        return getattr(self._local, "conn", None)
+
+    @conn.setter
+    def conn(self, value):
+        self._local.conn = value
+
+    @property
+    def cursor(self):
+        return getattr(self._local, "cursor", None)
+
+    @cursor.setter
+    def cursor(self, value):
+        self._local.cursor = value
+
+    def _bump_version(self, *tables):
+        """Called after every committed write so that cached reads of these tables are invalidated."""
+        with self._versions_lock:
+            for table in tables:
+                self.table_versions[table] = self.table_versions.get(table, 0) + 1
+
+    def data_version(self, method_name):
+        """
+        Write versions of the tables a read method depends on (part of its cache key): this
+        process's own counters plus the change log heads, which also move on other processes' writes.
+        """
+        tables = self.READ_DEPENDENCIES[method_name]
+        with self._versions_lock:
+            local = tuple(self.table_versions[table] for table in tables)
+        return local + self._change_log_heads(tables)
+
+    def _change_log_heads(self, tables):
+        """Latest change_log seq of these tables and of archive summaries, on a connection of its own."""
+        try:
+            with contextlib.closing(self._open()) as conn:
+                heads = dict(conn.execute(f"SELECT table_name, seq FROM change_log_heads WHERE table_name IN ({self._IDS})",
+                                          (json.dumps([*tables, "*"]),)))
+        except sqlite3.Error:
+            return () # Snapshot taken before the change log existed: local versions only
+        return tuple(heads.get(table, 0) for table in (*tables, "*"))
+
+    def _open(self):
+        if self.read_only:
+            return sqlite3.connect(pathlib.Path(self.db_name).absolute().as_uri() + "?mode=ro", uri=True,
+                                   timeout=self.BUSY_TIMEOUT, check_same_thread=False)
+        conn = sqlite3.connect(self.db_name, timeout=self.BUSY_TIMEOUT, check_same_thread=False)
+        # Off by default in SQLite: without it the ON DELETE CASCADE clauses below do nothing
+        conn.execute("PRAGMA foreign_keys = ON")
+        return conn
+
+    def _connect(self):
+        try:
+            self.conn = self._open()
+            self.cursor = self.conn.cursor()
+            # print(f"Connected to database: {self.db_name}") # For debugging
+        except sqlite3.Error as e:
+            self.on_error(f"Database connection error: {e}")
+
+    def _close(self):
+        if self.conn:
+            self.conn.close()
+            # print("Database connection closed.") # For debugging
+
+    def _create_tables(self):
+        self._connect() # Ensure connection is open
+        try:
+            # Stored in the file, so every connection gets it: with WAL, readers (streaming reads included)
+            # and the writer don't block each other, writers only wait for one another
+            self.cursor.execute("PRAGMA journal_mode = WAL")
+            self.cursor.execute('''
+                CREATE TABLE IF NOT EXISTS students (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    name TEXT NOT NULL,
+                    last_name TEXT NOT NULL,
+                    date_of_birth TEXT NOT NULL
+                )
+            ''')
+            self.cursor.execute('''
+                CREATE TABLE IF NOT EXISTS courses (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    nome_corso TEXT NOT NULL UNIQUE,
+                    durata TEXT NOT NULL,
+                    docente TEXT NOT NULL
+                )
+            ''')
+            self.cursor.execute('''
+                CREATE TABLE IF NOT EXISTS classrooms (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    nome_aula TEXT NOT NULL UNIQUE,
+                    capacita_sedie INTEGER NOT NULL,
+                    occupazione_aula TEXT -- Legacy JSON schedule by course name, moved to classroom_slots (see below)
+                )
+            ''')
+            self.cursor.execute('''
+                CREATE TABLE IF NOT EXISTS course_students (
+                    course_id INTEGER,
+                    student_id INTEGER,
+                    academic_year TEXT, -- '2024-2025': closed years are moved to archive files
+                    PRIMARY KEY (course_id, student_id),
+                    FOREIGN KEY (course_id) REFERENCES courses(id) ON DELETE CASCADE,
+                    FOREIGN KEY (student_id) REFERENCES students(id) ON DELETE CASCADE
+                )
+            ''')
+            # Databases created before academic years: their enrollments count as the current year
+            self.cursor.execute("PRAGMA table_info(course_students)")
+            if "academic_year" not in [row[1] for row in self.cursor.fetchall()]:
+                self.cursor.execute("ALTER TABLE course_students ADD COLUMN academic_year TEXT")
+                self.cursor.execute("UPDATE course_students SET academic_year = ?", (academic_year_of(),))
+            # Graduated students, closed courses and classrooms out of service keep their rows (history) with a date here
+            for table in ("students", "courses", "classrooms"):
+                self.cursor.execute(f"PRAGMA table_info({table})")
+                if "inactive_since" not in [row[1] for row in self.cursor.fetchall()]:
+                    self.cursor.execute(f"ALTER TABLE {table} ADD COLUMN inactive_since TEXT")
+            # Classroom schedules, one row per slot, by id: renaming a course or a room is a one-row update
+            self.cursor.execute('''
+                CREATE TABLE IF NOT EXISTS classroom_slots (
+                    classroom_id INTEGER NOT NULL,
+                    time_slot TEXT NOT NULL, -- free text, e.g. 'Monday 09:00 - 11:00'
+                    course_id INTEGER NOT NULL,
+                    PRIMARY KEY (classroom_id, time_slot),
+                    FOREIGN KEY (classroom_id) REFERENCES classrooms(id) ON DELETE CASCADE,
+                    FOREIGN KEY (course_id) REFERENCES courses(id) ON DELETE CASCADE
+                )
+            ''')
+            self.cursor.execute("CREATE INDEX IF NOT EXISTS idx_classroom_slots_course ON classroom_slots (course_id)")
+            # Schedules still stored the old way (JSON of course names) are moved over, once
+            self.cursor.execute('''
+                SELECT COUNT(*) FROM classrooms a, json_each(a.occupazione_aula) slot
+                WHERE NOT EXISTS (SELECT 1 FROM courses c WHERE c.nome_corso = slot.value)
+            ''')
+            unknown = self.cursor.fetchone()[0]
+            if unknown:
+                self.on_warning(f"{unknown} schedule slot(s) name a course that doesn't exist and were dropped.")
+            self.cursor.execute('''
+                INSERT OR IGNORE INTO classroom_slots (classroom_id, time_slot, course_id)
+                SELECT a.id, slot.key, c.id FROM classrooms a, json_each(a.occupazione_aula) slot
+                JOIN courses c ON c.nome_corso = slot.value
+            ''')
+            self.cursor.execute("UPDATE classrooms SET occupazione_aula = NULL WHERE occupazione_aula IS NOT NULL")
+            # New table for attendance
+            self.cursor.execute('''
+                CREATE TABLE IF NOT EXISTS attendance (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    student_id INTEGER NOT NULL,
+                    course_id INTEGER NOT NULL,
+                    attendance_date TEXT NOT NULL,
+                    status TEXT NOT NULL, -- e.g., 'Present', 'Absent', 'Late', 'Excused'
+                    FOREIGN KEY (student_id) REFERENCES students(id) ON DELETE CASCADE,
+                    FOREIGN KEY (course_id) REFERENCES courses(id) ON DELETE CASCADE,
+                    UNIQUE(student_id, course_id, attendance_date) -- Ensure only one entry per student, course, and date
+                )
+            ''')
+            # Date windows (early warning, reports): without it every one of them scans the whole table
+            self.cursor.execute("CREATE INDEX IF NOT EXISTS idx_attendance_date ON attendance (attendance_date)")
+            # Recurring lessons: one row per series, occurrences are computed (see recurrence.py)
+            self.cursor.execute('''
+                CREATE TABLE IF NOT EXISTS schedule_rules (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    classroom_id INTEGER NOT NULL,
+                    course_id INTEGER NOT NULL,
+                    weekday INTEGER NOT NULL, -- 0 = Monday
+                    start_time TEXT NOT NULL, -- 'HH:MM'
+                    end_time TEXT NOT NULL,
+                    start_date TEXT NOT NULL, -- 'YYYY-MM-DD', inclusive
+                    end_date TEXT NOT NULL,
+                    interval_weeks INTEGER NOT NULL DEFAULT 1, -- 1 = weekly, 2 = every other week
+                    exceptions TEXT, -- JSON list of 'YYYY-MM-DD' dates without lesson
+                    FOREIGN KEY (classroom_id) REFERENCES classrooms(id) ON DELETE CASCADE,
+                    FOREIGN KEY (course_id) REFERENCES courses(id) ON DELETE CASCADE
+                )
+            ''')
+            # Students waiting for a seat, in arrival order (id), per course and academic year
+            self.cursor.execute('''
+                CREATE TABLE IF NOT EXISTS course_waitlist (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    course_id INTEGER NOT NULL,
+                    student_id INTEGER NOT NULL,
+                    academic_year TEXT NOT NULL,
+                    requested_at TEXT NOT NULL DEFAULT (strftime('%Y-%m-%dT%H:%M:%f', 'now')),
+                    UNIQUE (course_id, student_id, academic_year),
+                    FOREIGN KEY (course_id) REFERENCES courses(id) ON DELETE CASCADE,
+                    FOREIGN KEY (student_id) REFERENCES students(id) ON DELETE CASCADE
+                )
+            ''')
+            # Gradebook: the assessments of a course (tests, orals, projects) and the students' scores (see gradebook.py)
+            self.cursor.execute('''
+                CREATE TABLE IF NOT EXISTS assessments (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    course_id INTEGER NOT NULL,
+                    name TEXT NOT NULL,
+                    weight REAL NOT NULL DEFAULT 1 CHECK (weight >= 0), -- relative to the course's other assessments
+                    max_score REAL NOT NULL DEFAULT 10 CHECK (max_score > 0),
+                    assessment_date TEXT, -- 'YYYY-MM-DD'
+                    academic_year TEXT NOT NULL,
+                    FOREIGN KEY (course_id) REFERENCES courses(id) ON DELETE CASCADE
+                )
+            ''')
+            self.cursor.execute("CREATE INDEX IF NOT EXISTS idx_assessments_course ON assessments (course_id, academic_year)")
+            self.cursor.execute('''
+                CREATE TABLE IF NOT EXISTS scores (
+                    assessment_id INTEGER NOT NULL,
+                    student_id INTEGER NOT NULL,
+                    score REAL NOT NULL CHECK (score >= 0), -- Up to the assessment's max_score
+                    PRIMARY KEY (assessment_id, student_id),
+                    FOREIGN KEY (assessment_id) REFERENCES assessments(id) ON DELETE CASCADE,
+                    FOREIGN KEY (student_id) REFERENCES students(id) ON DELETE CASCADE
+                )
+            ''')
+            self.cursor.execute("CREATE INDEX IF NOT EXISTS idx_scores_student ON scores (student_id)")
+            # Seats of a course: the smallest classroom it is scheduled in (no row: not scheduled, no limit)
+            self.cursor.execute("DROP VIEW IF EXISTS course_seats")
+            self.cursor.execute('''
+                CREATE VIEW course_seats AS
+                SELECT course_id, MIN(capacita_sedie) AS seats FROM (
+                    SELECT s.course_id, a.capacita_sedie FROM classroom_slots s JOIN classrooms a ON a.id = s.classroom_id
+                    UNION ALL
+                    SELECT r.course_id, a.capacita_sedie FROM schedule_rules r JOIN classrooms a ON a.id = r.classroom_id
+                ) GROUP BY course_id
+            ''')
+            # Change data capture: every insert/update/delete of the tables above, in commit order.
+            # AUTOINCREMENT: seq only grows, even after old entries are pruned
+            self.cursor.execute('''
+                CREATE TABLE IF NOT EXISTS change_log (
+                    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                    table_name TEXT NOT NULL,
+                    operation TEXT NOT NULL, -- 'INSERT', 'UPDATE' or 'DELETE'
+                    row_id INTEGER NOT NULL, -- rowid of the changed row
+                    data TEXT NOT NULL, -- JSON object: the row after the change (before it, for deletes)
+                    changed_at TEXT NOT NULL DEFAULT (strftime('%Y-%m-%dT%H:%M:%f', 'now'))
+                )
+            ''')
+            # Where each named consumer of the change log got to
+            self.cursor.execute('''
+                CREATE TABLE IF NOT EXISTS change_consumers (
+                    name TEXT PRIMARY KEY,
+                    last_seq INTEGER NOT NULL DEFAULT 0,
+                    updated_at TEXT NOT NULL DEFAULT (strftime('%Y-%m-%dT%H:%M:%f', 'now'))
+                )
+            ''')
+            # Latest seq per table ('*' for archive summaries), kept by a trigger: part of every cache
+            # key, so that writes made by other processes (CLI, API) invalidate cached reads too.
+            # Unlike MAX(seq) over change_log these never go back when the log is pruned.
+            self.cursor.execute("CREATE TABLE IF NOT EXISTS change_log_heads (table_name TEXT PRIMARY KEY, seq INTEGER NOT NULL)")
+            self.cursor.execute('''
+                INSERT INTO change_log_heads (table_name, seq)
+                SELECT table_name, MAX(seq) FROM change_log
+                WHERE NOT EXISTS (SELECT 1 FROM change_log_heads) GROUP BY table_name
+            ''')
+            self.cursor.execute('''
+                CREATE TRIGGER IF NOT EXISTS change_log_heads_insert AFTER INSERT ON change_log
+                BEGIN
+                    INSERT INTO change_log_heads (table_name, seq) VALUES (NEW.table_name, NEW.seq)
+                    ON CONFLICT (table_name) DO UPDATE SET seq = excluded.seq;
+                END
+            ''')
+            # Bulk maintenance (archiving) adds a row here for the length of its transaction and logs one summary entry
+            self.cursor.execute("CREATE TABLE IF NOT EXISTS change_log_pause (reason TEXT)")
+            # Recreated every time so that their column lists follow CHANGE_LOG_TABLES
+            for table, columns in self.CHANGE_LOG_TABLES.items():
+                for operation, ref in (("INSERT", "NEW"), ("UPDATE", "NEW"), ("DELETE", "OLD")):
+                    data = ", ".join(f"'{column}', {ref}.{column}" for column in columns)
+                    self.cursor.execute(f"DROP TRIGGER IF EXISTS change_log_{table}_{operation.lower()}")
+                    self.cursor.execute(f'''
+                        CREATE TRIGGER change_log_{table}_{operation.lower()}
+                        AFTER {operation} ON {table}
+                        WHEN NOT EXISTS (SELECT 1 FROM change_log_pause)
+                        BEGIN
+                            INSERT INTO change_log (table_name, operation, row_id, data)
+                            VALUES ('{table}', '{operation}', {ref}.rowid, json_object({data}));
+                        END
+                    ''')
+            # Whatever frees seats promotes the head of the waitlist, in the same transaction
+            for name, (event, courses) in self._WAITLIST_TRIGGERS.items():
+                self.cursor.execute(f"DROP TRIGGER IF EXISTS waitlist_promote_{name}")
+                self.cursor.execute(f'''
+                    CREATE TRIGGER waitlist_promote_{name} {event}
+                    WHEN EXISTS (SELECT 1 FROM course_waitlist WHERE course_id IN {courses})
+                    BEGIN
+                        {self._PROMOTE_WAITLIST.format(courses=courses)};
+                        {self._DEQUEUE_ENROLLED.format(courses=courses)};
+                    END
+                ''')
+            self.conn.commit()
+            # print("Tables checked/created successfully.") # For debugging
+        except sqlite3.Error as e:
+            self.on_error(f"Error creating tables: {e}")
+        finally:
+            self._close()
+
+    # --- Student Operations ---
+    def insert_student(self, name, last_name, date_of_birth):
+        self._connect()
+        try:
+            self.cursor.execute('''
+                INSERT INTO students (name, last_name, date_of_birth) VALUES (?, ?, ?)
+            ''', (name, last_name, date_of_birth))
+            self.conn.commit()
+            self._bump_version("students")
+            return self.cursor.lastrowid # Return the ID of the newly inserted student
+        except sqlite3.IntegrityError as e:
+            self.on_warning(f"Student '{name} {last_name}' might already exist. Error: {e}")
+            return None
+        except sqlite3.Error as e:
+            self.on_error(f"Error inserting student: {e}")
+            return None
+        finally:
+            self._close()
+
+    def insert_students(self, rows):
+        """Inserts (name, last_name, date_of_birth) rows in a single transaction. Returns their IDs ([] on error)."""
+        self._connect()
+        try:
+            ids = []
+            with self.conn: # One commit for the whole batch, rolled back if any row fails
+                for row in rows:
+                    self.cursor.execute('INSERT INTO students (name, last_name, date_of_birth) VALUES (?, ?, ?)', row)
+                    ids.append(self.cursor.lastrowid)
+            self._bump_version("students")
+            return ids
+        except sqlite3.Error as e:
+            self.on_error(f"Error inserting students: {e}")
+            return []
+        finally:
+            self._close()
+
+    def fetch_students(self):
+        self._connect()
+        try:
+            self.cursor.execute('SELECT id, name, last_name, date_of_birth FROM students WHERE inactive_since IS NULL')
+            return self.cursor.fetchall()
+        except sqlite3.Error as e:
+            self.on_error(f"Error fetching students: {e}")
+            return []
+        finally:
+            self._close()
+
+    def update_student(self, student_id, name, last_name, date_of_birth):
+        """Edits one student in place (by id). Returns True, or False on error."""
+        self._connect()
+        try:
+            self.cursor.execute('UPDATE students SET name = ?, last_name = ?, date_of_birth = ? WHERE id = ?',
+                                (name, last_name, date_of_birth, student_id))
+            self.conn.commit()
+            self._bump_version("students")
+            return True
+        except sqlite3.Error as e:
+            self.on_error(f"Error updating student: {e}")
+            return False
+        finally:
+            self._close()
+
+    def enrollment_summary(self):
+        """Counts for district-wide reports, in one query: students, courses, enrollments, classrooms, chairs."""
+        self._connect()
+        try:
+            self.cursor.execute('''
+                SELECT (SELECT COUNT(*) FROM students WHERE inactive_since IS NULL),
+                       (SELECT COUNT(*) FROM courses WHERE inactive_since IS NULL),
+                       (SELECT COUNT(*) FROM course_students),
+                       (SELECT COUNT(*) FROM classrooms WHERE inactive_since IS NULL),
+                       (SELECT COALESCE(SUM(capacita_sedie), 0) FROM classrooms WHERE inactive_since IS NULL)
+            ''')
+            return dict(zip(("students", "courses", "enrollments", "classrooms", "chairs"), self.cursor.fetchone()))
+        except sqlite3.Error as e:
+            self.on_error(f"Error counting enrollment: {e}")
+            return None
+        finally:
+            self._close()
+
+    # --- Course Operations ---
+    def insert_course(self, nome_corso, durata, docente):
+        self._connect()
+        try:
+            self.cursor.execute('''
+                INSERT INTO courses (nome_corso, durata, docente) VALUES (?, ?, ?)
+            ''', (nome_corso, durata, docente))
+            self.conn.commit()
+            self._bump_version("courses")
+            return self.cursor.lastrowid
+        except sqlite3.IntegrityError:
+            self.on_warning(f"Course '{nome_corso}' already exists.")
+            return None
+        except sqlite3.Error as e:
+            self.on_error(f"Error inserting course: {e}")
+            return None
+        finally:
+            self._close()
+
+    def fetch_courses(self):
+        """Active courses with this academic year's roster: (id, nome_corso, durata, docente, [student rows])."""
+        self._connect()
+        try:
+            # One query: every course with its enrolled students (NULLs for a course with nobody enrolled)
+            self.cursor.execute('''
+                SELECT c.id, c.nome_corso, c.durata, c.docente, s.id, s.name, s.last_name, s.date_of_birth
+                FROM courses c
+                LEFT JOIN course_students cs ON cs.course_id = c.id AND cs.academic_year = ?
+                LEFT JOIN students s ON s.id = cs.student_id
+                WHERE c.inactive_since IS NULL
+                ORDER BY c.id
+            ''', (academic_year_of(),))
+            courses_with_students = []
+            for course, rows in itertools.groupby(self.cursor, key=lambda row: row[:4]):
+                courses_with_students.append((*course, [row[4:] for row in rows if row[4] is not None]))
+            return courses_with_students
+        except sqlite3.Error as e:
+            self.on_error(f"Error fetching courses: {e}")
+            return []
+        finally:
+            self._close()
+
+    def update_course(self, course_id, nome_corso, durata, docente):
+        """
+        Edits one course in place (by id). Schedules, enrollments and attendance point at the id,
+        so a rename is this single row. Returns True, or False on error.
+        """
+        self._connect()
+        try:
+            self.cursor.execute('UPDATE courses SET nome_corso = ?, durata = ?, docente = ? WHERE id = ?',
+                                (nome_corso, durata, docente, course_id))
+            self.conn.commit()
+            self._bump_version("courses")
+            return True
+        except sqlite3.IntegrityError:
+            self.on_warning(f"Course '{nome_corso}' already exists.")
+            return False
+        except sqlite3.Error as e:
+            self.on_error(f"Error updating course: {e}")
+            return False
+        finally:
+            self._close()
+
+    def assign_student_to_course(self, course_id, student_id):
+        """Enrolls one student within the course's seats, else waitlists them (see reserve_seats)."""
+        return self.reserve_seats([(course_id, student_id)])
+
+    def assign_students_to_courses(self, pairs):
+        """Batch version of assign_student_to_course: (course_id, student_id) pairs in one transaction."""
+        return self.reserve_seats(pairs)
+
+    # --- Seat limits and waitlist ---
+    # Waitlisted students who fit in the seats of their course (course_seats minus that year's enrollments),
+    # in queue order, for the courses in {courses}. Unscheduled courses have no limit.
+    _PROMOTE_WAITLIST = '''
+        INSERT INTO course_students (course_id, student_id, academic_year)
+        SELECT course_id, student_id, academic_year FROM (
+            SELECT w.course_id, w.student_id, w.academic_year,
+                   ROW_NUMBER() OVER (PARTITION BY w.course_id, w.academic_year ORDER BY w.id) AS queue_position
+            FROM course_waitlist w
+            WHERE w.course_id IN {courses}
+              AND EXISTS (SELECT 1 FROM courses c WHERE c.id = w.course_id AND c.inactive_since IS NULL)
+              AND EXISTS (SELECT 1 FROM students s WHERE s.id = w.student_id AND s.inactive_since IS NULL)
+        ) w
+        WHERE queue_position <= IFNULL(
+            (SELECT seats FROM course_seats s WHERE s.course_id = w.course_id)
+            - (SELECT COUNT(*) FROM course_students cs WHERE cs.course_id = w.course_id AND cs.academic_year = w.academic_year),
+            queue_position)
+        ON CONFLICT (course_id, student_id) DO UPDATE SET academic_year = excluded.academic_year
+    '''
+    _DEQUEUE_ENROLLED = '''
+        DELETE FROM course_waitlist WHERE course_id IN {courses} AND EXISTS (
+            SELECT 1 FROM course_students cs WHERE cs.course_id = course_waitlist.course_id
+            AND cs.student_id = course_waitlist.student_id AND cs.academic_year = course_waitlist.academic_year)
+    '''
+    # name: (trigger event, courses whose seats may have been freed)
+    _WAITLIST_TRIGGERS = {
+        "unenrolled": ("AFTER DELETE ON course_students", "(OLD.course_id)"),
+        "slot_deleted": ("AFTER DELETE ON classroom_slots", "(OLD.course_id)"),
+        "slot_moved": ("AFTER UPDATE ON classroom_slots", "(OLD.course_id, NEW.course_id)"),
+        "rule_deleted": ("AFTER DELETE ON schedule_rules", "(OLD.course_id)"),
+        "capacity_raised": ("AFTER UPDATE OF capacita_sedie ON classrooms",
+                            "(SELECT course_id FROM classroom_slots WHERE classroom_id = NEW.id "
+                            "UNION SELECT course_id FROM schedule_rules WHERE classroom_id = NEW.id)"),
+    }
+    _REQUESTED = "SELECT json_extract(value, '$[0]') AS course_id, json_extract(value, '$[1]') AS student_id, key AS position FROM json_each(:pairs)"
+    # One statement for the whole batch: requests are ranked per course in arrival order and
+    # only those within the free seats are inserted, so a course can't be overbooked
+    _RESERVE_SEATS = f'''
+        WITH requested AS (
+            SELECT course_id, student_id, MIN(position) AS position FROM ({_REQUESTED}) GROUP BY course_id, student_id
+        ), candidates AS (
+            SELECT r.course_id, r.student_id, ROW_NUMBER() OVER (PARTITION BY r.course_id ORDER BY r.position) AS queue_position
+            FROM requested r
+            WHERE NOT EXISTS (SELECT 1 FROM course_students cs WHERE cs.course_id = r.course_id
+                              AND cs.student_id = r.student_id AND cs.academic_year = :year)
+        )
+        INSERT INTO course_students (course_id, student_id, academic_year)
+        SELECT course_id, student_id, :year FROM candidates c
+        WHERE queue_position <= IFNULL(
+            (SELECT seats FROM course_seats s WHERE s.course_id = c.course_id)
+            - (SELECT COUNT(*) FROM course_students cs WHERE cs.course_id = c.course_id AND cs.academic_year = :year)
+            - (SELECT COUNT(*) FROM course_waitlist w WHERE w.course_id = c.course_id AND w.academic_year = :year),
+            queue_position)
+        ON CONFLICT (course_id, student_id) DO UPDATE SET academic_year = excluded.academic_year
+        RETURNING course_id, student_id
+    '''
+
+    def reserve_seats(self, pairs):
+        """
+        Enrolls (course_id, student_id) pairs for the current academic year within the seats of each course
+        (see course_seats); the others join the course's waitlist, behind whoever is already waiting.
+        One write transaction taken up front (BEGIN IMMEDIATE), so concurrent writers queue instead of
+        overbooking. Returns {"enrolled": [pairs], "waitlisted": [pairs]}, or None on error.
+        """
+        params = {"pairs": json.dumps([list(pair) for pair in pairs]), "year": academic_year_of()}
+        self._connect()
+        try:
+            with self.conn:
+                self.cursor.execute("BEGIN IMMEDIATE")
+                self.cursor.execute(self._RESERVE_SEATS, params)
+                enrolled = [tuple(row) for row in self.cursor.fetchall()]
+                self.cursor.execute(f'''
+                    INSERT OR IGNORE INTO course_waitlist (course_id, student_id, academic_year)
+                    SELECT r.course_id, r.student_id, :year FROM ({self._REQUESTED}) r
+                    WHERE NOT EXISTS (SELECT 1 FROM course_students cs WHERE cs.course_id = r.course_id
+                                      AND cs.student_id = r.student_id AND cs.academic_year = :year)
+                    ORDER BY r.position
+                ''', params)
+                self.cursor.execute(f'''
+                    SELECT DISTINCT w.course_id, w.student_id FROM course_waitlist w JOIN ({self._REQUESTED}) r
+                    ON w.course_id = r.course_id AND w.student_id = r.student_id WHERE w.academic_year = :year
+                ''', params)
+                waitlisted = self.cursor.fetchall()
+            self._bump_version("course_students", "course_waitlist")
+            return {"enrolled": enrolled, "waitlisted": waitlisted}
+        except sqlite3.Error as e:
+            self.on_error(f"Error reserving seats: {e}")
+            return None
+        finally:
+            self._close()
+
+    def fetch_waitlist(self, academic_year=None):
+        """(course_id, student_id) waiting for a seat in `academic_year` (default: current), in queue order per course."""
+        self._connect()
+        try:
+            self.cursor.execute('SELECT course_id, student_id FROM course_waitlist WHERE academic_year = ? ORDER BY course_id, id',
+                                (academic_year or academic_year_of(),))
+            return self.cursor.fetchall()
+        except sqlite3.Error as e:
+            self.on_error(f"Error fetching waitlist: {e}")
+            return []
+        finally:
+            self._close()
+
+    def fetch_course_seats(self, academic_year=None):
+        """(course_id, seats or None if unlimited, enrolled, waitlisted) of active courses for `academic_year`."""
+        self._connect()
+        try:
+            self.cursor.execute('''
+                SELECT c.id, s.seats,
+                       (SELECT COUNT(*) FROM course_students cs WHERE cs.course_id = c.id AND cs.academic_year = :year),
+                       (SELECT COUNT(*) FROM course_waitlist w WHERE w.course_id = c.id AND w.academic_year = :year)
+                FROM courses c LEFT JOIN course_seats s ON s.course_id = c.id
+                WHERE c.inactive_since IS NULL ORDER BY c.id
+            ''', {"year": academic_year or academic_year_of()})
+            return self.cursor.fetchall()
+        except sqlite3.Error as e:
+            self.on_error(f"Error fetching course seats: {e}")
+            return []
+        finally:
+            self._close()
+
+    def leave_waitlist(self, pairs):
+        """Takes (course_id, student_id) pairs off the current year's waitlist. Returns True, or False on error."""
+        self._connect()
+        try:
+            with self.conn:
+                self.cursor.executemany('DELETE FROM course_waitlist WHERE course_id = ? AND student_id = ? AND academic_year = ?',
+                                        ((course_id, student_id, academic_year_of()) for course_id, student_id in pairs))
+            self._bump_version("course_waitlist")
+            return True
+        except sqlite3.Error as e:
+            self.on_error(f"Error leaving waitlist: {e}")
+            return False
+        finally:
+            self._close()
+
+    # --- Classroom Operations ---
+    # Slots given as { time slot: course name } (the shape of Aula.occupazione_aula), stored by course id
+    _SLOTS_BY_NAME = '''
+        INSERT OR REPLACE INTO classroom_slots (classroom_id, time_slot, course_id)
+        SELECT ?, slot.key, c.id FROM json_each(?) slot JOIN courses c ON c.nome_corso = slot.value
+    '''
+
+    def insert_classroom(self, nome_aula, capacita_sedie, occupazione_aula):
+        self._connect()
+        try:
+            with self.conn:
+                self.cursor.execute('''
+                    INSERT INTO classrooms (nome_aula, capacita_sedie) VALUES (?, ?)
+                ''', (nome_aula, capacita_sedie))
+                classroom_id = self.cursor.lastrowid
+                if occupazione_aula:
+                    self.cursor.execute(self._SLOTS_BY_NAME, (classroom_id, json.dumps(occupazione_aula)))
+            self._bump_version("classrooms", "classroom_slots")
+            return classroom_id
+        except sqlite3.IntegrityError:
+            self.on_warning(f"Classroom '{nome_aula}' already exists.")
+            return None
+        except sqlite3.Error as e:
+            self.on_error(f"Error inserting classroom: {e}")
+            return None
+        finally:
+            self._close()
+
+    def fetch_classrooms(self):
+        self._connect()
+        try:
+            self.cursor.execute('SELECT id, nome_aula, capacita_sedie FROM classrooms WHERE inactive_since IS NULL')
+            classrooms_data = [(aula_id, nome_aula, capacita_sedie, {}) for aula_id, nome_aula, capacita_sedie in self.cursor.fetchall()]
+            schedules = {row[0]: row[3] for row in classrooms_data}
+            # occupazione_aula with the current course names
+            self.cursor.execute('''
+                SELECT s.classroom_id, s.time_slot, c.nome_corso FROM classroom_slots s JOIN courses c ON s.course_id = c.id
+            ''')
+            for aula_id, time_slot, nome_corso in self.cursor.fetchall():
+                if aula_id in schedules:
+                    schedules[aula_id][time_slot] = nome_corso
+            return classrooms_data
+        except sqlite3.Error as e:
+            self.on_error(f"Error fetching classrooms: {e}")
+            return []
+        finally:
+            self._close()
+
+    def update_classroom(self, classroom_id, nome_aula, capacita_sedie):
+        """Edits one classroom in place (by id), a single-row update like update_course. Returns True, or False on error."""
+        self._connect()
+        try:
+            self.cursor.execute('UPDATE classrooms SET nome_aula = ?, capacita_sedie = ? WHERE id = ?',
+                                (nome_aula, capacita_sedie, classroom_id))
+            self.conn.commit()
+            self._bump_version("classrooms", "course_students", "course_waitlist")
+            return True
+        except sqlite3.IntegrityError:
+            self.on_warning(f"Classroom '{nome_aula}' already exists.")
+            return False
+        except sqlite3.Error as e:
+            self.on_error(f"Error updating classroom: {e}")
+            return False
+        finally:
+            self._close()
+
+    def fetch_classroom_slots(self):
+        """(classroom_id, time_slot, course_id) of every scheduled slot."""
+        self._connect()
+        try:
+            self.cursor.execute('SELECT classroom_id, time_slot, course_id FROM classroom_slots ORDER BY classroom_id, time_slot')
+            return self.cursor.fetchall()
+        except sqlite3.Error as e:
+            self.on_error(f"Error fetching classroom schedules: {e}")
+            return []
+        finally:
+            self._close()
+
+    def update_classroom_schedule(self, aula_id, occupazione_aula):
+        """Replaces a classroom's whole schedule ({ time slot: course name }); unknown course names are skipped."""
+        self._connect()
+        try:
+            with self.conn:
+                self.cursor.execute('DELETE FROM classroom_slots WHERE classroom_id = ?', (aula_id,))
+                self.cursor.execute(self._SLOTS_BY_NAME, (aula_id, json.dumps(occupazione_aula)))
+            self._bump_version("classroom_slots", "course_students", "course_waitlist")
+        except sqlite3.Error as e:
+            self.on_error(f"Error updating classroom schedule: {e}")
+        finally:
+            self._close()
+
+    def write_classroom_slots(self, assign=(), clear=()):
+        """
+        Sets (classroom_id, time_slot, course_id) slots and frees (classroom_id, time_slot) ones, in one
+        transaction: only the slots that change are written. Returns True, or False on error.
+        """
+        self._connect()
+        try:
+            with self.conn:
+                self.cursor.executemany('DELETE FROM classroom_slots WHERE classroom_id = ? AND time_slot = ?', clear)
+                self.cursor.executemany('''
+                    INSERT INTO classroom_slots (classroom_id, time_slot, course_id) VALUES (?, ?, ?)
+                    ON CONFLICT (classroom_id, time_slot)
+                    DO UPDATE SET course_id = excluded.course_id WHERE course_id IS NOT excluded.course_id
+                ''', assign)
+            self._bump_version("classroom_slots", "course_students", "course_waitlist")
+            return True
+        except sqlite3.Error as e:
+            self.on_error(f"Error updating classroom schedule: {e}")
+            return False
+        finally:
+            self._close()
+
+    # --- Recurring Schedule Rules ---
+    def insert_schedule_rule(self, classroom_id, course_id, weekday, start_time, end_time, start_date, end_date,
+                             interval_weeks=1, exceptions=()):
+        self._connect()
+        try:
+            self.cursor.execute('''
+                INSERT INTO schedule_rules (classroom_id, course_id, weekday, start_time, end_time,
+                                            start_date, end_date, interval_weeks, exceptions)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', (classroom_id, course_id, weekday, start_time, end_time, start_date, end_date, interval_weeks,
+                  json.dumps(sorted(exceptions))))
+            self.conn.commit()
+            self._bump_version("schedule_rules")
+            return self.cursor.lastrowid
+        except sqlite3.Error as e:
+            self.on_error(f"Error inserting schedule rule: {e}")
+            return None
+        finally:
+            self._close()
+
+    def fetch_schedule_rules(self):
+        """(id, classroom_id, course_id, weekday, start_time, end_time, start_date, end_date, interval_weeks, exceptions list)"""
+        self._connect()
+        try:
+            self.cursor.execute('''
+                SELECT id, classroom_id, course_id, weekday, start_time, end_time,
+                       start_date, end_date, interval_weeks, exceptions
+                FROM schedule_rules
+                ORDER BY id
+            ''')
+            return [row[:-1] + (json.loads(row[-1]) if row[-1] else [],) for row in self.cursor.fetchall()]
+        except sqlite3.Error as e:
+            self.on_error(f"Error fetching schedule rules: {e}")
+            return []
+        finally:
+            self._close()
+
+    def update_schedule_rule_exceptions(self, rule_id, exceptions):
+        self._connect()
+        try:
+            self.cursor.execute('UPDATE schedule_rules SET exceptions = ? WHERE id = ?',
+                                (json.dumps(sorted(exceptions)), rule_id))
+            self.conn.commit()
+            self._bump_version("schedule_rules")
+            return True
+        except sqlite3.Error as e:
+            self.on_error(f"Error updating schedule rule: {e}")
+            return False
+        finally:
+            self._close()
+
+    def delete_schedule_rule(self, rule_id):
+        self._connect()
+        try:
+            self.cursor.execute('DELETE FROM schedule_rules WHERE id = ?', (rule_id,))
+            self.conn.commit()
+            self._bump_version("schedule_rules", "course_students", "course_waitlist")
+            return True
+        except sqlite3.Error as e:
+            self.on_error(f"Error deleting schedule rule: {e}")
+            return False
+        finally:
+            self._close()
+
+    # --- Calendar feeds (see ical.py) ---
+    _FEED_SUBJECTS = {
+        # kind: (title query, filter on the slot/rule alias x)
+        "student": ("SELECT name || ' ' || last_name FROM students WHERE id = :key AND inactive_since IS NULL",
+                    "x.course_id IN (SELECT course_id FROM course_students WHERE student_id = :key)"),
+        "teacher": ("SELECT docente FROM courses WHERE docente = :key AND inactive_since IS NULL LIMIT 1",
+                    "x.course_id IN (SELECT id FROM courses WHERE docente = :key)"),
+        "room": ("SELECT nome_aula FROM classrooms WHERE id = :key AND inactive_since IS NULL",
+                 "x.classroom_id = :key"),
+    }
+    _FEED_COURSES = {
+        "student": "SELECT c.id FROM course_students cs JOIN courses c ON c.id = cs.course_id "
+                   "WHERE cs.student_id = :key AND c.inactive_since IS NULL",
+        "teacher": "SELECT id FROM courses WHERE docente = :key AND inactive_since IS NULL",
+        "room": "SELECT course_id FROM classroom_slots WHERE classroom_id = :key "
+                "UNION SELECT course_id FROM schedule_rules WHERE classroom_id = :key",
+    }
+
+    def fetch_feed(self, kind, key):
+        """
+        What the calendar feed of a student (key: id), teacher (docente) or room (classroom id) shows,
+        read in one transaction together with the change-log position it reflects:
+        (seq, title, course ids, slots, rules), or None if there's no such active student, teacher or room.
+        slots: (classroom_id, course_id, nome_aula, nome_corso, time_slot); rules: (classroom_id, course_id,
+        nome_aula, nome_corso) + a fetch_schedule_rules row.
+        """
+        title_query, where = self._FEED_SUBJECTS[kind]
+        active = "a.inactive_since IS NULL AND c.inactive_since IS NULL"
+        self._connect()
+        try:
+            self.cursor.execute("BEGIN") # One read snapshot: the data is exactly the state at `seq`
+            self.cursor.execute(self._LAST_CHANGE_SEQ)
+            seq = self.cursor.fetchone()[0]
+            self.cursor.execute(title_query, {"key": key})
+            title = self.cursor.fetchone()
+            if title is None:
+                return None
+            self.cursor.execute(self._FEED_COURSES[kind], {"key": key})
+            course_ids = [row[0] for row in self.cursor.fetchall()]
+            self.cursor.execute(f'''
+                SELECT x.classroom_id, x.course_id, a.nome_aula, c.nome_corso, x.time_slot
+                FROM classroom_slots x
+                JOIN classrooms a ON a.id = x.classroom_id
+                JOIN courses c ON c.id = x.course_id
+                WHERE {where} AND {active}
+                ORDER BY x.classroom_id, x.time_slot
+            ''', {"key": key})
+            slots = self.cursor.fetchall()
+            self.cursor.execute(f'''
+                SELECT x.classroom_id, x.course_id, a.nome_aula, c.nome_corso, x.id, x.classroom_id, x.course_id,
+                       x.weekday, x.start_time, x.end_time, x.start_date, x.end_date, x.interval_weeks, x.exceptions
+                FROM schedule_rules x
+                JOIN classrooms a ON a.id = x.classroom_id
+                JOIN courses c ON c.id = x.course_id
+                WHERE {where} AND {active}
+                ORDER BY x.id
+            ''', {"key": key})
+            rules = [row[:-1] + (json.loads(row[-1]) if row[-1] else [],) for row in self.cursor.fetchall()]
+            return seq, title[0], course_ids, slots, rules
+        except sqlite3.Error as e:
+            self.on_error(f"Error fetching calendar feed: {e}")
+            return None
+        finally:
+            self._close() # Ends the read transaction
+
+    # --- Lifecycle: bulk delete / deactivate / merge ---
+    # Every operation is one transaction of set-based statements over a JSON list of IDs,
+    # with foreign keys enforced (see _open) so that deletes cascade to enrollments, attendance and rules.
+    _IDS = "SELECT value FROM json_each(?)"
+
+    def _count(self, table, column, ids):
+        self.cursor.execute(f"SELECT COUNT(*) FROM {table} WHERE {column} IN ({self._IDS})", (ids,))
+        return self.cursor.fetchone()[0]
+
+    def _slots_of(self, classroom_ids):
+        """[(nome_aula, time_slot, nome_corso)] scheduled in the given classrooms."""
+        self.cursor.execute(f'''
+            SELECT a.nome_aula, s.time_slot, c.nome_corso
+            FROM classroom_slots s JOIN classrooms a ON s.classroom_id = a.id JOIN courses c ON s.course_id = c.id
+            WHERE a.id IN ({self._IDS}) ORDER BY a.nome_aula, s.time_slot
+        ''', (classroom_ids,))
+        return self.cursor.fetchall()
+
+    def _lifecycle(self, description, work, tables):
+        """Runs work() in one transaction and returns its result (None on error, everything rolled back)."""
+        self._connect()
+        try:
+            with self.conn:
+                result = work()
+            self._bump_version(*tables)
+            return result
+        except sqlite3.Error as e:
+            self.on_error(f"Error {description}: {e}")
+            return None
+        finally:
+            self._close()
+
+    def delete_students(self, student_ids):
+        """Deletes students with their enrollments, attendance and scores. Returns the counts removed, or None on error."""
+        ids = json.dumps(list(student_ids))
+        def work():
+            counts = {"course_students": self._count("course_students", "student_id", ids),
+                      "attendance": self._count("attendance", "student_id", ids),
+                      "scores": self._count("scores", "student_id", ids)}
+            self.cursor.execute(f"DELETE FROM students WHERE id IN ({self._IDS})", (ids,))
+            return {"students": self.cursor.rowcount, **counts}
+        result = self._lifecycle("deleting students", work,
+                                 ("students", "course_students", "course_waitlist", "attendance", "scores"))
+        return result
+
+    def graduate_students(self, student_ids, on_date=None):
+        """
+        Marks students as left (graduated, withdrawn) on `on_date` (default today) and ends their
+        enrollments from that date's academic year on. Earlier years' enrollments and the attendance
+        history stay (until archive_academic_year moves them); fetch_students no longer returns them.
+        """
+        ids = json.dumps(list(student_ids))
+        on_date = str(on_date or datetime.date.today())
+        year = academic_year_of(on_date)
+        def work():
+            self.cursor.execute(f"UPDATE students SET inactive_since = ? WHERE inactive_since IS NULL AND id IN ({self._IDS})",
+                                (on_date, ids))
+            graduated = self.cursor.rowcount
+            self.cursor.execute(f"DELETE FROM course_waitlist WHERE student_id IN ({self._IDS}) AND academic_year >= ?", (ids, year))
+            self.cursor.execute(f"DELETE FROM course_students WHERE student_id IN ({self._IDS}) AND academic_year >= ?", (ids, year))
+            return {"students": graduated, "course_students": self.cursor.rowcount}
+        return self._lifecycle("graduating students", work, ("students", "course_students", "course_waitlist"))
+
+    def merge_students(self, target_id, duplicate_ids):
+        """
+        Folds duplicate records into `target_id`: enrollments, attendance and scores move over (the target's
+        own record wins where both have one for the same course and day or assessment), then the duplicates are deleted.
+        """
+        ids = json.dumps([i for i in duplicate_ids if i != target_id])
+        def work():
+            self.cursor.execute(f'''
+                INSERT INTO course_students (course_id, student_id, academic_year)
+                SELECT course_id, ?, academic_year FROM course_students WHERE student_id IN ({self._IDS})
+                ON CONFLICT (course_id, student_id)
+                DO UPDATE SET academic_year = excluded.academic_year WHERE excluded.academic_year > academic_year
+            ''', (target_id, ids))
+            self.cursor.execute(f"UPDATE OR IGNORE attendance SET student_id = ? WHERE student_id IN ({self._IDS})",
+                                (target_id, ids))
+            moved = self.cursor.rowcount
+            self.cursor.execute(f"UPDATE OR IGNORE scores SET student_id = ? WHERE student_id IN ({self._IDS})",
+                                (target_id, ids))
+            scores = self.cursor.rowcount
+            self.cursor.execute(f"DELETE FROM students WHERE id IN ({self._IDS})", (ids,))
+            return {"students": self.cursor.rowcount, "attendance": moved, "scores": scores}
+        result = self._lifecycle("merging students", work,
+                                 ("students", "course_students", "course_waitlist", "attendance", "scores"))
+        return result
+
+    def delete_courses(self, course_ids):
+        """Deletes courses with their slots, recurring rules, enrollments, attendance and assessments."""
+        ids = json.dumps(list(course_ids))
+        def work():
+            counts = {"course_students": self._count("course_students", "course_id", ids),
+                      "attendance": self._count("attendance", "course_id", ids),
+                      "schedule_rules": self._count("schedule_rules", "course_id", ids),
+                      "assessments": self._count("assessments", "course_id", ids)}
+            self.cursor.execute(f"DELETE FROM courses WHERE id IN ({self._IDS})", (ids,))
+            return {"courses": self.cursor.rowcount, **counts}
+        result = self._lifecycle("deleting courses", work, ("courses", "classroom_slots", "course_students", "course_waitlist",
+                                                            "attendance", "schedule_rules", "assessments", "scores"))
+        return result
+
+    def deactivate_courses(self, course_ids, on_date=None):
+        """Closes courses: off every schedule, recurring rules removed; enrollments and attendance stay as history."""
+        ids = json.dumps(list(course_ids))
+        on_date = str(on_date or datetime.date.today())
+        def work():
+            self.cursor.execute(f"DELETE FROM course_waitlist WHERE course_id IN ({self._IDS})", (ids,))
+            self.cursor.execute(f"DELETE FROM classroom_slots WHERE course_id IN ({self._IDS})", (ids,))
+            self.cursor.execute(f"DELETE FROM schedule_rules WHERE course_id IN ({self._IDS})", (ids,))
+            rules = self.cursor.rowcount
+            self.cursor.execute(f"UPDATE courses SET inactive_since = ? WHERE inactive_since IS NULL AND id IN ({self._IDS})",
+                                (on_date, ids))
+            return {"courses": self.cursor.rowcount, "schedule_rules": rules}
+        return self._lifecycle("deactivating courses", work, ("courses", "classroom_slots", "course_waitlist", "schedule_rules"))
+
+    def merge_courses(self, target_id, duplicate_ids):
+        """
+        Folds duplicate courses into `target_id`: enrollments, attendance, recurring rules, assessments
+        and classroom slots move to it, then the duplicates are deleted.
+        """
+        ids = json.dumps([i for i in duplicate_ids if i != target_id])
+        def work():
+            self.cursor.execute(f'''
+                INSERT INTO course_students (course_id, student_id, academic_year)
+                SELECT ?, student_id, academic_year FROM course_students WHERE course_id IN ({self._IDS})
+                ON CONFLICT (course_id, student_id)
+                DO UPDATE SET academic_year = excluded.academic_year WHERE excluded.academic_year > academic_year
+            ''', (target_id, ids))
+            self.cursor.execute(f"UPDATE OR IGNORE attendance SET course_id = ? WHERE course_id IN ({self._IDS})",
+                                (target_id, ids))
+            moved = self.cursor.rowcount
+            self.cursor.execute(f"UPDATE schedule_rules SET course_id = ? WHERE course_id IN ({self._IDS})", (target_id, ids))
+            rules = self.cursor.rowcount
+            self.cursor.execute(f"UPDATE classroom_slots SET course_id = ? WHERE course_id IN ({self._IDS})", (target_id, ids))
+            self.cursor.execute(f"UPDATE assessments SET course_id = ? WHERE course_id IN ({self._IDS})", (target_id, ids))
+            assessments = self.cursor.rowcount
+            self.cursor.execute(f"DELETE FROM courses WHERE id IN ({self._IDS})", (ids,))
+            return {"courses": self.cursor.rowcount, "attendance": moved, "schedule_rules": rules, "assessments": assessments}
+        result = self._lifecycle("merging courses", work, ("courses", "classroom_slots", "course_students", "course_waitlist",
+                                                           "attendance", "schedule_rules", "assessments"))
+        return result
+
+    def delete_classrooms(self, classroom_ids):
+        """Deletes classrooms with their schedules and recurring rules. "displaced": the lessons they had."""
+        ids = json.dumps(list(classroom_ids))
+        def work():
+            rules = self._count("schedule_rules", "classroom_id", ids)
+            displaced = self._slots_of(ids)
+            self.cursor.execute(f"DELETE FROM classrooms WHERE id IN ({self._IDS})", (ids,))
+            return {"classrooms": self.cursor.rowcount, "schedule_rules": rules, "displaced": displaced}
+        return self._lifecycle("deleting classrooms", work,
+                               ("classrooms", "classroom_slots", "schedule_rules", "course_students", "course_waitlist"))
+
+    def deactivate_classrooms(self, classroom_ids, on_date=None):
+        """
+        Takes classrooms out of service: schedules emptied, recurring rules removed.
+        "displaced": the lessons they had, to be rescheduled.
+        """
+        ids = json.dumps(list(classroom_ids))
+        return self._lifecycle("deactivating classrooms", lambda: self._take_out_of_service(ids, on_date),
+                               ("classrooms", "classroom_slots", "schedule_rules", "course_students", "course_waitlist"))
+
+    def _take_out_of_service(self, ids, on_date):
+        self.cursor.execute(f"DELETE FROM schedule_rules WHERE classroom_id IN ({self._IDS})", (ids,))
+        rules = self.cursor.rowcount
+        displaced = self._slots_of(ids)
+        self.cursor.execute(f"DELETE FROM classroom_slots WHERE classroom_id IN ({self._IDS})", (ids,))
+        self.cursor.execute(f"UPDATE classrooms SET inactive_since = ? WHERE inactive_since IS NULL AND id IN ({self._IDS})",
+                            (str(on_date or datetime.date.today()), ids))
+        return {"classrooms": self.cursor.rowcount, "schedule_rules": rules, "displaced": displaced}
+
+    def apply_schedule_changes(self, changes, close_classroom_ids=(), on_date=None):
+        """
+        Promotes a what-if schedule (scenarios.py) in one transaction: (classroom_id, time_slot, before, after)
+        changes, course ids with None for a free slot, then the classrooms it takes out of service.
+        Nothing is written if a slot no longer holds `before` (someone changed it meanwhile): "conflicts"
+        lists those changes. Returns {"changed", "conflicts", "classrooms", "schedule_rules", "displaced"}, or None.
+        """
+        changes = [tuple(change) for change in changes]
+        rows, ids = json.dumps([list(change) for change in changes]), json.dumps(sorted(close_classroom_ids))
+        def work():
+            self.cursor.execute("BEGIN IMMEDIATE") # Checked and written with no other writer in between
+            self.cursor.execute('''
+                SELECT json_extract(value, '$[0]'), json_extract(value, '$[1]'), json_extract(value, '$[2]'), json_extract(value, '$[3]')
+                FROM json_each(?) c
+                WHERE json_extract(c.value, '$[2]') IS NOT (SELECT course_id FROM classroom_slots s
+                    WHERE s.classroom_id = json_extract(c.value, '$[0]') AND s.time_slot = json_extract(c.value, '$[1]'))
+            ''', (rows,))
+            conflicts = [tuple(row) for row in self.cursor.fetchall()]
+            if conflicts:
+                return {"changed": 0, "conflicts": conflicts, "classrooms": 0, "schedule_rules": 0, "displaced": []}
+            self.cursor.executemany('DELETE FROM classroom_slots WHERE classroom_id = ? AND time_slot = ?',
+                                    [(classroom_id, time_slot) for classroom_id, time_slot, _, after in changes if after is None])
+            self.cursor.executemany('''
+                INSERT INTO classroom_slots (classroom_id, time_slot, course_id) VALUES (?, ?, ?)
+                ON CONFLICT (classroom_id, time_slot) DO UPDATE SET course_id = excluded.course_id
+            ''', [(classroom_id, time_slot, after) for classroom_id, time_slot, _, after in changes if after is not None])
+            closed = (self._take_out_of_service(ids, on_date) if close_classroom_ids
+                      else {"classrooms": 0, "schedule_rules": 0, "displaced": []})
+            return {"changed": len(changes), "conflicts": [], **closed}
+        return self._lifecycle("promoting the schedule scenario", work,
+                               ("classrooms", "classroom_slots", "schedule_rules", "course_students", "course_waitlist"))
+
+    def merge_classrooms(self, target_id, duplicate_ids):
+        """
+        Folds duplicate classrooms into `target_id`: their slots join its schedule where it is free
+        (the target's own lessons win) and their recurring rules move to it, then the duplicates are deleted.
+        Returns the counts plus "schedule" ({time slot: course id} of the target afterwards) and
+        "displaced" ([(nome_aula, time slot, nome_corso)] that didn't fit).
+        """
+        ids = json.dumps([i for i in duplicate_ids if i != target_id])
+        def work():
+            self.cursor.execute(f"UPDATE OR IGNORE classroom_slots SET classroom_id = ? WHERE classroom_id IN ({self._IDS})",
+                                (target_id, ids))
+            # What is left in the duplicates collided with a slot of the target (same course: nothing lost)
+            self.cursor.execute(f'''
+                SELECT a.nome_aula, s.time_slot, c.nome_corso
+                FROM classroom_slots s JOIN classrooms a ON s.classroom_id = a.id JOIN courses c ON s.course_id = c.id
+                WHERE s.classroom_id IN ({self._IDS}) AND NOT EXISTS (
+                    SELECT 1 FROM classroom_slots t WHERE t.classroom_id = ? AND t.time_slot = s.time_slot AND t.course_id = s.course_id)
+                ORDER BY a.nome_aula, s.time_slot
+            ''', (ids, target_id))
+            displaced = self.cursor.fetchall()
+            self.cursor.execute(f"UPDATE schedule_rules SET classroom_id = ? WHERE classroom_id IN ({self._IDS})",
+                                (target_id, ids))
+            rules = self.cursor.rowcount
+            self.cursor.execute(f"DELETE FROM classrooms WHERE id IN ({self._IDS})", (ids,))
+            merged = self.cursor.rowcount
+            self.cursor.execute("SELECT time_slot, course_id FROM classroom_slots WHERE classroom_id = ?", (target_id,))
+            return {"classrooms": merged, "schedule_rules": rules, "schedule": dict(self.cursor.fetchall()), "displaced": displaced}
+        return self._lifecycle("merging classrooms", work,
+                               ("classrooms", "classroom_slots", "schedule_rules", "course_students", "course_waitlist"))
+
+    # --- Attendance Operations ---
+    # Unchanged statuses are not rewritten, so re-sending a roll-call adds nothing to the change log
+    _ATTENDANCE_UPSERT = '''
+        INSERT INTO attendance (student_id, course_id, attendance_date, status)
+        VALUES (?, ?, ?, ?)
+        ON CONFLICT (student_id, course_id, attendance_date)
+        DO UPDATE SET status = excluded.status WHERE status IS NOT excluded.status
+    '''
+
+    def record_attendance(self, student_id, course_id, attendance_date, status):
+        self._connect()
+        try:
+            # Upsert: an entry for the same student, course, and date is updated in place (one UPDATE in the change log)
+            self.cursor.execute(self._ATTENDANCE_UPSERT, (student_id, course_id, attendance_date, status))
+            self.conn.commit()
+            self._bump_version("attendance")
+            self._notify_attendance([(student_id, course_id, attendance_date, status)])
+            return True
+        except sqlite3.Error as e:
+            self.on_error(f"Error recording attendance: {e}")
+            return False
+        finally:
+            self._close()
+
+    def record_attendance_many(self, rows):
+        """Batch version of record_attendance: (student_id, course_id, attendance_date, status) rows in one transaction."""
+        rows = list(rows)
+        self._connect()
+        try:
+            with self.conn:
+                self.cursor.executemany(self._ATTENDANCE_UPSERT, rows)
+            self._bump_version("attendance")
+            self._notify_attendance(rows)
+            return True
+        except sqlite3.Error as e:
+            self.on_error(f"Error recording attendance: {e}")
+            return False
+        finally:
+            self._close()
+
+    def _notify_attendance(self, rows):
+        for listener in list(self.attendance_listeners):
+            listener(rows)
+
+    def attendance_bitmaps(self):
+        """
+        The compact in-memory attendance store (see attendance_bitmap.py), built from the table on first
+        use and brought up to date from the change log on every call, so that writes made by other
+        connections and processes show up too. Rebuilt when the log can't say what changed
+        (an archive, or entries pruned before they were replayed).
+        """
+        with self._bitmaps_lock:
+            head = self.last_change_seq()
+            if head is None: # Database error: serve what's built
+                return self._attendance_bitmaps
+            if self._attendance_bitmaps is not None and head > self._bitmaps_seq:
+                if self.change_log_gap(self._bitmaps_seq) is not False or not self._replay_attendance(head):
+                    self._attendance_bitmaps = None
+            if self._attendance_bitmaps is None:
+                from .attendance_bitmap import AttendanceBitmaps
+                bitmaps = AttendanceBitmaps()
+                # Head first: writes racing with the load are replayed on the next call, which is harmless
+                for rows in self.iter_attendance_records():
+                    bitmaps.record_many(rows)
+                self._attendance_bitmaps, self._bitmaps_seq = bitmaps, head
+            return self._attendance_bitmaps
+
+    def _replay_attendance(self, head):
+        """Applies the log entries after _bitmaps_seq to the bitmaps. False when they need a rebuild instead."""
+        bitmaps = self._attendance_bitmaps
+        for rows in self.iter_changes(self._bitmaps_seq, tables=("attendance", "students", "courses", "*")):
+            for change in map(change_from_row, rows):
+                data = change.data
+                if change.table == "*":
+                    return False
+                if change.table == "attendance" and change.operation == "DELETE":
+                    bitmaps.forget_many([(data["student_id"], data["course_id"], data["attendance_date"])])
+                elif change.table == "attendance":
+                    bitmaps.record(data["student_id"], data["course_id"], data["attendance_date"], data["status"])
+                # Merges move attendance to another student or course, then delete the merged ones
+                elif change.operation == "DELETE":
+                    bitmaps.discard(**{"student_ids" if change.table == "students" else "course_ids": [change.row_id]})
+            self._bitmaps_seq = max(self._bitmaps_seq, rows[-1][0])
+        self._bitmaps_seq = max(self._bitmaps_seq, head)
+        return True
+
+    @staticmethod
+    def _attendance_query(course_id=None, student_id=None, attendance_date=None, academic_year=None, archived=False):
+        query = f'''
+            SELECT
+                a.id,
+                s.name,
+                s.last_name,
+                c.nome_corso,
+                a.attendance_date,
+                a.status,
+                a.student_id
+            FROM {"archive" if archived else "main"}.attendance a
+            JOIN students s ON a.student_id = s.id
+            JOIN courses c ON a.course_id = c.id
+            WHERE 1=1
+        '''
+        params = []
+        if course_id:
+            query += " AND a.course_id = ?"
+            params.append(course_id)
+        if student_id:
+            query += " AND a.student_id = ?"
+            params.append(student_id)
+        if attendance_date:
+            query += " AND a.attendance_date = ?"
+            params.append(attendance_date)
+        if academic_year:
+            query += " AND a.attendance_date BETWEEN ? AND ?"
+            params += [day.isoformat() for day in academic_year_bounds(academic_year)]
+        return query, params
+
+    def fetch_attendance(self, course_id=None, student_id=None, attendance_date=None, academic_year=None):
+        """
+        Live attendance; with `academic_year`, that year's records, from its archive file once archived.
+        Rows: (id, name, last_name, nome_corso, attendance_date, status, student_id).
+        """
+        archive = self._archive_for(academic_year)
+        self._connect()
+        try:
+            if archive:
+                self.cursor.execute("ATTACH DATABASE ? AS archive", (archive,))
+            self.cursor.execute(*self._attendance_query(course_id, student_id, attendance_date, academic_year, bool(archive)))
+            return self.cursor.fetchall()
+        except sqlite3.Error as e:
+            self.on_error(f"Error fetching attendance: {e}")
+            return []
+        finally:
+            self._close()
+
+    # --- Gradebook (see gradebook.py) ---
+    def insert_assessment(self, course_id, name, weight=1, max_score=10, assessment_date=None, academic_year=None):
+        """New assessment of a course in `academic_year` (default: the year of `assessment_date`, else the current one)."""
+        academic_year = academic_year or academic_year_of(assessment_date and str(assessment_date))
+        self._connect()
+        try:
+            self.cursor.execute('''
+                INSERT INTO assessments (course_id, name, weight, max_score, assessment_date, academic_year)
+                VALUES (?, ?, ?, ?, ?, ?)
+            ''', (course_id, name, weight, max_score, assessment_date and str(assessment_date), academic_year))
+            self.conn.commit()
+            self._bump_version("assessments")
+            return self.cursor.lastrowid
+        except sqlite3.Error as e:
+            self.on_error(f"Error inserting assessment: {e}")
+            return None
+        finally:
+            self._close()
+
+    def delete_assessment(self, assessment_id):
+        """Deletes an assessment with its scores. Returns the number of scores removed, or None on error."""
+        ids = json.dumps([assessment_id])
+        def work():
+            scores = self._count("scores", "assessment_id", ids)
+            self.cursor.execute(f"DELETE FROM assessments WHERE id IN ({self._IDS})", (ids,))
+            return scores
+        return self._lifecycle("deleting assessment", work, ("assessments", "scores"))
+
+    def fetch_assessments(self, course_id=None, academic_year=None):
+        """(id, course_id, name, weight, max_score, assessment_date, academic_year) of `academic_year` (default: current)."""
+        query = '''
+            SELECT id, course_id, name, weight, max_score, assessment_date, academic_year FROM assessments
+            WHERE academic_year = ?
+        '''
+        params = [academic_year or academic_year_of()]
+        if course_id:
+            query += " AND course_id = ?"
+            params.append(course_id)
+        self._connect()
+        try:
+            self.cursor.execute(query + " ORDER BY course_id, assessment_date IS NULL, assessment_date, id", params)
+            return self.cursor.fetchall()
+        except sqlite3.Error as e:
+            self.on_error(f"Error fetching assessments: {e}")
+            return []
+        finally:
+            self._close()
+
+    def fetch_scores(self, assessment_id):
+        """[(student_id, score)] of one assessment."""
+        self._connect()
+        try:
+            self.cursor.execute("SELECT student_id, score FROM scores WHERE assessment_id = ? ORDER BY student_id",
+                                (assessment_id,))
+            return self.cursor.fetchall()
+        except sqlite3.Error as e:
+            self.on_error(f"Error fetching scores: {e}")
+            return []
+        finally:
+            self._close()
+
+    # Unchanged scores are not rewritten, so saving a roster again adds nothing to the change log
+    _SCORE_UPSERT = '''
+        INSERT INTO scores (assessment_id, student_id, score) VALUES (?, ?, ?)
+        ON CONFLICT (assessment_id, student_id) DO UPDATE SET score = excluded.score WHERE score IS NOT excluded.score
+    '''
+
+    def record_scores(self, assessment_id, scores):
+        """
+        Scores of one assessment for a whole roster, in one transaction: {student_id: score}, where a
+        score of None removes the student's score. Returns {"saved", "removed"}, or None on error.
+        """
+        saved = [(assessment_id, student_id, score) for student_id, score in scores.items() if score is not None]
+        removed = json.dumps([student_id for student_id, score in scores.items() if score is None])
+        def work():
+            self.cursor.executemany(self._SCORE_UPSERT, saved)
+            self.cursor.execute(f"DELETE FROM scores WHERE assessment_id = ? AND student_id IN ({self._IDS})",
+                                (assessment_id, removed))
+            return {"saved": len(saved), "removed": self.cursor.rowcount}
+        return self._lifecycle("recording scores", work, ("scores",))
+
+    def fetch_transcript(self, student_id, academic_year=None):
+        """
+        (course_id, nome_corso, assessment_id, name, weight, max_score, assessment_date, score or None) for every
+        assessment of `academic_year` in the courses the student attends or has a score in, by course and date.
+        """
+        self._connect()
+        try:
+            self.cursor.execute('''
+                SELECT c.id, c.nome_corso, a.id, a.name, a.weight, a.max_score, a.assessment_date, s.score
+                FROM assessments a
+                JOIN courses c ON c.id = a.course_id
+                LEFT JOIN scores s ON s.assessment_id = a.id AND s.student_id = ?
+                WHERE a.academic_year = ?
+                  AND (s.score IS NOT NULL OR a.course_id IN (SELECT course_id FROM course_students WHERE student_id = ?))
+                ORDER BY c.nome_corso, c.id, a.assessment_date IS NULL, a.assessment_date, a.id
+            ''', (student_id, academic_year or academic_year_of(), student_id))
+            return self.cursor.fetchall()
+        except sqlite3.Error as e:
+            self.on_error(f"Error fetching transcript: {e}")
+            return []
+        finally:
+            self._close()
+
+    # --- Streaming reads (large result sets) ---
+    def _iter_batches(self, query, params=(), batch_size=500, archive=None):
+        """
+        Yields the rows of `query` in lists of at most `batch_size`, on a connection of its own
+        (closed when the generator is exhausted or closed), so the result set is never held in memory.
+        `archive`: archive file attached as 'archive' first.
+        """
+        conn = self._open()
+        try:
+            if archive:
+                conn.execute("ATTACH DATABASE ? AS archive", (archive,))
+            cursor = conn.execute(query, params)
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                yield rows
+        except sqlite3.Error as e:
+            self.on_error(f"Error streaming query results: {e}")
+        finally:
+            conn.close()
+
+    def iter_students(self, batch_size=500):
+        return self._iter_batches('SELECT id, name, last_name, date_of_birth FROM students WHERE inactive_since IS NULL ORDER BY id', (), batch_size)
+
+    def iter_attendance_records(self, batch_size=5000, since=None, until=None):
+        """
+        Raw (student_id, course_id, attendance_date, status) rows of the whole attendance table,
+        or of the days from `since` to `until` (inclusive, either may be None) through the date index.
+        """
+        query = 'SELECT student_id, course_id, attendance_date, status FROM attendance'
+        bounds = [(f"attendance_date {op} ?", str(day)) for op, day in ((">=", since), ("<=", until)) if day]
+        if bounds:
+            query += " WHERE " + " AND ".join(condition for condition, _ in bounds)
+        return self._iter_batches(query, tuple(day for _, day in bounds), batch_size)
+
+    def last_attendance_date(self):
+        """Date of the latest attendance record (datetime.date), None without records or on error."""
+        self._connect()
+        try:
+            self.cursor.execute("SELECT MAX(attendance_date) FROM attendance")
+            last = self.cursor.fetchone()[0]
+            return datetime.date.fromisoformat(last) if last else None
+        except sqlite3.Error as e:
+            self.on_error(f"Error fetching attendance: {e}")
+            return None
+        finally:
+            self._close()
+
+    def iter_score_records(self, academic_year=None, batch_size=50000):
+        """Raw (assessment_id, student_id, score) rows of `academic_year` (default: current), current students only."""
+        return self._iter_batches('''
+            SELECT s.assessment_id, s.student_id, s.score
+            FROM assessments a
+            JOIN scores s ON s.assessment_id = a.id
+            WHERE a.academic_year = ?
+              AND s.student_id NOT IN (SELECT id FROM students WHERE inactive_since IS NOT NULL) -- Few: cheaper than a join
+        ''', (academic_year or academic_year_of(),), batch_size)
+
+    def iter_attendance(self, course_id=None, student_id=None, attendance_date=None, batch_size=500, academic_year=None):
+        archive = self._archive_for(academic_year)
+        query, params = self._attendance_query(course_id, student_id, attendance_date, academic_year, bool(archive))
+        return self._iter_batches(query + " ORDER BY a.id", params, batch_size, archive)
+
+    # --- Academic year archives ---
+    # Tables of an archive file (no foreign keys: students and courses stay in the live database)
+    _ARCHIVE_SCHEMA = {
+        "attendance": '''(
+            id INTEGER PRIMARY KEY,
+            student_id INTEGER NOT NULL,
+            course_id INTEGER NOT NULL,
+            attendance_date TEXT NOT NULL,
+            status TEXT NOT NULL,
+            UNIQUE(student_id, course_id, attendance_date)
+        )''',
+        "course_students": '''(
+            course_id INTEGER,
+            student_id INTEGER,
+            academic_year TEXT,
+            PRIMARY KEY (course_id, student_id, academic_year)
+        )''',
+    }
+
+    def archive_path(self, academic_year):
+        """Archive file of `academic_year`, next to the live database: school_data_archive_2023-2024.db"""
+        return f"{os.path.splitext(self.db_name)[0]}_archive_{academic_year}.db"
+
+    def archived_years(self):
+        """Labels of the academic years with an archive file, oldest first."""
+        prefix = os.path.basename(os.path.splitext(self.db_name)[0]) + "_archive_"
+        directory = os.path.dirname(os.path.abspath(self.db_name))
+        years = [name[len(prefix):-3] for name in os.listdir(directory) if name.startswith(prefix) and name.endswith(".db")]
+        return sorted(year for year in years if LABEL.match(year))
+
+    def archive_academic_year(self, academic_year, vacuum=True):
+        """
+        Moves the attendance and enrollments of a closed academic year into its archive file (attached,
+        copied and deleted in one transaction), then compacts the live database with VACUUM.
+        The change log gets a single ARCHIVE entry instead of one DELETE per row.
+        Returns {"attendance": rows moved, "course_students": rows moved}, or None on error.
+        """
+        try:
+            first_day, last_day = academic_year_bounds(academic_year)
+        except ValueError as e:
+            self.on_error(str(e))
+            return None
+        if last_day >= datetime.date.today():
+            self.on_error(f"Academic year {academic_year} is not over yet: only past years can be archived.")
+            return None
+        path = self.archive_path(academic_year)
+        self._connect()
+        try:
+            self.cursor.execute("ATTACH DATABASE ? AS archive", (path,))
+            for table, schema in self._ARCHIVE_SCHEMA.items():
+                self.cursor.execute(f"CREATE TABLE IF NOT EXISTS archive.{table} {schema}")
+            with self.conn:
+                moved = {}
+                # Re-running for the same year adds what was recorded since, nothing twice
+                self.cursor.execute('''
+                    INSERT OR IGNORE INTO archive.attendance
+                    SELECT id, student_id, course_id, attendance_date, status FROM main.attendance
+                    WHERE attendance_date BETWEEN ? AND ?
+                ''', (first_day.isoformat(), last_day.isoformat()))
+                self.cursor.execute('''
+                    INSERT OR IGNORE INTO archive.course_students
+                    SELECT course_id, student_id, academic_year FROM main.course_students WHERE academic_year = ?
+                ''', (academic_year,))
+                self.cursor.execute("INSERT INTO change_log_pause (reason) VALUES ('archive')")
+                self.cursor.execute("DELETE FROM main.attendance WHERE attendance_date BETWEEN ? AND ?",
+                                    (first_day.isoformat(), last_day.isoformat()))
+                moved["attendance"] = self.cursor.rowcount
+                self.cursor.execute("DELETE FROM main.course_waitlist WHERE academic_year = ?", (academic_year,))
+                self.cursor.execute("DELETE FROM main.course_students WHERE academic_year = ?", (academic_year,))
+                moved["course_students"] = self.cursor.rowcount
+                self.cursor.execute("DELETE FROM change_log_pause")
+                self.cursor.execute('''
+                    INSERT INTO change_log (table_name, operation, row_id, data) VALUES ('*', 'ARCHIVE', 0, ?)
+                ''', (json.dumps({"academic_year": academic_year, "archive": path, **moved}),))
+                # Before the VACUUM, so that it also gives back the pages of the consumed entries
+                self.cursor.execute(self._PRUNE_CHANGE_LOG)
+            self.cursor.execute("DETACH DATABASE archive")
+            if vacuum:
+                self.cursor.execute("VACUUM")
+        except sqlite3.Error as e:
+            self.on_error(f"Error archiving academic year {academic_year}: {e}")
+            return None
+        finally:
+            self._close()
+        self._bump_version("attendance", "course_students", "course_waitlist")
+        return moved
+
+    def _archive_for(self, academic_year):
+        """Archive file to attach for a historical query, None when the year is still in the live database."""
+        if academic_year is None:
+            return None
+        path = self.archive_path(academic_year)
+        return path if os.path.exists(path) else None
+
+    def fetch_archived_enrollments(self, academic_year):
+        """(course_id, nome_corso, student_id, name, last_name) enrolled in `academic_year`, archived or live."""
+        archive = self._archive_for(academic_year)
+        self._connect()
+        try:
+            if archive:
+                self.cursor.execute("ATTACH DATABASE ? AS archive", (archive,))
+            self.cursor.execute(f'''
+                SELECT c.id, c.nome_corso, s.id, s.name, s.last_name
+                FROM {"archive" if archive else "main"}.course_students cs
+                JOIN courses c ON cs.course_id = c.id
+                JOIN students s ON cs.student_id = s.id
+                WHERE cs.academic_year = ?
+                ORDER BY c.nome_corso, s.last_name, s.name
+            ''', (academic_year,))
+            return self.cursor.fetchall()
+        except sqlite3.Error as e:
+            self.on_error(f"Error fetching enrollments of {academic_year}: {e}")
+            return []
+        finally:
+            self._close()
+
+    # --- Report snapshots ---
+    def enable_report_snapshot(self, max_age=60):
+        """
+        Turns on the periodically refreshed copy that report reads can use (see snapshot.py).
+        Idempotent: the first call creates it, later ones return it. Returns the ReportSnapshot.
+        """
+        with self._snapshot_lock:
+            if self.report_snapshot is None:
+                from .snapshot import ReportSnapshot
+                self.report_snapshot = ReportSnapshot(self, max_age)
+            return self.report_snapshot
+
+    def report_reader(self):
+        """
+        The DatabaseManager heavy report reads should go through: a read-only manager on the
+        snapshot when enable_report_snapshot() was called (data up to max_age seconds old), else self.
+        """
+        snapshot = self.report_snapshot
+        return snapshot.reader() if snapshot is not None else self
+
+    # --- Change log (change data capture, see changes.py) ---
+    # From sqlite_sequence rather than MAX(seq): it doesn't go back when the log is pruned
+    _LAST_CHANGE_SEQ = "SELECT COALESCE((SELECT seq FROM sqlite_sequence WHERE name = 'change_log'), 0)"
+
+    def last_change_seq(self):
+        """Sequence number of the latest change (0 if none), even if it has been pruned since."""
+        self._connect()
+        try:
+            self.cursor.execute(self._LAST_CHANGE_SEQ)
+            return self.cursor.fetchone()[0]
+        except sqlite3.Error as e:
+            self.on_error(f"Error reading change log: {e}")
+            return None
+        finally:
+            self._close()
+
+    def change_log_head(self):
+        """
+        (seq, changed_at) of the latest change ((0, None) for an empty log), None on error.
+        seq comes from sqlite_sequence, so it never goes back, even after the log is pruned.
+        """
+        self._connect()
+        try:
+            self.cursor.execute('''
+                SELECT s.seq, c.changed_at FROM sqlite_sequence s LEFT JOIN change_log c ON c.seq = s.seq
+                WHERE s.name = 'change_log'
+            ''')
+            row = self.cursor.fetchone()
+            return tuple(row) if row else (0, None)
+        except sqlite3.Error as e:
+            self.on_error(f"Error reading change log: {e}")
+            return None
+        finally:
+            self._close()
+
+    def change_log_gap(self, after):
+        """
+        True when entries after seq `after` have been pruned, so a reader that stopped there can't
+        catch up from the log. None on error.
+        """
+        self._connect()
+        try:
+            self.cursor.execute('''
+                SELECT COALESCE((SELECT MIN(seq) FROM change_log), head + 1) > ? + 1 AND head > ?
+                FROM (SELECT COALESCE((SELECT seq FROM sqlite_sequence WHERE name = 'change_log'), 0) AS head)
+            ''', (after, after))
+            return bool(self.cursor.fetchone()[0])
+        except sqlite3.Error as e:
+            self.on_error(f"Error reading change log: {e}")
+            return None
+        finally:
+            self._close()
+
+    def fetch_changes(self, after=0, limit=1000, tables=None):
+        """
+        Up to `limit` change_log entries with seq > `after`, oldest first:
+        (seq, table_name, operation, row_id, data JSON, changed_at). Uses the seq index only.
+        """
+        query = "SELECT seq, table_name, operation, row_id, data, changed_at FROM change_log WHERE seq > ?"
+        params = [after]
+        if tables:
+            query += f" AND table_name IN ({', '.join('?' * len(tables))})"
+            params += list(tables)
+        self._connect()
+        try:
+            self.cursor.execute(query + " ORDER BY seq LIMIT ?", params + [limit])
+            return self.cursor.fetchall()
+        except sqlite3.Error as e:
+            self.on_error(f"Error reading change log: {e}")
+            return []
+        finally:
+            self._close()
+
+    def iter_changes(self, after=0, batch_size=1000, tables=None):
+        """
+        Batches of fetch_changes() up to the end of the log. Each batch is a separate short query
+        (keyset pagination on seq), so the caller can write between batches without holding a read lock.
+        """
+        while True:
+            rows = self.fetch_changes(after, batch_size, tables)
+            if not rows:
+                return
+            yield rows
+            after = rows[-1][0]
+
+    def consumer_cursor(self, name):
+        """Last seq committed by consumer `name` (0 for a new consumer)."""
+        self._connect()
+        try:
+            self.cursor.execute("SELECT last_seq FROM change_consumers WHERE name = ?", (name,))
+            row = self.cursor.fetchone()
+            return row[0] if row else 0
+        except sqlite3.Error as e:
+            self.on_error(f"Error reading consumer cursor: {e}")
+            return None
+        finally:
+            self._close()
+
+    def commit_consumer_cursor(self, name, seq):
+        """Records that `name` has processed everything up to `seq`. Cursors never move backwards."""
+        self._connect()
+        try:
+            self.cursor.execute('''
+                INSERT INTO change_consumers (name, last_seq) VALUES (?, ?)
+                ON CONFLICT (name) DO UPDATE SET last_seq = MAX(last_seq, excluded.last_seq),
+                                                 updated_at = excluded.updated_at
+            ''', (name, seq))
+            self.conn.commit()
+            return True
+        except sqlite3.Error as e:
+            self.on_error(f"Error saving consumer cursor: {e}")
+            return False
+        finally:
+            self._close()
+
+    def fetch_consumers(self):
+        """(name, last_seq, updated_at) of every consumer."""
+        self._connect()
+        try:
+            self.cursor.execute("SELECT name, last_seq, updated_at FROM change_consumers ORDER BY name")
+            return self.cursor.fetchall()
+        except sqlite3.Error as e:
+            self.on_error(f"Error reading consumers: {e}")
+            return []
+        finally:
+            self._close()
+
+    # Entries every registered consumer has committed; nothing without consumers
+    _PRUNE_CHANGE_LOG = "DELETE FROM change_log WHERE seq <= (SELECT COALESCE(MIN(last_seq), 0) FROM change_consumers)"
+
+    def prune_change_log(self):
+        """
+        Deletes the entries every registered consumer has committed. Returns how many were deleted.
+        Runs after consumers commit (ChangeConsumer.consume, POST /changes/commit) and on archive;
+        unregistered readers (FeedCache, warm start) detect what they missed with change_log_gap().
+        """
+        self._connect()
+        try:
+            self.cursor.execute(self._PRUNE_CHANGE_LOG)
+            self.conn.commit()
+            return self.cursor.rowcount
+        except sqlite3.Error as e:
+            self.on_error(f"Error pruning change log: {e}")
+            return None
+        finally:
+            self._close()
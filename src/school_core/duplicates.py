@@ -0,0 +1,196 @@
+"""
+Near-duplicate student records (typos, swapped first/last names, mistyped birth dates).
+
+Comparing every pair of 100k students is 5e9 comparisons, so records are first put in
+blocks and only records sharing a block are scored:
+
+    pass 1: Soundex codes of first and last name (in either order) + birth year
+    pass 2: Soundex code of any name token + full date of birth
+
+A typo that keeps the Soundex code, a swap of first and last name or a wrong day of
+birth meet in pass 1; a typo that changes one name's code but keeps the birth date
+meets in pass 2. A block larger than `max_block` (a name that is very common in one
+year) is not compared all-pairs: it is sorted and every record is compared with its
+`window` neighbours (sorted neighbourhood).
+
+The score is the Jaro-Winkler similarity of the names, first/last or swapped, scaled
+down when the dates of birth differ: homonyms born on different days score 0.85, so
+they're told apart from duplicates (>= `threshold`, default 0.92).
+
+    index = DuplicateIndex(db_manager.fetch_students())
+    index.matches("Giovani", "Rossi", "2010-03-04")   # [(student id, score)] for a single insert
+    index.groups()                                   # [[id, ...]] of the whole school, for merging
+"""
+import collections
+import functools
+import itertools
+import re
+import unicodedata
+
+DEFAULT_THRESHOLD = 0.92
+
+_SOUNDEX = {letter: digit for digit, letters in (("1", "bfpv"), ("2", "cgjkqsxz"), ("3", "dt"), ("4", "l"),
+                                                  ("5", "mn"), ("6", "r")) for letter in letters}
+_NOT_NAME = re.compile(r"[^a-z0-9 ]+")
+
+StudentMatch = collections.namedtuple("StudentMatch", ["id", "other_id", "score"])
+
+@functools.lru_cache(maxsize=1 << 16) # Names repeat: first names, common surnames
+def normalize_name(text):
+    """Lowercase ASCII letters, digits and single spaces: 'D'Angelo  Núñez' -> 'dangelo nunez'."""
+    text = unicodedata.normalize("NFKD", str(text)).encode("ascii", "ignore").decode("ascii").lower()
+    return " ".join(_NOT_NAME.sub("", text.replace("-", " ")).split())
+
+@functools.lru_cache(maxsize=1 << 16)
+def soundex(word):
+    """American Soundex of a normalized word ('' for no letters)."""
+    letters = "".join(c for c in word if c.isalpha())
+    if not letters:
+        return ""
+    code, last = letters[0].upper(), _SOUNDEX.get(letters[0], "")
+    for letter in letters[1:]:
+        digit = _SOUNDEX.get(letter, "")
+        if digit and digit != last:
+            code += digit
+            if len(code) == 4:
+                break
+        if letter not in "hw": # h and w don't separate two letters with the same code
+            last = digit
+    return code.ljust(4, "0")
+
+@functools.lru_cache(maxsize=1 << 16) # Common first names meet each other over and over
+def jaro_winkler(a, b):
+    if a == b:
+        return 1.0
+    if not a or not b:
+        return 0.0
+    window = max(max(len(a), len(b)) // 2 - 1, 0)
+    taken = [False] * len(b)
+    matched_a = []
+    for i, letter in enumerate(a):
+        for j in range(max(0, i - window), min(len(b), i + window + 1)):
+            if not taken[j] and b[j] == letter:
+                taken[j] = True
+                matched_a.append(letter)
+                break
+    m = len(matched_a)
+    if not m:
+        return 0.0
+    matched_b = [letter for letter, hit in zip(b, taken) if hit]
+    transpositions = sum(x != y for x, y in zip(matched_a, matched_b)) / 2
+    jaro = (m / len(a) + m / len(b) + (m - transpositions) / m) / 3
+    prefix = 0
+    for x, y in zip(a[:4], b[:4]):
+        if x != y:
+            break
+        prefix += 1
+    return jaro + prefix * 0.1 * (1 - jaro)
+
+def _dob_factor(a, b):
+    """1 for the same date of birth, 0.97 for a likely typo (day/month swapped, one digit), else 0.85."""
+    if a == b:
+        return 1.0
+    if len(a) == len(b) == 10 and a[:4] == b[:4] and a[5:7] == b[8:10] and a[8:10] == b[5:7]:
+        return 0.97
+    if len(a) == len(b) and sum(x != y for x, y in zip(a, b)) == 1:
+        return 0.97
+    return 0.85
+
+# A prepared record: id, normalized first and last name, date of birth, block keys
+_Record = collections.namedtuple("_Record", ["id", "first", "last", "dob", "keys"])
+
+def _prepare(student_id, name, last_name, date_of_birth):
+    first, last, dob = normalize_name(name), normalize_name(last_name), str(date_of_birth or "").strip()
+    year = dob[:4]
+    keys = {("name", *sorted((soundex(first), soundex(last))), year)}
+    keys |= {("token", soundex(token), dob) for token in f"{first} {last}".split() if len(token) > 1}
+    return _Record(student_id, first, last, dob, frozenset(keys))
+
+def score(a, b):
+    """Similarity of two prepared records, 0..1."""
+    straight = (jaro_winkler(a.first, b.first) + jaro_winkler(a.last, b.last)) / 2
+    swapped = (jaro_winkler(a.first, b.last) + jaro_winkler(a.last, b.first)) / 2
+    return max(straight, swapped) * _dob_factor(a.dob, b.dob)
+
+class DuplicateIndex:
+    """Blocking index over (id, name, last_name, date_of_birth) rows, updated record by record."""
+
+    def __init__(self, students=(), threshold=DEFAULT_THRESHOLD, max_block=500, window=20):
+        self.threshold = threshold
+        self.max_block = max_block
+        self.window = window
+        self._records = {} # id -> _Record
+        self._blocks = collections.defaultdict(set) # block key -> {id}
+        for row in students:
+            self.add(*row)
+
+    def __len__(self):
+        return len(self._records)
+
+    def add(self, student_id, name, last_name, date_of_birth):
+        self.remove(student_id)
+        record = _prepare(student_id, name, last_name, date_of_birth)
+        self._records[student_id] = record
+        for key in record.keys:
+            self._blocks[key].add(student_id)
+
+    def remove(self, student_id):
+        record = self._records.pop(student_id, None)
+        if record is None:
+            return
+        for key in record.keys:
+            block = self._blocks.get(key)
+            if block is not None:
+                block.discard(student_id)
+                if not block:
+                    del self._blocks[key]
+
+    def matches(self, name, last_name, date_of_birth, exclude=None):
+        """[(id, score)] of the records that look like this student, best first (`exclude`: its own id)."""
+        probe = _prepare(None, name, last_name, date_of_birth)
+        candidates = set().union(*(self._blocks.get(key, ()) for key in probe.keys)) - {exclude}
+        scored = ((student_id, score(probe, self._records[student_id])) for student_id in candidates)
+        return sorted(((student_id, s) for student_id, s in scored if s >= self.threshold), key=lambda m: (-m[1], m[0]))
+
+    def _candidate_pairs(self):
+        for ids in self._blocks.values():
+            if len(ids) < 2:
+                continue
+            if len(ids) <= self.max_block:
+                yield from itertools.combinations(sorted(ids), 2)
+                continue
+            ordered = sorted(ids, key=lambda i: (self._records[i].last, self._records[i].first, i))
+            for position, student_id in enumerate(ordered):
+                for other_id in ordered[position + 1:position + 1 + self.window]:
+                    yield (student_id, other_id) if student_id < other_id else (other_id, student_id)
+
+    def pairs(self):
+        """StudentMatch(id, other_id, score) for every pair at or above the threshold (id < other_id), best first."""
+        seen, found = set(), []
+        records = self._records
+        for pair in self._candidate_pairs():
+            if pair in seen:
+                continue
+            seen.add(pair)
+            s = score(records[pair[0]], records[pair[1]])
+            if s >= self.threshold:
+                found.append(StudentMatch(pair[0], pair[1], s))
+        return sorted(found, key=lambda m: (-m.score, m.id, m.other_id))
+
+    def groups(self, pairs=None):
+        """Sets of records that are duplicates of each other (connected pairs), as sorted id lists, largest first."""
+        parent = {}
+
+        def root(student_id):
+            parent.setdefault(student_id, student_id)
+            while parent[student_id] != student_id:
+                parent[student_id] = parent[parent[student_id]]
+                student_id = parent[student_id]
+            return student_id
+
+        for match in self.pairs() if pairs is None else pairs:
+            parent[root(match.id)] = root(match.other_id)
+        groups = collections.defaultdict(list)
+        for student_id in parent:
+            groups[root(student_id)].append(student_id)
+        return sorted((sorted(ids) for ids in groups.values()), key=lambda ids: (-len(ids), ids[0]))
@@ -0,0 +1,209 @@
+"""
+Absence early warning: rolling absence rates and absence/late streaks for every
+(student, course) pair, computed on whole NumPy arrays.
+
+Only the attendance of the last TREND_DAYS + LOOKBACK days is read (raw rows, no joins,
+through the date index), converted to arrays a chunk at a time into a dense pairs × days
+grid. Rolling 2- and 4-week rates are differences of cumulative sums along the day axis,
+streaks are counted back from each pair's last session that broke them, so the cost is
+a handful of array passes whatever the number of students or the length of the history.
+Only the trailing TREND_DAYS columns of the rates are kept.
+
+Days without a record for a pair (weekends, holidays, not enrolled yet) are not
+sessions: rates are absences / recorded sessions inside the window.
+"""
+import datetime
+import itertools
+
+import numpy as np
+
+# Days of rates kept (the UI's trend chart shows 90), and days read before them for complete 4-week windows
+TREND_DAYS = 90
+LOOKBACK = 27
+CHUNK = 50_000 # Rows converted to arrays at a time
+_STATUS_CODES = {"Absent": 1, "Late": 2} # Anything else (Present, Excused...) is 0
+
+DEFAULT_THRESHOLDS = {
+    "rate_14": 0.20,         # 2-week absence rate
+    "rate_28": 0.15,         # 4-week absence rate
+    "absence_streak": 3,     # consecutive absences up to the last session
+    "late_streak": 3,        # consecutive late arrivals up to the last session
+}
+
+def _rolling_sum(cumulative, window):
+    """cumulative[:, d + 1] = sum of days 0..d; returns the sum over the `window` days ending at each day."""
+    days = cumulative.shape[1] - 1
+    end = np.arange(1, days + 1)
+    start = np.maximum(end - window, 0)
+    return cumulative[:, end] - cumulative[:, start]
+
+def _trailing_streak(hit, recorded):
+    """Per row: how many of the last recorded sessions in a row have `hit` set."""
+    breaks = recorded & ~hit
+    days = hit.shape[1]
+    # Index of the last session that broke the streak (-1 if none)
+    last_break = np.where(breaks.any(axis=1), days - 1 - np.argmax(breaks[:, ::-1], axis=1), -1)
+    cumulative = np.concatenate([np.zeros((hit.shape[0], 1), dtype=np.int32), np.cumsum(hit, axis=1, dtype=np.int32)], axis=1)
+    return cumulative[:, -1] - cumulative[np.arange(hit.shape[0]), last_break + 1]
+
+class EarlyWarning:
+    """
+    `student_ids[p]` / `course_ids[p]` identify pair `p`, `days` is the calendar day axis (the trailing days only).
+    `rate_14[p, d]` / `rate_28[p, d]` are rolling absence rates (NaN without sessions in the window);
+    `absence_streak[p]` / `late_streak[p]` are the current streaks as of the last day.
+    """
+    def __init__(self, student_ids, course_ids, days, rate_14, rate_28, sessions_28, absence_streak, late_streak):
+        self.student_ids = student_ids
+        self.course_ids = course_ids
+        self.days = days
+        self.rate_14 = rate_14
+        self.rate_28 = rate_28
+        self.sessions_28 = sessions_28
+        self.absence_streak = absence_streak
+        self.late_streak = late_streak
+
+    def __len__(self):
+        return len(self.student_ids)
+
+    def flags(self, thresholds=None):
+        """Boolean arrays (one per threshold) over the pairs, as of the last day."""
+        t = dict(DEFAULT_THRESHOLDS, **(thresholds or {}))
+        if not len(self.days):
+            empty = np.zeros(len(self), dtype=bool)
+            return {name: empty for name in t}
+        with np.errstate(invalid="ignore"):
+            return {
+                "rate_14": self.rate_14[:, -1] >= t["rate_14"],
+                "rate_28": self.rate_28[:, -1] >= t["rate_28"],
+                "absence_streak": self.absence_streak >= t["absence_streak"],
+                "late_streak": self.late_streak >= t["late_streak"],
+            }
+
+    def flagged(self, thresholds=None):
+        """
+        One dict per flagged pair, worst first: ids, current rates, the change of the 2-week rate
+        over the last two weeks, streaks and the names of the thresholds crossed.
+        """
+        flags = self.flags(thresholds)
+        any_flag = np.logical_or.reduce(list(flags.values()))
+        if not any_flag.any():
+            return []
+        last = -1
+        previous = -15 if len(self.days) >= 15 else 0
+        trend = self.rate_14[:, last] - self.rate_14[:, previous]
+        order = np.lexsort((-self.absence_streak, -np.nan_to_num(self.rate_14[:, last])))
+        results = []
+        for p in order[any_flag[order]]:
+            results.append({
+                "student_id": int(self.student_ids[p]),
+                "course_id": int(self.course_ids[p]),
+                "rate_14": float(self.rate_14[p, last]),
+                "rate_28": float(self.rate_28[p, last]),
+                "trend_14": float(trend[p]),
+                "sessions_28": int(self.sessions_28[p]),
+                "absence_streak": int(self.absence_streak[p]),
+                "late_streak": int(self.late_streak[p]),
+                "reasons": [name for name, flag in flags.items() if flag[p]],
+            })
+        return results
+
+    def trend(self, student_id, course_id, days=None):
+        """(dates, rate_14, rate_28) of one pair, the last `days` days only if given."""
+        match = np.flatnonzero((self.student_ids == student_id) & (self.course_ids == course_id))
+        if not len(match):
+            return [], np.array([]), np.array([])
+        p = match[0]
+        window = slice(-days, None) if days else slice(None)
+        return self.days[window], self.rate_14[p, window], self.rate_28[p, window]
+
+def _columns(rows, first_day, last_day):
+    """
+    (student, course, day, status code) arrays of the rows between the two days (None: unbounded),
+    converted CHUNK rows at a time so that the tuples of only one chunk are alive at once.
+    """
+    rows = iter(rows)
+    parts = []
+    while True:
+        chunk = list(itertools.islice(rows, CHUNK))
+        if not chunk:
+            break
+        day = np.array([r[2] for r in chunk], dtype="datetime64[D]")
+        keep = np.ones(len(chunk), dtype=bool)
+        if first_day is not None:
+            keep &= day >= first_day
+        if last_day is not None:
+            keep &= day <= last_day
+        student = np.fromiter((r[0] for r in chunk), dtype=np.int64, count=len(chunk))
+        course = np.fromiter((r[1] for r in chunk), dtype=np.int64, count=len(chunk))
+        status = np.fromiter((_STATUS_CODES.get(r[3], 0) for r in chunk), dtype=np.int8, count=len(chunk))
+        parts.append((student[keep], course[keep], day[keep], status[keep]))
+    if not parts:
+        return np.array([], dtype=np.int64), np.array([], dtype=np.int64), np.array([], dtype="datetime64[D]"), np.array([], dtype=np.int8)
+    return tuple(np.concatenate(column) for column in zip(*parts))
+
+def _empty():
+    empty = np.array([], dtype=np.int64)
+    return EarlyWarning(empty, empty, [], np.zeros((0, 0)), np.zeros((0, 0)), empty, empty, empty)
+
+def build_early_warning(rows, as_of=None, days=TREND_DAYS):
+    """
+    `rows`: iterable of (student_id, course_id, attendance_date, status) tuples, e.g. the batches of
+    DatabaseManager.iter_attendance_records() chained together. `as_of` (default: last recorded day)
+    ends the day axis; later records are ignored. Only the last `days` days are kept (None: all of them),
+    computed from LOOKBACK more so that their 4-week windows are complete; streaks don't look further back.
+    """
+    last_day = np.datetime64(as_of, "D") if as_of else None
+    first_day = last_day - (days + LOOKBACK - 1) if as_of and days else None
+    student, course, day, status = _columns(rows, first_day, last_day)
+    if not len(day):
+        return _empty()
+    if last_day is None:
+        last_day = day.max()
+        if days:
+            first_day = last_day - (days + LOOKBACK - 1)
+            keep = day >= first_day
+            student, course, day, status = student[keep], course[keep], day[keep], status[keep]
+    if first_day is None:
+        first_day = day.min()
+
+    # Dense grid: one row per (student, course), one column per calendar day
+    keys = student * (int(course.max()) + 1) + course
+    pair_keys, pair = np.unique(keys, return_inverse=True)
+    pair_course = pair_keys % (int(course.max()) + 1)
+    pair_student = pair_keys // (int(course.max()) + 1)
+    column = (day - first_day).astype(np.int64)
+    shape = (len(pair_keys), int((last_day - first_day).astype(np.int64)) + 1)
+
+    recorded = np.zeros(shape, dtype=bool)
+    absent = np.zeros(shape, dtype=bool)
+    late = np.zeros(shape, dtype=bool)
+    recorded[pair, column] = True
+    absent[pair, column] = status == _STATUS_CODES["Absent"]
+    late[pair, column] = status == _STATUS_CODES["Late"]
+
+    zeros = np.zeros((shape[0], 1), dtype=np.int32)
+    sessions = np.concatenate([zeros, np.cumsum(recorded, axis=1, dtype=np.int32)], axis=1)
+    absences = np.concatenate([zeros, np.cumsum(absent, axis=1, dtype=np.int32)], axis=1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        sessions_14 = _rolling_sum(sessions, 14)
+        sessions_28 = _rolling_sum(sessions, 28)
+        rate_14 = np.where(sessions_14 > 0, _rolling_sum(absences, 14) / sessions_14, np.nan)
+        rate_28 = np.where(sessions_28 > 0, _rolling_sum(absences, 28) / sessions_28, np.nan)
+
+    kept = slice(-days, None) if days else slice(None)
+    start = first_day.item() # datetime.date
+    axis = [start + datetime.timedelta(days=i) for i in range(shape[1])][kept]
+    return EarlyWarning(pair_student, pair_course, axis, rate_14[:, kept], rate_28[:, kept], sessions_28[:, -1],
+                        _trailing_streak(absent, recorded), _trailing_streak(late, recorded))
+
+def early_warning_from_db(db_manager, as_of=None, days=TREND_DAYS):
+    """
+    Reads the attendance of the days build_early_warning() needs (through the date index) and builds
+    the EarlyWarning arrays. Pass db_manager.report_reader() to scan the report snapshot instead of the live file.
+    """
+    as_of = as_of or db_manager.last_attendance_date()
+    if as_of is None:
+        return _empty()
+    since = as_of - datetime.timedelta(days=days + LOOKBACK - 1) if days else None
+    batches = db_manager.iter_attendance_records(since=since, until=as_of)
+    return build_early_warning((row for rows in batches for row in rows), as_of, days)
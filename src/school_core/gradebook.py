@@ -0,0 +1,248 @@
+"""
+Gradebook: weighted final grades, rankings and grade distributions of a whole academic
+year, computed on NumPy arrays.
+
+Scores are read once (raw rows, no joins) and every score is divided by its assessment's
+max_score. A student's final grade in a course is the weighted mean of the scores they
+have, in tenths (0-10, rounded to two decimals); assessments not taken yet don't count,
+and `coverage` is the share of the course's weight behind the grade. Every (student,
+course) pair is one array element, so all courses are graded, ranked and summarised
+with a handful of bincount/lexsort passes whatever the size of the school.
+
+Rankings are competition style (8.5, 8.5, 7 -> 1, 1, 3) and percentiles count ties as
+half below: within each course, and for the school on each student's average grade.
+
+    gradebook = gradebook_from_db(db_manager)
+    gradebook.course_ranking(course_id)   # [{"student_id", "grade", "rank", ...}] best first
+    gradebook.distribution()              # [{"course_id", "mean", "p50", "passing", ...}]
+    gradebook.student_grades(student_id)  # a transcript's final grades
+"""
+import collections
+import itertools
+
+import numpy as np
+
+PASSING_GRADE = 6.0
+QUANTILES = (10, 25, 50, 75, 90)
+
+Assessment = collections.namedtuple("Assessment", ["id", "course_id", "name", "weight", "max_score",
+                                                   "assessment_date", "academic_year"])
+Assessment.__doc__ = "A row of DatabaseManager.fetch_assessments."
+
+def _changes(values):
+    """True where a sorted array starts a new run of equal values."""
+    starts = np.ones(len(values), dtype=bool)
+    starts[1:] = values[1:] != values[:-1]
+    return starts
+
+def _runs(starts):
+    """The first and last position of the run each position is in, runs beginning where `starts` is True."""
+    n = len(starts)
+    position = np.arange(n)
+    ends = np.ones(n, dtype=bool)
+    ends[:-1] = starts[1:]
+    first = np.maximum.accumulate(np.where(starts, position, 0))
+    last = np.minimum.accumulate(np.where(ends, position, n)[::-1])[::-1]
+    return first, last
+
+def _hundredths(grades):
+    return np.rint(grades * 100).astype(np.int64)
+
+def _rank(groups, points):
+    """
+    Rank (1 = highest) and percentile of each element within its group, ties sharing the best
+    rank; `points` are non-negative integers (grades in hundredths). Returns (order, rank,
+    percentile, group size): `order` sorts the elements by group and descending points, the
+    others follow it.
+    """
+    top = int(points.max()) + 1 if len(points) else 1
+    key = groups * top + (top - 1 - points)
+    order = np.argsort(key, kind="stable") # One integer sort: much faster than lexsort on two keys
+    group_starts = _changes(groups[order])
+    group_first, group_last = _runs(group_starts)
+    tie_first, tie_last = _runs(_changes(key[order])) # A tie never crosses groups
+    size = group_last - group_first + 1
+    rank = tie_first - group_first + 1
+    percentile = 100 * ((group_last - tie_last) + (tie_last - tie_first + 1) / 2) / size
+    return order, rank, percentile, size
+
+class Gradebook:
+    """
+    Pairs: `student_ids[p]` / `course_ids[p]` with `grade[p]` (NaN if all their assessments weigh 0),
+    `coverage[p]`, `scored[p]` (assessments with a score) and, within the course, `rank[p]`
+    (0 if ungraded) out of `ranked[p]` graded students and `percentile[p]`. Students: `students[s]` with `average[s]` over their courses,
+    `school_rank[s]` and `school_percentile[s]`. Courses: `courses[c]` with `assessments[c]`.
+    """
+    def __init__(self, student_ids, course_ids, grade, coverage, scored, rank, ranked, percentile,
+                 students, average, school_rank, school_percentile, courses, assessments):
+        self.student_ids = student_ids
+        self.course_ids = course_ids
+        self.grade = grade
+        self.coverage = coverage
+        self.scored = scored
+        self.rank = rank
+        self.ranked = ranked
+        self.percentile = percentile
+        self.students = students
+        self.average = average
+        self.school_rank = school_rank
+        self.school_percentile = school_percentile
+        self.courses = courses
+        self.assessments = assessments
+
+    def __len__(self):
+        return len(self.student_ids)
+
+    def _pair(self, p):
+        graded = bool(self.rank[p])
+        return {
+            "student_id": int(self.student_ids[p]),
+            "course_id": int(self.course_ids[p]),
+            "grade": float(self.grade[p]) if graded else None,
+            "coverage": float(self.coverage[p]),
+            "scored": int(self.scored[p]),
+            "rank": int(self.rank[p]) if graded else None,
+            "of": int(self.ranked[p]),
+            "percentile": float(self.percentile[p]) if graded else None,
+        }
+
+    def course_ranking(self, course_id):
+        """One dict per student of the course, best grade first (ungraded students last)."""
+        pairs = np.flatnonzero(self.course_ids == course_id)
+        pairs = pairs[np.lexsort((self.student_ids[pairs], np.where(self.rank[pairs] > 0, self.rank[pairs], len(self) + 1)))]
+        return [self._pair(p) for p in pairs]
+
+    def student_grades(self, student_id):
+        """One dict per course of the student (pairs are sorted by student, then course)."""
+        first, last = np.searchsorted(self.student_ids, [student_id, student_id + 1])
+        return [self._pair(p) for p in range(first, last)]
+
+    def student_standing(self, student_id):
+        """{"average", "school_rank", "school_percentile", "of"} of a graded student, else None."""
+        s = np.searchsorted(self.students, student_id)
+        if s == len(self.students) or self.students[s] != student_id:
+            return None
+        return {"average": float(self.average[s]), "school_rank": int(self.school_rank[s]),
+                "school_percentile": float(self.school_percentile[s]), "of": len(self.students)}
+
+    def school_ranking(self, limit=None):
+        """The graded students by average grade, best first: one dict each."""
+        order = np.lexsort((self.students, self.school_rank))[:limit]
+        return [{"student_id": int(self.students[s]), "average": float(self.average[s]),
+                 "school_rank": int(self.school_rank[s]), "school_percentile": float(self.school_percentile[s])}
+                for s in order]
+
+    def distribution(self):
+        """
+        One dict per course with assessments: graded students, mean, min, the QUANTILES ("p10"...,
+        linear interpolation as numpy.percentile), max, and the share of students at PASSING_GRADE or above.
+        """
+        graded = self.rank > 0
+        course, grade = self.course_ids[graded], self.grade[graded]
+        rows = {int(c): {"course_id": int(c), "assessments": int(a), "students": 0, "mean": None, "min": None,
+                         **{f"p{q}": None for q in QUANTILES}, "max": None, "passing": None}
+                for c, a in zip(self.courses, self.assessments)}
+        if len(grade):
+            # Ascending by course, then grade: every course is one run
+            order = np.argsort(course * 1001 + _hundredths(grade), kind="stable")
+            course, grade = course[order], grade[order]
+            start = np.flatnonzero(_changes(course))
+            end = np.append(start[1:], len(course)) - 1
+            size = end - start + 1
+            position = start[:, None] + np.array(QUANTILES) / 100 * (size - 1)[:, None]
+            below = np.floor(position).astype(np.int64)
+            above = np.ceil(position).astype(np.int64)
+            quantiles = grade[below] + (grade[above] - grade[below]) * (position - below)
+            sums = np.add.reduceat(grade, start)
+            passing = np.add.reduceat((grade >= PASSING_GRADE).astype(np.int64), start)
+            for i, c in enumerate(course[start]):
+                rows[int(c)].update({"students": int(size[i]), "mean": float(sums[i] / size[i]), "min": float(grade[start[i]]),
+                            **{f"p{q}": float(quantiles[i, j]) for j, q in enumerate(QUANTILES)},
+                            "max": float(grade[end[i]]), "passing": float(passing[i] / size[i])})
+        return [rows[c] for c in sorted(rows)]
+
+def build_gradebook(assessments, scores):
+    """
+    `assessments`: (id, course_id, weight, max_score) rows of one academic year; `scores`: iterable of
+    (assessment_id, student_id, score) rows, e.g. the batches of DatabaseManager.iter_score_records()
+    chained together. Scores of assessments not listed are ignored.
+    """
+    assessments = np.array(list(assessments), dtype=np.float64).reshape(-1, 4)
+    scores = np.fromiter(itertools.chain.from_iterable(scores), dtype=np.float64).reshape(-1, 3)
+    assessment_ids = assessments[:, 0].astype(np.int64)
+    order = np.argsort(assessment_ids)
+    assessment_ids, assessments = assessment_ids[order], assessments[order]
+    a_course = assessments[:, 1].astype(np.int64)
+    courses, per_course = np.unique(a_course, return_counts=True)
+
+    score_assessment = scores[:, 0].astype(np.int64)
+    if len(assessment_ids):
+        index = np.minimum(np.searchsorted(assessment_ids, score_assessment), len(assessment_ids) - 1)
+        known = assessment_ids[index] == score_assessment
+    else:
+        index, known = np.zeros(len(scores), dtype=np.int64), np.zeros(len(scores), dtype=bool)
+    index, student, score = index[known], scores[known, 1].astype(np.int64), scores[known, 2]
+    course = a_course[index]
+    weight = assessments[index, 2]
+    fraction = score / assessments[index, 3]
+
+    # One element per (student, course): keys sorted by student, then course
+    stride = int(course.max()) + 1 if len(course) else 1
+    pair_keys, pair = np.unique(student * stride + course, return_inverse=True)
+    pair_student, pair_course = pair_keys // stride, pair_keys % stride
+    weighted = np.bincount(pair, weights=weight * fraction, minlength=len(pair_keys))
+    weights = np.bincount(pair, weights=weight, minlength=len(pair_keys))
+    scored = np.bincount(pair, minlength=len(pair_keys))
+    course_weight = np.bincount(a_course, weights=assessments[:, 2], minlength=stride)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        grade = np.round(np.where(weights > 0, 10 * weighted / weights, np.nan), 2)
+        total = course_weight[pair_course]
+        coverage = np.where(total > 0, weights / total, 0.0)
+
+    rank = np.zeros(len(pair_keys), dtype=np.int64)
+    ranked = np.zeros(len(pair_keys), dtype=np.int64)
+    percentile = np.full(len(pair_keys), np.nan)
+    graded = np.flatnonzero(~np.isnan(grade))
+    if len(graded):
+        order, ranks, percentiles, sizes = _rank(pair_course[graded], _hundredths(grade[graded]))
+        rank[graded[order]] = ranks
+        percentile[graded[order]] = percentiles
+        ranked[graded[order]] = sizes
+
+    # The school: every graded student's mean over their courses
+    students, student_index = np.unique(pair_student[graded], return_inverse=True)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        average = np.round(np.bincount(student_index, weights=grade[graded], minlength=len(students)) /
+                           np.bincount(student_index, minlength=len(students)), 2)
+    school_rank = np.zeros(len(students), dtype=np.int64)
+    school_percentile = np.zeros(len(students))
+    if len(students):
+        order, ranks, percentiles, _ = _rank(np.zeros(len(students), dtype=np.int64), _hundredths(average))
+        school_rank[order] = ranks
+        school_percentile[order] = percentiles
+    return Gradebook(pair_student, pair_course, grade, coverage, scored, rank, ranked, percentile,
+                     students, average, school_rank, school_percentile, courses, per_course)
+
+def gradebook_from_db(db_manager, academic_year=None):
+    """Reads the year's assessments and scores in one pass each and builds the Gradebook arrays."""
+    assessments = [(a[0], a[1], a[3], a[4]) for a in db_manager.fetch_assessments(academic_year=academic_year)]
+    scores = itertools.chain.from_iterable(db_manager.iter_score_records(academic_year))
+    return build_gradebook(assessments, scores)
+
+def build_transcript(rows, grades):
+    """
+    One dict per course of a student: "course_id", "nome_corso", "assessments" (one dict per assessment, "score"
+    None if not taken) and the final grade from Gradebook.student_grades ("grade", "coverage", "rank", "of",
+    "percentile"; None without scores). `rows`: DatabaseManager.fetch_transcript.
+    """
+    finals = {g["course_id"]: g for g in grades}
+    transcript = {}
+    for course_id, nome_corso, assessment_id, name, weight, max_score, assessment_date, score in rows:
+        final = finals.get(course_id, {})
+        entry = transcript.setdefault(course_id, {
+            "course_id": course_id, "nome_corso": nome_corso, "assessments": [],
+            **{key: final.get(key) for key in ("grade", "coverage", "rank", "of", "percentile")},
+        })
+        entry["assessments"].append({"id": assessment_id, "name": name, "assessment_date": assessment_date,
+                                     "weight": weight, "max_score": max_score, "score": score})
+    return list(transcript.values())
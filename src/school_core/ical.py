@@ -0,0 +1,244 @@
+"""
+iCalendar (RFC 5545) feeds of the timetable: one per student, teacher (Corso.docente) and room.
+
+Weekly slots and recurring rules become one VEVENT each with an RRULE (EXDATE for the
+cancelled lessons), so a feed stays small whatever range a calendar app displays.
+Times are floating: local school time, no time zone.
+
+FeedCache keeps the rendered feeds with their ETag. Calendar apps poll every few
+minutes; at most every `check_interval` seconds the cache reads the change log
+(changes.py) from its last position and drops exactly the feeds the new entries touch
+(a student's enrollments, a teacher's courses, the courses and rooms a feed shows), so
+an unchanged feed costs a dict lookup and, with If-None-Match, a 304. Feeds are read from the database, not
+from a Segreteria, so writes made by other processes (Streamlit, the CLI) show up too.
+
+    feeds = FeedCache(db_manager)
+    feed = feeds.get("student", 42)   # Feed(title, etag, body, seq), or None
+"""
+import collections
+import datetime
+import hashlib
+import threading
+import time
+
+from .academic_year import academic_year_bounds, academic_year_of
+from .changes import change_from_row
+from .recurrence import first_occurrence, rule_from_row, rule_from_time_slot
+
+FEED_KINDS = ("student", "teacher", "room")
+
+# Change-log tables that can change what a feed shows ('*': an archived academic year)
+FEED_TABLES = ("*", "students", "courses", "classrooms", "classroom_slots", "schedule_rules", "course_students")
+
+Feed = collections.namedtuple("Feed", ["title", "etag", "body", "seq"])
+Feed.__doc__ = "body: the VCALENDAR as UTF-8 bytes; seq: the change-log position it reflects."
+
+def _escape(text):
+    return str(text).replace("\\", "\\\\").replace(";", "\\;").replace(",", "\\,").replace("\n", "\\n")
+
+def _fold(line):
+    """Content lines longer than 75 octets go on continuation lines starting with a space (RFC 5545 3.1)."""
+    if len(line.encode("utf-8")) <= 75:
+        return line
+    parts, current, size = [], "", 0
+    for char in line:
+        width = len(char.encode("utf-8"))
+        if size + width > (74 if parts else 75):
+            parts.append(current)
+            current, size = "", 0
+        current += char
+        size += width
+    parts.append(current)
+    return "\r\n ".join(parts)
+
+def _local(date, time):
+    return f"{date:%Y%m%d}T{time:%H%M%S}"
+
+def feed_events(slots, rules, today=None):
+    """
+    (uid, ScheduleRule, nome_aula, nome_corso) for the slots and rules of DatabaseManager.fetch_feed. Weekly slots
+    start with the current academic year; slots that can't be parsed are skipped.
+    """
+    year_start = academic_year_bounds(academic_year_of(today))[0]
+    events = []
+    for classroom_id, course_id, nome_aula, nome_corso, time_slot in slots:
+        rule = rule_from_time_slot(classroom_id, course_id, time_slot)
+        if rule is None:
+            continue
+        if rule.start_date == datetime.date.min:
+            rule = rule._replace(start_date=year_start)
+        events.append((f"slot-{classroom_id}-{hashlib.sha1(time_slot.encode('utf-8')).hexdigest()[:12]}@school",
+                       rule, nome_aula, nome_corso))
+    for row in rules:
+        rule = rule_from_row(row[4:])
+        events.append((f"rule-{rule.id}@school", rule, row[2], row[3]))
+    return events
+
+def _event_lines(uid, rule, nome_aula, nome_corso):
+    """VEVENT properties of one slot or rule (DTSTAMP excluded), [] if it has no lesson at all."""
+    first = first_occurrence(rule)
+    if first is None or rule.end_date is not None and first > rule.end_date:
+        return []
+    lines = [f"UID:{uid}", f"SUMMARY:{_escape(nome_corso)}", f"LOCATION:{_escape(nome_aula)}",
+             f"DTSTART:{_local(first, rule.start)}", f"DTEND:{_local(first, rule.end)}"]
+    if rule.end_date != first:
+        until = f";UNTIL={_local(rule.end_date, datetime.time.max)}" if rule.end_date else ""
+        lines.append(f"RRULE:FREQ=WEEKLY;INTERVAL={rule.interval_weeks}{until}")
+        lines += [f"EXDATE:{_local(date, rule.start)}" for date in sorted(rule.exceptions)]
+    return lines
+
+def render_feed(title, events, stamp=None):
+    """
+    (text, etag): the VCALENDAR with CRLF line ends, and a weak ETag of its content. DTSTAMP
+    (`stamp`, default now) is left out of the ETag, so re-rendering unchanged data keeps it.
+    """
+    stamp = (stamp or datetime.datetime.now(datetime.timezone.utc)).strftime("%Y%m%dT%H%M%SZ")
+    head = ["BEGIN:VCALENDAR", "VERSION:2.0", "PRODID:-//school_core//Timetable//EN", "CALSCALE:GREGORIAN",
+            "METHOD:PUBLISH", f"X-WR-CALNAME:{_escape(title)}"]
+    blocks = [block for block in (_event_lines(*event) for event in events) if block]
+    digest = hashlib.sha1("\n".join(head + [line for block in blocks for line in block]).encode("utf-8")).hexdigest()
+    lines = list(head)
+    for uid_line, *properties in blocks:
+        lines += ["BEGIN:VEVENT", uid_line, f"DTSTAMP:{stamp}", *properties, "END:VEVENT"]
+    lines.append("END:VCALENDAR")
+    return "".join(_fold(line) + "\r\n" for line in lines), f'W/"{digest}"'
+
+def touched_keys(change):
+    """Dependency keys of the feeds a change-log entry can affect (see FeedCache)."""
+    data = change.data
+    if change.table == "students":
+        return [("student", change.row_id)]
+    if change.table == "courses": # The previous teacher's feed depends on the course itself
+        return [("course", data.get("id")), ("teacher", data.get("docente"))]
+    if change.table == "classrooms":
+        return [("room", data.get("id"))]
+    if change.table in ("classroom_slots", "schedule_rules"):
+        return [("room", data.get("classroom_id")), ("course", data.get("course_id"))]
+    if change.table == "course_students":
+        return [("student", data.get("student_id"))]
+    return []
+
+def etag_matches(if_none_match, etag):
+    """If-None-Match header check, with the weak comparison RFC 9110 asks for."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    opaque = etag.removeprefix("W/")
+    return any(tag.strip().removeprefix("W/") == opaque for tag in if_none_match.split(","))
+
+class FeedCache:
+    """
+    Rendered feeds keyed by (kind, key), LRU-bounded, thread-safe. Each feed depends on its own
+    key, on ("course", id) for the courses it covers and on ("room", id) for the rooms it shows;
+    refresh() maps every new change-log entry to the keys it touches and drops their dependents.
+    """
+    def __init__(self, db_manager, max_feeds=5000, check_interval=1.0):
+        self.db_manager = db_manager
+        self.max_feeds = max_feeds
+        self.check_interval = check_interval # Seconds a change may go unnoticed (one log query per interval)
+        self._checked_at = None
+        self._feeds = collections.OrderedDict() # (kind, key) -> (Feed, dependency keys)
+        self._dependents = collections.defaultdict(set) # dependency key -> {(kind, key)}
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock() # One thread reads the change log at a time
+        self._seq = None # Change-log position the cached feeds are up to date with
+        self._year = None # Weekly slots start with the academic year: a new one re-renders everything
+        self.stats = collections.Counter() # hits, renders, invalidated
+
+    def get(self, kind, key):
+        """The feed of a student (id), teacher (docente) or room (classroom id); None if there's no such one."""
+        if kind not in FEED_KINDS:
+            raise ValueError(f"Unknown feed kind '{kind}', expected one of {', '.join(FEED_KINDS)}")
+        if self._checked_at is None or time.monotonic() - self._checked_at >= self.check_interval:
+            self.refresh()
+        with self._lock:
+            entry = self._feeds.get((kind, key))
+            if entry is not None:
+                self._feeds.move_to_end((kind, key))
+                self.stats["hits"] += 1
+                return entry[0]
+        data = self.db_manager.fetch_feed(kind, key)
+        if data is None:
+            return None
+        seq, title, course_ids, slots, rules = data
+        text, etag = render_feed(title, feed_events(slots, rules))
+        feed = Feed(title, etag, text.encode("utf-8"), seq)
+        depends = {(kind, key)} | {("course", course_id) for course_id in course_ids}
+        depends |= {dependency for row in slots + rules for dependency in (("room", row[0]), ("course", row[1]))}
+        with self._lock:
+            self.stats["renders"] += 1
+            # Read before the last refresh: changes it skipped may concern this feed, so don't keep it
+            if self._seq is not None and seq >= self._seq:
+                self._store((kind, key), feed, depends)
+        return feed
+
+    def _store(self, feed_key, feed, depends):
+        self._drop(feed_key)
+        self._feeds[feed_key] = (feed, depends)
+        for dependency in depends:
+            self._dependents[dependency].add(feed_key)
+        while len(self._feeds) > self.max_feeds:
+            self._drop(next(iter(self._feeds)))
+
+    def _drop(self, feed_key):
+        entry = self._feeds.pop(feed_key, None)
+        if entry is None:
+            return False
+        for dependency in entry[1]:
+            dependents = self._dependents.get(dependency)
+            if dependents is not None:
+                dependents.discard(feed_key)
+                if not dependents:
+                    del self._dependents[dependency]
+        return True
+
+    def refresh(self):
+        """Drops the feeds touched by the change-log entries since the last call. Returns how many were dropped."""
+        with self._refresh_lock:
+            self._checked_at = time.monotonic()
+            last = self.db_manager.last_change_seq()
+            if last is None: # Database error: keep serving what's cached
+                return 0
+            year = academic_year_of()
+            # Not a registered consumer: entries pruned before this cache read them mean unknown changes
+            if (self._seq is None or year != self._year or last < self._seq
+                    or (last > self._seq and self.db_manager.change_log_gap(self._seq))):
+                with self._lock:
+                    dropped = len(self._feeds)
+                    self._clear()
+                    self._seq, self._year = last, year
+                    self.stats["invalidated"] += dropped
+                return dropped
+            if last == self._seq:
+                return 0
+            touched, position, everything = set(), last, False
+            for rows in self.db_manager.iter_changes(self._seq, tables=FEED_TABLES):
+                for row in rows:
+                    change = change_from_row(row)
+                    if change.table == "*":
+                        everything = True
+                    else:
+                        touched.update(touched_keys(change))
+                position = max(position, rows[-1][0])
+            with self._lock:
+                if everything:
+                    dropped = len(self._feeds)
+                    self._clear()
+                else:
+                    stale = {feed_key for key in touched for feed_key in self._dependents.get(key, ())}
+                    dropped = sum(self._drop(feed_key) for feed_key in stale)
+                self._seq = position
+                self.stats["invalidated"] += dropped
+            return dropped
+
+    def _clear(self):
+        self._feeds.clear()
+        self._dependents.clear()
+
+    def clear(self):
+        with self._lock:
+            self._clear()
+
+    def __len__(self):
+        return len(self._feeds)
@@ -0,0 +1,67 @@
+"""Domain classes: people, courses, classrooms."""
+
+ATTENDANCE_STATUSES = ("Present", "Absent", "Late", "Excused")
+
+class Persona:
+    def __init__(self, name, last_name, date_of_birth):
+        self.name = name
+        self.last_name = last_name
+        self.date_of_birth = date_of_birth
+
+class Alunni(Persona):
+    def __init__(self, name, last_name, date_of_birth, id=None):
+        super().__init__(name, last_name, date_of_birth)
+        self.id = id # Database ID
+
+    def display_alunno_info(self):
+        return {
+            "ID": self.id,
+            "Name": self.name,
+            "Last Name": self.last_name,
+            "Date of Birth": self.date_of_birth
+        }
+
+class Corso:
+    def __init__(self, nome_corso, durata, docente, id=None):
+        self.id = id # Database ID
+        self.nome_corso = nome_corso
+        self.durata = durata
+        self.docente = docente
+        self.alunni_frequentanti_il_tal_corso = [] # In-memory list of Alunni objects
+
+    def display_corso_info(self):
+        return {
+            "ID": self.id,
+            "Course Name": self.nome_corso,
+            "Duration": self.durata,
+            "Teacher": self.docente,
+            "Number of Students": len(self.alunni_frequentanti_il_tal_corso),
+            "Assigned Students": ", ".join([f"{s.name} {s.last_name}" for s in self.alunni_frequentanti_il_tal_corso]) if self.alunni_frequentanti_il_tal_corso else "None"
+        }
+
+class Aula:
+    def __init__(self, nome_aula, capacita_sedie, id=None):
+        self.id = id # Database ID
+        self.nome_aula = nome_aula
+        self.capacita_sedie = capacita_sedie
+        # Calendar of the aula: { 'Day Time': Corso }. The Corso objects (ids in the database) are shared
+        # with Segreteria.all_courses, so a renamed course shows up here without touching the calendar
+        self.lezioni = {}
+
+    @property
+    def occupazione_aula(self):
+        """Read-only view of the calendar with the current course names: { 'Day Time': Corso.nome_corso }"""
+        return {time_slot: corso.nome_corso for time_slot, corso in self.lezioni.items()}
+
+    def display_aula_info(self):
+        return {
+            "ID": self.id,
+            "Classroom Name": self.nome_aula,
+            "Chair Capacity": self.capacita_sedie,
+            "Occupancy Schedule": self.occupazione_aula if self.occupazione_aula else "No schedule defined."
+        }
+
+class UtilitySuite:
+    @staticmethod
+    def controlla_sedie(aula: Aula, numero_alunni_previsti: int) -> int:
+        return numero_alunni_previsti - aula.capacita_sedie
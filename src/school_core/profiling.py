@@ -0,0 +1,237 @@
+"""
+Opt-in profiling of Streamlit reruns (or any block of code).
+
+RerunProfiler wraps one rerun with cProfile and tracemalloc: the profile shows where
+the time went, the tracemalloc snapshot which lines allocated the memory that is
+still alive when the rerun ends (what a session keeps growing by). size_breakdown
+estimates how much each `st.session_state` entry holds, one level at a time, so a
+Segreteria list can be told apart from a cached DataFrame or calendar events.
+
+    profiler = RerunProfiler()
+    profiler.start()
+    ...  # the rerun
+    capture = profiler.stop(label="View Attendance", state=st.session_state)
+    zip_bytes = capture_zip(capture)
+
+Both profilers are process-wide (tracemalloc) or slow everything down (cProfile), so
+one rerun is profiled at a time: start() returns False while another one is running.
+A rerun cut short (st.rerun(), st.stop(), an exception) never calls stop(): its
+capture is dropped by the next start() on the same thread, once its thread has
+ended, or after `max_duration` seconds. Captures are kept in a ProfileStore shared
+by the sessions of the process.
+"""
+import collections
+import cProfile
+import csv
+import datetime
+import io
+import os
+import pstats
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+import types
+import zipfile
+
+# Not part of what a session holds: code, and objects shared by the whole process
+_SKIP_TYPES = (types.ModuleType, type, types.FunctionType, types.BuiltinFunctionType, types.MethodType,
+               threading.Thread)
+
+def deep_sizeof(obj, exclude=()):
+    """
+    Approximate bytes reachable from `obj` (containers, instance attributes, DataFrames,
+    NumPy arrays), each object counted once. Objects in `exclude` (e.g. the shared
+    DatabaseManager) and code objects are not followed.
+    """
+    seen = set(map(id, exclude))
+    stack, total = [obj], 0
+    while stack:
+        item = stack.pop()
+        if id(item) in seen or isinstance(item, _SKIP_TYPES):
+            continue
+        seen.add(id(item))
+        if hasattr(item, "memory_usage") and hasattr(item, "columns"): # DataFrame: its own deep count
+            total += int(item.memory_usage(deep=True).sum())
+            continue
+        total += getattr(item, "nbytes", 0) if hasattr(item, "dtype") else 0 # NumPy buffer
+        total += sys.getsizeof(item, 0)
+        if isinstance(item, dict):
+            stack.extend(item.keys())
+            stack.extend(item.values())
+        elif isinstance(item, (list, tuple, set, frozenset, collections.deque)):
+            stack.extend(item)
+        if hasattr(item, "__dict__"):
+            stack.append(vars(item))
+        for slot in getattr(type(item), "__slots__", ()):
+            if hasattr(item, slot):
+                stack.append(getattr(item, slot))
+    return total
+
+def _children(obj):
+    if hasattr(obj, "columns"): # A DataFrame is one row, not one per column
+        return []
+    if isinstance(obj, dict) or hasattr(obj, "keys") and hasattr(obj, "__getitem__"):
+        return [(f"[{key!r}]", obj[key]) for key in list(obj.keys())]
+    if hasattr(obj, "__dict__") and not isinstance(obj, _SKIP_TYPES):
+        return [(f".{name}", value) for name, value in vars(obj).items()]
+    return []
+
+def size_breakdown(state, depth=3, exclude=(), min_bytes=1024):
+    """
+    Rows (level, path, type name, bytes) for the entries of `state` (e.g. st.session_state) and,
+    down to `depth` levels, their items and attributes, largest first within each level.
+    Nested rows under `min_bytes` are left out. A row's bytes include its children, and
+    objects reachable from several rows (e.g. the Corso objects of a ScheduleIndex) count in each.
+    """
+    rows = []
+
+    def visit(path, obj, level):
+        sized = [(deep_sizeof(value, exclude), name, value) for name, value in _children(obj)
+                 if id(value) not in exclude_ids and not isinstance(value, _SKIP_TYPES)]
+        for size, name, value in sorted(sized, key=lambda item: -item[0]):
+            if level > 1 and size < min_bytes:
+                continue
+            rows.append((level, path + name, type(value).__name__, size))
+            if level < depth:
+                visit(path + name, value, level + 1)
+
+    exclude_ids = set(map(id, exclude))
+    visit("", state, 1)
+    return rows
+
+Capture = collections.namedtuple("Capture", ["label", "session", "started_at", "duration", "peak_bytes", "profile_text",
+                                             "allocations_text", "profile_bytes", "snapshot_bytes", "session_sizes"])
+
+def capture_zip(capture):
+    """ZIP with the cProfile stats (.prof, for snakeviz/pstats), the tracemalloc snapshot and text summaries."""
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr("profile.prof", capture.profile_bytes)
+        archive.writestr("profile.txt", capture.profile_text)
+        archive.writestr("tracemalloc.snapshot", capture.snapshot_bytes)
+        archive.writestr("allocations.txt", capture.allocations_text)
+        sizes = io.StringIO()
+        writer = csv.writer(sizes)
+        writer.writerow(["level", "path", "type", "bytes"])
+        writer.writerows(capture.session_sizes)
+        archive.writestr("session_state.csv", sizes.getvalue())
+    return buffer.getvalue()
+
+class RerunProfiler:
+    _guard = threading.Lock()
+    _active = None # The profiler currently running in this process
+
+    def __init__(self, frames=10, top=40, max_duration=300):
+        self.frames = frames # Traceback depth kept by tracemalloc
+        self.top = top # Lines in the text summaries
+        self.max_duration = max_duration
+        self._profile = None
+
+    def start(self):
+        """Starts profiling the current thread. False if another rerun is already being profiled."""
+        with self._guard:
+            active = RerunProfiler._active
+            if active is not None and not active._abandoned():
+                return False
+            if active is not None:
+                active._release()
+            RerunProfiler._active = self
+            self._thread = threading.current_thread()
+            self._started_at = datetime.datetime.now()
+            self._was_tracing = tracemalloc.is_tracing()
+            if not self._was_tracing:
+                tracemalloc.start(self.frames)
+            tracemalloc.reset_peak()
+            self._start_snapshot = tracemalloc.take_snapshot()
+            self._profile = cProfile.Profile()
+            self._start = time.perf_counter()
+            self._profile.enable()
+        return True
+
+    def _abandoned(self):
+        return (self._thread is threading.current_thread() or not self._thread.is_alive()
+                or time.perf_counter() - self._start > self.max_duration)
+
+    def _release(self):
+        """Drops an unfinished capture (its thread's cProfile hook is replaced or gone with the thread)."""
+        if self._thread is threading.current_thread():
+            self._profile.disable()
+        if not self._was_tracing and tracemalloc.is_tracing():
+            tracemalloc.stop()
+        self._profile = None
+        RerunProfiler._active = None
+
+    def stop(self, label="", session="", state=None, exclude=()):
+        """
+        Stops profiling and returns a Capture (None if start() didn't start). With `state`,
+        the capture includes its size_breakdown (computed after profiling has stopped).
+        """
+        with self._guard:
+            if self._profile is None or RerunProfiler._active is not self:
+                return None
+            try:
+                self._profile.disable()
+                duration = time.perf_counter() - self._start
+                snapshot = tracemalloc.take_snapshot()
+                peak_bytes = tracemalloc.get_traced_memory()[1]
+                if not self._was_tracing:
+                    tracemalloc.stop()
+                session_sizes = size_breakdown(state, exclude=exclude) if state is not None else []
+                return Capture(label, session, self._started_at, duration, peak_bytes, self._profile_text(),
+                               self._allocations_text(snapshot), self._profile_bytes(), self._snapshot_bytes(snapshot),
+                               session_sizes)
+            finally:
+                self._profile = None
+                RerunProfiler._active = None
+
+    def _profile_text(self):
+        out = io.StringIO()
+        pstats.Stats(self._profile, stream=out).sort_stats("cumulative").print_stats(self.top)
+        return out.getvalue()
+
+    def _profile_bytes(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "profile.prof")
+            self._profile.dump_stats(path)
+            with open(path, "rb") as f:
+                return f.read()
+
+    def _allocations_text(self, snapshot):
+        """Lines that allocated the memory still alive at the end of the rerun (growth since start)."""
+        ignore = [tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, __file__)]
+        stats = snapshot.filter_traces(ignore).compare_to(self._start_snapshot.filter_traces(ignore), "lineno")
+        grown = [stat for stat in stats if stat.size_diff > 0]
+        lines = [f"Memory still allocated at the end of the rerun: {sum(s.size_diff for s in grown) / 1024:.1f} KiB "
+                 f"in {sum(s.count_diff for s in grown)} blocks"]
+        lines += [str(stat) for stat in grown[:self.top]]
+        return "\n".join(lines) + "\n"
+
+    @staticmethod
+    def _snapshot_bytes(snapshot):
+        """Snapshot.dump() file, for tracemalloc.Snapshot.load() and offline comparisons."""
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "tracemalloc.snapshot")
+            snapshot.dump(path)
+            with open(path, "rb") as f:
+                return f.read()
+
+class ProfileStore:
+    """The most recent captures of the process, newest first (thread-safe)."""
+
+    def __init__(self, max_entries=20):
+        self._captures = collections.deque(maxlen=max_entries)
+        self._lock = threading.Lock()
+
+    def add(self, capture):
+        with self._lock:
+            self._captures.appendleft(capture)
+
+    def captures(self):
+        with self._lock:
+            return list(self._captures)
+
+    def clear(self):
+        with self._lock:
+            self._captures.clear()
@@ -0,0 +1,180 @@
+"""
+Recurring schedule rules: "every (other) Monday 09:00 - 11:00 from September to
+January, except these dates", stored as one row instead of one slot per lesson.
+
+Occurrences are never stored. They are computed with date arithmetic for the
+window being looked at, and RecurringSchedule keeps the last expanded windows.
+Clash checks between two rules solve for the first common week directly (the two
+series meet every lcm(interval) weeks), so they don't expand anything either.
+"""
+import collections
+import datetime
+import math
+
+from .time_slots import WEEKDAY_NAMES, parse_time_slot
+
+ScheduleRule = collections.namedtuple(
+    "ScheduleRule",
+    ["id", "classroom_id", "course_id", "weekday", "start", "end", "start_date", "end_date", "interval_weeks", "exceptions"],
+    defaults=(1, frozenset()),
+)
+ScheduleRule.__doc__ = """
+classroom_id/course_id: the ids, as in Aula.lezioni (names are looked up for display, so renames touch no rule);
+weekday: 0 = Monday; start/end: datetime.time; start_date/end_date: datetime.date, inclusive
+(end_date None = open-ended); interval_weeks: 1 weekly, 2 biweekly...; exceptions: dates without lesson.
+"""
+
+# One lesson of a rule
+Occurrence = collections.namedtuple("Occurrence", ["date", "start", "end", "classroom_id", "course_id", "rule_id"])
+
+FREQUENCIES = {"Weekly": 1, "Every 2 weeks": 2}
+
+def _as_date(value):
+    return datetime.date.fromisoformat(value) if isinstance(value, str) else value
+
+def _as_time(value):
+    return datetime.time.fromisoformat(value) if isinstance(value, str) else value
+
+def make_rule(classroom_id, course_id, weekday, start, end, start_date, end_date, interval_weeks=1, exceptions=(), id=None):
+    """Builds a ScheduleRule, accepting ISO strings for dates and times."""
+    return ScheduleRule(id, classroom_id, course_id, int(weekday), _as_time(start), _as_time(end), _as_date(start_date),
+                        _as_date(end_date) if end_date else None, max(1, int(interval_weeks)),
+                        frozenset(_as_date(d) for d in exceptions))
+
+def rule_from_row(row):
+    """Row of DatabaseManager.fetch_schedule_rules -> ScheduleRule."""
+    rule_id, classroom_id, course_id, weekday, start, end, start_date, end_date, interval_weeks, exceptions = row
+    return make_rule(classroom_id, course_id, weekday, start, end, start_date, end_date, interval_weeks, exceptions, id=rule_id)
+
+def rule_from_time_slot(classroom_id, course_id, time_slot):
+    """
+    A literal Aula.lezioni slot seen as a rule: 'Monday 09:00 - 11:00' repeats every week
+    with no end, '2025-10-01 09:00 - 11:00' happens once. None if the slot can't be parsed.
+    """
+    slot = parse_time_slot(time_slot)
+    if slot is None:
+        return None
+    if slot.date is not None:
+        return ScheduleRule(None, classroom_id, course_id, slot.weekday, slot.start, slot.end, slot.date, slot.date)
+    return ScheduleRule(None, classroom_id, course_id, slot.weekday, slot.start, slot.end, datetime.date.min, None)
+
+def first_occurrence(rule):
+    """Date of the first lesson: the first `weekday` on or after start_date."""
+    offset = (rule.weekday - rule.start_date.weekday()) % 7
+    if rule.start_date.toordinal() + offset > datetime.date.max.toordinal():
+        return None
+    return rule.start_date + datetime.timedelta(days=offset)
+
+def _last_date(rule):
+    return rule.end_date or datetime.date.max
+
+def occurrences(rule, start, end):
+    """Dates of the lessons of `rule` between `start` and `end` (inclusive), exceptions skipped."""
+    first = first_occurrence(rule)
+    if first is None:
+        return []
+    start, end = max(start, first), min(end, _last_date(rule))
+    if start > end:
+        return []
+    step = 7 * rule.interval_weeks
+    # Jump straight to the first lesson inside the window
+    k = -(-(start - first).days // step)
+    day = first.toordinal() + k * step
+    dates = []
+    while day <= end.toordinal():
+        date = datetime.date.fromordinal(day)
+        if date not in rule.exceptions:
+            dates.append(date)
+        day += step
+    return dates
+
+def occurs_on(rule, date):
+    first = first_occurrence(rule)
+    if first is None or date < first or date > _last_date(rule) or date in rule.exceptions:
+        return False
+    return (date - first).days % (7 * rule.interval_weeks) == 0
+
+def first_clash(a, b):
+    """First date on which lessons of rules `a` and `b` overlap in time, or None. No expansion."""
+    if a.weekday != b.weekday or not (a.start < b.end and b.start < a.end):
+        return None
+    first_a, first_b = first_occurrence(a), first_occurrence(b)
+    if first_a is None or first_b is None:
+        return None
+    low, high = max(first_a, first_b), min(_last_date(a), _last_date(b))
+    if low > high:
+        return None
+    # a meets in weeks x = i_a * k after first_a, b in weeks x = offset + i_b * m: solve x mod lcm
+    offset = (first_b - first_a).days // 7
+    i_a, i_b = a.interval_weeks, b.interval_weeks
+    period = i_a * i_b // math.gcd(i_a, i_b)
+    x0 = next((x for x in range(0, period, i_a) if (x - offset) % i_b == 0), None)
+    if x0 is None:
+        return None # The two series never fall in the same week
+    base = first_a.toordinal() + 7 * x0
+    step = 7 * period
+    day = base + max(0, -(-(low.toordinal() - base) // step)) * step
+    # Only exception dates can push the answer further: at most len(exceptions) + 1 steps
+    while day <= high.toordinal():
+        date = datetime.date.fromordinal(day)
+        if date not in a.exceptions and date not in b.exceptions:
+            return date
+        day += step
+    return None
+
+def describe_rule(rule):
+    """'every Monday 09:00 - 11:00 (weekly, 2025-09-15 → 2026-01-30, 2 exceptions)'"""
+    frequency = "weekly" if rule.interval_weeks == 1 else f"every {rule.interval_weeks} weeks"
+    text = (f"every {WEEKDAY_NAMES[rule.weekday]} {rule.start.strftime('%H:%M')} - {rule.end.strftime('%H:%M')} "
+            f"({frequency}, {rule.start_date.isoformat()} → {rule.end_date.isoformat() if rule.end_date else '…'}")
+    if rule.exceptions:
+        text += f", {len(rule.exceptions)} exception{'s' if len(rule.exceptions) > 1 else ''}"
+    return text + ")"
+
+class RecurringSchedule:
+    """The rules of the school, with a small LRU cache of expanded windows (cleared on any change)."""
+    def __init__(self, rules=(), max_windows=32):
+        self.rules = {rule.id: rule for rule in rules}
+        self.max_windows = max_windows
+        self._windows = collections.OrderedDict()
+
+    def set_rules(self, rules):
+        self.rules = {rule.id: rule for rule in rules}
+        self._windows.clear()
+
+    def add(self, rule):
+        self.rules[rule.id] = rule
+        self._windows.clear()
+
+    def remove(self, rule_id):
+        self.rules.pop(rule_id, None)
+        self._windows.clear()
+
+    def occurrences(self, start, end):
+        """All lessons between `start` and `end` (inclusive), sorted by date and time."""
+        key = (start, end)
+        cached = self._windows.get(key)
+        if cached is not None:
+            self._windows.move_to_end(key)
+            return cached
+        result = sorted(
+            (Occurrence(date, rule.start, rule.end, rule.classroom_id, rule.course_id, rule.id)
+             for rule in self.rules.values() for date in occurrences(rule, start, end)),
+            key=lambda o: (o.date, o.start, o.classroom_id),
+        )
+        self._windows[key] = result
+        if len(self._windows) > self.max_windows:
+            self._windows.popitem(last=False)
+        return result
+
+    def clashes(self, rule, candidates=None):
+        """[(other rule, first clash date)] for the rules in `candidates` (default: all) that clash with `rule`."""
+        candidates = self.rules.values() if candidates is None else candidates
+        result = []
+        for other in candidates:
+            if other.id is not None and other.id == rule.id:
+                continue
+            date = first_clash(rule, other)
+            if date is not None:
+                result.append((other, date))
+        return result
@@ -0,0 +1,132 @@
+"""
+Report rendering pipeline.
+
+Purchase orders, per-room calendars and per-course rosters are rendered from
+templates. Large batches are fanned out over a process pool and streamed into a
+single ZIP archive (for `st.download_button`) or written to an output directory (CLI).
+
+A job is a plain picklable tuple `(kind, args)`, e.g. `("purchase_order", ("Aula 1", 5))`,
+so workers never need the Segreteria objects.
+"""
+import concurrent.futures
+import datetime
+import io
+import os
+import string
+import zipfile
+
+PURCHASE_ORDER_TEMPLATE = string.Template(
+    "--- SUPPLIER ORDER FORM ---\n"
+    "Date: $data\n"
+    "Recipient: School Material Supplier\n"
+    "\n"
+    "Subject: Additional Chair Order\n"
+    "\n"
+    "Dear Supplier,\n"
+    "We kindly request the supply of $quantita additional chairs for classroom '$nome_aula'.\n"
+    "Please confirm availability and delivery times.\n"
+    "\n"
+    "Sincerely,\n"
+    "The School Secretariat\n"
+)
+
+ROOM_CALENDAR_TEMPLATE = string.Template(
+    "--- Classroom Calendar ---\n"
+    "Generated On: $generated\n"
+    "\n"
+    "=== Classroom: $nome_aula ===\n"
+    "$righe"
+)
+
+COURSE_ROSTER_TEMPLATE = string.Template(
+    "--- Course Roster ---\n"
+    "Generated On: $generated\n"
+    "\n"
+    "Course: $nome_corso\n"
+    "Duration: $durata\n"
+    "Teacher: $docente\n"
+    "Number of Students: $numero\n"
+    "\n"
+    "$righe"
+)
+
+def _safe_filename(name):
+    return name.replace(' ', '_').replace(os.sep, '_').replace('/', '_')
+
+def render_purchase_order(nome_aula, quantita, data_odierna=None):
+    """Returns (content, filename) of the supplier order form for `quantita` chairs."""
+    data_odierna = data_odierna or datetime.date.today().strftime("%d-%m-%Y")
+    content = PURCHASE_ORDER_TEMPLATE.substitute(data=data_odierna, quantita=quantita, nome_aula=nome_aula)
+    return content, f"ordine_fornitore_{_safe_filename(nome_aula)}_{data_odierna}.txt"
+
+def render_room_calendar(nome_aula, occupazione_aula, generated=None):
+    """Returns (content, filename) of one classroom's schedule. `occupazione_aula` maps time slot -> course name."""
+    generated = generated or datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    if occupazione_aula:
+        righe = "".join(f"  {time_slot}: {course_name}\n" for time_slot, course_name in sorted(occupazione_aula.items()))
+    else:
+        righe = "  No schedule for this classroom.\n"
+    content = ROOM_CALENDAR_TEMPLATE.substitute(generated=generated, nome_aula=nome_aula, righe=righe)
+    return content, f"calendario_{_safe_filename(nome_aula)}.txt"
+
+def render_course_roster(nome_corso, durata, docente, students, generated=None):
+    """Returns (content, filename) of a course roster. `students` is a list of (name, last_name, date_of_birth)."""
+    generated = generated or datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    if students:
+        righe = "".join(f"  {i}. {name} {last_name} ({dob})\n"
+                        for i, (name, last_name, dob) in enumerate(sorted(students, key=lambda s: (s[1], s[0])), start=1))
+    else:
+        righe = "  No students assigned.\n"
+    content = COURSE_ROSTER_TEMPLATE.substitute(generated=generated, nome_corso=nome_corso, durata=durata,
+                                                docente=docente, numero=len(students), righe=righe)
+    return content, f"registro_{_safe_filename(nome_corso)}.txt"
+
+RENDERERS = {
+    "purchase_order": render_purchase_order,
+    "room_calendar": render_room_calendar,
+    "course_roster": render_course_roster,
+}
+
+def _render_chunk(jobs):
+    # Runs inside the worker processes: must stay a module-level function so it can be pickled
+    return [RENDERERS[kind](*args) for kind, args in jobs]
+
+def render_reports(jobs, max_workers=None, chunk_size=64):
+    """
+    Yields (content, filename) for every job, in job order.
+    Batches smaller than two chunks are rendered in-process: a pool costs more than it saves there.
+    """
+    jobs = list(jobs)
+    if max_workers == 1 or len(jobs) < 2 * chunk_size:
+        yield from _render_chunk(jobs)
+        return
+    chunks = [jobs[i:i + chunk_size] for i in range(0, len(jobs), chunk_size)]
+    with concurrent.futures.ProcessPoolExecutor(max_workers=max_workers) as pool:
+        for rendered in pool.map(_render_chunk, chunks):
+            yield from rendered
+
+def write_reports_zip(jobs, fileobj, **kwargs):
+    """Streams the rendered reports into a ZIP archive as they arrive from the workers. Returns the number of files."""
+    count = 0
+    with zipfile.ZipFile(fileobj, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+        for content, filename in render_reports(jobs, **kwargs):
+            archive.writestr(filename, content)
+            count += 1
+    return count
+
+def build_reports_zip(jobs, **kwargs):
+    """Returns the ZIP archive as bytes, ready for `st.download_button`."""
+    buffer = io.BytesIO()
+    write_reports_zip(jobs, buffer, **kwargs)
+    return buffer.getvalue()
+
+def write_reports_dir(jobs, output_dir, **kwargs):
+    """Writes every rendered report as its own file in `output_dir`. Returns the list of written paths."""
+    os.makedirs(output_dir, exist_ok=True)
+    paths = []
+    for content, filename in render_reports(jobs, **kwargs):
+        path = os.path.join(output_dir, filename)
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(content)
+        paths.append(path)
+    return paths
@@ -0,0 +1,134 @@
+"""
+Room utilization and occupancy analytics.
+
+Builds a room × day × hour occupancy matrix with NumPy from the classroom schedules,
+the number of students enrolled in each course and the chair capacity of each room.
+Weekly slots ('Monday 09:00 - 11:00') repeat on every matching day of the range,
+dated slots ('2025-10-01 09:00 - 11:00') only count on their day.
+
+Everything after the matrix is built is whole-array arithmetic, so 500 rooms over a
+full academic year stay interactive.
+"""
+import datetime
+
+import numpy as np
+
+from .time_slots import parse_time_slot
+
+class OccupancyMatrix:
+    """
+    `occupied[r, d, h]` tells whether room `r` is booked on day `d` at hour `day_start + h`,
+    `demand[r, d, h]` is the number of students expected then. `capacity[r]` is the room's chair count.
+    """
+    def __init__(self, rooms, capacity, days, day_start, day_end, occupied, demand, open_weekdays):
+        self.rooms = rooms
+        self.capacity = capacity
+        self.days = days
+        self.day_start = day_start
+        self.day_end = day_end
+        self.occupied = occupied
+        self.demand = demand
+        self.weekdays = np.array([d.weekday() for d in days], dtype=np.int8)
+        self.open_days = np.isin(self.weekdays, list(open_weekdays))
+
+    @property
+    def hours(self):
+        return list(range(self.day_start, self.day_end))
+
+    def room_metrics(self):
+        """Per-room utilization %, idle hours, mean fill ratio, peak demand and overfilled hours."""
+        open_demand = self.demand[:, self.open_days, :]
+        occupied = self.occupied[:, self.open_days, :]
+        occupied_hours = occupied.sum(axis=(1, 2))
+        available_hours = open_demand.shape[1] * open_demand.shape[2]
+        fill = open_demand / np.maximum(self.capacity, 1)[:, None, None]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            mean_fill = np.where(occupied_hours > 0, (fill * occupied).sum(axis=(1, 2)) / occupied_hours, 0.0)
+        return {
+            "Classroom": self.rooms,
+            "Capacity": self.capacity,
+            "Utilization %": 100.0 * occupied_hours / max(available_hours, 1),
+            "Occupied Hours": occupied_hours,
+            "Idle Hours": available_hours - occupied_hours,
+            "Fill Ratio": mean_fill,
+            "Peak Demand": open_demand.max(axis=(1, 2)) if open_demand.size else np.zeros(len(self.rooms), dtype=int),
+            "Overfilled Hours": (open_demand > self.capacity[:, None, None]).sum(axis=(1, 2)),
+        }
+
+    def weekday_utilization(self):
+        """rooms × 7 matrix of utilization % per weekday (NaN for weekdays not in the range)."""
+        occupied = self.occupied
+        result = np.full((len(self.rooms), 7), np.nan)
+        hours_per_day = self.demand.shape[2]
+        for weekday in range(7):
+            day_mask = self.weekdays == weekday
+            if day_mask.any():
+                result[:, weekday] = 100.0 * occupied[:, day_mask, :].sum(axis=(1, 2)) / (day_mask.sum() * hours_per_day)
+        return result
+
+    def weekday_peak_demand(self):
+        """rooms × 7 matrix of the highest demand seen on each weekday."""
+        result = np.zeros((len(self.rooms), 7), dtype=self.demand.dtype)
+        for weekday in range(7):
+            day_mask = self.weekdays == weekday
+            if day_mask.any():
+                result[:, weekday] = self.demand[:, day_mask, :].max(axis=(1, 2))
+        return result
+
+    def weekday_hour_utilization(self):
+        """7 × hours matrix: share of rooms (%) in use at each weekday/hour, averaged over the range."""
+        occupied = self.occupied.mean(axis=0) # days × hours
+        result = np.full((7, self.demand.shape[2]), np.nan)
+        for weekday in range(7):
+            day_mask = self.weekdays == weekday
+            if day_mask.any():
+                result[weekday] = 100.0 * occupied[day_mask].mean(axis=0)
+        return result
+
+def build_occupancy(aule, course_students, start_date, end_date, day_start=8, day_end=18, open_weekdays=range(5)):
+    """
+    `aule` are Aula objects, `course_students` maps course name -> number of enrolled students.
+    Slots that can't be parsed, or that fall outside [day_start, day_end), are ignored.
+    """
+    n_days = (end_date - start_date).days + 1
+    days = [start_date + datetime.timedelta(days=i) for i in range(n_days)]
+    n_hours = day_end - day_start
+    first_weekday = start_date.weekday()
+
+    # One row per schedule entry: room, first day index, repeats weekly?, hour range, demand
+    rows = []
+    for r, aula in enumerate(aule):
+        for time_slot, course_name in aula.occupazione_aula.items():
+            slot = parse_time_slot(time_slot)
+            if slot is None:
+                continue
+            h0 = max(slot.start.hour, day_start) - day_start
+            h1 = min(slot.end.hour + (1 if slot.end.minute else 0), day_end) - day_start
+            if h1 <= h0:
+                continue
+            if slot.date is None:
+                rows.append((r, (slot.weekday - first_weekday) % 7, 1, h0, h1, course_students.get(course_name, 0)))
+            elif start_date <= slot.date <= end_date:
+                rows.append((r, (slot.date - start_date).days, 0, h0, h1, course_students.get(course_name, 0)))
+
+    occupied = np.zeros((len(aule), n_days, n_hours), dtype=bool)
+    demand = np.zeros((len(aule), n_days, n_hours), dtype=np.int32)
+    if rows:
+        room, day0, weekly, h0, h1, students = (np.array(col) for col in zip(*rows))
+        # Expand every entry into its occurrences (weekly entries repeat every 7 days)
+        occurrences = np.where(weekly == 1, np.maximum((n_days - 1 - day0) // 7 + 1, 0), 1)
+        entry = np.repeat(np.arange(len(rows)), occurrences)
+        k = np.arange(len(entry)) - np.repeat(np.cumsum(occurrences) - occurrences, occurrences)
+        day = day0[entry] + 7 * k * weekly[entry]
+        # ...and every occurrence into its hours
+        span = (h1 - h0)[entry]
+        entry_h = np.repeat(entry, span)
+        day_h = np.repeat(day, span)
+        hour = h0[entry_h] + np.arange(len(entry_h)) - np.repeat(np.cumsum(span) - span, span)
+        cells = (room[entry_h], day_h, hour)
+        occupied[cells] = True
+        # Two courses in the same room and hour (a clash) count with the larger one
+        np.maximum.at(demand, cells, students[entry_h])
+
+    capacity = np.array([aula.capacita_sedie for aula in aule], dtype=np.int32)
+    return OccupancyMatrix([aula.nome_aula for aula in aule], capacity, days, day_start, day_end, occupied, demand, open_weekdays)
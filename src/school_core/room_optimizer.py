@@ -0,0 +1,196 @@
+"""
+Room reassignment optimizer.
+
+`controllo_forniture` only notices a chair shortfall after the fact. Often a bigger
+room is free in the same slot, so for every time slot the courses held in it are
+matched to the rooms available at that time with a min-cost assignment (Hungarian /
+shortest augmenting path). The cost of putting course c in room r is
+
+    chairs to buy(c, r), then missing chairs(c, r) * chair_weight, then move_cost if r is
+    not c's current room
+
+with chair_weight large enough that saving chairs always wins over saving moves.
+A room buys chairs for its worst slot, so chairs to buy(c, r) only counts the students
+of c beyond what r already lacks in its other slots of the proposed schedule: a slot
+is never solved into more chairs to buy, and a plan that would buy more than the
+current schedule is not proposed.
+The result is a proposed schedule diff and the purchase order for the chairs that are
+still missing after the moves.
+
+scipy's `linear_sum_assignment` is used when scipy is installed; otherwise the NumPy
+implementation below solves the same problem.
+"""
+import numpy as np
+
+from .time_slots import parse_time_slot, slots_overlap
+
+try:
+    from scipy.optimize import linear_sum_assignment as _scipy_linear_sum_assignment
+except ImportError: # scipy is optional
+    _scipy_linear_sum_assignment = None
+
+def _linear_sum_assignment(cost):
+    """
+    Minimum-cost assignment of every row to a distinct column (rows <= columns).
+    Shortest augmenting path with dual variables (Jonker-Volgenant, as in Crouse 2016);
+    the scan over columns is vectorized, so each augmentation costs O(scanned columns × columns).
+    Returns the column chosen for each row.
+    """
+    n_rows, n_cols = cost.shape
+    u = np.zeros(n_rows)
+    v = np.zeros(n_cols)
+    col4row = np.full(n_rows, -1)
+    row4col = np.full(n_cols, -1)
+    for cur_row in range(n_rows):
+        shortest = np.full(n_cols, np.inf)
+        path = np.full(n_cols, -1)
+        remaining = np.ones(n_cols, dtype=bool)
+        scanned_rows = []
+        min_val = 0.0
+        i = cur_row
+        sink = -1
+        while sink == -1:
+            scanned_rows.append(i)
+            reduced = min_val + cost[i] - u[i] - v
+            better = remaining & (reduced < shortest)
+            path[better] = i
+            shortest[better] = reduced[better]
+            candidates = np.where(remaining, shortest, np.inf)
+            j = int(np.argmin(candidates))
+            min_val = candidates[j]
+            if not np.isfinite(min_val):
+                raise ValueError("cost matrix is infeasible")
+            # On ties prefer a free column: it ends the search right away
+            ties = np.flatnonzero(candidates == min_val)
+            free = ties[row4col[ties] == -1]
+            if free.size:
+                j = int(free[0])
+            remaining[j] = False
+            if row4col[j] == -1:
+                sink = j
+            else:
+                i = row4col[j]
+        # Update the duals, then flip the augmenting path
+        u[cur_row] += min_val
+        for row in scanned_rows[1:]:
+            u[row] += min_val - shortest[col4row[row]]
+        scanned_cols = ~remaining
+        v[scanned_cols] -= min_val - shortest[scanned_cols]
+        j = sink
+        while True:
+            i = path[j]
+            row4col[j] = i
+            col4row[i], j = j, col4row[i]
+            if i == cur_row:
+                break
+    return col4row
+
+def solve_assignment(cost):
+    """Column index for each row of `cost` (rows <= columns), minimizing the total cost."""
+    if _scipy_linear_sum_assignment is not None:
+        rows, cols = _scipy_linear_sum_assignment(cost)
+        result = np.empty(cost.shape[0], dtype=int)
+        result[rows] = cols
+        return result
+    return _linear_sum_assignment(np.asarray(cost, dtype=float))
+
+class ReassignmentPlan:
+    """
+    `moves` are (time_slot, nome_corso, from nome_aula, to nome_aula).
+    `proposed` is the full proposed schedule { nome_aula: { time_slot: nome_corso } }.
+    """
+    def __init__(self, moves, proposed, capacities, course_students, missing_before):
+        self.moves = moves
+        self.proposed = proposed
+        self.capacities = capacities
+        self.course_students = course_students
+        self.missing_before = missing_before
+
+    def purchase_orders(self):
+        """{ nome_aula: chairs to buy } for the proposed schedule: the worst shortfall over the room's slots."""
+        orders = {}
+        for nome_aula, schedule in self.proposed.items():
+            worst = max((self.course_students.get(c, 0) - self.capacities[nome_aula] for c in schedule.values()), default=0)
+            if worst > 0:
+                orders[nome_aula] = worst
+        return orders
+
+    @property
+    def missing_after(self):
+        return sum(self.purchase_orders().values())
+
+    def report_jobs(self):
+        return [("purchase_order", (nome_aula, quantita)) for nome_aula, quantita in sorted(self.purchase_orders().items())]
+
+def _chairs_to_buy(schedules, capacities, course_students):
+    total = 0
+    for nome_aula, schedule in schedules.items():
+        total += max(max((course_students.get(c, 0) - capacities[nome_aula] for c in schedule.values()), default=0), 0)
+    return total
+
+def optimize_room_assignment(aule, course_students, move_cost=1):
+    """
+    `aule` are Aula objects, `course_students` maps course name -> enrolled students.
+    Slots are solved one at a time; a room is a candidate for a slot only if nothing
+    else in the (already updated) proposed schedule overlaps it there.
+    """
+    capacities = {aula.nome_aula: aula.capacita_sedie for aula in aule}
+    rooms = [aula.nome_aula for aula in aule]
+    capacity = np.array([capacities[r] for r in rooms], dtype=float)
+    current_schedule = {aula.nome_aula: dict(aula.occupazione_aula) for aula in aule}
+    proposed = {nome_aula: dict(schedule) for nome_aula, schedule in current_schedule.items()}
+    missing_before = _chairs_to_buy(proposed, capacities, course_students)
+
+    parsed = {}
+    def parse(time_slot):
+        if time_slot not in parsed:
+            parsed[time_slot] = parse_time_slot(time_slot)
+        return parsed[time_slot]
+
+    by_slot = {}
+    for nome_aula, schedule in proposed.items():
+        for time_slot, nome_corso in schedule.items():
+            by_slot.setdefault(time_slot, []).append((nome_corso, nome_aula))
+
+    moves = []
+    room_index = {r: k for k, r in enumerate(rooms)}
+    chair_weight = (len(rooms) + 1) * max(move_cost, 1)
+    for time_slot in sorted(by_slot):
+        entries = by_slot[time_slot]
+        slot = parse(time_slot)
+        # Rooms busy with some other, overlapping slot can't take a course now
+        available = np.array([
+            not any(other != time_slot and slots_overlap(slot, parse(other), time_slot, other) for other in proposed[r])
+            for r in rooms
+        ])
+        current = np.array([room_index[nome_aula] for _, nome_aula in entries])
+        available[current] = True
+        candidates = np.flatnonzero(available)
+
+        demand = np.array([course_students.get(nome_corso, 0) for nome_corso, _ in entries], dtype=float)
+        # What each room already lacks in its other slots: chairs bought for those cover this slot too
+        already_short = np.array([
+            max((course_students.get(c, 0) for other, c in proposed[r].items() if other != time_slot), default=0)
+            for r in rooms
+        ], dtype=float) - capacity
+        short = np.maximum(demand[:, None] - capacity[candidates][None, :], 0)
+        to_buy = np.maximum(short - np.maximum(already_short[candidates], 0)[None, :], 0)
+        # Chairs to buy first; then the slot's own shortfall, so that a room's overfull slots can leave
+        # it one at a time even while the others still keep its order up; then the moves
+        cost = (to_buy * (short.sum() + 1) + short) * chair_weight + move_cost * (candidates[None, :] != current[:, None])
+        assigned = candidates[solve_assignment(cost)]
+
+        for (nome_corso, old_room), new_k in zip(entries, assigned):
+            new_room = rooms[new_k]
+            if new_room != old_room:
+                moves.append((time_slot, nome_corso, old_room, new_room))
+        # Apply the slot's solution: clear all old placements first, as courses may swap rooms
+        for nome_corso, old_room in entries:
+            del proposed[old_room][time_slot]
+        for (nome_corso, _), new_k in zip(entries, assigned):
+            proposed[rooms[new_k]][time_slot] = nome_corso
+
+    plan = ReassignmentPlan(moves, proposed, capacities, course_students, missing_before)
+    if plan.missing_after > missing_before: # Never propose buying more chairs than today
+        return ReassignmentPlan([], current_schedule, capacities, course_students, missing_before)
+    return plan
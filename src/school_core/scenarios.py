@@ -0,0 +1,313 @@
+"""
+What-if branches of the weekly schedule: move a course, close a room, compare, then promote one.
+
+ScheduleScenarios copies the schedule once (the base, {aula id: {time_slot: course id}});
+a branch only records the slots it changes, (aula id, time_slot) -> course id or None
+for a freed slot, and reads everything else from the base. Forking a branch copies its
+changes, not the schedule, and a room the branch didn't touch is served as the base's
+own dict (read-only).
+
+Metrics (chairs to buy, clashes, lessons left without a room) are computed in full
+once for the base; a branch's are the base's adjusted by the lessons it removed and
+added, so evaluating it costs O(changes x concurrent lessons) whatever the size of the
+school. Clashes are counted per pair of overlapping lessons: in the same room, with
+the same teacher, or, weighted by the students they share, with common students.
+Recurring rules (recurrence.py) are not part of the scenarios.
+
+    scenarios = segreteria.scenarios()
+    branch = scenarios.branch("lab closed")
+    branch.close_room(lab.id)
+    branch.move(lab.id, "Monday 09:00 - 11:00", room_b.id)
+    branch.metrics(), scenarios.diff(None, "lab closed")   # None: the live schedule
+    segreteria.promote_scenario("lab closed")              # one transaction
+"""
+import collections
+import types
+
+from .time_slots import parse_time_slot, slots_overlap
+
+SlotChange = collections.namedtuple("SlotChange", ["aula_id", "time_slot", "before", "after"])
+SlotChange.__doc__ = "A slot that differs between two schedules: course ids, None for a free slot."
+
+ScenarioMetrics = collections.namedtuple("ScenarioMetrics", ["lessons", "chairs_to_buy", "room_clashes", "teacher_clashes",
+                                                             "student_clashes", "unplaced"])
+ScenarioMetrics.__doc__ = ("student_clashes: students expected in two places at once (summed over lesson pairs); "
+                           "unplaced: lessons of closed rooms that the branch hasn't scheduled elsewhere at the same time.")
+
+_EMPTY = types.MappingProxyType({})
+
+class Scenario:
+    """A branch: the slots it changes over the base and the rooms it closes."""
+    def __init__(self, scenarios, name, frozen=False):
+        self.scenarios = scenarios
+        self.name = name
+        self.frozen = frozen # The live schedule itself
+        self.closed = set() # aula ids
+        self.dropped = [] # (aula id, time_slot) changes discarded because the live schedule changed them too
+        self._changes = {} # (aula id, time_slot) -> course id, None: freed
+        self._rooms = collections.defaultdict(dict) # aula id -> {time_slot: course id or None}, view of _changes
+        self._slots = collections.defaultdict(dict) # time_slot -> {aula id: course id or None}
+        self._views = {} # Merged schedules built since the last change
+        self._metrics = None
+
+    def __len__(self):
+        return len(self._changes)
+
+    def course_at(self, aula_id, time_slot):
+        if (aula_id, time_slot) in self._changes:
+            return self._changes[(aula_id, time_slot)]
+        return self.scenarios._base.get(aula_id, _EMPTY).get(time_slot)
+
+    def _merged(self, base, overlay):
+        merged = dict(base)
+        for key, course_id in overlay.items():
+            if course_id is None:
+                merged.pop(key, None)
+            else:
+                merged[key] = course_id
+        return types.MappingProxyType(merged)
+
+    def schedule(self, aula_id):
+        """{time_slot: course id} of a room in this branch (read-only)."""
+        base = self.scenarios._base.get(aula_id, _EMPTY)
+        if aula_id not in self._rooms:
+            return types.MappingProxyType(base)
+        if ("room", aula_id) not in self._views:
+            self._views[("room", aula_id)] = self._merged(base, self._rooms[aula_id])
+        return self._views[("room", aula_id)]
+
+    def at_slot(self, time_slot):
+        """{aula id: course id} of the lessons held at exactly this time slot (read-only)."""
+        base = self.scenarios._by_slot.get(time_slot, _EMPTY)
+        if time_slot not in self._slots:
+            return base
+        if ("slot", time_slot) not in self._views:
+            self._views[("slot", time_slot)] = self._merged(base, self._slots[time_slot])
+        return self._views[("slot", time_slot)]
+
+    def _set(self, aula_id, time_slot, course_id):
+        if self.frozen:
+            raise ValueError("The live schedule can't be edited: fork a branch")
+        key = (aula_id, time_slot)
+        if course_id == self.scenarios._base.get(aula_id, _EMPTY).get(time_slot):
+            if key not in self._changes:
+                return
+            del self._changes[key]
+            del self._rooms[aula_id][time_slot]
+            del self._slots[time_slot][aula_id]
+            if not self._rooms[aula_id]:
+                del self._rooms[aula_id]
+            if not self._slots[time_slot]:
+                del self._slots[time_slot]
+        else:
+            self._changes[key] = self._rooms[aula_id][time_slot] = self._slots[time_slot][aula_id] = course_id
+            self.scenarios._register_slot(time_slot)
+        self._views.pop(("room", aula_id), None)
+        self._views.pop(("slot", time_slot), None)
+        self._metrics = None
+
+    def assign(self, aula_id, time_slot, course_id):
+        if aula_id not in self.scenarios.capacities:
+            raise ValueError(f"Unknown classroom id {aula_id}")
+        if aula_id in self.closed:
+            raise ValueError(f"Classroom {aula_id} is closed in scenario '{self.name}'")
+        if course_id not in self.scenarios.course_teachers:
+            raise ValueError(f"Unknown course id {course_id}")
+        self._set(aula_id, time_slot, course_id)
+
+    def clear(self, aula_id, time_slot):
+        self._set(aula_id, time_slot, None)
+
+    def move(self, aula_id, time_slot, to_aula_id, to_time_slot=None):
+        """Moves the lesson at (aula_id, time_slot) to another room and/or time slot."""
+        course_id = self.course_at(aula_id, time_slot)
+        if course_id is None:
+            raise ValueError(f"No lesson in classroom {aula_id} at '{time_slot}'")
+        self.clear(aula_id, time_slot)
+        self.assign(to_aula_id, to_time_slot or time_slot, course_id)
+
+    def close_room(self, aula_id):
+        """Frees every slot of the room; its lessons count as unplaced until they're assigned elsewhere."""
+        if aula_id not in self.scenarios.capacities:
+            raise ValueError(f"Unknown classroom id {aula_id}")
+        for time_slot in list(self.schedule(aula_id)):
+            self.clear(aula_id, time_slot)
+        self.closed.add(aula_id)
+        self._metrics = None
+
+    def changes(self):
+        """[SlotChange] from the base to this branch, by room and time slot."""
+        return [SlotChange(aula_id, time_slot, self.scenarios._base.get(aula_id, _EMPTY).get(time_slot), course_id)
+                for (aula_id, time_slot), course_id in sorted(self._changes.items())]
+
+    def metrics(self):
+        if self._metrics is None:
+            self._metrics = self.scenarios._metrics_of(self)
+        return self._metrics
+
+class ScheduleScenarios:
+    """
+    The base schedule and its branches. `schedules`: {aula id: {time_slot: course id}} (copied),
+    `capacities`: {aula id: chairs}, `course_teachers`: {course id: docente},
+    `course_students`: {course id: {student id}}. `version` is the caller's data version the
+    base was copied at (Segreteria.version).
+    """
+    def __init__(self, schedules, capacities, course_teachers, course_students, version=None):
+        self._base = {aula_id: dict(slots) for aula_id, slots in schedules.items()}
+        self._by_slot = collections.defaultdict(dict) # time_slot -> {aula id: course id}
+        for aula_id, slots in self._base.items():
+            for time_slot, course_id in slots.items():
+                self._by_slot[time_slot][aula_id] = course_id
+        self._by_slot = {time_slot: types.MappingProxyType(rooms) for time_slot, rooms in self._by_slot.items()}
+        self.capacities = dict(capacities)
+        self.course_teachers = dict(course_teachers)
+        self.course_students = course_students
+        self.version = version
+        self.live = Scenario(self, None, frozen=True)
+        self.branches = {} # name -> Scenario
+        self._parsed = {time_slot: parse_time_slot(time_slot) for time_slot in self._by_slot}
+        self._overlapping = {} # time_slot -> [known time slots that overlap it, itself included]
+        self._shared = {} # (course id, course id) -> students in common
+        self._room_chairs = {aula_id: self._chairs_missing(aula_id, slots) for aula_id, slots in self._base.items()}
+
+    def _register_slot(self, time_slot):
+        if time_slot not in self._parsed:
+            self._parsed[time_slot] = parse_time_slot(time_slot)
+            self._overlapping.clear()
+
+    def _overlapping_slots(self, time_slot):
+        if time_slot not in self._overlapping:
+            slot = self._parsed[time_slot]
+            self._overlapping[time_slot] = [other for other, parsed in self._parsed.items()
+                                            if slots_overlap(slot, parsed, time_slot, other)]
+        return self._overlapping[time_slot]
+
+    def get(self, name):
+        """A branch by name (or the branch itself); None is the live schedule."""
+        if name is None:
+            return self.live
+        if isinstance(name, Scenario):
+            return name
+        if name not in self.branches:
+            raise KeyError(f"No scenario named '{name}'")
+        return self.branches[name]
+
+    def branch(self, name, parent=None):
+        """A new branch of the live schedule, or of `parent` (its changes are copied, not shared)."""
+        if not name or name in self.branches:
+            raise ValueError(f"Scenario name '{name}' is empty or already used")
+        parent = self.get(parent)
+        branch = Scenario(self, name)
+        for (aula_id, time_slot), course_id in parent._changes.items():
+            branch._set(aula_id, time_slot, course_id)
+        branch.closed = set(parent.closed)
+        self.branches[name] = branch
+        return branch
+
+    def drop(self, name):
+        self.branches.pop(name, None)
+
+    def adopt(self, other):
+        """
+        Replays the branches of an older ScheduleScenarios on this base. Where the live schedule changed
+        a slot the branch changes too, the live one wins: the slot goes to the branch's `dropped` list.
+        Rooms and courses that are gone are skipped.
+        """
+        for name, old in other.branches.items():
+            branch = self.branches[name] = Scenario(self, name)
+            branch.dropped = list(old.dropped)
+            for (aula_id, time_slot), course_id in old._changes.items():
+                if other._base.get(aula_id, _EMPTY).get(time_slot) != self._base.get(aula_id, _EMPTY).get(time_slot):
+                    branch.dropped.append((aula_id, time_slot))
+                elif aula_id in self.capacities and (course_id is None or course_id in self.course_teachers):
+                    branch._set(aula_id, time_slot, course_id)
+            for aula_id in old.closed & self.capacities.keys():
+                branch.close_room(aula_id)
+
+    def diff(self, a, b):
+        """[SlotChange] from scenario `a` to scenario `b` (names, None: the live schedule)."""
+        a, b = self.get(a), self.get(b)
+        keys = sorted(a._changes.keys() | b._changes.keys())
+        return [SlotChange(aula_id, time_slot, before, after) for aula_id, time_slot in keys
+                for before, after in [(a.course_at(aula_id, time_slot), b.course_at(aula_id, time_slot))] if before != after]
+
+    # --- Metrics ---
+    def _chairs_missing(self, aula_id, slots):
+        """Chairs the room lacks for its biggest course (0 if it has enough)."""
+        biggest = max((len(self.course_students.get(course_id, ())) for course_id in slots.values()), default=0)
+        return max(biggest - self.capacities.get(aula_id, 0), 0)
+
+    def _shared_students(self, course_id, other_id):
+        key = (course_id, other_id) if course_id <= other_id else (other_id, course_id)
+        if key not in self._shared:
+            students = self.course_students.get(course_id, set())
+            self._shared[key] = len(students) if course_id == other_id else len(students & self.course_students.get(other_id, set()))
+        return self._shared[key]
+
+    def _clashes(self, view, aula_id, time_slot, course_id, skip=()):
+        """[room, teacher, student] clashes of one lesson with the other lessons of `view`, except the `skip` keys."""
+        totals = [0, 0, 0]
+        teacher = self.course_teachers.get(course_id)
+        for other_slot in self._overlapping_slots(time_slot):
+            for other_aula, other_course in view.at_slot(other_slot).items():
+                key = (other_aula, other_slot)
+                if key == (aula_id, time_slot) or key in skip:
+                    continue
+                if other_aula == aula_id:
+                    totals[0] += 1
+                    continue
+                if teacher and teacher == self.course_teachers.get(other_course):
+                    totals[1] += 1
+                totals[2] += self._shared_students(course_id, other_course)
+        return totals
+
+    def _base_metrics(self):
+        """
+        The full count, one time slot at a time: students and teachers are counted over the lessons
+        of the overlapping slots once, instead of comparing every pair of concurrent lessons.
+        """
+        if self.live._metrics is None:
+            totals = [0, 0, 0]
+            for time_slot, rooms in self._by_slot.items():
+                students, teachers, by_room = collections.Counter(), collections.Counter(), collections.defaultdict(list)
+                for other_slot in self._overlapping_slots(time_slot):
+                    for aula_id, course_id in self._by_slot.get(other_slot, _EMPTY).items():
+                        students.update(self.course_students.get(course_id, ()))
+                        teachers[self.course_teachers.get(course_id)] += 1
+                        if other_slot != time_slot:
+                            by_room[aula_id].append(course_id)
+                for aula_id, course_id in rooms.items():
+                    same_room = by_room.get(aula_id, ()) # Room clashes, not teacher or student ones
+                    own = self.course_students.get(course_id, ())
+                    teacher = self.course_teachers.get(course_id)
+                    totals[0] += len(same_room)
+                    if teacher:
+                        totals[1] += teachers[teacher] - 1 - sum(self.course_teachers.get(other) == teacher for other in same_room)
+                    totals[2] += (sum(students[student_id] for student_id in own) - len(own)
+                                  - sum(self._shared_students(course_id, other) for other in same_room))
+            lessons = sum(len(slots) for slots in self._base.values())
+            # Every pair was counted from both ends
+            self.live._metrics = ScenarioMetrics(lessons, sum(self._room_chairs.values()), *(x // 2 for x in totals), 0)
+        return self.live._metrics
+
+    def _delta(self, view, lessons):
+        """Clashes of `lessons` (aula id, time_slot, course id) with `view`, each pair among them counted once."""
+        totals, seen = [0, 0, 0], set()
+        for aula_id, time_slot, course_id in lessons:
+            totals = [x + y for x, y in zip(totals, self._clashes(view, aula_id, time_slot, course_id, seen))]
+            seen.add((aula_id, time_slot))
+        return totals
+
+    def _metrics_of(self, branch):
+        base = self._base_metrics()
+        if branch is self.live:
+            return base
+        removed = [(change.aula_id, change.time_slot, change.before) for change in branch.changes() if change.before is not None]
+        added = [(change.aula_id, change.time_slot, change.after) for change in branch.changes() if change.after is not None]
+        lost, gained = self._delta(self.live, removed), self._delta(branch, added)
+        chairs = base.chairs_to_buy + sum(self._chairs_missing(aula_id, branch.schedule(aula_id)) - self._room_chairs.get(aula_id, 0)
+                                          for aula_id in branch._rooms.keys() | branch.closed)
+        unplaced = sum(course_id not in branch.at_slot(time_slot).values()
+                       for aula_id in branch.closed for time_slot, course_id in self._base.get(aula_id, {}).items())
+        clashes = (old - minus + plus for old, minus, plus in zip(base[2:5], lost, gained))
+        return ScenarioMetrics(base.lessons - len(removed) + len(added), chairs, *clashes, unplaced)
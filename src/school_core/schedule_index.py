@@ -0,0 +1,134 @@
+"""
+Inverted indexes over the classroom schedules.
+
+`Aula.lezioni` only answers "what happens in this room?". The index keeps
+teacher -> slots, course -> slots and student -> slots up to date as schedules and
+enrollments change, so the per-person timetables cost O(result size) instead of a
+scan of every room and every enrollment.
+
+Entries are `(time_slot, aula id)` pairs and courses are keyed by id: names are
+looked up when a timetable is read, so renaming a course or a room needs no
+maintenance here. Lookups return `(time_slot, nome_aula, nome_corso)` tuples.
+"""
+from .time_slots import parse_time_slot, slot_contains
+
+class ScheduleIndex:
+    def __init__(self):
+        self.course_slots = {}   # course id -> {(time_slot, aula id)}
+        self.teacher_slots = {}  # docente -> {(time_slot, aula id)}
+        self.student_slots = {}  # student id -> {(time_slot, aula id)}
+        self._aule = {}  # aula id -> Aula
+        self._corsi = {} # course id -> Corso
+        self._course_teacher = {}   # course id -> docente its slots are indexed under
+        self._course_students = {}  # course id -> {student id}
+        self._slot_course = {} # (time_slot, aula id) -> course id
+
+    def rebuild(self, aule, corsi):
+        """Builds all indexes from scratch (after load_data)."""
+        self.__init__()
+        for corso in corsi:
+            self._add_course(corso)
+            self._course_students[corso.id] = {s.id for s in corso.alunni_frequentanti_il_tal_corso}
+        for aula in aule:
+            self._aule[aula.id] = aula
+            for time_slot, corso in aula.lezioni.items():
+                self._add_entry((time_slot, aula.id), corso.id)
+
+    def _add_course(self, corso):
+        self._corsi.setdefault(corso.id, corso)
+        self._course_teacher.setdefault(corso.id, corso.docente)
+
+    def _add_entry(self, entry, course_id):
+        self._slot_course[entry] = course_id
+        self.course_slots.setdefault(course_id, set()).add(entry)
+        if course_id in self._course_teacher:
+            self.teacher_slots.setdefault(self._course_teacher[course_id], set()).add(entry)
+        for student_id in self._course_students.get(course_id, ()):
+            self.student_slots.setdefault(student_id, set()).add(entry)
+
+    def _remove_entry(self, entry):
+        course_id = self._slot_course.pop(entry, None)
+        if course_id is None:
+            return
+        self.course_slots.get(course_id, set()).discard(entry)
+        if course_id in self._course_teacher:
+            self.teacher_slots.get(self._course_teacher[course_id], set()).discard(entry)
+        for student_id in self._course_students.get(course_id, ()):
+            self.student_slots.get(student_id, set()).discard(entry)
+
+    def _named(self, entries):
+        """(time_slot, aula id) entries -> sorted (time_slot, nome_aula, nome_corso) with the current names."""
+        return sorted((time_slot, self._aule[aula_id].nome_aula, self._corsi[self._slot_course[(time_slot, aula_id)]].nome_corso)
+                      for time_slot, aula_id in entries)
+
+    # --- Maintenance (called by Segreteria on every change) ---
+    def set_slot(self, aula, time_slot, corso):
+        """Records that `corso` now occupies `aula` at `time_slot`, replacing any previous course there."""
+        self._aule.setdefault(aula.id, aula)
+        self._add_course(corso)
+        self._remove_entry((time_slot, aula.id))
+        self._add_entry((time_slot, aula.id), corso.id)
+
+    def clear_slot(self, aula, time_slot):
+        self._remove_entry((time_slot, aula.id))
+
+    def enroll(self, corso, student_id):
+        students = self._course_students.setdefault(corso.id, set())
+        if student_id in students:
+            return
+        students.add(student_id)
+        slots = self.course_slots.get(corso.id)
+        if slots:
+            self.student_slots.setdefault(student_id, set()).update(slots)
+
+    def set_teacher(self, corso):
+        """Moves the course's slots to its (edited) teacher."""
+        previous = self._course_teacher.get(corso.id)
+        if previous == corso.docente:
+            return
+        slots = self.course_slots.get(corso.id, set())
+        if previous is not None:
+            self.teacher_slots.get(previous, set()).difference_update(slots)
+        self._course_teacher[corso.id] = corso.docente
+        self.teacher_slots.setdefault(corso.docente, set()).update(slots)
+
+    def drop_students(self, student_ids):
+        """Forgets deleted or graduated students."""
+        student_ids = set(student_ids)
+        for student_id in student_ids:
+            self.student_slots.pop(student_id, None)
+        for students in self._course_students.values():
+            students -= student_ids
+
+    def drop_course(self, corso):
+        """Forgets a deleted course and every slot it had."""
+        for entry in list(self.course_slots.get(corso.id, ())):
+            self._remove_entry(entry)
+        self.course_slots.pop(corso.id, None)
+        self._corsi.pop(corso.id, None)
+        self._course_teacher.pop(corso.id, None)
+        self._course_students.pop(corso.id, None)
+
+    def drop_classroom(self, aula):
+        """Forgets a deleted classroom and every slot it had."""
+        for time_slot in aula.lezioni:
+            self._remove_entry((time_slot, aula.id))
+        self._aule.pop(aula.id, None)
+
+    # --- Lookups ---
+    def slots_for_course(self, course_id):
+        return self._named(self.course_slots.get(course_id, ()))
+
+    def slots_for_teacher(self, docente):
+        return self._named(self.teacher_slots.get(docente, ()))
+
+    def slots_for_student(self, student_id):
+        return self._named(self.student_slots.get(student_id, ()))
+
+    def student_location(self, student_id, weekday, at_time, on_date=None):
+        """Entries of the student's timetable that cover `at_time` on `weekday` (usually zero or one)."""
+        return [entry for entry in self.slots_for_student(student_id)
+                if slot_contains(parse_time_slot(entry[0]), weekday, at_time, on_date)]
+
+    def teachers(self):
+        return sorted(set(self._course_teacher.values()))
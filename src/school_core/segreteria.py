@@ -0,0 +1,913 @@
+"""
+The secretariat: in-memory school state on top of DatabaseManager.
+
+UI-agnostic: messages go through the `notify(level, message)` callback and every
+method returns its result, so Streamlit, the CLI and scripts all share this logic.
+"""
+import collections
+import datetime
+import logging
+
+from .db import DatabaseManager
+from .academic_year import academic_year_of
+from .duplicates import DuplicateIndex
+from .gradebook import Assessment, build_transcript, gradebook_from_db
+from . import warm_start as warm
+from .models import Alunni, Aula, Corso, Persona, UtilitySuite
+from .recurrence import RecurringSchedule, describe_rule, make_rule, rule_from_row, rule_from_time_slot
+from .report_rendering import render_purchase_order
+from .scenarios import ScheduleScenarios
+from .schedule_index import ScheduleIndex
+
+logger = logging.getLogger("school_core")
+
+_LOG_LEVELS = {"success": logging.INFO, "info": logging.INFO, "warning": logging.WARNING, "error": logging.ERROR}
+
+def _log_notify(level, message):
+    logger.log(_LOG_LEVELS.get(level, logging.INFO), message)
+
+def _direct_read(db_manager, method_name, *args):
+    return getattr(db_manager, method_name)(*args)
+
+class Segreteria(Persona):
+    def __init__(self, name, last_name, date_of_birth, db_manager=None, notify=None, read=None, warm_start=None):
+        super().__init__(name, last_name, date_of_birth)
+        self.db_manager = db_manager or DatabaseManager()
+        # notify(level, message) with level in 'success', 'info', 'warning', 'error'
+        self.notify = notify or _log_notify
+        # read(db_manager, method_name, *args) lets a front end put a cache in front of the DB reads
+        self.read = read or _direct_read
+        self.all_students = []
+        self.all_courses = []
+        self.all_aule = []
+        self.waitlist = {} # course id -> [Alunni] waiting for a seat this academic year, in queue order
+        self.schedule_index = ScheduleIndex() # teacher/course/student -> slots, kept in sync below
+        self.recurring = RecurringSchedule() # Recurring lessons, expanded on demand
+        self.version = 0 # Bumped on every in-memory change, invalidates the memoized options below
+        self._memo = {}
+        self._duplicates = None # DuplicateIndex over all_students, built on first use and kept in sync
+        self._scenarios = None # What-if branches of the schedule, see scenarios()
+        self.warm_start = warm_start # Path of the warm-start snapshot (see warm_start.py), None for none
+        self._warm_stamp = None # Change-log head the snapshot reflects
+        self._warm_version = None # self.version when the snapshot was written
+
+    def _changed(self):
+        self.version += 1
+
+    @property
+    def all_aula_schedules(self):
+        """{ nome_aula: { time slot: nome_corso } } with the current names."""
+        return {aula.nome_aula: aula.occupazione_aula for aula in self.all_aule}
+
+    def _memoized(self, key, build):
+        """Returns build() and reuses it across reruns until the in-memory data changes."""
+        cached = self._memo.get(key)
+        if cached is None or cached[0] != self.version:
+            cached = (self.version, build())
+            self._memo[key] = cached
+        return cached[1]
+
+    # --- Options for the selectboxes (rebuilt only after changes, not on every rerun) ---
+    def course_options(self):
+        return self._memoized("course_options", lambda: {c.nome_corso: c for c in self.all_courses})
+
+    def aula_options(self):
+        return self._memoized("aula_options", lambda: {a.nome_aula: a for a in self.all_aule})
+
+    def student_options(self):
+        """{ 'name last_name': Alunni }; homonyms get their ID in the label instead of hiding each other."""
+        def build():
+            homonyms = collections.Counter((s.name, s.last_name) for s in self.all_students)
+            return {f"{s.name} {s.last_name}" + (f" (#{s.id})" if homonyms[(s.name, s.last_name)] > 1 else ""): s
+                    for s in self.all_students}
+        return self._memoized("student_options", build)
+
+    # --- Duplicate students (see duplicates.py) ---
+    def _duplicate_index(self):
+        if self._duplicates is None:
+            self._duplicates = DuplicateIndex((s.id, s.name, s.last_name, s.date_of_birth) for s in self.all_students)
+        return self._duplicates
+
+    def find_duplicates(self, name, last_name, date_of_birth, exclude=None):
+        """[(Alunni, score)] of the students that look like this one, best first (`exclude`: the student itself)."""
+        matches = self._duplicate_index().matches(name, last_name, date_of_birth, exclude=getattr(exclude, "id", exclude))
+        if not matches: # The usual case: no need to look the records up
+            return []
+        by_id = {s.id: s for s in self.all_students}
+        return [(by_id[student_id], score) for student_id, score in matches if student_id in by_id]
+
+    def duplicate_groups(self):
+        """
+        [[(Alunni, score)]] of records that look like the same student, largest groups first; within a group
+        the oldest record (lowest ID) comes first, each with its best score against the others.
+        One scan of the whole school, memoized until the next change.
+        """
+        def build():
+            index = self._duplicate_index()
+            pairs = index.pairs()
+            best = collections.defaultdict(float)
+            for match in pairs:
+                best[match.id] = max(best[match.id], match.score)
+                best[match.other_id] = max(best[match.other_id], match.score)
+            by_id = {s.id: s for s in self.all_students}
+            return [[(by_id[student_id], best[student_id]) for student_id in ids] for ids in index.groups(pairs)]
+        return self._memoized("duplicate_groups", build)
+
+    def _index_students(self, alunni):
+        if self._duplicates is not None:
+            for alunno in alunni:
+                self._duplicates.add(alunno.id, alunno.name, alunno.last_name, alunno.date_of_birth)
+
+    # --- Creation (DB first, then in-memory state) ---
+    def add_student(self, name, last_name, date_of_birth, allow_duplicates=True):
+        """With allow_duplicates=False a student that looks like an existing one is reported and not added."""
+        if not allow_duplicates:
+            matches = self.find_duplicates(name, last_name, date_of_birth)
+            if matches:
+                self.notify("warning", f"⚠️ '{name} {last_name}' ({date_of_birth}) looks like " + ", ".join(
+                    f"{a.name} {a.last_name} (#{a.id}, {a.date_of_birth})" for a, _ in matches[:3]) + ". Not added.")
+                return None
+        student_id = self.db_manager.insert_student(name, last_name, date_of_birth)
+        if not student_id:
+            return None
+        new_alunno = Alunni(name, last_name, date_of_birth, id=student_id)
+        self.all_students.append(new_alunno)
+        self._index_students([new_alunno])
+        self._changed()
+        return new_alunno
+
+    def add_course(self, nome_corso, durata, docente):
+        course_id = self.db_manager.insert_course(nome_corso, durata, docente)
+        if not course_id:
+            return None
+        new_corso = Corso(nome_corso, durata, docente, id=course_id)
+        self.all_courses.append(new_corso)
+        self._changed()
+        return new_corso
+
+    def add_classroom(self, nome_aula, capacita_sedie):
+        classroom_id = self.db_manager.insert_classroom(nome_aula, capacita_sedie, {}) # Initial empty schedule
+        if not classroom_id:
+            return None
+        new_aula = Aula(nome_aula, capacita_sedie, id=classroom_id)
+        self.all_aule.append(new_aula)
+        self._changed()
+        return new_aula
+
+    def add_students(self, rows):
+        """Batch add_student: (name, last_name, date_of_birth) rows, one DB transaction. Returns the new Alunni."""
+        rows = [tuple(row) for row in rows]
+        ids = self.db_manager.insert_students(rows)
+        new_alunni = [Alunni(name, last_name, dob, id=student_id) for (name, last_name, dob), student_id in zip(rows, ids)]
+        if new_alunni:
+            self.all_students.extend(new_alunni)
+            self._index_students(new_alunni)
+            self._changed()
+        return new_alunni
+
+    def creazione_calendario(self, aula: Aula, corso: Corso, time_slot: str):
+        aula.lezioni[time_slot] = corso
+        self.db_manager.write_classroom_slots(assign=[(aula.id, time_slot, corso.id)]) # Update DB: this slot only
+        self.schedule_index.set_slot(aula, time_slot, corso)
+        self._changed()
+        self.notify("success", f"✅ Schedule for '{aula.nome_aula}' at '{time_slot}' set to '{corso.nome_corso}'.")
+        self._sync_waitlist()
+
+    def creazione_classe(self, corso: Corso, students_to_assign: list):
+        already_assigned = {s.id for s in corso.alunni_frequentanti_il_tal_corso}
+        reserved = self.reserve_seats([(corso, s) for s in students_to_assign if s.id not in already_assigned])
+        if reserved is None:
+            return
+        enrolled, waitlisted = reserved
+        self.notify("success", f"✅ {len(enrolled)} new students assigned to course '{corso.nome_corso}'.")
+        if waitlisted:
+            self.notify("warning", f"⚠️ '{corso.nome_corso}' is full: {len(waitlisted)} students are on its waitlist "
+                                   f"and will be enrolled as seats free up.")
+
+    def schedule_many(self, entries):
+        """Batch creazione_calendario: (aula, corso, time_slot) entries, one DB transaction."""
+        entries = list(entries)
+        for aula, corso, time_slot in entries:
+            aula.lezioni[time_slot] = corso
+            self.schedule_index.set_slot(aula, time_slot, corso)
+        self.db_manager.write_classroom_slots(assign=[(aula.id, time_slot, corso.id) for aula, corso, time_slot in entries])
+        self._changed()
+        self._sync_waitlist()
+        return len(entries)
+
+    def enroll_many(self, pairs):
+        """
+        Batch creazione_classe: (corso, alunno) pairs, one DB transaction. Returns how many were
+        enrolled; students over a course's seats are waitlisted (see self.waitlist).
+        """
+        new_pairs = []
+        assigned = {}
+        for corso, alunno in pairs:
+            ids = assigned.setdefault(corso.id, {s.id for s in corso.alunni_frequentanti_il_tal_corso})
+            if alunno.id not in ids:
+                ids.add(alunno.id)
+                new_pairs.append((corso, alunno))
+        reserved = self.reserve_seats(new_pairs)
+        return len(reserved[0]) if reserved else 0
+
+    # --- Seat limits: a course has the seats of the smallest classroom it is scheduled in ---
+    def _enroll_in_memory(self, corso, alunno):
+        if any(s.id == alunno.id for s in corso.alunni_frequentanti_il_tal_corso):
+            return 0
+        corso.alunni_frequentanti_il_tal_corso.append(alunno)
+        self.schedule_index.enroll(corso, alunno.id)
+        return 1
+
+    def reserve_seats(self, pairs):
+        """
+        Enrolls (corso, alunno) pairs within the free seats, one atomic DB statement; the rest join the
+        waitlists. Returns ([enrolled pairs], [waitlisted pairs]), or None on error.
+        """
+        if not pairs:
+            return [], []
+        result = self.db_manager.reserve_seats([(corso.id, alunno.id) for corso, alunno in pairs])
+        if result is None:
+            return None
+        by_ids = {(corso.id, alunno.id): (corso, alunno) for corso, alunno in pairs}
+        enrolled = [by_ids[pair] for pair in map(tuple, result["enrolled"]) if pair in by_ids]
+        waitlisted = [by_ids[pair] for pair in map(tuple, result["waitlisted"]) if pair in by_ids]
+        for corso, alunno in enrolled:
+            self._enroll_in_memory(corso, alunno)
+        for corso, alunno in waitlisted:
+            queue = self.waitlist.setdefault(corso.id, [])
+            if all(a.id != alunno.id for a in queue):
+                queue.append(alunno)
+        self._changed()
+        return enrolled, waitlisted
+
+    def course_seats(self):
+        """{course id: (seats or None if not scheduled, enrolled this year, waitlisted)}"""
+        return {course_id: (seats, enrolled, waiting)
+                for course_id, seats, enrolled, waiting in self.read(self.db_manager, "fetch_course_seats")}
+
+    def leave_waitlist(self, corso: Corso, alunni):
+        ids = {a.id for a in alunni}
+        if not self.db_manager.leave_waitlist([(corso.id, student_id) for student_id in ids]):
+            return False
+        self.waitlist[corso.id] = [a for a in self.waitlist.get(corso.id, []) if a.id not in ids]
+        self._changed()
+        self.notify("success", f"✅ {len(ids)} students removed from the waitlist of '{corso.nome_corso}'.")
+        return True
+
+    def _sync_waitlist(self):
+        """
+        Picks up the students the DB promoted from the waitlists when seats were freed (unenrollments,
+        schedule and capacity changes: see DatabaseManager._WAITLIST_TRIGGERS).
+        """
+        if not any(self.waitlist.values()):
+            return
+        students = {s.id: s for s in self.all_students}
+        corsi = {c.id: c for c in self.all_courses}
+        waiting = {}
+        for course_id, student_id in self.read(self.db_manager, "fetch_waitlist"):
+            if course_id in corsi and student_id in students:
+                waiting.setdefault(course_id, []).append(students[student_id])
+        promoted = 0
+        for course_id, alunni in self.waitlist.items():
+            still_waiting = {a.id for a in waiting.get(course_id, ())}
+            if course_id in corsi:
+                promoted += sum(self._enroll_in_memory(corsi[course_id], a) for a in alunni
+                                if a.id in students and a.id not in still_waiting)
+        self.waitlist = waiting
+        self._changed()
+        if promoted:
+            self.notify("info", f"🎟️ {promoted} students moved from the waitlist into their courses.")
+
+    # --- Edits: one row by id in the DB; the objects are shared, so every calendar, roster and index sees the change ---
+    def edit_student(self, alunno: Alunni, name, last_name, date_of_birth):
+        if not self.db_manager.update_student(alunno.id, name, last_name, date_of_birth):
+            return False
+        alunno.name, alunno.last_name, alunno.date_of_birth = name, last_name, date_of_birth
+        self._index_students([alunno])
+        self._changed()
+        self.notify("success", f"✅ Student #{alunno.id} updated: {name} {last_name}.")
+        return True
+
+    def edit_course(self, corso: Corso, nome_corso, durata, docente):
+        if not self.db_manager.update_course(corso.id, nome_corso, durata, docente):
+            return False
+        corso.nome_corso, corso.durata, corso.docente = nome_corso, durata, docente
+        self.schedule_index.set_teacher(corso)
+        self._changed()
+        self.notify("success", f"✅ Course #{corso.id} updated: '{nome_corso}' ({docente}).")
+        return True
+
+    def edit_classroom(self, aula: Aula, nome_aula, capacita_sedie):
+        if not self.db_manager.update_classroom(aula.id, nome_aula, capacita_sedie):
+            return False
+        aula.nome_aula, aula.capacita_sedie = nome_aula, capacita_sedie
+        self._changed()
+        self.notify("success", f"✅ Classroom #{aula.id} updated: '{nome_aula}' ({capacita_sedie} chairs).")
+        self._sync_waitlist() # More chairs: more seats for its courses
+        return True
+
+    # --- Lifecycle: bulk delete / graduate / merge (one DB transaction each, then the in-memory state) ---
+    def _drop_students(self, ids):
+        self.all_students = [s for s in self.all_students if s.id not in ids]
+        if self._duplicates is not None:
+            for student_id in ids:
+                self._duplicates.remove(student_id)
+        for corso in self.all_courses:
+            corso.alunni_frequentanti_il_tal_corso = [s for s in corso.alunni_frequentanti_il_tal_corso if s.id not in ids]
+        self.schedule_index.drop_students(ids)
+
+    def _drop_courses(self, corsi):
+        ids = {c.id for c in corsi}
+        self.all_courses = [c for c in self.all_courses if c.id not in ids]
+        for aula in self.all_aule:
+            for time_slot in [slot for slot, corso in aula.lezioni.items() if corso.id in ids]:
+                del aula.lezioni[time_slot]
+        for corso in corsi:
+            self.schedule_index.drop_course(corso)
+        self.recurring.set_rules(rule for rule in self.recurring.rules.values() if rule.course_id not in ids)
+
+    def _drop_classrooms(self, aule):
+        ids = {a.id for a in aule}
+        for aula in aule:
+            self.schedule_index.drop_classroom(aula)
+        self.all_aule = [a for a in self.all_aule if a.id not in ids]
+        self.recurring.set_rules(rule for rule in self.recurring.rules.values() if rule.classroom_id not in ids)
+
+    def _notify_displaced(self, displaced):
+        if displaced:
+            lessons = ", ".join(f"'{nome_corso}' ({time_slot}, was in '{nome_aula}')" for nome_aula, time_slot, nome_corso in displaced)
+            self.notify("warning", f"⚠️ {len(displaced)} lessons need a new classroom: {lessons}")
+
+    def delete_students(self, alunni):
+        """Deletes the students with their enrollments, attendance and scores. Returns the DB counts, or None."""
+        ids = {a.id for a in alunni}
+        result = self.db_manager.delete_students(ids)
+        if result is None:
+            return None
+        self._drop_students(ids)
+        self._changed()
+        self.notify("success", f"✅ Deleted {result['students']} students, {result['course_students']} enrollments, "
+                               f"{result['attendance']} attendance records and {result['scores']} scores.")
+        self._sync_waitlist()
+        return result
+
+    def graduate_students(self, alunni, on_date=None):
+        """Marks the students as left (graduated, withdrawn) and ends their enrollments; attendance is kept."""
+        ids = {a.id for a in alunni}
+        result = self.db_manager.graduate_students(ids, on_date)
+        if result is None:
+            return None
+        self._drop_students(ids)
+        self._changed()
+        self.notify("success", f"✅ {result['students']} students graduated, {result['course_students']} enrollments ended.")
+        self._sync_waitlist()
+        return result
+
+    def merge_students(self, alunno, duplicates):
+        """Folds duplicate records into `alunno`: their enrollments, attendance and scores move to it."""
+        ids = {a.id for a in duplicates} - {alunno.id}
+        if not ids:
+            self.notify("warning", "⚠️ Choose at least one duplicate other than the record to keep.")
+            return None
+        result = self.db_manager.merge_students(alunno.id, ids)
+        if result is None:
+            return None
+        for corso in self.all_courses:
+            enrolled = {s.id for s in corso.alunni_frequentanti_il_tal_corso}
+            if enrolled & ids and alunno.id not in enrolled:
+                corso.alunni_frequentanti_il_tal_corso.append(alunno)
+                self.schedule_index.enroll(corso, alunno.id)
+        self._drop_students(ids)
+        self._changed()
+        self.notify("success", f"✅ Merged {result['students']} records into {alunno.name} {alunno.last_name} "
+                               f"({result['attendance']} attendance records and {result['scores']} scores moved).")
+        self._sync_waitlist()
+        return result
+
+    def delete_courses(self, corsi):
+        """Deletes the courses with their slots, recurring rules, enrollments, attendance and assessments."""
+        result = self.db_manager.delete_courses({c.id for c in corsi})
+        if result is None:
+            return None
+        self._drop_courses(corsi)
+        self._changed()
+        self.notify("success", f"✅ Deleted {result['courses']} courses, {result['course_students']} enrollments, "
+                               f"{result['attendance']} attendance records, {result['schedule_rules']} recurring lessons "
+                               f"and {result['assessments']} assessments.")
+        return result
+
+    def deactivate_courses(self, corsi, on_date=None):
+        """Closes the courses: removed from every schedule, history kept."""
+        result = self.db_manager.deactivate_courses({c.id for c in corsi}, on_date)
+        if result is None:
+            return None
+        self._drop_courses(corsi)
+        self._changed()
+        self.notify("success", f"✅ {result['courses']} courses closed, {result['schedule_rules']} recurring lessons removed.")
+        return result
+
+    def merge_courses(self, corso, duplicates):
+        """Folds duplicate courses into `corso`: students, attendance, slots, recurring lessons and assessments move to it."""
+        duplicates = [c for c in duplicates if c.id != corso.id]
+        if not duplicates:
+            self.notify("warning", "⚠️ Choose at least one duplicate other than the course to keep.")
+            return None
+        result = self.db_manager.merge_courses(corso.id, {c.id for c in duplicates})
+        if result is None:
+            return None
+        enrolled = {s.id for s in corso.alunni_frequentanti_il_tal_corso}
+        for duplicate in duplicates:
+            for alunno in duplicate.alunni_frequentanti_il_tal_corso:
+                if alunno.id not in enrolled:
+                    enrolled.add(alunno.id)
+                    corso.alunni_frequentanti_il_tal_corso.append(alunno)
+                    self.schedule_index.enroll(corso, alunno.id)
+        ids = {c.id for c in duplicates}
+        for aula in self.all_aule:
+            for time_slot, other in list(aula.lezioni.items()):
+                if other.id in ids:
+                    aula.lezioni[time_slot] = corso
+                    self.schedule_index.set_slot(aula, time_slot, corso)
+        for duplicate in duplicates:
+            self.schedule_index.drop_course(duplicate)
+        self.recurring.set_rules(rule._replace(course_id=corso.id) if rule.course_id in ids else rule
+                                 for rule in self.recurring.rules.values())
+        self.all_courses = [c for c in self.all_courses if c.id not in ids]
+        self._changed()
+        self.notify("success", f"✅ Merged {result['courses']} courses into '{corso.nome_corso}' "
+                               f"({result['attendance']} attendance records and {result['assessments']} assessments moved).")
+        self._sync_waitlist()
+        return result
+
+    def delete_classrooms(self, aule):
+        """Deletes the classrooms with their schedules and recurring lessons; the lessons they had are reported."""
+        result = self.db_manager.delete_classrooms({a.id for a in aule})
+        if result is None:
+            return None
+        self._drop_classrooms(aule)
+        self._changed()
+        self.notify("success", f"✅ Deleted {result['classrooms']} classrooms and {result['schedule_rules']} recurring lessons.")
+        self._notify_displaced(result["displaced"])
+        self._sync_waitlist()
+        return result
+
+    def deactivate_classrooms(self, aule, on_date=None):
+        """Takes the classrooms out of service; the lessons they had are reported for rescheduling."""
+        result = self.db_manager.deactivate_classrooms({a.id for a in aule}, on_date)
+        if result is None:
+            return None
+        self._drop_classrooms(aule)
+        self._changed()
+        self.notify("success", f"✅ {result['classrooms']} classrooms out of service, {result['schedule_rules']} recurring lessons removed.")
+        self._notify_displaced(result["displaced"])
+        self._sync_waitlist()
+        return result
+
+    def merge_classrooms(self, aula, duplicates):
+        """Folds duplicate classrooms into `aula`: their slots (where it is free) and recurring lessons move to it."""
+        duplicates = [a for a in duplicates if a.id != aula.id]
+        if not duplicates:
+            self.notify("warning", "⚠️ Choose at least one duplicate other than the classroom to keep.")
+            return None
+        result = self.db_manager.merge_classrooms(aula.id, {a.id for a in duplicates})
+        if result is None:
+            return None
+        ids = {a.id for a in duplicates}
+        corsi = {c.id: c for c in self.all_courses}
+        self.recurring.set_rules(rule._replace(classroom_id=aula.id) if rule.classroom_id in ids else rule
+                                 for rule in self.recurring.rules.values())
+        self._drop_classrooms(duplicates)
+        for time_slot, course_id in result["schedule"].items():
+            corso = corsi.get(course_id)
+            if corso is not None and aula.lezioni.get(time_slot) is not corso:
+                aula.lezioni[time_slot] = corso
+                self.schedule_index.set_slot(aula, time_slot, corso)
+        self._changed()
+        self.notify("success", f"✅ Merged {result['classrooms']} classrooms into '{aula.nome_aula}'.")
+        self._notify_displaced(result["displaced"])
+        self._sync_waitlist()
+        return result
+
+    def propose_room_reassignment(self, move_cost=1):
+        """Runs the room optimizer on the current schedules. Nothing is changed until apply_room_reassignment."""
+        from .room_optimizer import optimize_room_assignment # NumPy is only loaded when needed
+        course_students = {c.nome_corso: len(c.alunni_frequentanti_il_tal_corso) for c in self.all_courses}
+        return optimize_room_assignment(self.all_aule, course_students, move_cost=move_cost)
+
+    def apply_room_reassignment(self, plan):
+        """Writes the proposed schedule of every classroom touched by the plan's moves."""
+        aule_by_name = {a.nome_aula: a for a in self.all_aule}
+        corsi_by_name = {c.nome_corso: c for c in self.all_courses}
+        moves = [(time_slot, corsi_by_name[nome_corso], aule_by_name[old_room], aule_by_name[new_room])
+                 for time_slot, nome_corso, old_room, new_room in plan.moves]
+        for time_slot, _, old_aula, _ in moves:
+            del old_aula.lezioni[time_slot]
+            self.schedule_index.clear_slot(old_aula, time_slot)
+        for time_slot, corso, _, new_aula in moves:
+            new_aula.lezioni[time_slot] = corso
+            self.schedule_index.set_slot(new_aula, time_slot, corso)
+        # Only the moved slots are written; a room another course moved into keeps its slot
+        self.db_manager.write_classroom_slots(
+            assign=[(new_aula.id, time_slot, corso.id) for time_slot, corso, _, new_aula in moves],
+            clear=[(old_aula.id, time_slot) for time_slot, _, old_aula, _ in moves if time_slot not in old_aula.lezioni])
+        self._changed()
+        self.notify("success", f"✅ {len(plan.moves)} lessons moved.")
+        self._sync_waitlist()
+
+    # --- What-if scenarios (see scenarios.py) ---
+    def scenarios(self):
+        """
+        The what-if branches of the weekly schedule. The base is copied once per version of the
+        in-memory data; after a change the branches are replayed on a fresh copy of it.
+        """
+        current = self._scenarios
+        if current is None or current.version != self.version:
+            self._scenarios = ScheduleScenarios(
+                {a.id: {time_slot: corso.id for time_slot, corso in a.lezioni.items()} for a in self.all_aule},
+                {a.id: a.capacita_sedie for a in self.all_aule},
+                {c.id: c.docente for c in self.all_courses},
+                {c.id: {s.id for s in c.alunni_frequentanti_il_tal_corso} for c in self.all_courses},
+                version=self.version)
+            if current is not None:
+                self._scenarios.adopt(current)
+        return self._scenarios
+
+    def promote_scenario(self, name, on_date=None):
+        """
+        Makes a branch the live schedule, in one transaction: its slot changes, then the rooms it closes
+        go out of service. Refused if someone changed one of its slots meanwhile. Returns the DB result, or None.
+        """
+        scenarios = self.scenarios()
+        branch = scenarios.get(name)
+        changes, unplaced = branch.changes(), branch.metrics().unplaced
+        result = self.db_manager.apply_schedule_changes(changes, branch.closed, on_date)
+        if result is None:
+            return None
+        if result["conflicts"]:
+            self.notify("error", f"❌ Scenario '{name}' not applied: {len(result['conflicts'])} of its slots were changed "
+                                 f"by someone else since. Reload the data to see them.")
+            return result
+        aule_by_id = {a.id: a for a in self.all_aule}
+        corsi_by_id = {c.id: c for c in self.all_courses}
+        for aula_id, time_slot, _, course_id in changes:
+            aula = aule_by_id[aula_id]
+            if course_id is None:
+                aula.lezioni.pop(time_slot, None)
+                self.schedule_index.clear_slot(aula, time_slot)
+            else:
+                aula.lezioni[time_slot] = corsi_by_id[course_id]
+                self.schedule_index.set_slot(aula, time_slot, corsi_by_id[course_id])
+        self._drop_classrooms([aule_by_id[aula_id] for aula_id in branch.closed if aula_id in aule_by_id])
+        scenarios.drop(name)
+        self._changed()
+        self.notify("success", f"✅ Scenario '{name}' is now the live schedule: {result['changed']} slots changed, "
+                               f"{result['classrooms']} classrooms out of service.")
+        self._notify_displaced(result["displaced"])
+        if unplaced:
+            self.notify("warning", f"⚠️ {unplaced} lessons of the closed classrooms were not moved elsewhere and are no longer scheduled.")
+        self._sync_waitlist()
+        return result
+
+    # --- Recurring schedule rules (see recurrence.py) ---
+    def rule_names(self, rule):
+        """(nome_aula, nome_corso) of a ScheduleRule or Occurrence, with the current names."""
+        aule, corsi = self._memoized("rule_names", lambda: ({a.id: a for a in self.all_aule}, {c.id: c for c in self.all_courses}))
+        aula, corso = aule.get(rule.classroom_id), corsi.get(rule.course_id)
+        return (aula.nome_aula if aula else f"Classroom #{rule.classroom_id}",
+                corso.nome_corso if corso else f"Course #{rule.course_id}")
+
+    def schedule_rule_clashes(self, rule):
+        """
+        [(other rule, first clash date)] for the lessons `rule` would overlap: rules and literal slots
+        in the same classroom, and the lessons of the same teacher in any classroom.
+        """
+        corso = next((c for c in self.all_courses if c.id == rule.course_id), None)
+        same_teacher = {c.id for c in self.all_courses if corso and c.docente == corso.docente}
+        candidates = [r for r in self.recurring.rules.values() if r.classroom_id == rule.classroom_id or r.course_id in same_teacher]
+        for aula in self.all_aule:
+            for time_slot, other in aula.lezioni.items():
+                if aula.id == rule.classroom_id or other.id in same_teacher:
+                    slot_rule = rule_from_time_slot(aula.id, other.id, time_slot)
+                    if slot_rule is not None:
+                        candidates.append(slot_rule)
+        return self.recurring.clashes(rule, candidates)
+
+    def add_schedule_rule(self, aula: Aula, corso: Corso, weekday, start, end, start_date, end_date,
+                          interval_weeks=1, exceptions=()):
+        """Stores a recurring lesson as one rule. Returns the ScheduleRule, or None if invalid or clashing."""
+        rule = make_rule(aula.id, corso.id, weekday, start, end, start_date, end_date, interval_weeks, exceptions)
+        if rule.end <= rule.start or rule.end_date is None or rule.end_date < rule.start_date:
+            self.notify("error", "❌ The lesson must end after it starts, and the end date can't precede the start date.")
+            return None
+        clashes = self.schedule_rule_clashes(rule)
+        if clashes:
+            details = "; ".join(f"'{nome_corso}' in '{nome_aula}' on {date.isoformat()}"
+                                for other, date in clashes for nome_aula, nome_corso in [self.rule_names(other)])
+            self.notify("error", f"❌ '{corso.nome_corso}' {describe_rule(rule)} clashes with: {details}")
+            return None
+        rule_id = self.db_manager.insert_schedule_rule(
+            aula.id, corso.id, rule.weekday, rule.start.strftime("%H:%M"), rule.end.strftime("%H:%M"),
+            rule.start_date.isoformat(), rule.end_date.isoformat(), rule.interval_weeks,
+            [d.isoformat() for d in rule.exceptions]
+        )
+        if not rule_id:
+            return None
+        rule = rule._replace(id=rule_id)
+        self.recurring.add(rule)
+        self._changed()
+        self.notify("success", f"✅ '{corso.nome_corso}' in '{aula.nome_aula}' {describe_rule(rule)}.")
+        return rule
+
+    def add_schedule_rule_exception(self, rule, date):
+        """Cancels one lesson of a recurring rule."""
+        exceptions = rule.exceptions | {date}
+        if not self.db_manager.update_schedule_rule_exceptions(rule.id, [d.isoformat() for d in exceptions]):
+            return None
+        rule = rule._replace(exceptions=frozenset(exceptions))
+        self.recurring.add(rule)
+        self._changed()
+        return rule
+
+    def recurring_rules(self):
+        """[(nome_aula, nome_corso, ScheduleRule)] sorted by classroom, weekday and time."""
+        rules = [self.rule_names(rule) + (rule,) for rule in self.recurring.rules.values()]
+        return sorted(rules, key=lambda r: (r[0], r[2].weekday, r[2].start, r[2].id))
+
+    def delete_schedule_rule(self, rule):
+        if self.db_manager.delete_schedule_rule(rule.id):
+            self.recurring.remove(rule.id)
+            self._changed()
+            self._sync_waitlist()
+
+    def lessons_between(self, start, end):
+        """Occurrences of all recurring rules from `start` to `end` (inclusive); recent windows are cached."""
+        return self.recurring.occurrences(start, end)
+
+    def calendar_events(self, window=None):
+        """
+        Events for streamlit-calendar, plus the warnings for slots that couldn't be parsed.
+        Weekly slots and recurring rules are expanded for `window` = (first day, last day) only,
+        by default the seven days from today. Memoized until the schedules change.
+        """
+        if window is None:
+            today = datetime.date.today()
+            window = (today, today + datetime.timedelta(days=6))
+        return self._memoized(("calendar_events", window), lambda: self._build_calendar_events(window))
+
+    def _build_calendar_events(self, window):
+        warnings = []
+        # Literal slots go through the same expansion as the stored rules
+        slot_rules = []
+        for aula_obj in self.all_aule:
+            for time_slot_str, corso in aula_obj.lezioni.items():
+                rule = rule_from_time_slot(aula_obj.id, corso.id, time_slot_str)
+                if rule is None:
+                    warnings.append(f"Could not parse schedule time '{time_slot_str}' for '{aula_obj.nome_aula}'. Skipping this event.")
+                else:
+                    slot_rules.append(rule)
+        lessons = RecurringSchedule(slot_rules).occurrences(*window) + self.lessons_between(*window)
+        events = [{
+            "title": f"{nome_corso} ({nome_aula})",
+            "start": f"{lesson.date.isoformat()}T{lesson.start.strftime('%H:%M')}:00",
+            "end": f"{lesson.date.isoformat()}T{lesson.end.strftime('%H:%M')}:00",
+            "resourceId": nome_aula # Optional: to group by classroom if needed
+        } for lesson in lessons for nome_aula, nome_corso in [self.rule_names(lesson)]]
+        return events, warnings
+
+    # --- Gradebook (see gradebook.py): assessments and scores stay in the DB, grades are computed on demand ---
+    def assessments(self, corso=None, academic_year=None):
+        """The Assessments of `corso` (default: every course) in `academic_year` (default: current), by course and date."""
+        return [Assessment(*row) for row in self.read(self.db_manager, "fetch_assessments", corso and corso.id, academic_year)]
+
+    def add_assessment(self, corso: Corso, name, weight=1, max_score=10, assessment_date=None):
+        name = str(name).strip()
+        if not name or weight < 0 or max_score <= 0:
+            self.notify("error", "❌ An assessment needs a name, a weight of 0 or more and a maximum score above 0.")
+            return None
+        assessment_date = assessment_date and str(assessment_date)
+        assessment_id = self.db_manager.insert_assessment(corso.id, name, weight, max_score, assessment_date)
+        if not assessment_id:
+            return None
+        self.notify("success", f"✅ Assessment '{name}' added to '{corso.nome_corso}'.")
+        return Assessment(assessment_id, corso.id, name, weight, max_score, assessment_date, academic_year_of(assessment_date))
+
+    def delete_assessment(self, assessment):
+        removed = self.db_manager.delete_assessment(assessment.id)
+        if removed is not None:
+            self.notify("success", f"✅ Assessment '{assessment.name}' deleted with {removed} scores.")
+        return removed
+
+    def scores(self, assessment):
+        """{student id: score} of one assessment."""
+        return dict(self.read(self.db_manager, "fetch_scores", assessment.id))
+
+    def record_scores(self, assessment, scores):
+        """
+        Saves an assessment's scores for the course roster in one transaction: {Alunni or student id: score,
+        or None to remove it}. Nothing is saved if a score is out of range or a student doesn't attend the
+        course. Returns {"saved", "removed"}, or None.
+        """
+        scores = {getattr(key, "id", key): score for key, score in scores.items()}
+        corso = next((c for c in self.all_courses if c.id == assessment.course_id), None)
+        roster = {a.id for a in corso.alunni_frequentanti_il_tal_corso} if corso else set()
+        outside = sorted(set(scores) - roster)
+        if outside:
+            self.notify("error", f"❌ Students {', '.join(map(str, outside[:10]))} don't attend this course. No score saved.")
+            return None
+        invalid = sorted(i for i, score in scores.items() if score is not None and not 0 <= score <= assessment.max_score)
+        if invalid:
+            self.notify("error", f"❌ Scores must be between 0 and {assessment.max_score:g} (students "
+                                 f"{', '.join(map(str, invalid[:10]))}). No score saved.")
+            return None
+        result = self.db_manager.record_scores(assessment.id, scores)
+        if result is not None:
+            self.notify("success", f"✅ '{assessment.name}': {result['saved']} scores saved, {result['removed']} removed.")
+        return result
+
+    def gradebook(self, academic_year=None):
+        """Final grades, rankings and distributions of the whole school (see gradebook.Gradebook)."""
+        return gradebook_from_db(self.db_manager, academic_year)
+
+    def transcript(self, alunno, gradebook, academic_year=None):
+        """Per course: the student's assessments with their scores and the final grade from `gradebook`."""
+        rows = self.read(self.db_manager, "fetch_transcript", alunno.id, academic_year)
+        return build_transcript(rows, gradebook.student_grades(alunno.id))
+
+    # --- Timetable lookups (served by the schedule index) ---
+    def teacher_timetable(self, docente):
+        """[(time_slot, nome_aula, nome_corso)] taught by `docente`."""
+        return self.schedule_index.slots_for_teacher(docente)
+
+    def course_timetable(self, corso: Corso):
+        return self.schedule_index.slots_for_course(corso.id)
+
+    def student_timetable(self, alunno: Alunni):
+        return self.schedule_index.slots_for_student(alunno.id)
+
+    def student_location(self, alunno: Alunni, weekday: int, at_time: datetime.time):
+        """Where is the student on `weekday` (0 = Monday) at `at_time`? Returns the matching timetable entries."""
+        return self.schedule_index.student_location(alunno.id, weekday, at_time)
+
+    def stampa_calendario(self):
+        output_content = ""
+        output_content += "--- School Calendar ---\n"
+        output_content += f"Generated On: {datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n\n"
+        
+        all_aula_schedules = self.all_aula_schedules
+        if not all_aula_schedules and not self.recurring.rules:
+            output_content += "No classroom schedules defined.\n"
+        else:
+            sorted_aula_names = sorted(all_aula_schedules.keys())
+            for aula_name in sorted_aula_names:
+                schedule_data = all_aula_schedules[aula_name]
+                output_content += f"=== Classroom: {aula_name} ===\n"
+                if not schedule_data:
+                    output_content += "  No schedule for this classroom.\n"
+                else:
+                    sorted_schedule = sorted(schedule_data.items())
+                    for time_slot, course_name in sorted_schedule:
+                        output_content += f"  {time_slot}: {course_name}\n"
+                output_content += "\n"
+            if self.recurring.rules:
+                output_content += "=== Recurring Lessons ===\n"
+                for nome_aula, nome_corso, rule in self.recurring_rules():
+                    output_content += f"  {nome_aula}: {nome_corso} {describe_rule(rule)}\n"
+                output_content += "\n"
+        return output_content, "calendario_scolastico.txt"
+
+    def controllo_forniture(self, aula: Aula, numero_alunni_previsti: int):
+        """
+        Verifies the chairs of `aula` for `numero_alunni_previsti` students.
+        Returns (order_content, order_filename) of the supplier order if chairs are missing, else None.
+        """
+        self.notify("info", f"Secretariat: Performing supply check for classroom '{aula.nome_aula}'.")
+
+        sedie_mancanti = UtilitySuite.controlla_sedie(aula, numero_alunni_previsti)
+
+        if sedie_mancanti > 0:
+            self.notify("warning", f"🚨 Attention! {sedie_mancanti} chairs are missing for classroom '{aula.nome_aula}'.")
+            return self._invia_ordine_fornitore(aula.nome_aula, sedie_mancanti)
+        self.notify("success", f"✅ Sufficient chairs for classroom '{aula.nome_aula}'. No new orders needed.")
+        return None
+
+    def _invia_ordine_fornitore(self, nome_aula: str, quantita: int):
+        return render_purchase_order(nome_aula, quantita)
+
+    def supply_shortfalls(self):
+        """Returns { nome_aula: missing chairs } using the largest course scheduled in each classroom."""
+        shortfalls = {}
+        for aula in self.all_aule:
+            expected = max((len(corso.alunni_frequentanti_il_tal_corso) for corso in aula.lezioni.values()), default=0)
+            if expected - aula.capacita_sedie > 0:
+                shortfalls[aula.nome_aula] = expected - aula.capacita_sedie
+        return shortfalls
+
+    def report_jobs(self, orders=True, calendars=True, rosters=True):
+        """Builds the job list for report_rendering (purchase orders, room calendars, course rosters)."""
+        jobs = []
+        if orders:
+            jobs += [("purchase_order", (nome_aula, quantita)) for nome_aula, quantita in self.supply_shortfalls().items()]
+        if calendars:
+            jobs += [("room_calendar", (aula.nome_aula, dict(aula.occupazione_aula))) for aula in self.all_aule]
+        if rosters:
+            jobs += [("course_roster", (c.nome_corso, c.durata, c.docente,
+                                        [(a.name, a.last_name, a.date_of_birth) for a in c.alunni_frequentanti_il_tal_corso]))
+                     for c in self.all_courses]
+        return jobs
+
+    # --- Data Persistence Methods (now using DBManager) ---
+    def save_data(self):
+        # Data is saved incrementally as it's added/updated through the methods above
+        self.notify("info", "Data is saved incrementally. No need for a full save button in this design yet.")
+
+    def _warm_state(self):
+        return self.all_students, self.all_courses, self.all_aule, self.waitlist, self.schedule_index, self.recurring
+
+    def load_data(self):
+        head = self.warm_start and self.db_manager.change_log_head()
+        state = head and warm.load(self.warm_start, head)
+        if state:
+            self.all_students, self.all_courses, self.all_aule, self.waitlist, self.schedule_index, self.recurring = state
+            self._duplicates = None
+            self._changed()
+            self._warm_stamp, self._warm_version = head, self.version
+            return
+        # The snapshot is stamped with the current head: its state must come from the database itself,
+        # not from a read cache that may predate another process's write
+        self._load_from_db(_direct_read if head else self.read)
+        # A write that landed during the load may or may not be in memory: no snapshot then
+        if head and self.db_manager.change_log_head() == head and warm.save(self.warm_start, head, self._warm_state()):
+            self._warm_stamp, self._warm_version = head, self.version
+
+    def save_warm_start(self):
+        """
+        Rewrites the warm-start snapshot after this process's writes. Skipped when nothing changed in
+        memory or when the change log has entries (e.g. from another process) that memory doesn't show.
+        """
+        if not self.warm_start or self._warm_stamp is None or self.version == self._warm_version:
+            return False
+        rows = [row for batch in self.db_manager.iter_changes(self._warm_stamp[0]) for row in batch]
+        if not rows:
+            return False
+        # Entries pruned since the stamp can't be checked against memory
+        if self.db_manager.change_log_gap(self._warm_stamp[0]) is not False or not warm.reflects(self, rows):
+            self._warm_stamp = None # Memory is behind the database: the next load_data rebuilds
+            return False
+        head = (rows[-1][0], rows[-1][5])
+        if not warm.save(self.warm_start, head, self._warm_state()):
+            return False
+        self._warm_stamp, self._warm_version = head, self.version
+        return True
+
+    def _load_from_db(self, read):
+        self.all_students = []
+        self.all_courses = []
+        self.all_aule = []
+        self._duplicates = None
+
+        # Load Students
+        students_data = read(self.db_manager, "fetch_students")
+        temp_alunni_dict = {} # Use a dict for quick lookup by ID
+        for s_id, name, last_name, dob in students_data:
+            alunno = Alunni(name, last_name, dob, id=s_id)
+            self.all_students.append(alunno)
+            temp_alunni_dict[s_id] = alunno
+        # st.success(f"Loaded {len(self.all_students)} students from database.") # Removed for cleaner startup
+
+        # Load Classrooms
+        classrooms_data = read(self.db_manager, "fetch_classrooms")
+        temp_aula_dict = {} # For quick lookup
+        for a_id, nome_aula, capacita_sedie, _ in classrooms_data:
+            aula = Aula(nome_aula, capacita_sedie, id=a_id)
+            self.all_aule.append(aula)
+            temp_aula_dict[a_id] = aula
+        # st.success(f"Loaded {len(self.all_aule)} classrooms from database.") # Removed for cleaner startup
+
+        # Load Courses and assign students
+        courses_data = read(self.db_manager, "fetch_courses")
+        for c_id, nome_corso, durata, docente, assigned_students_data in courses_data:
+            corso = Corso(nome_corso, durata, docente, id=c_id)
+            for s_id, s_name, s_last_name, s_dob in assigned_students_data:
+                # Retrieve the actual Alunni object from temp_alunni_dict
+                if s_id in temp_alunni_dict:
+                    corso.alunni_frequentanti_il_tal_corso.append(temp_alunni_dict[s_id])
+                else:
+                    self.notify("warning", f"Student with ID {s_id} for course '{nome_corso}' not found during loading.")
+            self.all_courses.append(corso)
+        # st.success(f"Loaded {len(self.all_courses)} courses from database.") # Removed for cleaner startup
+
+        # Load Schedules: the slots point at the Corso objects, so renaming a course touches no calendar
+        corsi_by_id = {c.id: c for c in self.all_courses}
+        for a_id, time_slot, c_id in read(self.db_manager, "fetch_classroom_slots"):
+            if a_id in temp_aula_dict and c_id in corsi_by_id:
+                temp_aula_dict[a_id].lezioni[time_slot] = corsi_by_id[c_id]
+
+        self.recurring.set_rules(rule_from_row(row) for row in read(self.db_manager, "fetch_schedule_rules")
+                                 if row[1] in temp_aula_dict and row[2] in corsi_by_id)
+        self.schedule_index.rebuild(self.all_aule, self.all_courses)
+
+        self.waitlist = {}
+        for c_id, s_id in read(self.db_manager, "fetch_waitlist"):
+            if c_id in corsi_by_id and s_id in temp_alunni_dict:
+                self.waitlist.setdefault(c_id, []).append(temp_alunni_dict[s_id])
+        self._changed()
@@ -0,0 +1,123 @@
+"""
+Multi-campus mode: one SQLite database file per school or campus, behind a router.
+
+Every campus is a `<name>.db` file with the usual schema in one directory, so a
+campus can be backed up, copied or opened on its own (`--db campuses/north.db`).
+Writes to different campuses never wait on the same file lock, and a damaged file
+only takes its own campus down.
+
+District reports scatter one task per campus over a thread pool (sqlite3 releases
+the GIL while a query runs) and merge the partial results.
+"""
+import concurrent.futures
+import logging
+import os
+import re
+import threading
+
+from .db import DatabaseManager
+from .segreteria import Segreteria
+
+logger = logging.getLogger("school_core")
+
+# Campus names double as file names
+CAMPUS_NAME = re.compile(r"^[A-Za-z0-9][A-Za-z0-9_.-]*$")
+
+class ShardRouter:
+    """Routes each campus to its own DatabaseManager, opened on first use and then shared."""
+    def __init__(self, directory="campuses", on_error=None, on_warning=None, max_workers=None):
+        self.directory = directory
+        self.on_error = on_error or logger.error
+        self.on_warning = on_warning or logger.warning
+        self.max_workers = max_workers
+        self._shards = {}
+        self._lock = threading.Lock()
+        self._pool = None
+
+    def path(self, campus):
+        """Database file of `campus`. Raises ValueError for names that aren't safe file names."""
+        if not CAMPUS_NAME.match(campus or ""):
+            raise ValueError(f"Invalid campus name '{campus}': use letters, digits, '.', '_' and '-'.")
+        return os.path.join(self.directory, f"{campus}.db")
+
+    def campuses(self):
+        """Campuses that have a database file, sorted."""
+        if not os.path.isdir(self.directory):
+            return []
+        return sorted(name[:-3] for name in os.listdir(self.directory)
+                      if name.endswith(".db") and CAMPUS_NAME.match(name[:-3]))
+
+    def shard(self, campus, create=False):
+        """DatabaseManager of `campus`. Unknown campuses are reported and give None, unless `create`."""
+        with self._lock:
+            db_manager = self._shards.get(campus)
+            if db_manager is not None:
+                return db_manager
+            try:
+                path = self.path(campus)
+            except ValueError as e:
+                self.on_error(str(e))
+                return None
+            if not create and not os.path.exists(path):
+                self.on_error(f"Unknown campus '{campus}'.")
+                return None
+            os.makedirs(self.directory, exist_ok=True)
+            db_manager = self._shards[campus] = DatabaseManager(path, on_error=self.on_error, on_warning=self.on_warning)
+            return db_manager
+
+    def _executor(self):
+        with self._lock:
+            if self._pool is None:
+                self._pool = concurrent.futures.ThreadPoolExecutor(self.max_workers, thread_name_prefix="campus")
+            return self._pool
+
+    def scatter(self, task, campuses=None):
+        """
+        Runs task(campus, db_manager) for every campus (default: all) in parallel and returns
+        {campus: result}. Campuses whose task raised are reported through on_error and left out.
+        """
+        campuses = self.campuses() if campuses is None else list(campuses)
+        shards = [(campus, self.shard(campus)) for campus in campuses]
+        pool = self._executor()
+        futures = {campus: pool.submit(task, campus, db_manager) for campus, db_manager in shards if db_manager is not None}
+        results = {}
+        for campus, future in futures.items():
+            try:
+                results[campus] = future.result()
+            except Exception as e:
+                self.on_error(f"Campus '{campus}': {e}")
+        return results
+
+    # --- District reports ---
+    def enrollment_report(self, campuses=None):
+        """({campus: counts}, district totals) with the counts of DatabaseManager.enrollment_summary()."""
+        per_campus = {campus: summary for campus, summary in
+                      self.scatter(lambda campus, db_manager: db_manager.enrollment_summary(), campuses).items()
+                      if summary is not None}
+        totals = {}
+        for summary in per_campus.values():
+            for key, value in summary.items():
+                totals[key] = totals.get(key, 0) + value
+        return per_campus, totals
+
+    def supply_needs(self, campuses=None):
+        """({campus: {nome_aula: missing chairs}}, chairs to buy district-wide)."""
+        per_campus = self.scatter(_campus_shortfalls, campuses)
+        return per_campus, sum(sum(shortfalls.values()) for shortfalls in per_campus.values())
+
+    def close(self):
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown()
+                self._pool = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+def _campus_shortfalls(campus, db_manager):
+    secretario = Segreteria("Campus", campus, "", db_manager=db_manager, notify=lambda level, message: None)
+    secretario.load_data()
+    return secretario.supply_shortfalls()
@@ -0,0 +1,76 @@
+"""
+Point-in-time copies of the database for heavy report reads.
+
+A long read on the live file (all attendance, exports, early-warning scans) holds
+a shared lock that roll-call writers have to wait for. A ReportSnapshot copies the
+live file with the sqlite3 backup API into a temp file, at most once every
+`max_age` seconds, and serves reads from a read-only DatabaseManager on the copy.
+Reports see data up to `max_age` seconds old and only touch the live file's lock
+for the copy itself.
+"""
+import contextlib
+import datetime
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+
+from .db import DatabaseManager
+
+class ReportSnapshot:
+    # Copies kept on disk: readers that picked up the previous one may still be opening it
+    KEEP = 2
+
+    def __init__(self, db_manager, max_age=60, directory=None):
+        self.db_manager = db_manager
+        self.max_age = max_age
+        self.taken_at = None # datetime of the last copy
+        self.generation = 0
+        self._directory = tempfile.mkdtemp(prefix="school_snapshot_", dir=directory)
+        self._readers = []
+        self._taken = None # time.monotonic() of the last copy
+        self._lock = threading.Lock()
+
+    def age(self):
+        """Seconds since the last copy, None before the first one."""
+        return None if self._taken is None else time.monotonic() - self._taken
+
+    def reader(self):
+        """Read-only DatabaseManager on the current copy, refreshed first if older than max_age."""
+        with self._lock:
+            if not self._readers or time.monotonic() - self._taken >= self.max_age:
+                self._refresh()
+            return self._readers[-1] if self._readers else self.db_manager
+
+    def refresh(self):
+        with self._lock:
+            self._refresh()
+            return self._readers[-1] if self._readers else self.db_manager
+
+    def _refresh(self):
+        path = os.path.join(self._directory, f"snapshot_{self.generation + 1}.db")
+        try:
+            with contextlib.closing(sqlite3.connect(self.db_manager.db_name)) as src, \
+                    contextlib.closing(sqlite3.connect(path)) as dst:
+                src.backup(dst) # One step: a single short read transaction on the live file
+                # The copy inherits the live file's WAL mode; read-only, it needs no -wal/-shm files next to it
+                dst.execute("PRAGMA journal_mode = DELETE")
+        except sqlite3.Error as e:
+            # Keep serving the previous copy (or the live file before the first one)
+            self.db_manager.on_error(f"Error taking report snapshot: {e}")
+            return
+        self.generation += 1
+        self._readers.append(DatabaseManager(path, on_error=self.db_manager.on_error,
+                                             on_warning=self.db_manager.on_warning, read_only=True))
+        self.taken_at = datetime.datetime.now()
+        self._taken = time.monotonic()
+        while len(self._readers) > self.KEEP:
+            with contextlib.suppress(OSError):
+                os.remove(self._readers.pop(0).db_name)
+
+    def close(self):
+        with self._lock:
+            self._readers = []
+            shutil.rmtree(self._directory, ignore_errors=True)
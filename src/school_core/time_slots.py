@@ -0,0 +1,67 @@
+"""
+Parsing of the free-text time slots stored in `Aula.occupazione_aula`.
+
+The UI stores slots as 'Monday 09:00 - 11:00', older data and the CLI may use
+'YYYY-MM-DD 09:00 - 11:00', 'Monday 09:00' or Italian day names ('Lunedì 9:00').
+"""
+import collections
+import datetime
+
+DAY_NAMES = {
+    "monday": 0, "tuesday": 1, "wednesday": 2, "thursday": 3, "friday": 4, "saturday": 5, "sunday": 6,
+    "lunedì": 0, "martedì": 1, "mercoledì": 2, "giovedì": 3, "venerdì": 4, "sabato": 5, "domenica": 6,
+    "lunedi": 0, "martedi": 1, "mercoledi": 2, "giovedi": 3, "venerdi": 4,
+}
+WEEKDAY_NAMES = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+
+# date is None for weekly slots ('Monday ...'); end defaults to one hour after start
+TimeSlot = collections.namedtuple("TimeSlot", ["date", "weekday", "start", "end"])
+
+def _parse_time(value):
+    hours, minutes = value.split(":")
+    return datetime.time(int(hours), int(minutes))
+
+def parse_time_slot(time_slot):
+    """Returns a TimeSlot, or None if the string can't be understood."""
+    parts = time_slot.replace("–", "-").split()
+    if len(parts) < 2:
+        return None
+    day = None
+    weekday = DAY_NAMES.get(parts[0].lower())
+    if weekday is None:
+        try:
+            day = datetime.date.fromisoformat(parts[0])
+        except ValueError:
+            return None
+        weekday = day.weekday()
+    try:
+        if "-" in parts[1]: # 'Monday 09:00-11:00'
+            start, end = (_parse_time(p) for p in parts[1].split("-", 1))
+        elif len(parts) >= 4 and parts[2] == "-":
+            start, end = _parse_time(parts[1]), _parse_time(parts[3])
+        else:
+            start = _parse_time(parts[1])
+            end = (datetime.datetime.combine(datetime.date.min, start) + datetime.timedelta(hours=1)).time()
+    except ValueError:
+        return None
+    if end <= start: # Slots don't wrap past midnight
+        end = datetime.time.max
+    return TimeSlot(day, weekday, start, end)
+
+def slot_contains(slot, weekday, at_time, on_date=None):
+    """True if the parsed slot covers `at_time` on the given weekday (and date, for dated slots)."""
+    if slot is None or slot.weekday != weekday:
+        return False
+    if slot.date is not None and on_date is not None and slot.date != on_date:
+        return False
+    return slot.start <= at_time < slot.end
+
+def slots_overlap(a, b, text_a, text_b):
+    """True if two parsed slots (`text_a`, `text_b`: the strings) can hold lessons at the same time."""
+    if text_a == text_b:
+        return True
+    if a is None or b is None: # Unparseable slots only clash with the very same string
+        return False
+    if a.weekday != b.weekday or (a.date is not None and b.date is not None and a.date != b.date):
+        return False
+    return a.start < b.end and b.start < a.end
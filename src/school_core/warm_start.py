@@ -0,0 +1,145 @@
+"""
+Warm-start snapshot: the loaded, indexed state of a Segreteria pickled next to its database.
+
+load_data() rebuilds every object and the schedule index from the database, which is
+most of a worker's cold start. The snapshot (`<db file>.warm`) stores that state with a
+stamp: the change-log head it reflects, (seq, changed_at) of the latest entry, and the
+academic year. On start one query compares the stamp with the database's head; if they
+match the state is unpickled, otherwise (or on any error) the data is loaded from the
+database and the snapshot rewritten. The database stays the source of truth.
+
+After the process's own writes the snapshot is stamped with the new head only if every
+change-log entry since its stamp is already reflected in memory (reflects() below): a
+write from another process that this one hasn't loaded leaves the old stamp, and the
+next start rebuilds.
+
+    segreteria = Segreteria(..., warm_start=warm_start_path("school_data.db"))
+    segreteria.load_data()         # From the snapshot when it's current
+    segreteria.save_warm_start()   # After writes, e.g. at the end of a request
+"""
+import contextlib
+import gc
+import json
+import logging
+import os
+import pickle
+import tempfile
+
+from .academic_year import academic_year_of
+from .changes import change_from_row
+
+logger = logging.getLogger("school_core")
+
+# Bump when the pickled classes or the state tuple change: older snapshots are then ignored
+FORMAT = 2
+
+def warm_start_path(db_name):
+    return f"{db_name}.warm"
+
+def _header(stamp):
+    return {"format": FORMAT, "stamp": tuple(stamp), "academic_year": academic_year_of()}
+
+def save(path, stamp, state):
+    """Writes the snapshot atomically (temp file + rename). Returns True, or False on error."""
+    directory = os.path.dirname(os.path.abspath(path))
+    try:
+        with tempfile.NamedTemporaryFile("wb", dir=directory, prefix=".warm_", delete=False) as f:
+            pickle.dump(_header(stamp), f, protocol=pickle.HIGHEST_PROTOCOL)
+            pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(f.name, path)
+        return True
+    except (OSError, pickle.PicklingError, RecursionError) as e:
+        logger.warning("Warm-start snapshot not written: %s", e)
+        with contextlib.suppress(NameError, OSError):
+            os.remove(f.name)
+        return False
+
+def load(path, stamp):
+    """The pickled state if the snapshot exists and was taken at `stamp` (this academic year), else None."""
+    try:
+        with open(path, "rb") as f:
+            if pickle.load(f) != _header(stamp): # Only the small header is read for a stale snapshot
+                return None
+            collecting = gc.isenabled()
+            gc.disable() # Unpickling only creates objects: collections would find nothing to free
+            try:
+                return pickle.load(f)
+            finally:
+                if collecting:
+                    gc.enable()
+    except FileNotFoundError:
+        return None
+    except Exception as e: # A damaged or incompatible snapshot is just rebuilt
+        logger.warning("Warm-start snapshot ignored: %s", e)
+        return None
+
+def _key(change):
+    data = change.data
+    if change.table == "classroom_slots":
+        return data.get("classroom_id"), data.get("time_slot")
+    if change.table == "course_students":
+        return data.get("course_id"), data.get("student_id")
+    if change.table == "course_waitlist":
+        return data.get("course_id"), data.get("student_id"), data.get("academic_year")
+    return data.get("id")
+
+def reflects(segreteria, rows):
+    """
+    True if the in-memory state already shows every change-log row (the latest entry per record
+    decides), as load_data would: inactive records, and the ones that point to them, are not loaded.
+    """
+    latest = {}
+    for row in rows:
+        change = change_from_row(row)
+        latest[(change.table, _key(change))] = change
+    students = {a.id: a for a in segreteria.all_students}
+    courses = {c.id: c for c in segreteria.all_courses}
+    aule = {a.id: a for a in segreteria.all_aule}
+    year = academic_year_of()
+    for (table, _), change in latest.items():
+        data = change.data
+        exists = change.operation != "DELETE" and data.get("inactive_since") is None
+        if table == "students":
+            alunno = students.get(data["id"])
+            expected = (data["name"], data["last_name"], data["date_of_birth"]) if exists else None
+            if (alunno and (alunno.name, alunno.last_name, alunno.date_of_birth)) != expected:
+                return False
+        elif table == "courses":
+            corso = courses.get(data["id"])
+            expected = (data["nome_corso"], data["durata"], data["docente"]) if exists else None
+            if (corso and (corso.nome_corso, corso.durata, corso.docente)) != expected:
+                return False
+        elif table == "classrooms":
+            aula = aule.get(data["id"])
+            if (aula and (aula.nome_aula, aula.capacita_sedie)) != ((data["nome_aula"], data["capacita_sedie"]) if exists else None):
+                return False
+        elif table == "classroom_slots":
+            aula, course_id = aule.get(data["classroom_id"]), data["course_id"]
+            corso = aula and aula.lezioni.get(data["time_slot"])
+            expected = course_id if exists and aula and course_id in courses else None
+            if (corso and corso.id) != expected:
+                return False
+        elif table == "course_students":
+            corso = courses.get(data["course_id"])
+            enrolled = bool(corso) and any(s.id == data["student_id"] for s in corso.alunni_frequentanti_il_tal_corso)
+            if enrolled != (exists and bool(corso) and data["student_id"] in students):
+                return False
+        elif table == "course_waitlist":
+            waiting = any(a.id == data["student_id"] for a in segreteria.waitlist.get(data["course_id"], ()))
+            expected = exists and data["academic_year"] == year and data["course_id"] in courses and data["student_id"] in students
+            if waiting != expected:
+                return False
+        elif table == "schedule_rules":
+            rule = segreteria.recurring.rules.get(data["id"])
+            expected = exists and data["classroom_id"] in aule and data["course_id"] in courses
+            if (rule is not None) != expected:
+                return False
+            if rule is not None and (rule.classroom_id, rule.course_id) != (data["classroom_id"], data["course_id"]):
+                return False
+            if rule is not None and sorted(map(str, rule.exceptions)) != sorted(json.loads(data["exceptions"] or "[]")):
+                return False
+        elif table in ("attendance", "assessments", "scores"): # Not part of the loaded state
+            continue
+        else: # An archived year ('*') or a table this module doesn't know
+            return False
+    return True